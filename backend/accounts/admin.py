@@ -11,7 +11,7 @@ from .models import (
     ConsumerAccount, EmployeeAccount, CompanyAccount,
     AgencyStateCoordinator, AgencyState, AgencyDistrictCoordinator, AgencyDistrict,
     AgencyPincodeCoordinator, AgencyPincode, AgencySubFranchise, AgencyRegionAssignment,
-    Wallet, WalletTransaction, UserKYC, WithdrawalRequest
+    Wallet, WalletTransaction, UserKYC, WithdrawalRequest, TeamCounter
 )
 from django.contrib.admin.widgets import FilteredSelectMultiple
 from locations.models import State, City
@@ -846,7 +846,7 @@ class CategoryProxyAdmin(admin.ModelAdmin):
         preview = bool(form.cleaned_data.get('dist_preview'))
 
         try:
-            idx = _build_district_index() or {}
+            idx = _build_district_index()
         except Exception:
             idx = {}
 
@@ -870,9 +870,7 @@ class CategoryProxyAdmin(admin.ModelAdmin):
                     if m_state and not dlist and not m_pincodes_csv:
                         # All pins within the given state
                         sname = (m_state.name or '').strip().lower()
-                        for (skey, _d), pset in (idx.items() if hasattr(idx, 'items') else []):
-                            if skey == sname:
-                                pins.update(pset)
+                        pins.update(idx.pins_in_state(sname))
                     return pins
 
                 # Compute from owner's assignments
@@ -890,9 +888,7 @@ class CategoryProxyAdmin(admin.ModelAdmin):
                             pins.update(idx.get(('', dkey), set()))
                     elif a.level == 'state' and a.state:
                         sname = (a.state.name or '').strip().lower()
-                        for (skey, _d), pset in (idx.items() if hasattr(idx, 'items') else []):
-                            if skey == sname:
-                                pins.update(pset)
+                        pins.update(idx.pins_in_state(sname))
             except Exception:
                 pass
             return pins
@@ -922,8 +918,18 @@ class CategoryProxyAdmin(admin.ModelAdmin):
             if preview or count == 0:
                 continue
             try:
+                prev_sponsor = dict(candidates.values_list('id', 'registered_by_id'))
+                moved_ids = list(prev_sponsor.keys())
                 updated = candidates.update(registered_by=owner)
                 total_moved += updated
+                # QuerySet.update bypasses save(); refresh materialized sponsor paths and team counters
+                for moved in CustomUser.objects.filter(id__in=moved_ids):
+                    try:
+                        moved.refresh_genealogy_paths()
+                        active = bool(moved.account_active)
+                        TeamCounter.move_subtree(moved, prev_sponsor.get(moved.id), was_active=active, is_active=active)
+                    except Exception:
+                        pass
                 # Exclude moved users from further owners in this run
                 base = base.exclude(id__in=candidates.values_list('id', flat=True))
             except Exception:
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandParser
+
+from accounts.models import WalletTransaction
+
+
+class Command(BaseCommand):
+    help = (
+        "Backfill WalletTransaction.pending_release from meta.pending_due_to_inactive for rows written "
+        "before the column existed. Migration accounts/0036 runs this once; the command is for manual "
+        "re-runs. Walks rows by id in batches; safe to re-run."
+    )
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per batch (default: 5000)")
+        parser.add_argument("--dry-run", action="store_true", help="Count rows only; do not write.")
+
+    def handle(self, *args, **options):
+        batch_size = max(1, int(options.get("batch_size") or 5000))
+        dry_run = bool(options.get("dry_run"))
+
+        base = WalletTransaction.objects.filter(
+            pending_release=False, meta__pending_due_to_inactive=True
+        ).order_by("id")
+
+        last_id = 0
+        flagged = 0
+        while True:
+            ids = list(base.filter(id__gt=last_id).values_list("id", flat=True)[:batch_size])
+            if not ids:
+                break
+            last_id = ids[-1]
+            flagged += len(ids)
+            if not dry_run:
+                WalletTransaction.objects.filter(id__in=ids).update(pending_release=True)
+            self.stdout.write(f"  flagged={flagged} last_id={last_id}")
+
+        self.stdout.write(self.style.SUCCESS(f"Done. flagged={flagged} dry_run={dry_run}"))
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import transaction
+from django.db.models import Q
+
+from accounts.models import WalletTransaction
+
+
+class Command(BaseCommand):
+    help = (
+        "Backfill WalletTransaction.counterparty from meta (from_user_id/user_id, then from_user/username). "
+        "Walks rows by id in batches; safe to re-run."
+    )
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument("--batch-size", type=int, default=2000, help="Rows per batch (default: 2000)")
+        parser.add_argument("--dry-run", action="store_true", help="Resolve and report only; do not write.")
+
+    def handle(self, *args, **options):
+        batch_size = max(1, int(options.get("batch_size") or 2000))
+        dry_run = bool(options.get("dry_run"))
+
+        has_ref = (
+            Q(meta__has_key="from_user_id")
+            | Q(meta__has_key="user_id")
+            | Q(meta__has_key="from_user")
+            | Q(meta__has_key="username")
+        )
+        base = WalletTransaction.objects.filter(counterparty__isnull=True).filter(has_ref).order_by("id")
+
+        last_id = 0
+        scanned = 0
+        resolved = 0
+        while True:
+            rows = list(base.filter(id__gt=last_id).only("id", "meta", "counterparty")[:batch_size])
+            if not rows:
+                break
+            last_id = rows[-1].id
+            scanned += len(rows)
+            WalletTransaction.resolve_counterparties(rows)
+            changed = [r for r in rows if r.counterparty_id is not None]
+            resolved += len(changed)
+            if changed and not dry_run:
+                with transaction.atomic():
+                    WalletTransaction.objects.bulk_update(changed, ["counterparty"])
+            self.stdout.write(f"  scanned={scanned} resolved={resolved} last_id={last_id}")
+
+        self.stdout.write(self.style.SUCCESS(f"Done. scanned={scanned} resolved={resolved} dry_run={dry_run}"))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandParser
+
+from accounts.models import EarningsRollup, EarningsRollupState, WalletTransaction
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild EarningsRollup (per user x tx_type x bucket x day ledger totals) from WalletTransaction. "
+        "Safe to re-run; users without a built rollup are also queued for a background build on first read."
+    )
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument("--user-id", type=int, action="append", default=None, help="Limit to a user id (repeatable).")
+        parser.add_argument(
+            "--missing-only",
+            action="store_true",
+            help="Only build users whose rollup has never been built (skip users already maintained incrementally).",
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options.get("user_id")
+        missing_only = bool(options.get("missing_only"))
+
+        if user_ids:
+            targets = sorted(set(user_ids))
+        else:
+            targets = sorted(set(WalletTransaction.objects.order_by().values_list("user_id", flat=True).distinct()))
+        if missing_only:
+            built = set(EarningsRollupState.objects.values_list("user_id", flat=True))
+            targets = [uid for uid in targets if uid not in built]
+
+        self.stdout.write(self.style.NOTICE(f"users={len(targets)} missing_only={missing_only}"))
+        done = 0
+        for uid in targets:
+            try:
+                EarningsRollup.build_for_user(uid)
+                done += 1
+            except Exception as e:
+                self.stderr.write(f"user={uid} failed: {e}")
+            if done and done % 500 == 0:
+                self.stdout.write(f"  built={done}")
+
+        self.stdout.write(self.style.SUCCESS(f"Done. built={done}"))
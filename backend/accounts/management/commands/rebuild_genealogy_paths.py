@@ -0,0 +1,73 @@
+from collections import defaultdict, deque
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import transaction
+
+from accounts.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute materialized genealogy paths on CustomUser: sponsor_path (registered_by chain) "
+        "and matrix_path (5-matrix parent chain). Users in a cycle keep an empty path (FK walk fallback)."
+    )
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument(
+            "--tree",
+            choices=["sponsor", "matrix", "all"],
+            default="all",
+            help="Which path to rebuild (default: all).",
+        )
+        parser.add_argument("--batch-size", type=int, default=2000, help="bulk_update batch size (default: 2000)")
+        parser.add_argument("--dry-run", action="store_true", help="Report changes only; do not write.")
+
+    def handle(self, *args, **options):
+        which = options.get("tree") or "all"
+        batch_size = max(1, int(options.get("batch_size") or 2000))
+        dry_run = bool(options.get("dry_run"))
+
+        targets = []
+        if which in ("sponsor", "all"):
+            targets.append(("sponsor_path", "registered_by_id"))
+        if which in ("matrix", "all"):
+            targets.append(("matrix_path", "parent_id"))
+
+        for field, fk_attr in targets:
+            rows = list(CustomUser.objects.order_by("id").values_list("id", fk_attr, field))
+            ids = {r[0] for r in rows}
+            children = defaultdict(list)
+            roots = []
+            for uid, pid, _ in rows:
+                if pid and pid in ids:
+                    children[pid].append(uid)
+                else:
+                    roots.append(uid)
+
+            new_path = {}
+            for root_id in roots:
+                new_path[root_id] = "/"
+                q = deque([root_id])
+                while q:
+                    node = q.popleft()
+                    prefix = f"{new_path[node]}{node}/"
+                    for ch in children.get(node, []):
+                        new_path[ch] = prefix
+                        q.append(ch)
+
+            # Users never reached from a root are part of a cycle
+            changed = []
+            for uid, _, old in rows:
+                path = new_path.get(uid, "")
+                if path != (old or ""):
+                    changed.append(CustomUser(id=uid, **{field: path}))
+
+            cycles = len(rows) - len(new_path)
+            self.stdout.write(self.style.NOTICE(f"[{field}] users={len(rows)} roots={len(roots)} cyclic={cycles} changed={len(changed)}"))
+            if dry_run or not changed:
+                continue
+            for i in range(0, len(changed), batch_size):
+                with transaction.atomic():
+                    CustomUser.objects.bulk_update(changed[i:i + batch_size], [field])
+
+        self.stdout.write(self.style.SUCCESS(f"Done. dry_run={dry_run}"))
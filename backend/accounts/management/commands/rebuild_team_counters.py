@@ -0,0 +1,98 @@
+from collections import defaultdict, deque
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import transaction
+
+from accounts.models import CustomUser, TeamCounter, TeamCounterDelta
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute TeamCounter rows (direct/L1..L5 counts, team size, active team size) for every user "
+        "from the registered_by tree. Safe to re-run; use after bulk updates that bypass save()."
+    )
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument("--batch-size", type=int, default=2000, help="bulk upsert batch size (default: 2000)")
+        parser.add_argument("--dry-run", action="store_true", help="Report changes only; do not write.")
+
+    def handle(self, *args, **options):
+        batch_size = max(1, int(options.get("batch_size") or 2000))
+        dry_run = bool(options.get("dry_run"))
+        levels = len(TeamCounter.LEVEL_FIELDS)
+
+        # Pending deltas committed before the scan are part of it; dropped once the counters are written
+        delta_cutoff = TeamCounterDelta.objects.order_by("-id").values_list("id", flat=True).first() or 0
+        rows = list(CustomUser.objects.order_by("id").values_list("id", "registered_by_id", "account_active"))
+        ids = {r[0] for r in rows}
+        active = {uid: bool(a) for uid, _, a in rows}
+        children = defaultdict(list)
+        roots = []
+        for uid, pid, _ in rows:
+            if pid and pid in ids:
+                children[pid].append(uid)
+            else:
+                roots.append(uid)
+
+        # BFS order from roots; users in a sponsor cycle are never reached and get zero counters
+        order = []
+        q = deque(roots)
+        while q:
+            node = q.popleft()
+            order.append(node)
+            q.extend(children.get(node, []))
+
+        # Children before parents: level k of a node = sum of level k-1 of its children
+        lv = {}
+        team = {}
+        team_active = {}
+        for node in reversed(order):
+            kids = children.get(node, [])
+            counts = [len(kids)] + [0] * (levels - 1)
+            size = len(kids)
+            act = 0
+            for ch in kids:
+                ch_lv = lv[ch]
+                for k in range(1, levels):
+                    counts[k] += ch_lv[k - 1]
+                size += team[ch]
+                act += team_active[ch] + (1 if active[ch] else 0)
+            lv[node] = counts
+            team[node] = size
+            team_active[node] = act
+
+        existing = {
+            c.user_id: c
+            for c in TeamCounter.objects.all().only(
+                "user_id", "direct_active_count", "team_size", "active_team_size", *TeamCounter.LEVEL_FIELDS
+            )
+        }
+        fields = list(TeamCounter.LEVEL_FIELDS) + ["direct_active_count", "team_size", "active_team_size"]
+        changed = []
+        for uid, _, _ in rows:
+            counts = lv.get(uid, [0] * levels)
+            data = dict(zip(TeamCounter.LEVEL_FIELDS, counts))
+            data["direct_active_count"] = sum(1 for ch in children.get(uid, []) if active[ch]) if uid in lv else 0
+            data["team_size"] = team.get(uid, 0)
+            data["active_team_size"] = team_active.get(uid, 0)
+            cur = existing.get(uid)
+            if cur is not None and all(int(getattr(cur, f) or 0) == data[f] for f in fields):
+                continue
+            changed.append(TeamCounter(user_id=uid, **data))
+
+        cycles = len(rows) - len(order)
+        self.stdout.write(self.style.NOTICE(
+            f"users={len(rows)} roots={len(roots)} cyclic={cycles} counters={len(existing)} changed={len(changed)}"
+        ))
+        if not dry_run:
+            for i in range(0, len(changed), batch_size):
+                with transaction.atomic():
+                    TeamCounter.objects.bulk_create(
+                        changed[i:i + batch_size],
+                        update_conflicts=True,
+                        unique_fields=["user"],
+                        update_fields=fields,
+                    )
+            TeamCounterDelta.objects.filter(id__lte=delta_cutoff).delete()
+
+        self.stdout.write(self.style.SUCCESS(f"Done. dry_run={dry_run}"))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandParser
+from django.db.models import Sum
+
+from accounts.models import TaxPoolEntry
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold pending TaxPoolEntry rows (deferred tax withholding) into the company wallet "
+        "as TAX_POOL_CREDIT transactions. The process_tasks worker runs this periodically."
+    )
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Entries claimed per transaction (default: 1000)")
+        parser.add_argument("--max-batches", type=int, default=0, help="Stop after this many batches (0 = drain all)")
+        parser.add_argument("--dry-run", action="store_true", help="Show pending totals only; do not roll up.")
+
+    def handle(self, *args, **options):
+        pending = TaxPoolEntry.objects.filter(rolled_up=False)
+        agg = pending.aggregate(total=Sum("amount"))
+        self.stdout.write(self.style.NOTICE(f"Pending tax pool entries: {pending.count()} total=₹{agg['total'] or 0}"))
+
+        if options.get("dry_run"):
+            self.stdout.write(self.style.SUCCESS("Dry run: no rollup performed."))
+            return
+
+        done = TaxPoolEntry.rollup(
+            batch_size=int(options.get("batch_size") or 1000),
+            max_batches=int(options.get("max_batches") or 0),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {done} entries."))
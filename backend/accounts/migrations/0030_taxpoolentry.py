@@ -0,0 +1,35 @@
+# Generated by Django 6.1.2 on 2026-10-17 02:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0029_alter_customuser_category_rewardpointsaccount_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaxPoolEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('source_type', models.CharField(blank=True, default='', max_length=64)),
+                ('source_id', models.CharField(blank=True, default='', max_length=64)),
+                ('meta', models.JSONField(blank=True, null=True)),
+                ('rolled_up', models.BooleanField(db_index=True, default=False)),
+                ('rolled_up_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('company_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tax_pool_entries', to=settings.AUTH_USER_MODEL)),
+                ('from_user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tax_pool_contributions', to=settings.AUTH_USER_MODEL)),
+                ('wallet_tx', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tax_pool_entries', to='accounts.wallettransaction')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['rolled_up', 'company_user', 'id'], name='accounts_ta_rolled__61c102_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.1.2 on 2026-10-17 02:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0030_taxpoolentry'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('locations', '0004_remove_country_iso3_alter_country_iso2'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='matrix_path',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='sponsor_path',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['sponsor_path'], name='user_sponsor_path_idx', opclasses=['text_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['matrix_path'], name='user_matrix_path_idx', opclasses=['text_pattern_ops']),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 6.1.2 on 2026-10-17 03:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0031_customuser_genealogy_paths'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeamCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='team_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('l1_count', models.IntegerField(default=0)),
+                ('l2_count', models.IntegerField(default=0)),
+                ('l3_count', models.IntegerField(default=0)),
+                ('l4_count', models.IntegerField(default=0)),
+                ('l5_count', models.IntegerField(default=0)),
+                ('direct_active_count', models.IntegerField(default=0)),
+                ('team_size', models.IntegerField(default=0)),
+                ('active_team_size', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Team Counter',
+                'verbose_name_plural': 'Team Counters',
+            },
+        ),
+    ]
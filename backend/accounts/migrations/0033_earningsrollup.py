@@ -0,0 +1,40 @@
+# Generated by Django 6.1.2 on 2026-10-17 03:08
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0032_teamcounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EarningsRollupState',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='earnings_rollup_state', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('built_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EarningsRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tx_type', models.CharField(max_length=32)),
+                ('bucket', models.CharField(blank=True, default='', max_length=32)),
+                ('day', models.DateField()),
+                ('total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('credit_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('tx_count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='earnings_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'day'], name='accounts_ea_user_id_187f69_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'tx_type', 'bucket', 'day'), name='uniq_earnings_rollup_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.1.2 on 2026-10-17 03:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0034_wallettransaction_counterparty'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wallet',
+            name='auto_blocks_applied',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 6.1.2 on 2026-10-17 03:22
+
+from django.db import migrations, models
+
+
+def flag_pending_release(apps, schema_editor):
+    # One-time backfill of the new column from meta for rows written before it existed
+    WalletTransaction = apps.get_model("accounts", "WalletTransaction")
+    base = WalletTransaction.objects.filter(
+        pending_release=False, meta__pending_due_to_inactive=True
+    ).order_by("id")
+    last_id = 0
+    while True:
+        ids = list(base.filter(id__gt=last_id).values_list("id", flat=True)[:5000])
+        if not ids:
+            break
+        last_id = ids[-1]
+        WalletTransaction.objects.filter(id__in=ids).update(pending_release=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0035_wallet_auto_blocks_applied'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wallettransaction',
+            name='pending_release',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='wallettransaction',
+            index=models.Index(condition=models.Q(('pending_release', True)), fields=['user'], name='wallettx_pending_release_idx'),
+        ),
+        migrations.RunPython(flag_pending_release, migrations.RunPython.noop),
+    ]
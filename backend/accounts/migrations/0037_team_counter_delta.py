@@ -0,0 +1,26 @@
+# Generated by Django 6.1.2 on 2026-10-17 04:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0036_wallettransaction_pending_release'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeamCounterDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('upline', models.TextField()),
+                ('team', models.IntegerField(default=0)),
+                ('active', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
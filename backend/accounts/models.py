@@ -58,6 +58,10 @@ class CustomUser(AbstractUser):
     parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL, related_name='children')
     matrix_position = models.PositiveSmallIntegerField(null=True, blank=True, db_index=True)
     depth = models.PositiveIntegerField(default=0, db_index=True)
+    # Materialized ancestor paths, root-first ids: "/<root>/.../<parent>/" ("/" = no ancestor, "" = not computed).
+    # Maintained in save(); backfill with `rebuild_genealogy_paths`. See get_upline()/is_descendant_of().
+    sponsor_path = models.TextField(blank=True, default='')  # registered_by chain
+    matrix_path = models.TextField(blank=True, default='')   # parent (5-matrix) chain
 
     # Activation/eligibility flags
     first_purchase_activated_at = models.DateTimeField(null=True, blank=True)
@@ -86,6 +90,9 @@ class CustomUser(AbstractUser):
             models.Index(fields=['account_active', 'date_joined']),
             models.Index(fields=['first_purchase_activated_at']),
             models.Index(fields=['role', 'category']),
+            # Prefix (subtree) lookups on materialized paths
+            models.Index(fields=['sponsor_path'], name='user_sponsor_path_idx', opclasses=['text_pattern_ops']),
+            models.Index(fields=['matrix_path'], name='user_matrix_path_idx', opclasses=['text_pattern_ops']),
         ]
 
     def __str__(self):
@@ -167,8 +174,175 @@ class CustomUser(AbstractUser):
                 # best-effort
                 pass
 
+        # Keep materialized genealogy paths in sync with registered_by / parent
+        moved = self._sync_genealogy_paths(kwargs)
+
         super().save(*args, **kwargs)
 
+        self._loaded_genealogy = (self.registered_by_id, self.parent_id)
+        self._loaded_account_active = self.__dict__.get("account_active")
+        self._loaded_geo_fields = self._geo_fields()
+        for field, old_path in moved:
+            try:
+                self._rewrite_descendant_paths(field, old_path)
+            except Exception:
+                # best-effort; `rebuild_genealogy_paths` reconciles
+                pass
+
+    # ---------- Materialized genealogy paths ----------
+    GENEALOGY_PATH_FIELDS = (
+        ("sponsor_path", "registered_by_id"),
+        ("matrix_path", "parent_id"),
+    )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        inst = super().from_db(db, field_names, values)
+        inst._loaded_genealogy = (
+            inst.__dict__.get("registered_by_id"),
+            inst.__dict__.get("parent_id"),
+        )
+        # Previous activation state (TeamCounter active deltas)
+        inst._loaded_account_active = inst.__dict__.get("account_active")
+        # Previous geo recipient fields (GeoRecipientVersion bumps)
+        inst._loaded_geo_fields = inst._geo_fields()
+        return inst
+
+    def _geo_fields(self):
+        d = self.__dict__
+        return (d.get("category"), d.get("is_superuser"), d.get("is_staff"))
+
+    @classmethod
+    def _path_from_parent(cls, field: str, parent_id, self_id=None) -> str:
+        """
+        Path for a node whose parent is parent_id ("" when the parent's path is unknown or a cycle would form).
+        """
+        if not parent_id:
+            return "/"
+        parent_path = cls.objects.filter(pk=parent_id).values_list(field, flat=True).first()
+        if not parent_path:
+            return ""
+        if self_id and f"/{self_id}/" in f"{parent_path}{parent_id}/":
+            return ""
+        return f"{parent_path}{parent_id}/"
+
+    def _sync_genealogy_paths(self, save_kwargs) -> list:
+        """
+        Called from save(): recompute paths when the parent link changed (or on creation).
+        Returns [(path_field, old_path)] for paths whose subtree must be rewritten after save.
+        """
+        loaded = getattr(self, "_loaded_genealogy", None)
+        adding = bool(getattr(self._state, "adding", False))
+        update_fields = save_kwargs.get("update_fields")
+        deferred = self.get_deferred_fields()
+        moved = []
+        for idx, (field, fk_attr) in enumerate(self.GENEALOGY_PATH_FIELDS):
+            fk_name = fk_attr[:-3]
+            if update_fields is not None and fk_name not in update_fields and fk_attr not in update_fields:
+                continue
+            if fk_attr in deferred or field in deferred:
+                continue
+            cur_parent = getattr(self, fk_attr, None)
+            changed = adding or loaded is None or loaded[idx] != cur_parent
+            if not changed and getattr(self, field, ""):
+                continue
+            old_path = getattr(self, field, "") or ""
+            try:
+                new_path = self._path_from_parent(field, cur_parent, self_id=self.pk)
+            except Exception:
+                new_path = ""
+            setattr(self, field, new_path)
+            if update_fields is not None:
+                save_kwargs["update_fields"] = list(save_kwargs["update_fields"]) + [field]
+                update_fields = save_kwargs["update_fields"]
+            if self.pk and not adding and old_path != new_path:
+                moved.append((field, old_path))
+        return moved
+
+    def _rewrite_descendant_paths(self, field: str, old_path: str):
+        """
+        Re-prefix all descendants after this node moved (single UPDATE).
+        Descendants become "" (unknown) when either old or new path is unknown.
+        """
+        from django.db.models import Value
+        from django.db.models.functions import Concat, Substr
+        new_path = getattr(self, field, "") or ""
+        if not old_path:
+            # Descendants could not have had a computed path under an unknown prefix
+            return
+        old_prefix = f"{old_path}{self.pk}/"
+        qs = CustomUser.objects.filter(**{f"{field}__startswith": old_prefix})
+        if not new_path:
+            qs.update(**{field: ""})
+            return
+        new_prefix = f"{new_path}{self.pk}/"
+        qs.update(**{field: Concat(Value(new_prefix), Substr(field, len(old_prefix) + 1), output_field=models.TextField())})
+
+    def refresh_genealogy_paths(self):
+        """
+        Recompute this user's paths from the current parents and re-prefix the subtree.
+        Use after bulk QuerySet.update() of registered_by/parent (which bypasses save()).
+        """
+        for field, fk_attr in self.GENEALOGY_PATH_FIELDS:
+            old_path = CustomUser.objects.filter(pk=self.pk).values_list(field, flat=True).first() or ""
+            new_path = self._path_from_parent(field, getattr(self, fk_attr, None), self_id=self.pk)
+            setattr(self, field, new_path)
+            CustomUser.objects.filter(pk=self.pk).update(**{field: new_path})
+            if old_path != new_path:
+                self._rewrite_descendant_paths(field, old_path)
+
+    def get_upline(self, depth: int, tree: str = "sponsor") -> list:
+        """
+        Ordered ancestors [L1 (direct parent), L2, ...] up to `depth`.
+          - tree="sponsor": registered_by chain; tree="matrix": parent (5-matrix) chain
+        One query via the materialized path; falls back to walking the FK chain when the path is not computed.
+        """
+        field, fk_attr = self.GENEALOGY_PATH_FIELDS[0] if tree == "sponsor" else self.GENEALOGY_PATH_FIELDS[1]
+        depth = max(0, int(depth or 0))
+        if depth <= 0:
+            return []
+        path = getattr(self, field, "") or ""
+        if path:
+            ids = [int(x) for x in path.strip("/").split("/") if x][::-1][:depth]
+            if not ids:
+                return []
+            by_id = CustomUser.objects.in_bulk(ids)
+            chain = []
+            for i in ids:
+                u = by_id.get(i)
+                if not u:
+                    break
+                chain.append(u)
+            return chain
+
+        # Fallback: lazy walk (rows not yet backfilled)
+        fk_name = fk_attr[:-3]
+        chain = []
+        cur = self
+        seen = set()
+        for _ in range(depth):
+            parent = getattr(cur, fk_name, None)
+            if not parent or parent.id in seen:
+                break
+            chain.append(parent)
+            seen.add(parent.id)
+            cur = parent
+        return chain
+
+    def is_descendant_of(self, ancestor_id, tree: str = "sponsor", include_self: bool = True) -> bool:
+        """
+        True when ancestor_id is in this user's upline (or is this user when include_self).
+        """
+        if not ancestor_id:
+            return False
+        if include_self and int(ancestor_id) == int(self.pk or 0):
+            return True
+        field = "sponsor_path" if tree == "sponsor" else "matrix_path"
+        path = getattr(self, field, "") or ""
+        if path:
+            return f"/{int(ancestor_id)}/" in path
+        return any(u.id == int(ancestor_id) for u in self.get_upline(10000, tree=tree))
+
 
 # Existing proxy example retained
 class PincodeUser(CustomUser):
@@ -336,7 +510,7 @@ class PrefixSequence(models.Model):
 # ======================
 from decimal import Decimal
 from django.db import transaction
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 
 
@@ -346,9 +520,22 @@ class Wallet(models.Model):
     # New dual-balance model
     main_balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)         # Gross earnings (e.g., commissions)
     withdrawable_balance = models.DecimalField(max_digits=12, decimal_places=2, default=0) # Net withdrawable after tax withholding
+    # Auto ₹1000 blocks already applied (see _apply_auto_block_rule); None = not yet seeded from AuditTrail
+    auto_blocks_applied = models.PositiveIntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Credit types that withhold cfg.tax_percent to the company tax pool (see credit()).
+    COMMISSION_WITHHOLD_TYPES = frozenset({
+        "COMMISSION_CREDIT",
+        "DIRECT_REF_BONUS",
+        "LEVEL_BONUS",
+        "AUTOPOOL_BONUS_FIVE",
+        "AUTOPOOL_BONUS_THREE",
+        "FRANCHISE_INCOME",
+        "GLOBAL_ROYALTY",
+    })
+
     def __str__(self) -> str:
         return f"Wallet<{self.user.username}> ₹{self.balance}"
 
@@ -370,23 +557,14 @@ class Wallet(models.Model):
         amt = D(amount or 0)
 
         meta = meta or {}
-        COMMISSION_WITHHOLD_TYPES = {
-            "COMMISSION_CREDIT",
-            "DIRECT_REF_BONUS",
-            "LEVEL_BONUS",
-            "AUTOPOOL_BONUS_FIVE",
-            "AUTOPOOL_BONUS_THREE",
-            "FRANCHISE_INCOME",
-            "GLOBAL_ROYALTY",
-        }
-        is_commission = (tx_type in COMMISSION_WITHHOLD_TYPES)
+        is_commission = (tx_type in self.COMMISSION_WITHHOLD_TYPES)
         no_withhold = bool(meta.get("no_withhold"))
 
         if is_commission and not no_withhold and amt > 0:
             # Resolve tax percent and company recipient
             try:
                 from business.models import CommissionConfig
-                cfg = CommissionConfig.get_solo()
+                cfg = CommissionConfig.get_cached()
                 tax_percent = D(getattr(cfg, "tax_percent", D("10.00")) or D("10.00"))
                 company_user = getattr(cfg, "tax_company_user", None)
             except Exception:
@@ -445,11 +623,10 @@ class Wallet(models.Model):
             # Route tax to company wallet (no recursive withholding)
             if company_user and tax > 0:
                 try:
-                    cw = Wallet.get_or_create_for_user(company_user)
-                    # Use a non-commission type to avoid withholding
-                    cw.credit(
+                    Wallet.route_tax_to_company(
+                        company_user,
                         tax,
-                        tx_type="TAX_POOL_CREDIT",
+                        from_user=self.user,
                         meta={"from_user": getattr(self.user, "username", None), **meta},
                         source_type=source_type or 'TAX_POOL',
                         source_id=str(source_id) if source_id is not None else '',
@@ -541,216 +718,254 @@ class Wallet(models.Model):
 
     @classmethod
     @transaction.atomic
-    def release_pending_for_user(cls, user: "CustomUser"):
+    def release_pending_for_user(cls, user: "CustomUser", include_legacy: bool = False):
         """
         Convert all pending_due_to_inactive credits into withdrawable credits for the given user.
         - For commission transactions: use recorded 'net' in meta.
         - For non-commission transactions: release full amount.
         - Does not change total balance; only increases withdrawable balance and appends WITHDRAWABLE_CREDIT markers.
         - Clears the pending flag on original transactions to ensure idempotency.
+        Set-based: one read of the pending rows (partial index on pending_release), one wallet update,
+        bulk-inserted markers and a batched flag update.
+        include_legacy: first flag rows written before the pending_release column existed (meta only).
         """
         from decimal import Decimal as D
         if not user:
             return
+        if include_legacy:
+            WalletTransaction.objects.filter(
+                user=user, pending_release=False, meta__pending_due_to_inactive=True
+            ).update(pending_release=True)
+
+        pending = WalletTransaction.objects.filter(user=user, pending_release=True)
+        if not pending.exists():
+            return
         # Ensure wallet and lock for update
         w = cls.get_or_create_for_user(user)
         w = cls.objects.select_for_update().get(pk=w.pk)
 
-        # Find all transactions marked pending due to inactive
-        qs = WalletTransaction.objects.filter(user=user, meta__pending_due_to_inactive=True).order_by("id")
-        for tx in qs:
-            try:
-                meta = dict(tx.meta or {})
-            except Exception:
-                meta = {}
+        rows = list(pending.order_by("id").only("id", "amount", "source_type", "source_id", "meta"))
+        markers = []
+        total = D("0")
+        for tx in rows:
+            meta = dict(tx.meta) if isinstance(tx.meta, dict) else {}
             # Determine net to release
             net_val = meta.get("net", None)
             try:
                 net = D(str(net_val)) if net_val is not None else D(str(tx.amount or "0"))
             except Exception:
                 net = D("0")
-            if net <= 0:
-                # Clear the pending flag even if nothing to release
-                if meta.get("pending_due_to_inactive"):
-                    meta["pending_due_to_inactive"] = False
-                    tx.meta = meta
-                    tx.save(update_fields=["meta"])
-                continue
-
-            # Increase withdrawable only (do not change total balance/main)
-            w.withdrawable_balance = (w.withdrawable_balance or D("0")) + net
-            w.save(update_fields=["withdrawable_balance", "updated_at"])
-
-            # Append a withdrawable credit marker linked to original tx
-            WalletTransaction.objects.create(
-                user=user,
-                amount=net,
-                balance_after=w.balance,
-                type="WITHDRAWABLE_CREDIT",
-                source_type=tx.source_type or "",
-                source_id=tx.source_id or "",
-                meta={"ledger": "WITHDRAWAL", "released_from": "pending_inactive", "original_tx_id": tx.id},
-            )
-
-            # Clear pending flag on original transaction
             meta["pending_due_to_inactive"] = False
-            meta["released_from_pending"] = True
-            try:
+            if net > 0:
+                total += net
+                markers.append(WalletTransaction(
+                    user=user,
+                    amount=net,
+                    balance_after=w.balance,
+                    type="WITHDRAWABLE_CREDIT",
+                    source_type=tx.source_type or "",
+                    source_id=tx.source_id or "",
+                    meta={"ledger": "WITHDRAWAL", "released_from": "pending_inactive", "original_tx_id": tx.id},
+                ))
+                meta["released_from_pending"] = True
                 meta["released_net"] = str(net)
-            except Exception:
-                pass
             tx.meta = meta
-            tx.save(update_fields=["meta"])
+            tx.pending_release = False
+
+        # Increase withdrawable only (do not change total balance/main)
+        if total > 0:
+            w.withdrawable_balance = (w.withdrawable_balance or D("0")) + total
+            w.save(update_fields=["withdrawable_balance", "updated_at"])
+        WalletTransaction.objects.bulk_create(markers, batch_size=1000)
+        try:
+            with transaction.atomic():
+                EarningsRollup.record(markers)
+        except Exception:
+            # best-effort; `rebuild_earnings_rollup` reconciles
+            pass
+        WalletTransaction.objects.bulk_update(rows, ["meta", "pending_release"], batch_size=1000)
 
     @classmethod
     def get_or_create_for_user(cls, user: CustomUser) -> "Wallet":
         w, _ = cls.objects.get_or_create(user=user, defaults={'balance': Decimal('0.00')})
         return w
 
+    @classmethod
+    def route_tax_to_company(cls, company_user: CustomUser, amount: Decimal, *, from_user: CustomUser | None = None, meta: dict | None = None, source_type: str = "", source_id: str = ""):
+        """
+        Route withheld tax to the company wallet.
+        - settings.TAX_POOL_DEFERRED (default on): append a TaxPoolEntry; the worker rolls
+          pending entries into the company Wallet in bulk (TaxPoolEntry.rollup).
+        - Otherwise: credit the company wallet synchronously as TAX_POOL_CREDIT.
+        Deferring avoids taking a row lock on the single company wallet inside every commission credit.
+        """
+        from django.conf import settings
+        if getattr(settings, "TAX_POOL_DEFERRED", True):
+            return TaxPoolEntry.objects.create(
+                company_user=company_user,
+                from_user=from_user,
+                amount=amount,
+                source_type=source_type or "",
+                source_id=str(source_id or ""),
+                meta=meta or {},
+            )
+        cw = cls.get_or_create_for_user(company_user)
+        # Use a non-commission type to avoid withholding
+        return cw.credit(
+            amount,
+            tx_type="TAX_POOL_CREDIT",
+            meta=meta or {},
+            source_type=source_type or "",
+            source_id=str(source_id or ""),
+        )
+
     # Auto rule: for every ₹1000 accumulated in main_balance, apply a fixed deduction pack:
     # - ₹150 auto e‑coupon buy for self (if available; skipped if no stock)
     # - ₹50 fixed TDS routed to company tax wallet
     # - ₹50 direct referral bonus to the direct sponsor (registered_by) if present
     # Debits are recorded against user's withdrawable wallet and total balance.
-    # Idempotency is ensured via coupons.AuditTrail action="auto_1k_block_applied" per applied block.
+    # Idempotency: Wallet.auto_blocks_applied (updated under the wallet row lock); one
+    # coupons.AuditTrail action="auto_1k_block_applied" row per block is kept for history.
+    AUTO_BLOCK_SIZE = Decimal("1000.00")
+
     def _apply_auto_block_rule(self, w: "Wallet"):
         from decimal import Decimal as D
-        try:
-            from coupons.models import AuditTrail, CouponCode
-        except Exception:
-            return  # coupons app not available; skip
-
-        # Count already-applied blocks for this user
-        try:
-            blocks_applied = int(
-                AuditTrail.objects.filter(action="auto_1k_block_applied", actor=self.user).count()
-            )
-        except Exception:
-            blocks_applied = 0
 
-        # Compute eligible blocks from main_balance
+        # O(1) fast path: nothing new to apply (no queries)
+        applied = getattr(w, "auto_blocks_applied", None)
         try:
             main = D(str(getattr(w, "main_balance", 0) or 0))
         except Exception:
             main = D("0")
-        total_blocks = int(main // D("1000"))
-        to_apply = max(0, int(total_blocks) - int(blocks_applied))
-        if to_apply <= 0:
+        total_blocks = int(main // self.AUTO_BLOCK_SIZE)
+        if applied is not None and total_blocks <= int(applied):
             return
 
-        sponsor = getattr(self.user, "registered_by", None)
-
-        for i in range(to_apply):
-            block_no = int(blocks_applied) + i + 1
-            coupon_applied = False
-            coupon_code_val = None
+        try:
+            from coupons.models import AuditTrail, CouponCode
+        except Exception:
+            return  # coupons app not available; skip
 
-            # Try to allocate one ₹150 e‑coupon to this consumer
-            try:
-                base_qs = CouponCode.objects.filter(
-                    issued_channel="e_coupon",
-                    value=D("150.00"),
-                    status="AVAILABLE",
-                    assigned_agency__isnull=True,
-                    assigned_employee__isnull=True,
-                    assigned_consumer__isnull=True,
-                )
+        with transaction.atomic():
+            # Re-read under lock (no-op re-lock when called from credit())
+            lw = Wallet.objects.select_for_update().get(pk=w.pk)
+            applied = lw.auto_blocks_applied
+            if applied is None:
+                # Legacy wallet: seed the counter from the audit history once
                 try:
-                    locking_qs = base_qs.select_for_update(skip_locked=True)
+                    applied = int(AuditTrail.objects.filter(action="auto_1k_block_applied", actor=self.user).count())
                 except Exception:
-                    locking_qs = base_qs
-                pick_ids = list(locking_qs.order_by("serial", "id").values_list("id", flat=True)[:1])
-                if pick_ids:
-                    affected = (
-                        CouponCode.objects.filter(id__in=pick_ids)
-                        .filter(
-                            issued_channel="e_coupon",
-                            status="AVAILABLE",
-                            assigned_agency__isnull=True,
-                            assigned_employee__isnull=True,
-                            assigned_consumer__isnull=True,
-                        )
-                        .update(assigned_consumer_id=self.user_id, status="SOLD")
-                    )
-                    if affected:
-                        coupon_applied = True
-                        try:
-                            cobj = CouponCode.objects.filter(id=pick_ids[0]).only("code").first()
-                            coupon_code_val = getattr(cobj, "code", None)
-                        except Exception:
-                            coupon_code_val = None
+                    applied = 0
+            try:
+                main = D(str(lw.main_balance or 0))
             except Exception:
-                coupon_applied = False
+                main = D("0")
+            to_apply = max(0, int(main // self.AUTO_BLOCK_SIZE) - int(applied))
+            if to_apply <= 0:
+                if lw.auto_blocks_applied != applied:
+                    lw.auto_blocks_applied = applied
+                    lw.save(update_fields=["auto_blocks_applied"])
+                w.auto_blocks_applied = applied
+                return
+
+            sponsor = getattr(self.user, "registered_by", None)
+            coupon_codes = self._allocate_auto_block_coupons(CouponCode, to_apply)
 
             tax_fixed = D("50.00")
             sponsor_bonus = D("50.00") if sponsor else D("0.00")
-            coupon_cost = D("150.00") if coupon_applied else D("0.00")
-            total = (tax_fixed + sponsor_bonus + coupon_cost).quantize(D("0.01"))
-
-            # Credit net to withdrawable and debit total deductions from overall balance
-            net_block = (D("1000.00") - total).quantize(D("0.01"))
-            # Increase withdrawable by net (reclassification; do not touch main_balance)
-            w.withdrawable_balance = (w.withdrawable_balance or D("0")) + net_block
-            # Reduce overall balance by deductions that leave the user's wallet
-            w.balance = (w.balance or D("0")) - total
-            if w.balance < 0:
-                w.balance = D("0")
-            w.save(update_fields=["balance", "withdrawable_balance", "updated_at"])
-            # Record withdrawable credit transaction for visibility (no change to balance)
-            if net_block > 0:
-                WalletTransaction.objects.create(
-                    user=self.user,
-                    amount=net_block,
-                    balance_after=w.balance,
-                    type="WITHDRAWABLE_CREDIT",
-                    source_type="AUTO_1K_BLOCK",
-                    source_id=str(block_no),
-                    meta={"ledger": "WITHDRAWAL", "auto_rule": "AUTO_1K_BLOCK", "block_index": block_no},
-                )
+            txs = []
+            audits = []
+            block_nos = []
+            for i in range(to_apply):
+                block_no = int(applied) + i + 1
+                block_nos.append(block_no)
+                coupon_code_val = coupon_codes[i] if i < len(coupon_codes) else None
+                coupon_applied = coupon_code_val is not None
+                coupon_cost = D("150.00") if coupon_applied else D("0.00")
+                total = (tax_fixed + sponsor_bonus + coupon_cost).quantize(D("0.01"))
+
+                # Credit net to withdrawable and debit total deductions from overall balance
+                net_block = (self.AUTO_BLOCK_SIZE - total).quantize(D("0.01"))
+                # Increase withdrawable by net (reclassification; do not touch main_balance)
+                lw.withdrawable_balance = (lw.withdrawable_balance or D("0")) + net_block
+                # Reduce overall balance by deductions that leave the user's wallet
+                lw.balance = (lw.balance or D("0")) - total
+                if lw.balance < 0:
+                    lw.balance = D("0")
+                common = {"user": self.user, "balance_after": lw.balance, "source_type": "AUTO_1K_BLOCK", "source_id": str(block_no)}
+                # Record withdrawable credit transaction for visibility (no change to balance)
+                if net_block > 0:
+                    txs.append(WalletTransaction(
+                        amount=net_block, type="WITHDRAWABLE_CREDIT",
+                        meta={"ledger": "WITHDRAWAL", "auto_rule": "AUTO_1K_BLOCK", "block_index": block_no}, **common,
+                    ))
+                # Record user-side debits
+                if coupon_applied:
+                    txs.append(WalletTransaction(
+                        amount=D("-150.00"), type="AUTO_PURCHASE_DEBIT",
+                        meta={"reason": "AUTO_1K_BLOCK", "block_index": block_no, "coupon_code": coupon_code_val}, **common,
+                    ))
+                # Fixed TDS debit marker
+                txs.append(WalletTransaction(
+                    amount=D("-50.00"), type="ADJUSTMENT_DEBIT",
+                    meta={"reason": "TDS_FIXED_AUTO", "block_index": block_no}, **common,
+                ))
+                # Sponsor bonus debit marker (user-side visibility)
+                if sponsor_bonus > 0:
+                    txs.append(WalletTransaction(
+                        amount=D("-50.00"), type="ADJUSTMENT_DEBIT",
+                        meta={"reason": "DIRECT_REF_BONUS_AUTO", "block_index": block_no, "to_user_id": getattr(sponsor, "id", None)}, **common,
+                    ))
+                audits.append(AuditTrail(
+                    action="auto_1k_block_applied",
+                    actor=self.user,
+                    notes=f"Applied auto block {block_no}",
+                    metadata={
+                        "block_index": block_no,
+                        "coupon_applied": bool(coupon_applied),
+                        "coupon_cost": str(coupon_cost),
+                        "tds_fixed": "50.00",
+                        "sponsor_bonus": str(sponsor_bonus),
+                    },
+                ))
 
-            # Record user-side debits
-            if coupon_applied and coupon_cost > 0:
-                WalletTransaction.objects.create(
-                    user=self.user,
-                    amount=D("-150.00"),
-                    balance_after=w.balance,
-                    type="AUTO_PURCHASE_DEBIT",
-                    source_type="AUTO_1K_BLOCK",
-                    source_id=str(block_no),
-                    meta={"reason": "AUTO_1K_BLOCK", "block_index": block_no, "coupon_code": coupon_code_val},
-                )
-            # Fixed TDS debit marker
-            WalletTransaction.objects.create(
-                user=self.user,
-                amount=D("-50.00"),
-                balance_after=w.balance,
-                type="ADJUSTMENT_DEBIT",
-                source_type="AUTO_1K_BLOCK",
-                source_id=str(block_no),
-                meta={"reason": "TDS_FIXED_AUTO", "block_index": block_no},
-            )
-            # Sponsor bonus debit marker (user-side visibility)
-            if sponsor_bonus > 0:
-                WalletTransaction.objects.create(
-                    user=self.user,
-                    amount=D("-50.00"),
-                    balance_after=w.balance,
-                    type="ADJUSTMENT_DEBIT",
-                    source_type="AUTO_1K_BLOCK",
-                    source_id=str(block_no),
-                    meta={"reason": "DIRECT_REF_BONUS_AUTO", "block_index": block_no, "to_user_id": getattr(sponsor, "id", None)},
-                )
+            lw.auto_blocks_applied = int(applied) + to_apply
+            lw.save(update_fields=["balance", "withdrawable_balance", "auto_blocks_applied", "updated_at"])
+            try:
+                WalletTransaction.resolve_counterparties(txs)
+            except Exception:
+                pass
+            WalletTransaction.objects.bulk_create(txs)
+            try:
+                with transaction.atomic():
+                    EarningsRollup.record(txs)
+            except Exception:
+                # best-effort; `rebuild_earnings_rollup` reconciles
+                pass
+            try:
+                with transaction.atomic():
+                    AuditTrail.objects.bulk_create(audits)
+            except Exception:
+                pass
+
+            # Sponsor and company credits posted once for all applied blocks
+            n = len(block_nos)
+            block_meta = {"auto_rule": "AUTO_1K_BLOCK", "block_index": block_nos[-1]}
+            if n > 1:
+                block_meta["block_indexes"] = block_nos
+            block_sid = str(block_nos[0]) if n == 1 else f"{block_nos[0]}-{block_nos[-1]}"
+            from_meta = {"from_user_id": self.user.id, "from_user": getattr(self.user, "username", None), "no_withhold": True}
 
             # Credit sponsor (no withholding)
             if sponsor and sponsor_bonus > 0:
                 try:
                     sw = Wallet.get_or_create_for_user(sponsor)
                     sw.credit(
-                        sponsor_bonus,
+                        sponsor_bonus * n,
                         tx_type="DIRECT_REF_BONUS",
-                        meta={"from_user_id": self.user.id, "from_user": getattr(self.user, "username", None), "no_withhold": True, "auto_rule": "AUTO_1K_BLOCK", "block_index": block_no},
+                        meta={**from_meta, **block_meta},
                         source_type="AUTO_1K_BLOCK",
-                        source_id=str(block_no),
+                        source_id=block_sid,
                     )
                 except Exception:
                     pass
@@ -758,7 +973,7 @@ class Wallet(models.Model):
             # Credit company tax wallet (no withholding)
             try:
                 from business.models import CommissionConfig
-                cfg = CommissionConfig.get_solo()
+                cfg = CommissionConfig.get_cached()
                 company_user = getattr(cfg, "tax_company_user", None)
             except Exception:
                 company_user = None
@@ -769,33 +984,35 @@ class Wallet(models.Model):
                     company_user = None
             if company_user:
                 try:
-                    cw = Wallet.get_or_create_for_user(company_user)
-                    cw.credit(
-                        tax_fixed,
-                        tx_type="TAX_POOL_CREDIT",
-                        meta={"from_user_id": self.user.id, "from_user": getattr(self.user, "username", None), "no_withhold": True, "auto_rule": "AUTO_1K_BLOCK", "block_index": block_no},
+                    Wallet.route_tax_to_company(
+                        company_user,
+                        tax_fixed * n,
+                        from_user=self.user,
+                        meta={**from_meta, **block_meta},
                         source_type="AUTO_1K_BLOCK",
-                        source_id=str(block_no),
+                        source_id=block_sid,
                     )
                 except Exception:
                     pass
 
-            # Audit for idempotency
-            try:
-                AuditTrail.objects.create(
-                    action="auto_1k_block_applied",
-                    actor=self.user,
-                    notes=f"Applied auto block {block_no}",
-                    metadata={
-                        "block_index": block_no,
-                        "coupon_applied": bool(coupon_applied),
-                        "coupon_cost": str(coupon_cost),
-                        "tds_fixed": "50.00",
-                        "sponsor_bonus": str(sponsor_bonus),
-                    },
-                )
-            except Exception:
-                pass
+        # Reflect the applied blocks on the caller's (already locked or display) instance
+        w.balance = lw.balance
+        w.withdrawable_balance = lw.withdrawable_balance
+        w.auto_blocks_applied = lw.auto_blocks_applied
+        w.updated_at = lw.updated_at
+
+    def _allocate_auto_block_coupons(self, CouponCode, count: int) -> list:
+        """
+        Assign up to `count` free ₹150 e‑coupons to this user via the reservation-block allocator.
+        Returns the allocated codes; fewer than `count` when stock runs out.
+        """
+        from decimal import Decimal as D
+        try:
+            from coupons.allocator import allocate_pool_codes
+            picks = allocate_pool_codes(count, value=D("150.00"), assigned_consumer_id=self.user_id, status="SOLD")
+            return [code for _, code in picks]
+        except Exception:
+            return []
 
 
 class WalletTransaction(models.Model):
@@ -838,6 +1055,15 @@ class WalletTransaction(models.Model):
     source_type = models.CharField(max_length=64, blank=True, default='')
     source_id = models.CharField(max_length=64, blank=True, default='')
     meta = models.JSONField(null=True, blank=True)
+    # User the row refers to (meta from_user_id/from_user). Filled in batch by the bulk insert paths and
+    # `backfill_wallet_counterparty`; single inserts leave it empty and are resolved per page at read
+    # time (lookup_counterparties), so a credit never pays for a user lookup.
+    counterparty = models.ForeignKey(
+        CustomUser, null=True, blank=True, on_delete=models.SET_NULL, related_name='counterparty_transactions'
+    )
+    # Credit accrued while the user was inactive, not yet released to withdrawable (mirrors
+    # meta.pending_due_to_inactive; set on insert, cleared by Wallet.release_pending_for_user)
+    pending_release = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -845,11 +1071,422 @@ class WalletTransaction(models.Model):
         indexes = [
             models.Index(fields=['user', 'type']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['user'], name='wallettx_pending_release_idx', condition=models.Q(pending_release=True)),
         ]
 
     def __str__(self) -> str:
         return f"{self.user.username} {self.type} {self.amount} -> {self.balance_after}"
 
+    def save(self, *args, **kwargs):
+        if self._state.adding and not self.pending_release and isinstance(self.meta, dict):
+            self.pending_release = bool(self.meta.get("pending_due_to_inactive"))
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def counterparty_refs(meta):
+        """
+        (user_id, username) referenced by a ledger row's meta (from_user_id/user_id, from_user/username).
+        """
+        meta = meta if isinstance(meta, dict) else {}
+        uid = meta.get("from_user_id") or meta.get("user_id")
+        uname = meta.get("from_user") or meta.get("username")
+        try:
+            uid = int(uid) if uid else None
+        except Exception:
+            uid = None
+        uname = str(uname).strip() if uname else ""
+        return uid, uname
+
+    @classmethod
+    def lookup_counterparties(cls, refs, fields=("id",)) -> tuple:
+        """
+        Batch-resolve [(user_id, username)] refs with at most two queries.
+        Returns ({id: user}, {USERNAME_UPPER: user}); usernames match case-insensitively (lowest id wins).
+        """
+        from django.db.models.functions import Upper
+        ids = {uid for uid, _ in refs if uid}
+        names = {uname.upper() for _, uname in refs if uname}
+        fields = tuple(dict.fromkeys(("id", "username") + tuple(fields)))
+        by_id = {u.id: u for u in CustomUser.objects.filter(id__in=ids).only(*fields)} if ids else {}
+        by_name = {}
+        if names:
+            for u in (
+                CustomUser.objects.annotate(_uname=Upper("username"))
+                .filter(_uname__in=names)
+                .only(*fields)
+                .order_by("-id")
+            ):
+                by_name[u._uname] = u
+        return by_id, by_name
+
+    @classmethod
+    def resolve_counterparties(cls, txs) -> None:
+        """
+        Set counterparty_id on unsaved rows from their meta (id first, then username), in one batch.
+        """
+        pending = [(tx, cls.counterparty_refs(tx.meta)) for tx in txs if tx.counterparty_id is None]
+        pending = [(tx, ref) for tx, ref in pending if ref[0] or ref[1]]
+        if not pending:
+            return
+        by_id, by_name = cls.lookup_counterparties([ref for _, ref in pending])
+        for tx, (uid, uname) in pending:
+            u = by_id.get(uid) if uid else None
+            if u is None and uname:
+                u = by_name.get(uname.upper())
+            if u is not None:
+                tx.counterparty_id = u.id
+
+
+class EarningsRollup(models.Model):
+    """
+    Pre-aggregated ledger totals per user x tx_type x bucket x day.
+      - bucket: "level:<n>" for LEVEL_BONUS, "role:<role>" for COMMISSION_CREDIT,
+        "auto_1k" for AUTO_1K_BLOCK DIRECT_REF_BONUS rows, else ""
+      - total: sum of amounts; credit_total: sum of positive amounts; tx_count: rows
+
+    Updated on every WalletTransaction insert (post_save + bulk paths call record()).
+    A user's history is built once by the earnings_rollup_build job, queued on first read (EarningsRollupState);
+    until then totals() aggregates the ledger directly. `rebuild_earnings_rollup` reconciles.
+    """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='earnings_rollups')
+    tx_type = models.CharField(max_length=32)
+    bucket = models.CharField(max_length=32, blank=True, default='')
+    day = models.DateField()
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    credit_total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    tx_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'tx_type', 'bucket', 'day'], name='uniq_earnings_rollup_key'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'day']),
+        ]
+
+    def __str__(self) -> str:
+        return f"Rollup<{self.user_id}> {self.tx_type}/{self.bucket or '-'} {self.day}: {self.total}"
+
+    @staticmethod
+    def bucket_for(tx_type: str, meta, source_type: str = '') -> str:
+        meta = meta if isinstance(meta, dict) else {}
+        try:
+            if tx_type == 'LEVEL_BONUS':
+                lvl = int(meta.get('level') or meta.get('level_index') or 0)
+                return f"level:{lvl}" if lvl > 0 else ''
+            if tx_type == 'COMMISSION_CREDIT':
+                role = (meta.get('role') or '').strip().lower()
+                return f"role:{role[:26]}" if role else ''
+            if tx_type == 'DIRECT_REF_BONUS':
+                if meta.get('auto_rule') == 'AUTO_1K_BLOCK' or source_type == 'AUTO_1K_BLOCK':
+                    return 'auto_1k'
+        except Exception:
+            pass
+        return ''
+
+    @classmethod
+    def _key(cls, tx) -> tuple:
+        from django.utils import timezone
+        created = getattr(tx, 'created_at', None) or timezone.now()
+        try:
+            day = timezone.localdate(created)
+        except Exception:
+            day = created.date()
+        return (
+            tx.user_id,
+            tx.type,
+            cls.bucket_for(tx.type, getattr(tx, 'meta', None), getattr(tx, 'source_type', '') or ''),
+            day,
+        )
+
+    @staticmethod
+    def _aggregate(txs) -> dict:
+        agg = {}
+        for tx in txs:
+            key = EarningsRollup._key(tx)
+            amt = Decimal(str(getattr(tx, 'amount', 0) or 0))
+            t, c, n = agg.get(key, (Decimal('0'), Decimal('0'), 0))
+            agg[key] = (t + amt, c + (amt if amt > 0 else Decimal('0')), n + 1)
+        return agg
+
+    @classmethod
+    def record(cls, txs) -> None:
+        """
+        Fold newly inserted WalletTransaction rows into the rollup (one UPDATE per touched key; INSERT when new).
+        Users whose history has not been built yet are skipped; the build job reads it from the ledger.
+        """
+        from django.db import IntegrityError
+        from django.db.models import F
+        txs = [tx for tx in txs if getattr(tx, 'user_id', None) and getattr(tx, 'type', None)]
+        if not txs:
+            return
+        built = set(
+            EarningsRollupState.objects.filter(user_id__in={tx.user_id for tx in txs}).values_list('user_id', flat=True)
+        )
+        agg = cls._aggregate(tx for tx in txs if tx.user_id in built)
+        for (user_id, tx_type, bucket, day), (total, credit, count) in agg.items():
+            lookup = dict(user_id=user_id, tx_type=tx_type, bucket=bucket, day=day)
+            updated = cls.objects.filter(**lookup).update(
+                total=F('total') + total, credit_total=F('credit_total') + credit, tx_count=F('tx_count') + count
+            )
+            if updated:
+                continue
+            try:
+                with transaction.atomic():
+                    cls.objects.create(total=total, credit_total=credit, tx_count=count, **lookup)
+            except IntegrityError:
+                # Concurrent insert of the same key
+                cls.objects.filter(**lookup).update(
+                    total=F('total') + total, credit_total=F('credit_total') + credit, tx_count=F('tx_count') + count
+                )
+
+    @classmethod
+    def build_for_user(cls, user_id) -> None:
+        """
+        (Re)build one user's rollup from the full ledger. Locks the user's wallet so concurrent credits
+        (which post under the same lock) are either included here or recorded after the state row exists.
+        """
+        with transaction.atomic():
+            Wallet.objects.select_for_update().filter(user_id=user_id).first()
+            EarningsRollupState.objects.get_or_create(user_id=user_id)
+            cls.objects.filter(user_id=user_id).delete()
+            qs = WalletTransaction.objects.filter(user_id=user_id).only(
+                'id', 'user_id', 'type', 'amount', 'meta', 'source_type', 'created_at'
+            ).order_by()
+            agg = cls._aggregate(qs.iterator(chunk_size=2000))
+            cls.objects.bulk_create(
+                [
+                    cls(user_id=u, tx_type=t, bucket=b, day=d, total=tot, credit_total=cr, tx_count=n)
+                    for (u, t, b, d), (tot, cr, n) in agg.items()
+                ],
+                batch_size=1000,
+            )
+
+    BUILD_TASK = "earnings_rollup_build"
+
+    @classmethod
+    def schedule_build(cls, user_id) -> None:
+        """
+        Queue the background build of one user's history (at most one task per user per day).
+        """
+        from django.utils import timezone
+        from jobs.models import BackgroundTask
+        ikey = f"{cls.BUILD_TASK}:{int(user_id)}:{timezone.localdate().isoformat()}"
+        try:
+            BackgroundTask.enqueue(cls.BUILD_TASK, {"user_id": int(user_id)}, idempotency_key=ikey, max_attempts=3)
+        except Exception:
+            # best-effort; `rebuild_earnings_rollup` builds missing users
+            pass
+
+    @classmethod
+    def _ledger_totals(cls, user_id, *, day=None, since=None) -> dict:
+        """
+        totals() straight from WalletTransaction (one GROUP BY over the user's rows, bucket keys read from meta).
+        Served while the user's rollup has not been built yet.
+        """
+        from django.db.models import Count, Q, Sum
+        from django.db.models.fields.json import KT
+        qs = WalletTransaction.objects.filter(user_id=user_id)
+        if day is not None:
+            qs = qs.filter(created_at__date=day)
+        if since is not None:
+            qs = qs.filter(created_at__date__gte=since)
+        rows = (
+            qs.annotate(
+                _level=KT('meta__level'),
+                _level_index=KT('meta__level_index'),
+                _role=KT('meta__role'),
+                _auto_rule=KT('meta__auto_rule'),
+            )
+            .values('type', 'source_type', '_level', '_level_index', '_role', '_auto_rule')
+            .annotate(t=Sum('amount'), c=Sum('amount', filter=Q(amount__gt=0)), n=Count('id'))
+            .order_by()
+        )
+        out = {}
+        for r in rows:
+            meta = {'level': r['_level'], 'level_index': r['_level_index'], 'role': r['_role'], 'auto_rule': r['_auto_rule']}
+            key = (r['type'], cls.bucket_for(r['type'], meta, r['source_type'] or ''))
+            row = out.setdefault(key, {'total': Decimal('0'), 'credit_total': Decimal('0'), 'count': 0})
+            row['total'] += r['t'] or Decimal('0')
+            row['credit_total'] += r['c'] or Decimal('0')
+            row['count'] += int(r['n'] or 0)
+        return out
+
+    @classmethod
+    def totals(cls, user, *, day=None, since=None) -> dict:
+        """
+        {(tx_type, bucket): {"total", "credit_total", "count"}} for user, optionally limited to one day / since a date.
+        Users without a built rollup get the ledger aggregate and a queued build (never built inside the read).
+        """
+        from django.db.models import Sum
+        if not EarningsRollupState.objects.filter(user_id=user.pk).exists():
+            cls.schedule_build(user.pk)
+            return cls._ledger_totals(user.pk, day=day, since=since)
+        qs = cls.objects.filter(user_id=user.pk)
+        if day is not None:
+            qs = qs.filter(day=day)
+        if since is not None:
+            qs = qs.filter(day__gte=since)
+        out = {}
+        for r in qs.values('tx_type', 'bucket').annotate(t=Sum('total'), c=Sum('credit_total'), n=Sum('tx_count')):
+            out[(r['tx_type'], r['bucket'])] = {
+                'total': r['t'] or Decimal('0'),
+                'credit_total': r['c'] or Decimal('0'),
+                'count': int(r['n'] or 0),
+            }
+        return out
+
+    @staticmethod
+    def sum_of(totals: dict, types, *, bucket=None, field: str = 'total') -> Decimal:
+        """
+        Sum totals[(type, bucket)][field] over types (all buckets unless bucket is given).
+        """
+        types = {types} if isinstance(types, str) else set(types)
+        val = Decimal('0')
+        for (t, b), row in totals.items():
+            if t in types and (bucket is None or b == bucket):
+                val += row.get(field) or Decimal('0')
+        return val
+
+
+class EarningsRollupState(models.Model):
+    """
+    Marks users whose EarningsRollup history has been built; record() only maintains these users.
+    """
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='earnings_rollup_state')
+    built_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"RollupState<{self.user_id}> {self.built_at}"
+
+
+@receiver(post_save, sender=WalletTransaction)
+def record_earnings_rollup(sender, instance: WalletTransaction, created: bool, **kwargs):
+    if not created or kwargs.get('raw'):
+        return
+    try:
+        with transaction.atomic():
+            EarningsRollup.record([instance])
+    except Exception:
+        # best-effort; do not block ledger writes
+        pass
+
+
+class TaxPoolEntry(models.Model):
+    """
+    Append-only pending tax withholding destined for the company wallet.
+    Rows are inserted by Wallet.credit (no lock on the company wallet) and folded into
+    the company Wallet + TAX_POOL_CREDIT ledger rows by TaxPoolEntry.rollup().
+    """
+    company_user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='tax_pool_entries')
+    from_user = models.ForeignKey(CustomUser, null=True, blank=True, on_delete=models.SET_NULL, related_name='tax_pool_contributions')
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    source_type = models.CharField(max_length=64, blank=True, default='')
+    source_id = models.CharField(max_length=64, blank=True, default='')
+    meta = models.JSONField(null=True, blank=True)
+    rolled_up = models.BooleanField(default=False, db_index=True)
+    rolled_up_at = models.DateTimeField(null=True, blank=True)
+    wallet_tx = models.ForeignKey('WalletTransaction', null=True, blank=True, on_delete=models.SET_NULL, related_name='tax_pool_entries')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['rolled_up', 'company_user', 'id']),
+        ]
+
+    def __str__(self) -> str:
+        return f"TaxPool<{self.company_user_id}> ₹{self.amount} rolled_up={self.rolled_up}"
+
+    @classmethod
+    def rollup(cls, batch_size: int = 1000, max_batches: int = 0) -> int:
+        """
+        Fold pending entries into company wallets.
+        - Claims up to batch_size pending rows per company with skip_locked (safe with several workers).
+        - Locks each company wallet once per batch, applies the summed delta and bulk-inserts
+          one TAX_POOL_CREDIT WalletTransaction per entry (same ledger shape as the synchronous path).
+        Returns the number of entries rolled up.
+        """
+        from decimal import Decimal as D
+        from django.utils import timezone
+
+        done = 0
+        batches = 0
+        company_ids = list(
+            cls.objects.filter(rolled_up=False).order_by().values_list("company_user_id", flat=True).distinct()
+        )
+        for company_id in company_ids:
+            while True:
+                if max_batches and batches >= max_batches:
+                    return done
+                with transaction.atomic():
+                    entries = list(
+                        cls.objects.select_for_update(skip_locked=True)
+                        .filter(rolled_up=False, company_user_id=company_id)
+                        .order_by("id")[: max(1, int(batch_size))]
+                    )
+                    if not entries:
+                        break
+                    batches += 1
+                    company_user = CustomUser.objects.filter(pk=company_id).first()
+                    if not company_user:
+                        break
+                    try:
+                        inactive = not bool(getattr(company_user, "account_active", False))
+                    except Exception:
+                        inactive = False
+                    w = Wallet.get_or_create_for_user(company_user)
+                    w = Wallet.objects.select_for_update().get(pk=w.pk)
+
+                    running = D(w.balance or 0)
+                    txs = []
+                    for e in entries:
+                        amt = D(e.amount or 0)
+                        running = running + amt
+                        m = dict(e.meta or {})
+                        m["tax_pool_entry_id"] = e.id
+                        if inactive:
+                            m["pending_due_to_inactive"] = True
+                        txs.append(WalletTransaction(
+                            user=company_user,
+                            amount=amt,
+                            balance_after=running,
+                            type="TAX_POOL_CREDIT",
+                            source_type=e.source_type or '',
+                            source_id=e.source_id or '',
+                            meta=m,
+                            pending_release=inactive,
+                        ))
+                    total = sum((D(e.amount or 0) for e in entries), D("0"))
+                    w.main_balance = (w.main_balance or D("0")) + total
+                    w.balance = (w.balance or D("0")) + total
+                    w.save(update_fields=["balance", "main_balance", "updated_at"])
+                    try:
+                        WalletTransaction.resolve_counterparties(txs)
+                    except Exception:
+                        pass
+                    created = WalletTransaction.objects.bulk_create(txs)
+                    try:
+                        with transaction.atomic():
+                            EarningsRollup.record(created)
+                    except Exception:
+                        pass
+
+                    now = timezone.now()
+                    for e, tx in zip(entries, created):
+                        e.rolled_up = True
+                        e.rolled_up_at = now
+                        e.wallet_tx_id = getattr(tx, "pk", None)
+                    cls.objects.bulk_update(entries, ["rolled_up", "rolled_up_at", "wallet_tx"])
+                    done += len(entries)
+
+                    if not inactive:
+                        try:
+                            w._apply_auto_block_rule(w)
+                        except Exception:
+                            pass
+        return done
+
 
 # ======================
 # Reward Points Ledger
@@ -1219,7 +1856,7 @@ def handle_new_user_post_save(sender, instance: CustomUser, created: bool, **kwa
     cfg = None
     try:
         from business.models import CommissionConfig
-        cfg = CommissionConfig.get_solo()
+        cfg = CommissionConfig.get_cached()
     except Exception:
         pass
 
@@ -1242,11 +1879,406 @@ def release_pending_on_activation(sender, instance: CustomUser, created: bool, *
     try:
         if getattr(instance, "account_active", False):
             from accounts.models import Wallet
-            Wallet.release_pending_for_user(instance)
+            # On the inactive -> active transition also pick up rows flagged only in meta (pre pending_release)
+            was_inactive = getattr(instance, "_loaded_account_active", None) is False
+            Wallet.release_pending_for_user(instance, include_legacy=was_inactive)
+    except Exception:
+        # best-effort; do not block saves
+        pass
+
+
+class TeamCounter(models.Model):
+    """
+    Denormalized sponsor-tree (registered_by) downline counters per user.
+      - l1_count..l5_count: members at depth 1..5 (l1_count == direct referrals)
+      - direct_active_count: active direct referrals
+      - team_size / active_team_size: all descendants (any depth) / those with account_active=True
+
+    Maintained incrementally by CustomUser signals (join, activation change, sponsor move, delete):
+      - the NEAR_LEVELS nearest sponsors (all fields) in one UPDATE inside the caller's transaction
+      - deeper sponsors (team_size / active_team_size only) through an append-only TeamCounterDelta row,
+        folded in by TeamCounterDelta.rollup() (worker), so the root's row is not locked by every signup
+    Bulk QuerySet.update() paths bypass signals; reconcile with `rebuild_team_counters`. Users without a
+    row are computed lazily via for_user().
+    """
+    LEVEL_FIELDS = ("l1_count", "l2_count", "l3_count", "l4_count", "l5_count")
+    NEAR_LEVELS = 5
+
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name="team_counter")
+    l1_count = models.IntegerField(default=0)
+    l2_count = models.IntegerField(default=0)
+    l3_count = models.IntegerField(default=0)
+    l4_count = models.IntegerField(default=0)
+    l5_count = models.IntegerField(default=0)
+    direct_active_count = models.IntegerField(default=0)
+    team_size = models.IntegerField(default=0)
+    active_team_size = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Team Counter"
+        verbose_name_plural = "Team Counters"
+
+    def __str__(self) -> str:
+        return f"TeamCounter<{self.user_id}> direct={self.l1_count} team={self.team_size}"
+
+    @property
+    def direct_count(self) -> int:
+        return int(self.l1_count or 0)
+
+    def levels(self) -> list:
+        return [int(getattr(self, f) or 0) for f in self.LEVEL_FIELDS]
+
+    @staticmethod
+    def direct_count_expr():
+        """
+        Annotation for CustomUser querysets: stored direct count, or a live COUNT for users without a counter row.
+        """
+        from django.db.models import F, IntegerField, OuterRef, Subquery, Count
+        from django.db.models.functions import Coalesce
+        live = (
+            CustomUser.objects.filter(registered_by_id=OuterRef("pk"))
+            .order_by()
+            .values("registered_by_id")
+            .annotate(c=Count("id"))
+            .values("c")
+        )
+        return Coalesce(F("team_counter__l1_count"), Subquery(live, output_field=IntegerField()), 0)
+
+    # ---------- Computation ----------
+
+    @classmethod
+    def compute(cls, user: CustomUser) -> dict:
+        """
+        Exact counters for one user from the live tree.
+          - L1..L5: one registered_by_id__in query per level
+          - team totals: one prefix COUNT over sponsor_path (falls back to a level-by-level walk when
+            the user's path is not computed)
+        """
+        from django.db.models import Count, Q
+        data = {f: 0 for f in cls.LEVEL_FIELDS}
+        current = [user.pk]
+        seen = {user.pk}
+        team = active = 0
+        depth = 0
+        walk_all = not (getattr(user, "sponsor_path", "") or "")
+        while current and (depth < len(cls.LEVEL_FIELDS) or walk_all):
+            rows = [
+                r for r in CustomUser.objects.filter(registered_by_id__in=current).values_list("id", "account_active")
+                if r[0] not in seen
+            ]
+            if depth < len(cls.LEVEL_FIELDS):
+                data[cls.LEVEL_FIELDS[depth]] = len(rows)
+            if depth == 0:
+                data["direct_active_count"] = sum(1 for _, a in rows if a)
+            team += len(rows)
+            active += sum(1 for _, a in rows if a)
+            current = [r[0] for r in rows]
+            seen.update(current)
+            depth += 1
+        data.setdefault("direct_active_count", 0)
+
+        if not walk_all:
+            agg = CustomUser.objects.filter(sponsor_path__startswith=f"{user.sponsor_path}{user.pk}/").aggregate(
+                team=Count("id"), active=Count("id", filter=Q(account_active=True))
+            )
+            team = int(agg.get("team") or 0)
+            active = int(agg.get("active") or 0)
+        data["team_size"] = team
+        data["active_team_size"] = active
+        return data
+
+    @classmethod
+    def for_user(cls, user: CustomUser) -> "TeamCounter":
+        """
+        Stored counters for user; computed and persisted on first access.
+        """
+        obj = cls.objects.filter(user_id=user.pk).first()
+        if obj:
+            return obj
+        data = cls.compute(user)
+        try:
+            obj, _ = cls.objects.get_or_create(user_id=user.pk, defaults=data)
+        except Exception:
+            obj = cls(user_id=user.pk, **data)
+        return obj
+
+    # ---------- Incremental maintenance ----------
+
+    @staticmethod
+    def upline_ids(parent_id) -> list:
+        """
+        Sponsor chain starting at parent_id: [parent, grand-parent, ...] (one query via sponsor_path).
+        """
+        if not parent_id:
+            return []
+        parent = CustomUser.objects.filter(pk=parent_id).only("id", "sponsor_path", "registered_by").first()
+        if not parent:
+            return []
+        path = parent.sponsor_path or ""
+        if path:
+            return [parent.pk] + [int(x) for x in path.strip("/").split("/") if x][::-1]
+        return [parent.pk] + [u.pk for u in parent.get_upline(100000)]
+
+    @classmethod
+    def apply_subtree(cls, upline: list, *, sign: int, levels: list, team: int, active: int, direct_active: int) -> None:
+        """
+        Add (sign=+1) or remove (sign=-1) a subtree under upline[0]: one UPDATE over the NEAR_LEVELS
+        nearest sponsors, one TeamCounterDelta row for the rest.
+          - levels: [1, child L1, child L2, child L3, child L4] (subtree members by depth below its root)
+          - team / active: subtree size / active members (including its root)
+          - direct_active: 1 when the subtree root itself is active (affects upline[0] only)
+        Missing counter rows are skipped (they are computed on first access).
+        """
+        from django.db.models import Case, F, When
+        from django.utils import timezone
+        upline = [int(x) for x in upline if x]
+        if not upline:
+            return
+        TeamCounterDelta.defer(upline[cls.NEAR_LEVELS:], team=sign * team, active=sign * active)
+        upline = upline[:cls.NEAR_LEVELS]
+        updates = {
+            "team_size": F("team_size") + sign * team,
+            "active_team_size": F("active_team_size") + sign * active,
+            "updated_at": timezone.now(),
+        }
+        if direct_active:
+            updates["direct_active_count"] = Case(
+                When(user_id=upline[0], then=F("direct_active_count") + sign * direct_active),
+                default=F("direct_active_count"),
+            )
+        # Ancestor at distance d gains the subtree members at depth k-d at its level k
+        for k, field in enumerate(cls.LEVEL_FIELDS, start=1):
+            whens = []
+            for d in range(1, min(k, len(upline)) + 1):
+                n = int(levels[k - d] or 0) if (k - d) < len(levels) else 0
+                if n:
+                    whens.append(When(user_id=upline[d - 1], then=F(field) + sign * n))
+            if whens:
+                updates[field] = Case(*whens, default=F(field))
+        cls.objects.filter(user_id__in=upline).update(**updates)
+
+    @classmethod
+    def apply_active_change(cls, upline: list, delta: int) -> None:
+        from django.db.models import Case, F, When
+        from django.utils import timezone
+        upline = [int(x) for x in upline if x]
+        if not upline or not delta:
+            return
+        TeamCounterDelta.defer(upline[cls.NEAR_LEVELS:], team=0, active=delta)
+        upline = upline[:cls.NEAR_LEVELS]
+        cls.objects.filter(user_id__in=upline).update(
+            active_team_size=F("active_team_size") + delta,
+            direct_active_count=Case(
+                When(user_id=upline[0], then=F("direct_active_count") + delta),
+                default=F("direct_active_count"),
+            ),
+            updated_at=timezone.now(),
+        )
+
+    @classmethod
+    def move_subtree(cls, user: CustomUser, old_sponsor_id, *, was_active: bool, is_active: bool) -> None:
+        """
+        Re-attach user's subtree from old_sponsor_id's upline to the current registered_by upline.
+        Use after QuerySet.update(registered_by=...) which bypasses the save() signal.
+        """
+        old = cls._subtree_delta(user, was_active)
+        cls.apply_subtree(cls.upline_ids(old_sponsor_id), sign=-1, **old)
+        new = cls._subtree_delta(user, is_active)
+        cls.apply_subtree(cls.upline_ids(user.registered_by_id), sign=1, **new)
+
+    @classmethod
+    def _subtree_delta(cls, user: CustomUser, is_active: bool) -> dict:
+        own = cls.objects.filter(user_id=user.pk).first()
+        if own is None:
+            own = cls.for_user(user)
+        lv = own.levels()
+        return {
+            "levels": [1] + lv[:4],
+            "team": 1 + int(own.team_size or 0),
+            "active": (1 if is_active else 0) + int(own.active_team_size or 0),
+            "direct_active": 1 if is_active else 0,
+        }
+
+
+class TeamCounterDelta(models.Model):
+    """
+    Append-only pending team_size / active_team_size change for sponsors beyond TeamCounter.NEAR_LEVELS.
+    One row per event lists every affected sponsor; rollup() folds rows into TeamCounter and deletes them.
+    """
+    upline = models.TextField()  # comma-separated sponsor ids
+    team = models.IntegerField(default=0)
+    active = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["id"]
+
+    def __str__(self) -> str:
+        return f"TeamCounterDelta<{self.pk}> team={self.team} active={self.active}"
+
+    def upline_ids(self) -> list:
+        return [int(x) for x in (self.upline or "").split(",") if x]
+
+    @classmethod
+    def defer(cls, upline: list, *, team: int, active: int) -> None:
+        if upline and (team or active):
+            cls.objects.create(upline=",".join(str(int(x)) for x in upline), team=team, active=active)
+
+    @classmethod
+    def rollup(cls, batch_size: int = 1000, max_batches: int = 0) -> int:
+        """
+        Fold pending rows into TeamCounter.
+        - Claims up to batch_size rows per batch with skip_locked (safe with several workers).
+        - Sums per sponsor, then one UPDATE per distinct (team, active) sum, in sponsor id order.
+        Returns the number of rows folded.
+        """
+        from collections import defaultdict
+        from django.db.models import F
+        from django.utils import timezone
+
+        done = 0
+        batches = 0
+        while not (max_batches and batches >= max_batches):
+            with transaction.atomic():
+                rows = list(cls.objects.select_for_update(skip_locked=True).order_by("id")[: max(1, int(batch_size))])
+                if not rows:
+                    break
+                batches += 1
+                sums = defaultdict(lambda: [0, 0])
+                for r in rows:
+                    for uid in r.upline_ids():
+                        sums[uid][0] += int(r.team or 0)
+                        sums[uid][1] += int(r.active or 0)
+                groups = defaultdict(list)
+                for uid in sorted(sums):
+                    team, active = sums[uid]
+                    if team or active:
+                        groups[(team, active)].append(uid)
+                now = timezone.now()
+                for (team, active), uids in sorted(groups.items(), key=lambda kv: kv[1][0]):
+                    TeamCounter.objects.filter(user_id__in=uids).update(
+                        team_size=F("team_size") + team,
+                        active_team_size=F("active_team_size") + active,
+                        updated_at=now,
+                    )
+                cls.objects.filter(pk__in=[r.pk for r in rows]).delete()
+                done += len(rows)
+        return done
+
+
+@receiver(post_save, sender=CustomUser)
+def update_team_counters_on_save(sender, instance: CustomUser, created: bool, update_fields=None, **kwargs):
+    """
+    Keep TeamCounter rows in sync on join, activation change and sponsor (registered_by) moves.
+    Best-effort: failures never block the save; `rebuild_team_counters` reconciles.
+    """
+    if kwargs.get("raw"):
+        return
+    try:
+        if created:
+            TeamCounter.objects.get_or_create(user_id=instance.pk)
+            if instance.registered_by_id:
+                active = 1 if instance.account_active else 0
+                TeamCounter.apply_subtree(
+                    TeamCounter.upline_ids(instance.registered_by_id),
+                    sign=1, levels=[1], team=1, active=active, direct_active=active,
+                )
+            return
+
+        fields = set(update_fields or [])
+        loaded = getattr(instance, "_loaded_genealogy", None)
+        prev_sponsor = loaded[0] if loaded else instance.registered_by_id
+        prev_active = getattr(instance, "_loaded_account_active", None)
+        cur_active = instance.__dict__.get("account_active")
+        if update_fields is not None and not ({"registered_by", "registered_by_id"} & fields):
+            prev_sponsor = instance.registered_by_id
+        if update_fields is not None and "account_active" not in fields:
+            prev_active = cur_active
+        if prev_active is None or cur_active is None:
+            prev_active = cur_active
+
+        if prev_sponsor != instance.registered_by_id:
+            TeamCounter.move_subtree(instance, prev_sponsor, was_active=bool(prev_active), is_active=bool(cur_active))
+        elif bool(prev_active) != bool(cur_active) and instance.registered_by_id:
+            TeamCounter.apply_active_change(
+                TeamCounter.upline_ids(instance.registered_by_id), 1 if cur_active else -1
+            )
     except Exception:
         # best-effort; do not block saves
         pass
 
+
+@receiver(pre_delete, sender=CustomUser)
+def update_team_counters_on_delete(sender, instance: CustomUser, **kwargs):
+    """
+    Deleting a user detaches its whole subtree from the upline (registered_by is SET_NULL).
+    """
+    try:
+        if instance.registered_by_id:
+            loaded = getattr(instance, "_loaded_account_active", None)
+            delta = TeamCounter._subtree_delta(instance, bool(loaded if loaded is not None else instance.account_active))
+            TeamCounter.apply_subtree(TeamCounter.upline_ids(instance.registered_by_id), sign=-1, **delta)
+    except Exception:
+        pass
+
+
+@receiver(pre_delete, sender=CustomUser)
+def detach_genealogy_paths_on_delete(sender, instance: CustomUser, **kwargs):
+    """
+    registered_by/parent are SET_NULL: the deleted user's children become roots, so re-root the
+    materialized paths of the whole subtree (single UPDATE per tree). Runs after the counter update above.
+    """
+    from django.db.models import Value
+    from django.db.models.functions import Concat, Substr
+    for field, _ in CustomUser.GENEALOGY_PATH_FIELDS:
+        try:
+            path = getattr(instance, field, "") or ""
+            if not path:
+                continue
+            prefix = f"{path}{instance.pk}/"
+            CustomUser.objects.filter(**{f"{field}__startswith": prefix}).update(
+                **{field: Concat(Value("/"), Substr(field, len(prefix) + 1), output_field=models.TextField())}
+            )
+        except Exception:
+            pass
+
+
+@receiver(post_save, sender=AgencyRegionAssignment)
+@receiver(post_delete, sender=AgencyRegionAssignment)
+def bump_geo_recipients_on_assignment(sender, instance, **kwargs):
+    if kwargs.get("raw"):
+        return
+    try:
+        from business.services import geo_recipients
+        geo_recipients.bump_version()
+    except Exception:
+        pass
+
+
+@receiver(post_save, sender=CustomUser)
+def bump_geo_recipients_on_user(sender, instance: CustomUser, created: bool, **kwargs):
+    """
+    Category / superuser / staff changes decide who gets geo payouts: bump the index version when
+    they change on a user who is, or was, a geo role or royalty candidate.
+    """
+    if kwargs.get("raw"):
+        return
+    try:
+        from business.services import geo_recipients
+        current = instance._geo_fields()
+        loaded = getattr(instance, "_loaded_geo_fields", None)
+        if not created and loaded == current:
+            return
+        relevant = geo_recipients.is_geo_relevant(*current)
+        if not created and loaded is not None:
+            relevant = relevant or geo_recipients.is_geo_relevant(*loaded)
+        if relevant:
+            geo_recipients.bump_version()
+    except Exception:
+        pass
+
+
 class UserNominee(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="nominees", db_index=True)
     name = models.CharField(max_length=150)
@@ -0,0 +1,241 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from accounts.models import EarningsRollup, EarningsRollupState, TeamCounter, TeamCounterDelta, Wallet, WalletTransaction
+from coupons.models import AuditTrail, Coupon, CouponCode
+from jobs.models import BackgroundTask
+
+
+class TeamCounterTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.chain = []
+        sponsor = None
+        for i in range(8):
+            sponsor = User.objects.create_user(username=f"chain{i}", password="x", registered_by=sponsor, account_active=True)
+            self.chain.append(sponsor)
+        TeamCounterDelta.rollup()
+
+    def _counter(self, user):
+        return TeamCounter.objects.get(user_id=user.pk)
+
+    def test_signup_updates_near_sponsors_now_and_deep_sponsors_on_rollup(self):
+        User = get_user_model()
+        User.objects.create_user(username="leaf", password="x", registered_by=self.chain[-1], account_active=True)
+
+        near = self.chain[-1:-TeamCounter.NEAR_LEVELS - 1:-1]
+        deep = self.chain[:-TeamCounter.NEAR_LEVELS]
+        for d, sponsor in enumerate(near, start=1):
+            c = self._counter(sponsor)
+            self.assertEqual(c.team_size, d)
+            self.assertEqual(getattr(c, TeamCounter.LEVEL_FIELDS[d - 1]), 1)
+        self.assertEqual(self._counter(self.chain[-1]).direct_active_count, 1)
+        self.assertEqual(self._counter(deep[0]).team_size, len(self.chain) - 1)
+        self.assertEqual(TeamCounterDelta.objects.count(), 1)
+
+        self.assertEqual(TeamCounterDelta.rollup(), 1)
+        self.assertFalse(TeamCounterDelta.objects.exists())
+        for sponsor in deep:
+            c = self._counter(sponsor)
+            self.assertEqual(c.team_size, len(self.chain) - self.chain.index(sponsor))
+            self.assertEqual(c.active_team_size, c.team_size)
+            data = TeamCounter.compute(sponsor)
+            self.assertEqual(c.levels(), [data[f] for f in TeamCounter.LEVEL_FIELDS])
+
+    def test_deactivation_defers_active_team_size_for_deep_sponsors(self):
+        leaf = self.chain[-1]
+        leaf.account_active = False
+        leaf.save(update_fields=["account_active"])
+        TeamCounterDelta.rollup()
+
+        for sponsor in self.chain[:-1]:
+            data = TeamCounter.compute(sponsor)
+            c = self._counter(sponsor)
+            self.assertEqual(c.active_team_size, data["active_team_size"])
+            self.assertEqual(c.direct_active_count, data["direct_active_count"])
+
+
+class PendingReleaseTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="dormant", password="x", account_active=False)
+        self.wallet = Wallet.get_or_create_for_user(self.user)
+
+    def _wallet(self):
+        return Wallet.objects.get(pk=self.wallet.pk)
+
+    def test_release_moves_net_to_withdrawable_once(self):
+        self.wallet.credit(Decimal("100.00"), tx_type="COMMISSION_CREDIT", source_type="T", source_id="1")
+        self.wallet.credit(Decimal("10.00"), tx_type="ADJUSTMENT_CREDIT", source_type="T", source_id="2")
+        commission = WalletTransaction.objects.get(user=self.user, type="COMMISSION_CREDIT")
+        net = Decimal(commission.meta["net"])
+        self.assertEqual(WalletTransaction.objects.filter(user=self.user, pending_release=True).count(), 2)
+        self.assertEqual(self._wallet().withdrawable_balance, Decimal("0"))
+
+        Wallet.release_pending_for_user(self.user)
+        Wallet.release_pending_for_user(self.user)
+
+        w = self._wallet()
+        self.assertEqual(w.withdrawable_balance, net + Decimal("10.00"))
+        self.assertEqual(w.balance, Decimal("110.00"))
+        self.assertFalse(WalletTransaction.objects.filter(user=self.user, pending_release=True).exists())
+        markers = WalletTransaction.objects.filter(user=self.user, type="WITHDRAWABLE_CREDIT")
+        self.assertEqual(sorted(m.amount for m in markers), sorted([net, Decimal("10.00")]))
+        commission.refresh_from_db()
+        self.assertFalse(commission.meta["pending_due_to_inactive"])
+        self.assertTrue(commission.meta["released_from_pending"])
+
+    def test_include_legacy_picks_up_meta_only_rows(self):
+        self.wallet.credit(Decimal("10.00"), tx_type="ADJUSTMENT_CREDIT")
+        WalletTransaction.objects.filter(user=self.user).update(pending_release=False)
+
+        Wallet.release_pending_for_user(self.user)
+        self.assertEqual(self._wallet().withdrawable_balance, Decimal("0"))
+
+        Wallet.release_pending_for_user(self.user, include_legacy=True)
+        self.assertEqual(self._wallet().withdrawable_balance, Decimal("10.00"))
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class WalletTransactionsListTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.owner = User.objects.create_user(username="ledgerowner", password="x")
+        self.sender = User.objects.create_user(username="sender", password="x", full_name="Sender Name")
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def _rows(self, n, meta):
+        return [
+            WalletTransaction(user=self.owner, amount=Decimal("1.00"), balance_after=Decimal("1.00"), type="ADJUSTMENT_CREDIT", meta=meta)
+            for _ in range(n)
+        ]
+
+    def _page(self, queries):
+        with self.assertNumQueries(queries):
+            res = self.client.get("/api/v1/wallet/transactions/", {"page_size": 15})
+        self.assertEqual(res.status_code, 200)
+        return res.json()["results"]
+
+    def test_single_insert_does_not_resolve_counterparty(self):
+        tx = WalletTransaction.objects.create(
+            user=self.owner, amount=Decimal("1.00"), balance_after=Decimal("1.00"), type="ADJUSTMENT_CREDIT",
+            meta={"from_user_id": self.sender.pk},
+        )
+        self.assertIsNone(tx.counterparty_id)
+        self.assertEqual(self._page(3)[0]["tr_username"], "sender")
+
+    def test_page_with_counterparty_fk_serializes_in_two_queries(self):
+        rows = self._rows(15, {"from_user_id": self.sender.pk})
+        WalletTransaction.resolve_counterparties(rows)
+        WalletTransaction.objects.bulk_create(rows)
+
+        results = self._page(2)
+        self.assertEqual(len(results), 15)
+        self.assertEqual({r["tr_username"] for r in results}, {"sender"})
+        self.assertEqual({r["full_name"] for r in results}, {"Sender Name"})
+
+    def test_legacy_page_resolves_in_two_extra_queries(self):
+        WalletTransaction.objects.bulk_create(
+            self._rows(8, {"from_user_id": self.sender.pk}) + self._rows(7, {"from_user": "SENDER"})
+        )
+
+        results = self._page(4)
+        self.assertEqual({r["tr_username"] for r in results}, {"sender"})
+
+
+class EarningsRollupTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="earner", password="x")
+        for level, amount in ((1, "5.00"), (1, "7.00"), (2, "3.00")):
+            WalletTransaction.objects.create(
+                user=self.user, amount=Decimal(amount), balance_after=Decimal("0"), type="LEVEL_BONUS", meta={"level": level}
+            )
+        WalletTransaction.objects.create(
+            user=self.user, amount=Decimal("-2.00"), balance_after=Decimal("0"), type="ADJUSTMENT_DEBIT"
+        )
+
+    def test_unbuilt_user_reads_ledger_and_queues_build(self):
+        ledger = EarningsRollup.totals(self.user)
+
+        self.assertFalse(EarningsRollupState.objects.filter(user=self.user).exists())
+        self.assertEqual(ledger[("LEVEL_BONUS", "level:1")], {"total": Decimal("12.00"), "credit_total": Decimal("12.00"), "count": 2})
+        self.assertEqual(ledger[("ADJUSTMENT_DEBIT", "")]["credit_total"], Decimal("0"))
+        task = BackgroundTask.objects.get(type=EarningsRollup.BUILD_TASK)
+        EarningsRollup.totals(self.user)
+        self.assertEqual(BackgroundTask.objects.filter(type=EarningsRollup.BUILD_TASK).count(), 1)
+
+        task.run()
+        self.assertTrue(EarningsRollupState.objects.filter(user=self.user).exists())
+        self.assertEqual(EarningsRollup.totals(self.user), ledger)
+
+
+class AutoBlockRuleTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.company = User.objects.create_user(username="company", password="x", category="company")
+        self.issuer = User.objects.create_user(username="issuer", password="x")
+        self.coupon = Coupon.objects.create(code="AUTO1K", title="Auto 1k", issuer=self.issuer)
+
+    def _earner(self, name):
+        sponsor = get_user_model().objects.create_user(username=f"{name}_sponsor", password="x", account_active=True)
+        user = get_user_model().objects.create_user(username=name, password="x", registered_by=sponsor, account_active=True)
+        return user, sponsor
+
+    def _stock(self, prefix, n):
+        CouponCode.objects.bulk_create([
+            CouponCode(code=f"{prefix}{i}", coupon=self.coupon, issued_by=self.issuer, value=Decimal("150"), issued_channel="e_coupon")
+            for i in range(n)
+        ])
+
+    def _credit(self, user, *amounts):
+        for amount in amounts:
+            Wallet.get_or_create_for_user(user).credit(Decimal(amount), tx_type="ADJUSTMENT_CREDIT", source_type="ADMIN")
+
+    def _wallet(self, user):
+        return Wallet.objects.get(user=user)
+
+    def _block_rows(self, user):
+        rows = []
+        for t in WalletTransaction.objects.filter(user=user, source_type="AUTO_1K_BLOCK"):
+            meta = {k: v for k, v in t.meta.items() if k not in ("coupon_code", "to_user_id")}
+            rows.append((t.source_id, t.type, t.amount, sorted(meta.items())))
+        return sorted(rows)
+
+    def test_multi_block_credit_matches_block_by_block(self):
+        user, sponsor = self._earner("bulk")
+        self._stock("B", 2)
+        self._credit(user, "3500")
+
+        w = self._wallet(user)
+        self.assertEqual(w.auto_blocks_applied, 3)
+        rows = self._block_rows(user)
+        self.assertEqual(sorted({r[0] for r in rows}), ["1", "2", "3"])
+        self.assertEqual([r[0] for r in rows if r[1] == "AUTO_PURCHASE_DEBIT"], ["1", "2"])
+        self.assertEqual(CouponCode.objects.filter(assigned_consumer=user, status="SOLD").count(), 2)
+        self.assertEqual(AuditTrail.objects.filter(action="auto_1k_block_applied", actor=user).count(), 3)
+
+        bonus = WalletTransaction.objects.get(user=sponsor, type="DIRECT_REF_BONUS")
+        self.assertEqual((bonus.amount, bonus.source_id), (Decimal("150.00"), "1-3"))
+        self.assertEqual(bonus.meta["block_indexes"], [1, 2, 3])
+
+        other, other_sponsor = self._earner("stepwise")
+        self._stock("S", 2)
+        self._credit(other, "1000", "1000", "1000", "500")
+
+        self.assertEqual(self._block_rows(other), rows)
+        fields = ("balance", "main_balance", "withdrawable_balance", "auto_blocks_applied")
+        for a, b in ((user, other), (sponsor, other_sponsor)):
+            wa, wb = self._wallet(a), self._wallet(b)
+            self.assertEqual([getattr(wa, f) for f in fields], [getattr(wb, f) for f in fields])
+
+    def test_fast_path_issues_no_queries(self):
+        user, _ = self._earner("idle")
+        self._credit(user, "1200")
+
+        w = self._wallet(user)
+        self.assertEqual(w.auto_blocks_applied, 1)
+        with self.assertNumQueries(0):
+            w._apply_auto_block_rule(w)
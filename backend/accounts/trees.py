@@ -0,0 +1,312 @@
+"""
+Bounded subtree loaders for genealogy tree endpoints.
+
+Trees are fetched level-by-level (one `..._id__in` query per depth) and assembled in memory,
+instead of one query per node. Optional node caps mark truncated nodes with "has_more": True
+so clients can lazy-load them via the *ByRoot endpoints.
+"""
+from __future__ import annotations
+
+from typing import Callable, Dict, Iterable, List, Optional
+
+from django.db.models import Q
+from django.db.models.functions import Upper
+
+from accounts.models import CustomUser
+
+
+DEFAULT_MAX_NODES = 5000
+HARD_MAX_NODES = 20000
+
+
+def parse_max_nodes(request, default: int = DEFAULT_MAX_NODES) -> int:
+    """
+    Read ?max_nodes= (default DEFAULT_MAX_NODES, capped at HARD_MAX_NODES).
+    """
+    try:
+        v = int(request.query_params.get("max_nodes") or default)
+    except Exception:
+        v = default
+    return max(1, min(v, HARD_MAX_NODES))
+
+
+def _load_tree(
+    root: CustomUser,
+    *,
+    max_depth: int,
+    max_nodes: Optional[int],
+    fetch_children: Callable[[List[CustomUser]], Dict[int, List[CustomUser]]],
+    has_children: Callable[[List[int]], set],
+    make_node: Callable[[CustomUser, int], dict],
+) -> dict:
+    root_node = make_node(root, 1)
+    by_id: Dict[int, dict] = {root.id: root_node}
+    seen = {root.id}
+    count = 1
+    frontier: List[CustomUser] = [root]
+    level = 1
+    capped = False
+
+    while frontier and level < max_depth and not capped:
+        kids = fetch_children(frontier)
+        next_frontier: List[CustomUser] = []
+        for parent in frontier:
+            pnode = by_id[parent.id]
+            for ch in kids.get(parent.id, []):
+                if ch.id in seen:
+                    continue
+                if max_nodes and count >= max_nodes:
+                    capped = True
+                    pnode["has_more"] = True
+                    break
+                seen.add(ch.id)
+                count += 1
+                cnode = make_node(ch, level + 1)
+                pnode["children"].append(cnode)
+                by_id[ch.id] = cnode
+                next_frontier.append(ch)
+        frontier = next_frontier
+        level += 1
+
+    # Boundary nodes (depth limit / cap): cheap existence check for lazy expansion
+    if frontier:
+        try:
+            with_kids = has_children([u.id for u in frontier])
+            for uid in with_kids:
+                node = by_id.get(uid)
+                if node is not None and not node["children"]:
+                    node["has_more"] = True
+        except Exception:
+            pass
+    return root_node
+
+
+# ----------------------
+# 5-matrix (parent) tree
+# ----------------------
+MATRIX_FIELDS = ("id", "username", "full_name", "matrix_position", "depth", "parent_id")
+
+
+def _matrix_node(u: CustomUser, level: int) -> dict:
+    return {
+        "id": u.id,
+        "username": u.username,
+        "full_name": u.full_name,
+        "level": level,
+        "matrix_position": getattr(u, "matrix_position", None),
+        "depth": getattr(u, "depth", 0),
+        "children": [],
+    }
+
+
+def _matrix_children(parents: List[CustomUser]) -> Dict[int, List[CustomUser]]:
+    out: Dict[int, List[CustomUser]] = {}
+    qs = (
+        CustomUser.objects.filter(parent_id__in=[p.id for p in parents])
+        .only(*MATRIX_FIELDS)
+        .order_by("matrix_position", "id")
+    )
+    for u in qs:
+        out.setdefault(u.parent_id, []).append(u)
+    return out
+
+
+def _matrix_has_children(ids: List[int]) -> set:
+    return set(CustomUser.objects.filter(parent_id__in=ids).values_list("parent_id", flat=True).distinct())
+
+
+def build_matrix_tree(root: CustomUser, max_depth: int, max_nodes: Optional[int] = DEFAULT_MAX_NODES) -> dict:
+    """
+    5-matrix genealogy (parent/children) subtree:
+      { id, username, full_name, level, matrix_position, depth, children:[...], has_more? }
+    """
+    return _load_tree(
+        root,
+        max_depth=max_depth,
+        max_nodes=max_nodes,
+        fetch_children=_matrix_children,
+        has_children=_matrix_has_children,
+        make_node=_matrix_node,
+    )
+
+
+# ---------------------------
+# Sponsor (registered_by) tree
+# ---------------------------
+SPONSOR_FIELDS = ("id", "username", "full_name", "registered_by_id", "sponsor_id", "prefixed_id", "unique_id", "phone")
+
+
+def _sponsor_tokens(u: CustomUser) -> set:
+    """
+    Robust sponsor tokens including dashless variant of prefixed_id (upper-cased for iexact matching).
+    """
+    tokens = set()
+    try:
+        pid = (getattr(u, "prefixed_id", "") or "").strip()
+        if pid:
+            tokens.add(pid)
+            tokens.add(pid.replace("-", ""))
+        uname = (getattr(u, "username", "") or "").strip()
+        if uname:
+            tokens.add(uname)
+        uid = (getattr(u, "unique_id", "") or "").strip()
+        if uid:
+            tokens.add(uid)
+        phone_digits = "".join(ch for ch in str(getattr(u, "phone", "") or "") if ch.isdigit())
+        if phone_digits:
+            tokens.add(phone_digits)
+    except Exception:
+        pass
+    return {t.upper() for t in tokens if t}
+
+
+def _resolve_token_owners(tokens: Iterable[str]) -> Dict[str, int]:
+    """
+    Batch version of "first user (lowest id) whose prefixed_id/username/unique_id/phone matches token".
+    """
+    tokens = {str(t).strip() for t in tokens if t and str(t).strip()}
+    if not tokens:
+        return {}
+    variants: Dict[str, dict] = {}
+    for t in tokens:
+        t_up = t.upper()
+        t_no_dash = "".join(ch for ch in t if ch.isalnum()).upper()
+        digits = "".join(ch for ch in t if ch.isdigit())
+        variants[t] = {
+            "prefixed_id": {t_up} | ({t_no_dash} if t_no_dash and t_no_dash != t_up else set()),
+            "username": {t_up} | ({digits} if digits else set()),
+            "unique_id": {t_up},
+            "phone": {digits} if digits else set(),
+        }
+    all_pid = set().union(*(v["prefixed_id"] for v in variants.values()))
+    all_uname = set().union(*(v["username"] for v in variants.values()))
+    all_uid = set().union(*(v["unique_id"] for v in variants.values()))
+    all_phone = set().union(*(v["phone"] for v in variants.values()))
+    match = Q(_pid__in=all_pid) | Q(_uname__in=all_uname) | Q(_uid__in=all_uid)
+    if all_phone:
+        match = match | Q(_phone__in=all_phone)
+    qs = (
+        CustomUser.objects.annotate(
+            _pid=Upper("prefixed_id"), _uname=Upper("username"), _uid=Upper("unique_id"), _phone=Upper("phone")
+        )
+        .filter(match)
+        .order_by("id")
+        .values_list("id", "_pid", "_uname", "_uid", "_phone")
+    )
+    rows = list(qs)
+    out: Dict[str, int] = {}
+    for t, v in variants.items():
+        for uid, pid, uname, unq, phone in rows:
+            if (pid in v["prefixed_id"]) or (uname in v["username"]) or (unq in v["unique_id"]) or (phone and phone in v["phone"]):
+                out[t] = uid
+                break
+    return out
+
+
+def _sponsor_node(with_level: bool):
+    def make(u: CustomUser, level: int) -> dict:
+        node = {"id": u.id, "username": u.username, "full_name": getattr(u, "full_name", "")}
+        if with_level:
+            node["level"] = level
+        node["children"] = []
+        return node
+    return make
+
+
+def _sponsor_children_simple(parents: List[CustomUser]) -> Dict[int, List[CustomUser]]:
+    """
+    Consumer semantics: registered_by == parent OR (no registered_by AND sponsor_id iexact parent.prefixed_id).
+    Children ordered newest first.
+    """
+    ids = [p.id for p in parents]
+    pid_map = {}
+    for p in parents:
+        pid = (getattr(p, "prefixed_id", "") or "").strip().upper()
+        if pid:
+            pid_map[pid] = p.id
+    q = Q(registered_by_id__in=ids)
+    if pid_map:
+        q = q | (Q(registered_by__isnull=True) & Q(_sid__in=list(pid_map.keys())))
+    qs = (
+        CustomUser.objects.annotate(_sid=Upper("sponsor_id"))
+        .filter(q)
+        .only(*SPONSOR_FIELDS)
+        .order_by("-id")
+    )
+    out: Dict[int, List[CustomUser]] = {}
+    for u in qs:
+        parent_id = u.registered_by_id if u.registered_by_id in ids else pid_map.get((u.sponsor_id or "").strip().upper())
+        if parent_id and parent_id != u.id:
+            out.setdefault(parent_id, []).append(u)
+    return out
+
+
+def _sponsor_children_strict(parents: List[CustomUser]) -> Dict[int, List[CustomUser]]:
+    """
+    Admin semantics: registered_by == parent, or sponsor_id matches any parent token AND that token
+    resolves back to the parent. Children ordered by id.
+    """
+    ids = [p.id for p in parents]
+    token_to_parents: Dict[str, set] = {}
+    for p in parents:
+        for t in _sponsor_tokens(p):
+            token_to_parents.setdefault(t, set()).add(p.id)
+    q = Q(registered_by_id__in=ids)
+    if token_to_parents:
+        q = q | Q(_sid__in=list(token_to_parents.keys()))
+    candidates = list(
+        CustomUser.objects.annotate(_sid=Upper("sponsor_id"))
+        .filter(q)
+        .only(*SPONSOR_FIELDS)
+        .order_by("id")
+    )
+    # Verify each sponsor_id token resolves back to the parent (batched)
+    unresolved = {
+        (c.sponsor_id or "").strip()
+        for c in candidates
+        if c.registered_by_id not in ids and (c.sponsor_id or "").strip()
+    }
+    owners = _resolve_token_owners(unresolved)
+
+    out: Dict[int, List[CustomUser]] = {}
+    ids_set = set(ids)
+    for c in candidates:
+        added = set()
+        if c.registered_by_id in ids_set and c.registered_by_id != c.id:
+            out.setdefault(c.registered_by_id, []).append(c)
+            added.add(c.registered_by_id)
+        sid = (c.sponsor_id or "").strip()
+        owner = owners.get(sid)
+        if owner in token_to_parents.get(sid.upper(), set()) and owner not in added and owner != c.id:
+            out.setdefault(owner, []).append(c)
+    return out
+
+
+def _sponsor_has_children(ids: List[int]) -> set:
+    return set(
+        CustomUser.objects.filter(registered_by_id__in=ids).values_list("registered_by_id", flat=True).distinct()
+    )
+
+
+def build_sponsor_tree(
+    root: CustomUser,
+    max_depth: int,
+    max_nodes: Optional[int] = DEFAULT_MAX_NODES,
+    *,
+    strict_tokens: bool = False,
+    with_level: bool = False,
+) -> dict:
+    """
+    Sponsor-based downline subtree.
+      - strict_tokens=False: consumer views (registered_by or sponsor_id == prefixed_id), newest first
+      - strict_tokens=True: admin views (registered_by or verified sponsor token), oldest first
+      - with_level: include "level" in nodes (admin shape)
+    """
+    return _load_tree(
+        root,
+        max_depth=max_depth,
+        max_nodes=max_nodes,
+        fetch_children=_sponsor_children_strict if strict_tokens else _sponsor_children_simple,
+        has_children=_sponsor_has_children,
+        make_node=_sponsor_node(with_level),
+    )
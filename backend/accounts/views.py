@@ -1,6 +1,6 @@
 from rest_framework import generics
 from rest_framework.pagination import PageNumberPagination
-from .models import CustomUser, AgencyRegionAssignment, Wallet, WalletTransaction, SupportTicket, SupportTicketMessage
+from .models import CustomUser, AgencyRegionAssignment, Wallet, WalletTransaction, SupportTicket, SupportTicketMessage, TeamCounter, EarningsRollup
 from .serializers import RegisterSerializer, PublicUserSerializer, UserKYCSerializer, WithdrawalRequestSerializer, ProfileMeSerializer, SupportTicketSerializer, SupportTicketMessageSerializer
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework_simplejwt.views import TokenObtainPairView
@@ -334,9 +334,7 @@ def _collect_pincodes_from_user_assignments(user):
             elif a.level == 'state':
                 state_name = (getattr(a.state, 'name', '') or '').strip().lower()
                 if state_name:
-                    for (s, _d), sset in (idx.items() if hasattr(idx, 'items') else []):
-                        if s == state_name:
-                            pins.update(sset)
+                    pins.update(idx.pins_in_state(state_name))
     except Exception:
         pass
 
@@ -506,17 +504,14 @@ def regions_by_sponsor(request):
         # Group pincodes by state to allow frontend to auto-select state without pincode lookup
         pins_by_state = []
         try:
-            idx = _build_district_index() or {}
+            idx = _build_district_index()
             grouped = {}
             assigns_all = AgencyRegionAssignment.objects.filter(user=sponsor_user).select_related('state')
             for a in assigns_all:
                 if a.level == 'state' and a.state_id and a.state:
                     sname = (a.state.name or '').strip().lower()
                     # union all pins under this state from the offline index
-                    sset_total = set()
-                    for (skey, _d), pset in (idx.items() if hasattr(idx, 'items') else []):
-                        if skey == sname:
-                            sset_total.update(pset)
+                    sset_total = idx.pins_in_state(sname)
                     if sset_total:
                         grouped.setdefault(a.state_id, set()).update(sset_total)
                 elif a.level == 'district' and a.state_id and a.state:
@@ -531,11 +526,7 @@ def regions_by_sponsor(request):
                     p = (a.pincode or '').strip()
                     if p and p.isdigit() and len(p) == 6:
                         # try to map this pincode to a state via reverse lookup in the index
-                        found_state_name = None
-                        for (skey, _d), pset in (idx.items() if hasattr(idx, 'items') else []):
-                            if p in pset:
-                                found_state_name = skey
-                                break
+                        found_state_name = idx.state_of_pin(p)
                         if found_state_name:
                             st = State.objects.filter(name__iexact=found_state_name).first()
                             if st:
@@ -544,10 +535,7 @@ def regions_by_sponsor(request):
             # Fallback: if still no grouping and sponsor has a profile state, include all pins under that state
             if not grouped and getattr(sponsor_user, 'state_id', None) and getattr(sponsor_user, 'state', None):
                 sname = (getattr(sponsor_user.state, 'name', '') or '').strip().lower()
-                sset_total = set()
-                for (skey, _d), pset in (idx.items() if hasattr(idx, 'items') else []):
-                    if skey == sname:
-                        sset_total.update(pset)
+                sset_total = idx.pins_in_state(sname)
                 if sset_total:
                     grouped[sponsor_user.state_id] = sset_total
 
@@ -595,7 +583,7 @@ def regions_by_sponsor(request):
         resp = {'districts': out_districts}
         if registration_type in ('agency_sub_franchise', 'sub_franchise', 'sub-franchise', 'sf'):
             try:
-                idx = _build_district_index() or {}
+                idx = _build_district_index()
                 pins = set()
 
                 # Resolve state name if provided
@@ -641,7 +629,7 @@ def regions_by_sponsor(request):
     # - Else: all pincodes across the entire index (All-India)
     if registration_type in ('agency_sub_franchise', 'sub_franchise', 'sub-franchise', 'sf'):
         try:
-            idx = _build_district_index() or {}
+            idx = _build_district_index()
             pins = set()
 
             # Resolve state name if provided
@@ -666,13 +654,10 @@ def regions_by_sponsor(request):
                     pins.update(idx.get(('', dkey), set()))
             elif sname:
                 # Return all pins within the given state
-                for (skey, _d), pset in (idx.items() if hasattr(idx, 'items') else []):
-                    if skey == sname:
-                        pins.update(pset)
+                pins.update(idx.pins_in_state(sname))
             else:
                 # Return all pins across the entire index (All-India)
-                for _key, pset in (idx.items() if hasattr(idx, 'items') else []):
-                    pins.update(pset)
+                pins.update(idx.all_pins())
 
             pins_sorted = sorted(pins)
             full_name = getattr(sponsor_user, 'full_name', '') or sponsor_user.username
@@ -748,6 +733,7 @@ class MyMatrixTree(APIView):
     Returns the authenticated user's 5-matrix genealogy tree (spillover-based).
     Query params:
       - max_depth: optional (default 6, capped at 20)
+      - max_nodes: optional (default 5000, capped at 20000); truncated nodes carry has_more: true
     Response:
       { id, username, full_name, level, matrix_position, depth, children:[...] }
     """
@@ -761,28 +747,8 @@ class MyMatrixTree(APIView):
             max_depth = 6
         max_depth = max(1, min(max_depth, 20))
 
-        def build_node(u, level: int):
-            node = {
-                "id": u.id,
-                "username": u.username,
-                "full_name": u.full_name,
-                "level": level,
-                "matrix_position": getattr(u, "matrix_position", None),
-                "depth": getattr(u, "depth", 0),
-                "children": [],
-            }
-            if level >= max_depth:
-                return node
-            children = list(
-                CustomUser.objects.filter(parent_id=u.id)
-                .only("id", "username", "full_name", "matrix_position", "depth")
-                .order_by("matrix_position", "id")
-            )
-            for ch in children:
-                node["children"].append(build_node(ch, level + 1))
-            return node
-
-        tree = build_node(user, 1)
+        from accounts.trees import build_matrix_tree, parse_max_nodes
+        tree = build_matrix_tree(user, max_depth, max_nodes=parse_max_nodes(request))
         return Response(tree, status=status.HTTP_200_OK)
 
 
@@ -793,6 +759,7 @@ class MyMatrixTreeByRoot(APIView):
     Query params:
       - root_user_id: required
       - max_depth: optional (default 6, capped at 20)
+      - max_nodes: optional (default 5000, capped at 20000); truncated nodes carry has_more: true
     Response is identical to MyMatrixTree.
     """
     permission_classes = [IsAuthenticated]
@@ -810,23 +777,12 @@ class MyMatrixTreeByRoot(APIView):
         if not me_id:
             return Response({"detail": "Unauthorized"}, status=status.HTTP_401_UNAUTHORIZED)
 
-        target = CustomUser.objects.filter(id=root_id).only("id", "parent_id").first()
+        target = CustomUser.objects.filter(id=root_id).only("id", "parent_id", "matrix_path").first()
         if not target:
             return Response({"detail": "root user not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        cur = target
-        in_downline = False
-        # allow same user (self)
-        for _ in range(7):  # depth up to 6 + self check
-            if not cur:
-                break
-            if cur.id == me_id:
-                in_downline = True
-                break
-            pid = getattr(cur, "parent_id", None)
-            if not pid:
-                break
-            cur = CustomUser.objects.filter(id=pid).only("id", "parent_id").first()
+        # allow same user (self); otherwise caller must be within 6 levels up (materialized matrix_path)
+        in_downline = (target.id == me_id) or any(u.id == me_id for u in target.get_upline(6, tree="matrix"))
 
         if not in_downline:
             return Response({"detail": "Requested root is not inside your downline"}, status=status.HTTP_403_FORBIDDEN)
@@ -838,30 +794,10 @@ class MyMatrixTreeByRoot(APIView):
             max_depth = 6
         max_depth = max(1, min(max_depth, 20))
 
-        # Build subtree
-        def build_node(u, level: int):
-            node = {
-                "id": u.id,
-                "username": u.username,
-                "full_name": u.full_name,
-                "level": level,
-                "matrix_position": getattr(u, "matrix_position", None),
-                "depth": getattr(u, "depth", 0),
-                "children": [],
-            }
-            if level >= max_depth:
-                return node
-            children = list(
-                CustomUser.objects.filter(parent_id=u.id)
-                .only("id", "username", "full_name", "matrix_position", "depth")
-                .order_by("matrix_position", "id")
-            )
-            for ch in children:
-                node["children"].append(build_node(ch, level + 1))
-            return node
-
+        # Build subtree (level-by-level loader)
+        from accounts.trees import build_matrix_tree, parse_max_nodes
         root = CustomUser.objects.filter(id=root_id).first()
-        tree = build_node(root, 1)
+        tree = build_matrix_tree(root, max_depth, max_nodes=parse_max_nodes(request))
         return Response(tree, status=status.HTTP_200_OK)
 
 
@@ -870,6 +806,7 @@ class MySponsorTree(APIView):
     Returns the authenticated user's sponsor-based genealogy tree (registered_by/sponsor_id).
     Query params:
       - max_depth: optional (default 6, capped at 20)
+      - max_nodes: optional (default 5000, capped at 20000); truncated nodes carry has_more: true
     Response:
       { id, username, full_name, children:[...] }
     """
@@ -882,37 +819,8 @@ class MySponsorTree(APIView):
             max_depth = 6
         max_depth = max(1, min(max_depth, 20))
 
-        def build_node(u, level: int, visited=None):
-            if visited is None:
-                visited = set()
-            if getattr(u, "id", None) in visited:
-                return None
-            visited.add(u.id)
-            node = {
-                "id": u.id,
-                "username": u.username,
-                "full_name": getattr(u, "full_name", ""),
-                "children": [],
-            }
-            if level >= max_depth:
-                return node
-            children = list(
-                CustomUser.objects.filter(
-                    Q(registered_by_id=u.id)
-                    | (Q(registered_by__isnull=True) & Q(sponsor_id__iexact=getattr(u, "prefixed_id", "")))
-                )
-                .exclude(id=u.id)
-                .only("id", "username", "full_name")
-                .order_by("-id")
-                .distinct()
-            )
-            for ch in children:
-                cn = build_node(ch, level + 1, visited)
-                if cn:
-                    node["children"].append(cn)
-            return node
-
-        tree = build_node(request.user, 1)
+        from accounts.trees import build_sponsor_tree, parse_max_nodes
+        tree = build_sponsor_tree(request.user, max_depth, max_nodes=parse_max_nodes(request))
         return Response(tree, status=status.HTTP_200_OK)
 
 
@@ -922,6 +830,7 @@ class MySponsorTreeByRoot(APIView):
     Query params:
       - root_user_id: required
       - max_depth: optional (default 6, capped at 20)
+      - max_nodes: optional (default 5000, capped at 20000); truncated nodes carry has_more: true
     """
     permission_classes = [IsAuthenticated]
 
@@ -977,37 +886,8 @@ class MySponsorTreeByRoot(APIView):
             max_depth = 6
         max_depth = max(1, min(max_depth, 20))
 
-        def build_node(u, level: int, visited=None):
-            if visited is None:
-                visited = set()
-            if getattr(u, "id", None) in visited:
-                return None
-            visited.add(u.id)
-            node = {
-                "id": u.id,
-                "username": u.username,
-                "full_name": getattr(u, "full_name", ""),
-                "children": [],
-            }
-            if level >= max_depth:
-                return node
-            children = list(
-                CustomUser.objects.filter(
-                    Q(registered_by_id=u.id)
-                    | (Q(registered_by__isnull=True) & Q(sponsor_id__iexact=getattr(u, "prefixed_id", "")))
-                )
-                .exclude(id=u.id)
-                .only("id", "username", "full_name")
-                .order_by("-id")
-                .distinct()
-            )
-            for ch in children:
-                cn = build_node(ch, level + 1, visited)
-                if cn:
-                    node["children"].append(cn)
-            return node
-
-        tree = build_node(root, 1)
+        from accounts.trees import build_sponsor_tree, parse_max_nodes
+        tree = build_sponsor_tree(root, max_depth, max_nodes=parse_max_nodes(request))
         return Response(tree, status=status.HTTP_200_OK)
 
 
@@ -1017,7 +897,7 @@ class MySponsorTreeByRoot(APIView):
 class TeamSummaryView(APIView):
     """
     Returns a consolidated "My Team" snapshot for the logged-in user:
-    - Downline counts (Direct + L1..L5)
+    - Downline counts (Direct + L1..L5, team size, active team size) from TeamCounter
     - Earnings totals by category: direct referral, generation levels, autopool, franchise
     - Matrix progress (UserMatrixProgress) for THREE_50 / THREE_150 / FIVE_150
     - Recent team members and recent reward transactions (limited)
@@ -1027,82 +907,38 @@ class TeamSummaryView(APIView):
     def get(self, request):
         user = request.user
 
-        # Downline counts up to 5 levels (by registered_by chain)
-        def downline_counts(u, max_depth=5):
-            counts = []
-            current_ids = [u.id]
-            for d in range(max_depth):
-                lvl_ids = list(
-                    CustomUser.objects.filter(registered_by_id__in=current_ids).values_list("id", flat=True)
-                )
-                counts.append(len(lvl_ids))
-                if not lvl_ids:
-                    counts.extend([0] * (max_depth - d - 1))
-                    break
-                current_ids = lvl_ids
-            return counts
-
-        levels_1_5 = downline_counts(user, 5)
-        direct_count = levels_1_5[0] if levels_1_5 else 0
+        # Downline counts up to 5 levels (denormalized TeamCounter, computed on first access)
+        counter = TeamCounter.for_user(user)
+        levels_1_5 = counter.levels()
+        direct_count = counter.direct_count
 
-        # Earnings totals (wallet transactions)
+        # Earnings totals (pre-aggregated EarningsRollup; one GROUP BY over the user's rollup rows)
         tx = WalletTransaction.objects.filter(user=user)
-        def _sum(qs):
-            val = qs.aggregate(total=Sum("amount"))["total"] or 0
-            return str(val)
+        rollup = EarningsRollup.totals(user)
+
+        def _sum(types):
+            return str(EarningsRollup.sum_of(rollup, types))
 
         totals = {
-            "direct_referral": _sum(tx.filter(type="DIRECT_REF_BONUS")),
-            "generation_levels": _sum(tx.filter(type="LEVEL_BONUS")),
-            "autopool_three": _sum(tx.filter(type="AUTOPOOL_BONUS_THREE")),
-            "autopool_five": _sum(tx.filter(type="AUTOPOOL_BONUS_FIVE")),
-            "franchise_income": _sum(tx.filter(type="FRANCHISE_INCOME")),
-            "commissions": _sum(tx.filter(type="COMMISSION_CREDIT")),
-            "rewards": _sum(tx.filter(type="REWARD_CREDIT")),
+            "direct_referral": _sum("DIRECT_REF_BONUS"),
+            "generation_levels": _sum("LEVEL_BONUS"),
+            "autopool_three": _sum("AUTOPOOL_BONUS_THREE"),
+            "autopool_five": _sum("AUTOPOOL_BONUS_FIVE"),
+            "franchise_income": _sum("FRANCHISE_INCOME"),
+            "commissions": _sum("COMMISSION_CREDIT"),
+            "rewards": _sum("REWARD_CREDIT"),
         }
 
         # Generation earnings breakdown by level (L1..L5)
-        gen_breakdown = {"1": "0", "2": "0", "3": "0", "4": "0", "5": "0"}
-        try:
-            from decimal import Decimal as D
-            accum = {1: D("0"), 2: D("0"), 3: D("0"), 4: D("0"), 5: D("0")}
-            for r in tx.filter(type="LEVEL_BONUS").values("amount", "meta"):
-                meta = r.get("meta") or {}
-                try:
-                    lvl = int(meta.get("level") or meta.get("level_index") or 0)
-                except Exception:
-                    lvl = 0
-                if 1 <= lvl <= 5:
-                    try:
-                        amt = D(str(r.get("amount") or "0"))
-                        accum[lvl] = accum[lvl] + amt
-                    except Exception:
-                        pass
-            gen_breakdown = {str(k): str(v) for k, v in accum.items()}
-        except Exception:
-            # best-effort
-            pass
+        gen_breakdown = {
+            str(lvl): str(EarningsRollup.sum_of(rollup, "LEVEL_BONUS", bucket=f"level:{lvl}")) for lvl in range(1, 6)
+        }
 
         # Commission split by role for COMMISSION_CREDIT
-        comm_split = {"employee": "0", "agency": "0"}
-        try:
-            from decimal import Decimal as D
-            emp = D("0"); ag = D("0")
-            for r in tx.filter(type="COMMISSION_CREDIT").values("amount", "meta"):
-                meta = r.get("meta") or {}
-                role = (meta.get("role") or "").strip().lower()
-                try:
-                    amt = D(str(r.get("amount") or "0"))
-                except Exception:
-                    amt = D("0")
-                if role == "employee":
-                    emp += amt
-                elif role == "agency":
-                    ag += amt
-            comm_split = {"employee": str(emp), "agency": str(ag)}
-        except Exception:
-            # best-effort
-            pass
+        comm_split = {
+            "employee": str(EarningsRollup.sum_of(rollup, "COMMISSION_CREDIT", bucket="role:employee")),
+            "agency": str(EarningsRollup.sum_of(rollup, "COMMISSION_CREDIT", bucket="role:agency")),
+        }
 
         # Matrix progress (per pool_type)
         try:
@@ -1152,11 +988,11 @@ class TeamSummaryView(APIView):
             direct_qs = (
                 CustomUser.objects
                 .filter(registered_by=user)
-                .annotate(direct_referrals=Count("registrations", distinct=True))
+                .annotate(direct_referrals=TeamCounter.direct_count_expr())
                 .order_by("-date_joined")
             )
-            direct_active = direct_qs.filter(account_active=True).count()
-            direct_inactive = direct_qs.filter(account_active=False).count()
+            direct_active = int(counter.direct_active_count or 0)
+            direct_inactive = max(0, direct_count - direct_active)
             # Limit to reasonable number for UI; frontend can page later if needed
             direct_team = list(
                 direct_qs.values(
@@ -1180,6 +1016,8 @@ class TeamSummaryView(APIView):
                         "l4": levels_1_5[3] if len(levels_1_5) > 3 else 0,
                         "l5": levels_1_5[4] if len(levels_1_5) > 4 else 0,
                     },
+                    "team_size": int(counter.team_size or 0),
+                    "active_team_size": int(counter.active_team_size or 0),
                 },
                 "totals": totals,
                 "generation_levels_breakdown": gen_breakdown,
@@ -1248,7 +1086,7 @@ class WalletMe(APIView):
             }, status=status.HTTP_200_OK)
 
         w = Wallet.get_or_create_for_user(request.user)
-        # Auto-apply any pending ₹1000 blocks on wallet fetch (idempotent via AuditTrail)
+        # Auto-apply any pending ₹1000 blocks on wallet fetch (idempotent via Wallet.auto_blocks_applied)
         try:
             w._apply_auto_block_rule(w)
         except Exception:
@@ -1262,10 +1100,12 @@ class WalletMe(APIView):
             total_blocks = int(main // block_size)
             try:
                 from coupons.models import AuditTrail
-                applied_blocks = int(
-                    AuditTrail.objects.filter(action="auto_1k_block_applied", actor=request.user).count()
-                )
+                applied_blocks = w.auto_blocks_applied
+                if applied_blocks is None:
+                    applied_blocks = AuditTrail.objects.filter(action="auto_1k_block_applied", actor=request.user).count()
+                applied_blocks = int(applied_blocks)
                 last_obj = (
+                    None if not applied_blocks else
                     AuditTrail.objects
                     .filter(action="auto_1k_block_applied", actor=request.user)
                     .only("id", "created_at", "metadata")
@@ -1313,25 +1153,24 @@ class WalletMe(APIView):
         try:
             from django.utils import timezone as _tz
             today = _tz.localdate()
-            tx_all = WalletTransaction.objects.filter(user=request.user)
-
-            def _sum_t(qs):
-                val = qs.aggregate(total=Sum("amount"))["total"] or 0
-                return str(val)
-
-            direct_ref_total = _sum_t(tx_all.filter(type="DIRECT_REF_BONUS"))
-            matrix_five_total = _sum_t(tx_all.filter(type="AUTOPOOL_BONUS_FIVE"))
-            matrix_three_total = _sum_t(tx_all.filter(type="AUTOPOOL_BONUS_THREE"))
-            matrix_total = _sum_t(tx_all.filter(type__in=["LEVEL_BONUS", "AUTOPOOL_BONUS_THREE", "AUTOPOOL_BONUS_FIVE"]))
-            global_tri_total = _sum_t(tx_all.filter(type="GLOBAL_ROYALTY"))
-            global_turnover_total = _sum_t(tx_all.filter(type="GLOBAL_ACTIVATION_CREDIT"))
+            # Pre-aggregated per-day totals (EarningsRollup) instead of ledger scans
+            rollup = EarningsRollup.totals(request.user)
+            rollup_today = EarningsRollup.totals(request.user, day=today)
+
+            def _sum_t(types, *, bucket=None, field="total", src=None):
+                return str(EarningsRollup.sum_of(rollup if src is None else src, types, bucket=bucket, field=field))
+
+            direct_ref_total = _sum_t("DIRECT_REF_BONUS")
+            matrix_five_total = _sum_t("AUTOPOOL_BONUS_FIVE")
+            matrix_three_total = _sum_t("AUTOPOOL_BONUS_THREE")
+            matrix_total = _sum_t(["LEVEL_BONUS", "AUTOPOOL_BONUS_THREE", "AUTOPOOL_BONUS_FIVE"])
+            global_tri_total = _sum_t("GLOBAL_ROYALTY")
+            global_turnover_total = _sum_t("GLOBAL_ACTIVATION_CREDIT")
             from decimal import Decimal as D
-            withdrawal_benefit_total = _sum_t(tx_all.filter(type="LIFETIME_WITHDRAWAL_BONUS"))
-            commission_total = _sum_t(tx_all.filter(type="COMMISSION_CREDIT"))
-            franchise_total = _sum_t(tx_all.filter(type="FRANCHISE_INCOME"))
-            direct_ref_withdraw_commission_total = _sum_t(
-                tx_all.filter(type="DIRECT_REF_BONUS").filter(Q(meta__auto_rule="AUTO_1K_BLOCK") | Q(source_type="AUTO_1K_BLOCK"))
-            )
+            withdrawal_benefit_total = _sum_t("LIFETIME_WITHDRAWAL_BONUS")
+            commission_total = _sum_t("COMMISSION_CREDIT")
+            franchise_total = _sum_t("FRANCHISE_INCOME")
+            direct_ref_withdraw_commission_total = _sum_t("DIRECT_REF_BONUS", bucket="auto_1k")
             # Level-only bonus = matrix_total - (five + three)
             try:
                 level_bonus_total = str(
@@ -1341,21 +1180,19 @@ class WalletMe(APIView):
                 level_bonus_total = "0"
             # Today earning: sum of positive credits across ALL income sources (exclude debits/withholding)
             today_earning = _sum_t(
-                tx_all.filter(
-                    created_at__date=today,
-                    amount__gt=0,
-                    type__in=[
-                        "DIRECT_REF_BONUS",
-                        "LEVEL_BONUS",
-                        "AUTOPOOL_BONUS_FIVE",
-                        "AUTOPOOL_BONUS_THREE",
-                        "GLOBAL_ROYALTY",
-                        "GLOBAL_ACTIVATION_CREDIT",
-                        "COMMISSION_CREDIT",
-                        "FRANCHISE_INCOME",
-                        "LIFETIME_WITHDRAWAL_BONUS",
-                    ],
-                )
+                [
+                    "DIRECT_REF_BONUS",
+                    "LEVEL_BONUS",
+                    "AUTOPOOL_BONUS_FIVE",
+                    "AUTOPOOL_BONUS_THREE",
+                    "GLOBAL_ROYALTY",
+                    "GLOBAL_ACTIVATION_CREDIT",
+                    "COMMISSION_CREDIT",
+                    "FRANCHISE_INCOME",
+                    "LIFETIME_WITHDRAWAL_BONUS",
+                ],
+                field="credit_total",
+                src=rollup_today,
             )
             # All earnings (gross without TDS): sum of positive credits across all earning types
             earn_types = [
@@ -1372,7 +1209,7 @@ class WalletMe(APIView):
                 "REDEEM_ECOUPON_CREDIT",
                 "SELF_BONUS_ACTIVE",
             ]
-            all_earnings_total = _sum_t(tx_all.filter(amount__gt=0, type__in=earn_types))
+            all_earnings_total = _sum_t(earn_types, field="credit_total")
         except Exception:
             direct_ref_total = "0"
             matrix_five_total = "0"
@@ -1418,7 +1255,9 @@ class WalletMe(APIView):
             from coupons.models import AuditTrail as _AT
             self_activated = int(_AT.objects.filter(action="coupon_activated", actor=request.user).count())
             month_start = _tz2.now().replace(day=1).date()
-            monthly_self_benefit = int(WalletTransaction.objects.filter(user=request.user, type="SELF_BONUS_ACTIVE", created_at__date__gte=month_start).count())
+            monthly_self_benefit = int(EarningsRollup.sum_of(
+                EarningsRollup.totals(request.user, since=month_start), "SELF_BONUS_ACTIVE", field="count"
+            ))
         except Exception:
             self_activated = 0
             monthly_self_benefit = 0
@@ -1487,14 +1326,24 @@ class WalletMe(APIView):
         }, status=status.HTTP_200_OK)
 
 
+class WalletTransactionListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, "all") else data)
+        WalletTransactionSerializer.prime_counterparties(items, self.context)
+        return super().to_representation(items)
+
+
 class WalletTransactionSerializer(serializers.ModelSerializer):
     tr_username = serializers.SerializerMethodField()
     full_name = serializers.SerializerMethodField()
     pincode = serializers.SerializerMethodField()
     commission = serializers.SerializerMethodField()
 
+    COUNTERPARTY_FIELDS = ("id", "username", "full_name", "pincode")
+
     class Meta:
         model = WalletTransaction
+        list_serializer_class = WalletTransactionListSerializer
         fields = [
             "id",
             "amount",
@@ -1516,22 +1365,52 @@ class WalletTransactionSerializer(serializers.ModelSerializer):
         except Exception:
             return None
 
-    def _resolve_counterparty(self, obj):
-        try:
-            meta = obj.meta or {}
-        except Exception:
-            meta = {}
-        uid = meta.get("from_user_id") or meta.get("user_id")
-        uname = meta.get("from_user") or meta.get("username")
-        u = None
+    @classmethod
+    def prime_counterparties(cls, items, context) -> None:
+        """
+        Resolve counterparties for a whole page at once into a per-request cache (context["_counterparties"]):
+          - rows with a stored counterparty FK use it (select_related by the view)
+          - legacy rows resolve meta from_user_id/from_user with at most two batched queries
+        """
+        if context is None:
+            return
+        cache = context.setdefault("_counterparties", {})
+        fk = WalletTransaction._meta.get_field("counterparty")
+        owner_fk = WalletTransaction._meta.get_field("user")
+        request = context.get("request")
+        me = getattr(request, "user", None)
+        legacy = []
+        for obj in items:
+            if getattr(obj, "pk", None) is None or obj.pk in cache:
+                continue
+            # Fallback user is the row owner (the requester in list views); avoid a lazy load per row
+            if me is not None and obj.user_id == getattr(me, "pk", None) and not owner_fk.is_cached(obj):
+                obj.user = me
+            if obj.counterparty_id and fk.is_cached(obj):
+                cache[obj.pk] = obj.counterparty
+            else:
+                legacy.append(obj)
+        if not legacy:
+            return
+        refs = {obj.pk: WalletTransaction.counterparty_refs(obj.meta) for obj in legacy}
         try:
-            if uid:
-                u = CustomUser.objects.filter(id=uid).only("id", "username", "full_name", "pincode").first()
-            if not u and uname:
-                u = CustomUser.objects.filter(username__iexact=str(uname)).only("id", "username", "full_name", "pincode").first()
+            by_id, by_name = WalletTransaction.lookup_counterparties(list(refs.values()), fields=cls.COUNTERPARTY_FIELDS)
         except Exception:
-            u = None
-        return u or getattr(obj, "user", None)
+            by_id, by_name = {}, {}
+        for obj in legacy:
+            uid, uname = refs[obj.pk]
+            u = by_id.get(uid) if uid else None
+            if u is None and uname:
+                u = by_name.get(uname.upper())
+            cache[obj.pk] = u
+
+    def _resolve_counterparty(self, obj):
+        cache = self.context.get("_counterparties")
+        if cache is None or obj.pk not in cache:
+            # Single-object serialization: resolve just this row
+            self.prime_counterparties([obj], self.context)
+            cache = self.context.get("_counterparties") or {}
+        return cache.get(obj.pk) or getattr(obj, "user", None)
 
     def get_tr_username(self, obj):
         u = self._resolve_counterparty(obj)
@@ -1581,7 +1460,11 @@ class WalletTransactionsList(generics.ListAPIView):
     pagination_class = LenientWalletTxnPagination
 
     def get_queryset(self):
-        qs = WalletTransaction.objects.filter(user=self.request.user).order_by("-created_at")
+        qs = (
+            WalletTransaction.objects.filter(user=self.request.user)
+            .select_related("counterparty")
+            .order_by("-created_at")
+        )
         t = (self.request.query_params.get("type") or "").strip()
         if t:
             qs = qs.filter(type=t)
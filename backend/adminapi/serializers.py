@@ -18,7 +18,7 @@ class AdminUserNodeSerializer(serializers.ModelSerializer):
     kyc_verified_at = serializers.SerializerMethodField()
     kyc_status = serializers.SerializerMethodField()
     commission_level = serializers.SerializerMethodField()
-    direct_count = serializers.IntegerField(read_only=True)
+    direct_count = serializers.SerializerMethodField()
     has_children = serializers.SerializerMethodField()
     has_usable_password = serializers.SerializerMethodField()
     password_status = serializers.SerializerMethodField()
@@ -202,10 +202,28 @@ class AdminUserNodeSerializer(serializers.ModelSerializer):
         except Exception:
             return ""
 
+    def get_direct_count(self, obj):
+        """
+        Annotated direct_count (TeamCounter.direct_count_expr) or plain dict value; falls back to the
+        stored TeamCounter row when the queryset was not annotated.
+        """
+        try:
+            if isinstance(obj, dict):
+                return int(obj.get("direct_count") or 0)
+            dc = getattr(obj, "direct_count", None)
+            if dc is not None:
+                return int(dc or 0)
+            from accounts.models import TeamCounter
+            counter = TeamCounter.objects.filter(user_id=obj.pk).only("l1_count").first()
+            return int(getattr(counter, "l1_count", 0) or 0)
+        except Exception:
+            return 0
+
     def get_has_children(self, obj):
         try:
-            dc = getattr(obj, "direct_count", 0) or 0
-            return dc > 0
+            if isinstance(obj, dict) and "has_children" in obj:
+                return bool(obj.get("has_children"))
+            return self.get_direct_count(obj) > 0
         except Exception:
             return False
 
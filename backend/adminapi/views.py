@@ -11,7 +11,7 @@ from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.http import HttpResponse
 
-from accounts.models import CustomUser, Wallet, WalletTransaction, UserKYC, WithdrawalRequest, SupportTicket, SupportTicketMessage, AgencyRegionAssignment
+from accounts.models import CustomUser, Wallet, WalletTransaction, UserKYC, WithdrawalRequest, SupportTicket, SupportTicketMessage, AgencyRegionAssignment, TeamCounter
 from coupons.models import Coupon, CouponCode, CouponSubmission, CouponBatch
 from uploads.models import FileUpload, DashboardCard, HomeCard, LuckyDrawSubmission
 from market.models import Product, PurchaseRequest, Banner, BannerItem, BannerPurchaseRequest
@@ -207,7 +207,7 @@ class AdminUserTreeRoot(APIView):
         node = (
             CustomUser.objects.filter(id=user.id)
             .annotate(
-                direct_count=Count("registrations", distinct=True),
+                direct_count=TeamCounter.direct_count_expr(),
             )
             .first()
         )
@@ -245,7 +245,7 @@ class AdminUserTreeDefaultRoot(APIView):
 
         node = (
             CustomUser.objects.filter(id=user.id)
-            .annotate(direct_count=Count("registrations", distinct=True))
+            .annotate(direct_count=TeamCounter.direct_count_expr())
             .first()
         )
         has_children = (getattr(node, "direct_count", 0) or 0) > 0
@@ -283,7 +283,7 @@ class AdminUserTreeChildren(APIView):
 
         qs = (
             CustomUser.objects.filter(registered_by_id=user_id)
-            .annotate(direct_count=Count("registrations", distinct=True))
+            .annotate(direct_count=TeamCounter.direct_count_expr())
             .order_by("-date_joined")
         )
 
@@ -341,7 +341,7 @@ class AdminUsersList(ListAPIView):
                 ),
             )
             .annotate(
-                direct_count=Count("registrations", distinct=True),
+                direct_count=TeamCounter.direct_count_expr(),
                 activated_ecoupon_count=Count(
                     "coupon_submissions",
                     filter=Q(coupon_submissions__status="AGENCY_APPROVED"),
@@ -1405,8 +1405,9 @@ class AdminMatrixTree(APIView):
       - pool=FIVE_150|THREE_150|THREE_50 (affects default max_depth only)
       - root_user_id (int, required)
       - max_depth (optional override; default 6 for FIVE, 15 for THREE)
+      - max_nodes (optional; default 5000, capped at 20000). Truncated nodes carry has_more: true
     Response:
-      { id, username, full_name, level, children:[...] }
+      { id, username, full_name, level, children:[...], has_more? }
     """
     permission_classes = [IsAdminOrStaff]
 
@@ -1426,87 +1427,13 @@ class AdminMatrixTree(APIView):
             max_depth = default_depth
         max_depth = max(1, min(max_depth, 20))  # hard safety cap
 
-        # Prefetch children by registered_by in batches to reduce queries
-        def build_node(user, level, visited=None):
-            if visited is None:
-                visited = set()
-            if getattr(user, "id", None) in visited:
-                return None
-            visited.add(user.id)
-            node = {
-                "id": user.id,
-                "username": user.username,
-                "full_name": user.full_name,
-                "level": level,
-                "children": [],
-            }
-            if level >= max_depth:
-                return node
-            # Build robust sponsor tokens including dashless variant of prefixed_id
-            tokens = set()
-            try:
-                pid = (getattr(user, "prefixed_id", "") or "").strip()
-                if pid:
-                    tokens.add(pid)
-                    tokens.add(pid.replace("-", ""))
-                uname = (getattr(user, "username", "") or "").strip()
-                if uname:
-                    tokens.add(uname)
-                uid = (getattr(user, "unique_id", "") or "").strip()
-                if uid:
-                    tokens.add(uid)
-                phone_digits = "".join(ch for ch in str(getattr(user, "phone", "") or "") if ch.isdigit())
-                if phone_digits:
-                    tokens.add(phone_digits)
-            except Exception:
-                pass
-
-            # Initial candidate query by registered_by or sponsor token match
-            children_q = Q(registered_by_id=user.id)
-            for t in tokens:
-                children_q = children_q | Q(sponsor_id__iexact=t)
-
-            candidates = list(
-                CustomUser.objects.filter(children_q)
-                .exclude(id=user.id)
-                .only("id", "username", "full_name", "registered_by_id", "sponsor_id")
-                .order_by("id")
-                .distinct()
-            )
-
-            # Verify each sponsor_id token resolves back to the current user before accepting
-            def _owner_id_by_token(token: str):
-                if not token:
-                    return None
-                q = Q(prefixed_id__iexact=token) | Q(username__iexact=token) | Q(unique_id__iexact=token)
-                t_no_dash = "".join(ch for ch in str(token) if ch.isalnum())
-                if t_no_dash and t_no_dash != token:
-                    q = q | Q(prefixed_id__iexact=t_no_dash)
-                digits = "".join(ch for ch in str(token) if ch.isdigit())
-                if digits:
-                    q = q | Q(phone__iexact=digits) | Q(username__iexact=digits)
-                u2 = CustomUser.objects.filter(q).only("id").first()
-                return getattr(u2, "id", None)
-
-            children = []
-            for c in candidates:
-                if getattr(c, "registered_by_id", None) == user.id:
-                    children.append(c)
-                else:
-                    sid = (getattr(c, "sponsor_id", "") or "").strip()
-                    if _owner_id_by_token(sid) == user.id:
-                        children.append(c)
-
-            for c in children:
-                cn = build_node(c, level + 1, visited)
-                if cn:
-                    node["children"].append(cn)
-            return node
-
         root = CustomUser.objects.filter(id=root_id).first()
         if not root:
             return Response({"detail": "root user not found"}, status=404)
-        tree = build_node(root, 1)
+        from accounts.trees import build_sponsor_tree, parse_max_nodes
+        tree = build_sponsor_tree(
+            root, max_depth, max_nodes=parse_max_nodes(request), strict_tokens=True, with_level=True
+        )
         return Response(tree, status=200)
 
 
@@ -1518,8 +1445,9 @@ class AdminMatrix5Tree(APIView):
       - root_user_id: integer (alternative to identifier)
       - max_depth: default 6 (hard cap 20)
       - source: matrix | sponsor | auto (default: auto). When auto and matrix has no children, falls back to sponsor-based tree.
+      - max_nodes: default 5000 (hard cap 20000). Truncated nodes carry has_more: true
     Response:
-      { id, username, full_name, level, matrix_position?, depth?, children:[...] }
+      { id, username, full_name, level, matrix_position?, depth?, children:[...], has_more? }
     """
     permission_classes = [IsAdminOrStaff]
 
@@ -1569,101 +1497,15 @@ class AdminMatrix5Tree(APIView):
         if not user:
             return Response({"detail": "Root user not found"}, status=404)
 
-        # Builders
-        def build_matrix(u, level: int):
-            node = {
-                "id": u.id,
-                "username": u.username,
-                "full_name": u.full_name,
-                "level": level,
-                "matrix_position": getattr(u, "matrix_position", None),
-                "depth": getattr(u, "depth", 0),
-                "children": [],
-            }
-            if level >= max_depth:
-                return node
-            children = list(
-                CustomUser.objects.filter(parent_id=u.id)
-                .only("id", "username", "full_name", "matrix_position", "depth")
-                .order_by("matrix_position", "id")
-            )
-            for ch in children:
-                node["children"].append(build_matrix(ch, level + 1))
-            return node
-
-        def build_sponsor(u, level: int, visited=None):
-            if visited is None:
-                visited = set()
-            if getattr(u, "id", None) in visited:
-                return None
-            visited.add(u.id)
-            node = {
-                "id": u.id,
-                "username": u.username,
-                "full_name": u.full_name,
-                "level": level,
-                "children": [],
-            }
-            if level >= max_depth:
-                return node
-            # Build robust sponsor tokens including dashless variant of prefixed_id
-            tokens = set()
-            try:
-                pid = (getattr(u, "prefixed_id", "") or "").strip()
-                if pid:
-                    tokens.add(pid)
-                    tokens.add(pid.replace("-", ""))
-                uname = (getattr(u, "username", "") or "").strip()
-                if uname:
-                    tokens.add(uname)
-                uid = (getattr(u, "unique_id", "") or "").strip()
-                if uid:
-                    tokens.add(uid)
-                phone_digits = "".join(ch for ch in str(getattr(u, "phone", "") or "") if ch.isdigit())
-                if phone_digits:
-                    tokens.add(phone_digits)
-            except Exception:
-                pass
-
-            children_q = Q(registered_by_id=u.id)
-            for t in tokens:
-                children_q = children_q | Q(sponsor_id__iexact=t)
-
-            candidates = list(
-                CustomUser.objects.filter(children_q)
-                .exclude(id=u.id)
-                .only("id", "username", "full_name", "registered_by_id", "sponsor_id")
-                .order_by("id")
-                .distinct()
-            )
+        # Builders (level-by-level loaders, one query per depth)
+        from accounts.trees import build_matrix_tree, build_sponsor_tree, parse_max_nodes
+        max_nodes = parse_max_nodes(request)
 
-            def _owner_id_by_token(token: str):
-                if not token:
-                    return None
-                q = Q(prefixed_id__iexact=token) | Q(username__iexact=token) | Q(unique_id__iexact=token)
-                t_no_dash = "".join(ch for ch in str(token) if ch.isalnum())
-                if t_no_dash and t_no_dash != token:
-                    q = q | Q(prefixed_id__iexact=t_no_dash)
-                digits = "".join(ch for ch in str(token) if ch.isdigit())
-                if digits:
-                    q = q | Q(phone__iexact=digits) | Q(username__iexact=digits)
-                u2 = CustomUser.objects.filter(q).only("id").first()
-                return getattr(u2, "id", None)
+        def build_matrix(u, level: int):
+            return build_matrix_tree(u, max_depth, max_nodes=max_nodes)
 
-            children = []
-            for c in candidates:
-                if getattr(c, "registered_by_id", None) == u.id:
-                    children.append(c)
-                else:
-                    sid = (getattr(c, "sponsor_id", "") or "").strip()
-                    if _owner_id_by_token(sid) == u.id:
-                        children.append(c)
-
-            for c in children:
-                cn = build_sponsor(c, level + 1, visited)
-                if cn:
-                    node["children"].append(cn)
-            return node
+        def build_sponsor(u, level: int):
+            return build_sponsor_tree(u, max_depth, max_nodes=max_nodes, strict_tokens=True, with_level=True)
 
         # Decide source
         if source == "matrix":
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand, CommandParser
+
+from business.models import ProcessedEvent
+from coupons.models import AuditTrail
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed ProcessedEvent idempotency markers from existing AuditTrail rows "
+        "(coupon_activated, coupon_matrix_distributed, prime_150/prime_750/monthly_759_distributed). "
+        "Walks rows by id in batches; safe to re-run (existing markers are skipped)."
+    )
+
+    SCOPES = (
+        "coupon_activated",
+        "coupon_matrix_distributed",
+        "prime_150_distributed",
+        "prime_750_distributed",
+        "monthly_759_distributed",
+    )
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per batch (default: 5000)")
+        parser.add_argument("--dry-run", action="store_true", help="Count markers only; do not write.")
+
+    @staticmethod
+    def _keys(scope, actor_id, coupon_code_id, metadata):
+        if scope == "coupon_activated":
+            if actor_id and coupon_code_id:
+                yield f"{actor_id}:{coupon_code_id}"
+            return
+        if coupon_code_id:
+            yield str(coupon_code_id)
+        if scope == "coupon_matrix_distributed":
+            # Legacy rows were also matched on metadata.source_id (coupon may have been unlinked)
+            sid = (metadata or {}).get("source_id") if isinstance(metadata, dict) else None
+            if sid not in (None, ""):
+                yield str(sid)
+
+    def handle(self, *args, **options):
+        batch_size = max(1, int(options.get("batch_size") or 5000))
+        dry_run = bool(options.get("dry_run"))
+
+        total = 0
+        for scope in self.SCOPES:
+            base = AuditTrail.objects.filter(action=scope).order_by("id")
+            last_id = 0
+            seen = 0
+            keys_total = 0
+            while True:
+                rows = list(
+                    base.filter(id__gt=last_id).values_list("id", "actor_id", "coupon_code_id", "metadata")[:batch_size]
+                )
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                seen += len(rows)
+                keys = {k for _, actor_id, code_id, meta in rows for k in self._keys(scope, actor_id, code_id, meta)}
+                keys_total += len(keys)
+                if keys and not dry_run:
+                    ProcessedEvent.objects.bulk_create(
+                        [ProcessedEvent(scope=scope, key=k) for k in keys],
+                        ignore_conflicts=True,
+                        batch_size=batch_size,
+                    )
+            total += keys_total
+            self.stdout.write(f"  {scope}: audit_rows={seen} markers={keys_total}")
+
+        self.stdout.write(self.style.SUCCESS(f"Done. markers={total} dry_run={dry_run}"))
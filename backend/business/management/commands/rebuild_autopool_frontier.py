@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+from collections import defaultdict, deque
+from itertools import count
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import transaction
+
+from business.models import AutoPoolAccount
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the autopool frontier index (AutoPoolAccount.tree_path and child_count) "
+        "from parent_account links. Safe to re-run; placement falls back to BFS for rows without a path."
+    )
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument(
+            "--pool-type",
+            action="append",
+            default=None,
+            help="Limit to a pool type (repeatable). Default: all pool types.",
+        )
+        parser.add_argument("--batch-size", type=int, default=2000, help="bulk_update batch size (default: 2000)")
+        parser.add_argument("--dry-run", action="store_true", help="Compute and report changes only; do not write.")
+
+    def handle(self, *args, **options):
+        pool_types = options.get("pool_type") or [k for k, _ in AutoPoolAccount.POOL_TYPE_CHOICES]
+        batch_size = max(1, int(options.get("batch_size") or 2000))
+        dry_run = bool(options.get("dry_run"))
+
+        for pool_type in pool_types:
+            rows = list(
+                AutoPoolAccount.objects.filter(pool_type=pool_type)
+                .order_by("id")
+                .values_list("id", "parent_account_id", "status", "tree_path", "child_count", "position")
+            )
+            self.stdout.write(self.style.NOTICE(f"[{pool_type}] accounts={len(rows)}"))
+            if not rows:
+                continue
+
+            ids = {r[0] for r in rows}
+            children = defaultdict(list)
+            roots = []
+            active_children = defaultdict(int)
+            for acc_id, parent_id, status, _, _, position in rows:
+                # Parents in another pool (should not happen) are treated as roots
+                if parent_id and parent_id in ids:
+                    children[parent_id].append((acc_id, position))
+                    if status == "ACTIVE":
+                        active_children[parent_id] += 1
+                else:
+                    roots.append(acc_id)
+
+            # BFS from each root; segments come from position, as in AutoPoolAccount._create_in_pool.
+            # Children without a position (legacy rows) take the next free slot number, in id order.
+            new_path = {}
+            for root_id in roots:
+                new_path[root_id] = AutoPoolAccount._root_path(root_id)
+                q = deque([root_id])
+                while q:
+                    node = q.popleft()
+                    kids = children.get(node, [])
+                    taken = {pos for _, pos in kids if pos}
+                    free = (n for n in count(1) if n not in taken)
+                    for ch, pos in kids:
+                        new_path[ch] = AutoPoolAccount._child_path(new_path[node], pos or next(free))
+                        q.append(ch)
+
+            changed = []
+            for acc_id, _, _, old_path, old_count, _ in rows:
+                # "" when too deep for the path column; placement under such nodes uses the BFS fallback
+                path = new_path.get(acc_id, "")
+                cnt = int(active_children.get(acc_id, 0))
+                if path != (old_path or "") or cnt != int(old_count or 0):
+                    changed.append(AutoPoolAccount(id=acc_id, tree_path=path, child_count=cnt))
+
+            self.stdout.write(f"[{pool_type}] roots={len(roots)} changed={len(changed)}")
+            if dry_run or not changed:
+                continue
+
+            for i in range(0, len(changed), batch_size):
+                with transaction.atomic():
+                    AutoPoolAccount.objects.bulk_update(changed[i:i + batch_size], ["tree_path", "child_count"])
+
+        self.stdout.write(self.style.SUCCESS(f"Done. dry_run={dry_run}"))
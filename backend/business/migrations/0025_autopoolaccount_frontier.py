@@ -0,0 +1,29 @@
+# Generated by Django 6.1.2 on 2026-10-17 02:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business', '0024_commissionconfig_monthly_759_open_once_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='autopoolaccount',
+            name='child_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='autopoolaccount',
+            name='tree_path',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='autopoolaccount',
+            index=models.Index(condition=models.Q(('child_count__lt', 5), ('status', 'ACTIVE')), fields=['pool_type', 'level', 'tree_path'], name='autopool_frontier_idx', opclasses=['varchar_pattern_ops', 'int4_ops', 'varchar_pattern_ops']),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 6.1.2 on 2026-10-17 09:40
+
+from django.db import migrations
+
+
+SCOPES = (
+    "coupon_activated",
+    "coupon_matrix_distributed",
+    "prime_150_distributed",
+    "prime_750_distributed",
+    "monthly_759_distributed",
+)
+BATCH_SIZE = 5000
+
+
+def _keys(scope, actor_id, coupon_code_id, metadata):
+    if scope == "coupon_activated":
+        if actor_id and coupon_code_id:
+            yield f"{actor_id}:{coupon_code_id}"
+        return
+    if coupon_code_id:
+        yield str(coupon_code_id)
+    if scope == "coupon_matrix_distributed":
+        # Legacy rows were also matched on metadata.source_id (coupon may have been unlinked)
+        sid = metadata.get("source_id") if isinstance(metadata, dict) else None
+        if sid not in (None, ""):
+            yield str(sid)
+
+
+def seed_processed_events(apps, schema_editor):
+    AuditTrail = apps.get_model("coupons", "AuditTrail")
+    ProcessedEvent = apps.get_model("business", "ProcessedEvent")
+    for scope in SCOPES:
+        base = AuditTrail.objects.filter(action=scope).order_by("id")
+        last_id = 0
+        while True:
+            rows = list(
+                base.filter(id__gt=last_id).values_list("id", "actor_id", "coupon_code_id", "metadata")[:BATCH_SIZE]
+            )
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            keys = {k for _, actor_id, code_id, meta in rows for k in _keys(scope, actor_id, code_id, meta)}
+            if keys:
+                ProcessedEvent.objects.bulk_create(
+                    [ProcessedEvent(scope=scope, key=k) for k in keys],
+                    ignore_conflicts=True,
+                    batch_size=BATCH_SIZE,
+                )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business', '0026_processedevent'),
+        ('coupons', '0015_luckydrawparticipant'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_processed_events, migrations.RunPython.noop),
+    ]
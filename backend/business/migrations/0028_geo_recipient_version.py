@@ -0,0 +1,21 @@
+# Generated by Django 6.1.2 on 2026-10-17 04:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business', '0027_backfill_processed_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeoRecipientVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.1.2 on 2026-10-17 04:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business', '0028_geo_recipient_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='autopoolaccount',
+            name='autopool_frontier_idx',
+        ),
+        migrations.AddIndex(
+            model_name='autopoolaccount',
+            index=models.Index(fields=['pool_type', 'tree_path'], name='autopool_tree_path_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='autopoolaccount',
+            index=models.Index(condition=models.Q(('child_count__lt', 5), ('pool_type', 'FIVE_150'), ('status', 'ACTIVE')), fields=['pool_type', 'level', 'tree_path'], name='autopool_frontier5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='autopoolaccount',
+            index=models.Index(condition=models.Q(('child_count__lt', 3), ('pool_type__in', ['THREE_150', 'THREE_50']), ('status', 'ACTIVE')), fields=['pool_type', 'level', 'tree_path'], name='autopool_frontier3_idx'),
+        ),
+    ]
@@ -82,6 +82,13 @@ class BusinessRegistration(models.Model):
 from decimal import Decimal
 from django.db import transaction
 from django.utils.functional import cached_property
+import copy
+from contextlib import contextmanager
+from time import monotonic as _monotonic
+
+# Per-process CommissionConfig cache: (obj, stamp, check_at) or None. Replaced whole, never mutated,
+# so concurrent readers see either the old or the new entry.
+_SOLO_CACHE = None
 
 
 class CommissionConfig(models.Model):
@@ -186,12 +193,84 @@ class CommissionConfig(models.Model):
     def __str__(self):
         return f"CommissionConfig base={self.base_coupon_value}"
 
+    JSON_FIELDS = (
+        "five_matrix_percents_json",
+        "three_matrix_percents_json",
+        "rewards_weights_json",
+        "reward_points_config_json",
+        "franchise_fixed_json",
+        "referral_join_fixed_json",
+        "master_commission_json",
+        "three_matrix_amounts_json",
+        "five_matrix_amounts_json",
+    )
+
+    def save(self, *args, **kwargs):
+        # updated_at is the cache version stamp: keep it moving on partial saves too
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "updated_at" not in update_fields:
+            kwargs["update_fields"] = list(update_fields) + ["updated_at"]
+        return super().save(*args, **kwargs)
+
+    @classmethod
+    def get_solo(cls, fresh: bool = False) -> "CommissionConfig":
+        """
+        The config row, served from a per-process cache (see _solo_cached).
+        Returns a private copy (JSON fields included) so callers may mutate and save it.
+        fresh=True bypasses the cache.
+        """
+        if fresh:
+            obj = cls.objects.first()
+            if obj:
+                return obj
+            return cls.objects.create()
+        cached, _stamp = cls._solo_cached()
+        obj = copy.copy(cached)
+        for f in cls.JSON_FIELDS:
+            setattr(obj, f, copy.deepcopy(getattr(cached, f)))
+        return obj
+
     @classmethod
-    def get_solo(cls) -> "CommissionConfig":
-        obj = cls.objects.first()
-        if obj:
-            return obj
-        return cls.objects.create()
+    def _solo_cached(cls):
+        """
+        (shared instance, version stamp). Callers must not mutate the instance.
+          - invalidated in-process by post_save/post_delete
+          - other processes: re-check (id, updated_at) at most every COMMISSION_CONFIG_CACHE_SECONDS
+        """
+        global _SOLO_CACHE
+        entry = _SOLO_CACHE
+        now = _monotonic()
+        if entry is not None and now < entry[2]:
+            return entry[0], entry[1]
+        ttl = float(getattr(settings, "COMMISSION_CONFIG_CACHE_SECONDS", 5) or 0)
+        if entry is not None:
+            row = cls.objects.order_by("pk").values_list("pk", "updated_at").first()
+            if row is not None and row == entry[1]:
+                _SOLO_CACHE = (entry[0], entry[1], now + ttl)
+                return entry[0], entry[1]
+        obj = cls.objects.select_related("tax_company_user").order_by("pk").first()
+        if obj is None:
+            obj = cls.objects.create()
+        stamp = (obj.pk, obj.updated_at)
+        _SOLO_CACHE = (obj, stamp, now + ttl)
+        return obj, stamp
+
+    @classmethod
+    def get_cached(cls) -> "CommissionConfig":
+        """
+        Shared cached instance for read-only hot paths (credits, payout engines). Do not mutate or save it;
+        use get_solo() for edits.
+        """
+        return cls._solo_cached()[0]
+
+    @classmethod
+    def cache_version(cls):
+        return cls._solo_cached()[1]
+
+    @staticmethod
+    def invalidate_cache() -> None:
+        global _SOLO_CACHE
+        _SOLO_CACHE = None
 
     # ----------------------
     # Master config getters
@@ -472,6 +551,9 @@ class AutoPoolAccount(models.Model):
     source_id = models.CharField(max_length=64, blank=True, default="", db_index=True)
     parent_account = models.ForeignKey("self", null=True, blank=True, on_delete=models.SET_NULL, related_name="children")
     level = models.PositiveIntegerField(default=1, db_index=True)  # optional metadata for hierarchy traversal
+    # Frontier index (see _find_open_slot); backfilled by `rebuild_autopool_frontier`
+    tree_path = models.CharField(max_length=255, blank=True, default="")
+    child_count = models.PositiveSmallIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -480,6 +562,20 @@ class AutoPoolAccount(models.Model):
             models.Index(fields=["username_key", "status"]),
             models.Index(fields=["pool_type", "status"]),
             models.Index(fields=["parent_account", "pool_type", "position"]),
+            # Subtree / ancestor lookups: pool_type equality + tree_path range or IN
+            models.Index(fields=["pool_type", "tree_path"], name="autopool_tree_path_idx"),
+            # Open-slot frontier, one partial index per matrix width so only nodes with a free slot are
+            # indexed: (pool_type, level) equality + subtree tree_path range, first row in path order
+            models.Index(
+                fields=["pool_type", "level", "tree_path"],
+                name="autopool_frontier5_idx",
+                condition=models.Q(status="ACTIVE", pool_type="FIVE_150", child_count__lt=5),
+            ),
+            models.Index(
+                fields=["pool_type", "level", "tree_path"],
+                name="autopool_frontier3_idx",
+                condition=models.Q(status="ACTIVE", pool_type__in=["THREE_150", "THREE_50"], child_count__lt=3),
+            ),
         ]
         constraints = [
             models.UniqueConstraint(
@@ -492,20 +588,43 @@ class AutoPoolAccount(models.Model):
     def __str__(self):
         return f"Pool<{self.username_key}> ₹{self.entry_amount} [{self.status}] ({self.pool_type})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        inst = super().from_db(db, field_names, values)
+        # Previous status (parent's child_count follows children entering/leaving ACTIVE)
+        inst._loaded_status = inst.__dict__.get("status")
+        return inst
+
+    def save(self, *args, **kwargs):
+        loaded = getattr(self, "_loaded_status", None)
+        adding = bool(getattr(self._state, "adding", False))
+        super().save(*args, **kwargs)
+        status = self.__dict__.get("status")
+        if not adding and loaded is not None and status is not None and self.parent_account_id:
+            was_active, is_active = loaded == "ACTIVE", status == "ACTIVE"
+            if was_active != is_active:
+                self._adjust_child_count(self.parent_account_id, 1 if is_active else -1)
+        self._loaded_status = status
+
+    @classmethod
+    def _adjust_child_count(cls, parent_id, delta: int) -> None:
+        from django.db.models import F
+        qs = cls.objects.filter(pk=parent_id)
+        if delta < 0:
+            qs = qs.filter(child_count__gte=-delta)
+        qs.update(child_count=F("child_count") + delta)
+
     @classmethod
     def create_for_user(cls, user, amount: Decimal):
         """
         Simple creation without complex placement logic.
         Anchors to the consumer's username; parent/level can be extended later.
         """
-        return cls.objects.create(
-            owner=user,
-            username_key=getattr(user, "username", "") or "",
-            entry_amount=Decimal(amount or 0) or Decimal("0.00"),
-            pool_type="THREE_150",
-            status="ACTIVE",
-            parent_account=None,
-            level=1,
+        return cls._create_in_pool(
+            user,
+            "THREE_150",
+            Decimal(amount or 0) or Decimal("0.00"),
+            getattr(user, "username", "") or "",
         )
 
     @classmethod
@@ -567,125 +686,196 @@ class AutoPoolAccount(models.Model):
         idx = int(count) + 1
         return base if idx == 1 else f"{base}{sep}{idx}"
 
+    # ---------- Frontier index (open-slot lookup) ----------
+    # tree_path: fixed-width materialized path from the pool root ("<root id:10>" + "<position:02>" per level).
+    #   - prefix match == subtree membership
+    #   - (level, tree_path) order == BFS order (siblings by position)
+    #   - a subtree is the range [path, _path_upper(path)) (fixed-width digits: byte order == collation order)
+    # child_count: number of ACTIVE children; nodes with child_count < width are the open-slot frontier.
+    #   Maintained on placement and when a child enters/leaves ACTIVE (save) or is deleted (post_delete).
+    # Rows created before the frontier existed have an empty tree_path until `rebuild_autopool_frontier` runs;
+    # placement under such roots falls back to the legacy BFS.
+    ROOT_PATH_WIDTH = 10
+    POSITION_PATH_WIDTH = 2
+
     @classmethod
-    def place_in_three_pool(cls, user, pool_type: str, amount: Decimal, source_type: str = "", source_id: str = ""):
+    def _root_path(cls, acc_id: int) -> str:
+        return str(int(acc_id)).zfill(cls.ROOT_PATH_WIDTH)
+
+    @classmethod
+    def _child_path(cls, parent_path: str, position) -> str:
         """
-        Preferred behavior:
-          - If user already has a base self account in this pool, place new self-accounts under that subtree (3-wide BFS).
-          - Else, fall back to upline BFS placement (legacy), which becomes the base.
+        tree_path of the child at `position` under a parent path ("" when the parent has none or it won't fit).
         """
-        from collections import deque
-        from decimal import Decimal as D
-        from django.db import transaction as _tx
-        amt = D(amount or 0)
+        seg = int(position or 0)
+        if not parent_path or seg < 1 or seg >= 10 ** cls.POSITION_PATH_WIDTH:
+            return ""
+        path = parent_path + str(seg).zfill(cls.POSITION_PATH_WIDTH)
+        return path if len(path) <= 255 else ""
 
-        with _tx.atomic():
-            base_self = cls._base_self_account(user, pool_type)
-            uname = cls._next_username_key(user, pool_type)
+    @classmethod
+    def _legacy_find_open_slot(cls, root, pool_type: str, width: int):
+        """
+        Legacy BFS (one count + child fetch per visited node). Returns (node, position) or (None, None).
+        """
+        from collections import deque
+        q = deque([root])
+        while q:
+            node = q.popleft()
+            child_qs = cls.objects.filter(parent_account=node, pool_type=pool_type, status="ACTIVE").order_by("id")
+            cnt = child_qs.count()
+            if cnt < width:
+                return node, cls._free_position(node, pool_type)
+            for ch in child_qs:
+                q.append(ch)
+        return None, None
+
+    @staticmethod
+    def _path_upper(path: str) -> str:
+        """
+        Exclusive upper bound of the subtree range starting at `path` ("" when it has no same-width successor).
+        """
+        if not path or not path.isdigit():
+            return ""
+        upper = str(int(path) + 1).zfill(len(path))
+        return upper if len(upper) == len(path) else ""
 
-            # If base exists, BFS within the user's own subtree (cluster under main)
-            if base_self:
-                q = deque([base_self])
-                while q:
-                    node = q.popleft()
-                    child_qs = cls.objects.filter(parent_account=node, pool_type=pool_type, status="ACTIVE").order_by("id")
-                    cnt = child_qs.count()
-                    if cnt < 3:
-                        return cls.objects.create(
-                            owner=user,
-                            username_key=uname,
-                            entry_amount=amt,
-                            pool_type=pool_type,
-                            status="ACTIVE",
-                            parent_account=node,
-                            level=(getattr(node, "level", 0) or 0) + 1,
-                            position=(cnt + 1),
-                            source_type=source_type or "",
-                            source_id=source_id or "",
-                        )
-                    for ch in child_qs:
-                        q.append(ch)
-
-                # Fallback: attach directly under base_self if traversal exhausted
-                child_qs2 = cls.objects.filter(parent_account=base_self, pool_type=pool_type, status="ACTIVE").order_by("id")
-                pos = child_qs2.count() + 1
-                return cls.objects.create(
-                    owner=user,
-                    username_key=uname,
-                    entry_amount=amt,
-                    pool_type=pool_type,
-                    status="ACTIVE",
-                    parent_account=base_self,
-                    level=(getattr(base_self, "level", 0) or 0) + 1,
-                    position=pos,
-                    source_type=source_type or "",
-                    source_id=source_id or "",
-                )
+    @classmethod
+    def _free_position(cls, node, pool_type: str) -> int:
+        """
+        Lowest sibling position not held by any child of `node` (closed children keep theirs and their path).
+        """
+        taken = set(
+            cls.objects.filter(parent_account=node, pool_type=pool_type, position__isnull=False)
+            .values_list("position", flat=True)
+        )
+        pos = 1
+        while pos in taken:
+            pos += 1
+        return pos
 
-            # No base exists yet: legacy placement under first upline account with capacity
-            root_acc = cls._first_upline_account(user, pool_type)
+    @classmethod
+    def _find_open_slot(cls, root, pool_type: str, width: int):
+        """
+        First node (BFS order) within root's subtree having fewer than `width` ACTIVE children.
+        Probes the frontier index one level at a time below root: each probe is (pool_type, level) equality
+        plus the subtree's tree_path range, so it reads the first open node of that level in this subtree
+        only. The chosen node is row-locked and re-checked so concurrent placements never overfill a parent.
+        Returns (node, position).
+        """
+        path = getattr(root, "tree_path", "") or ""
+        upper = cls._path_upper(path)
+        if not path or not upper:
+            return cls._legacy_find_open_slot(root, pool_type, width)
 
-            # If no upline account exists, create a root account (this becomes the base)
-            if not root_acc:
-                return cls.objects.create(
-                    owner=user,
-                    username_key=uname,
-                    entry_amount=amt,
-                    pool_type=pool_type,
-                    status="ACTIVE",
-                    parent_account=None,
-                    level=1,
-                    position=None,
-                    source_type=source_type or "",
-                    source_id=source_id or "",
-                )
+        base = cls.objects.filter(
+            pool_type=pool_type,
+            status="ACTIVE",
+            child_count__lt=width,
+            tree_path__gte=path,
+            tree_path__lt=upper,
+        )
+        level = int(getattr(root, "level", 1) or 1)
+        last_level = level + (255 - len(path)) // cls.POSITION_PATH_WIDTH
+        retries = 3
+        while level <= last_level:
+            node_id = base.filter(level=level).order_by("tree_path").values_list("pk", flat=True).first()
+            if node_id is None:
+                level += 1
+                continue
+            node = cls.objects.select_for_update().filter(pk=node_id).first()
+            if node is not None and node.status == "ACTIVE" and int(node.child_count or 0) < width:
+                return node, cls._free_position(node, pool_type)
+            # Filled (or closed) by a concurrent placement: probe the same level again
+            retries -= 1
+            if retries <= 0:
+                break
+        return cls._legacy_find_open_slot(root, pool_type, width)
 
-            # BFS to find first account with <3 children in same pool
-            q = deque([root_acc])
-            while q:
-                node = q.popleft()
-                child_qs = cls.objects.filter(parent_account=node, pool_type=pool_type, status="ACTIVE").order_by("id")
-                cnt = child_qs.count()
-                if cnt < 3:
-                    return cls.objects.create(
-                        owner=user,
-                        username_key=uname,
-                        entry_amount=amt,
-                        pool_type=pool_type,
-                        status="ACTIVE",
-                        parent_account=node,
-                        level=(getattr(node, "level", 0) or 0) + 1,
-                        position=(cnt + 1),
-                        source_type=source_type or "",
-                        source_id=source_id or "",
-                    )
-                for ch in child_qs:
-                    q.append(ch)
-
-            # Fallback: attach under root_acc
-            child_qs2 = cls.objects.filter(parent_account=root_acc, pool_type=pool_type, status="ACTIVE").order_by("id")
-            pos = child_qs2.count() + 1
-            return cls.objects.create(
+    @classmethod
+    def _create_in_pool(cls, user, pool_type: str, amount: Decimal, uname: str, parent=None, position=None, source_type: str = "", source_id: str = ""):
+        """
+        Create an ACTIVE pool account and maintain the frontier index (tree_path, parent's child_count).
+        """
+        from django.db.models import F
+        if parent is None:
+            acc = cls.objects.create(
                 owner=user,
                 username_key=uname,
-                entry_amount=amt,
+                entry_amount=amount,
                 pool_type=pool_type,
                 status="ACTIVE",
-                parent_account=root_acc,
-                level=(getattr(root_acc, "level", 0) or 0) + 1,
-                position=pos,
+                parent_account=None,
+                level=1,
+                position=None,
                 source_type=source_type or "",
                 source_id=source_id or "",
             )
+            acc.tree_path = cls._root_path(acc.id)
+            cls.objects.filter(pk=acc.pk).update(tree_path=acc.tree_path)
+            return acc
 
-    @classmethod
-    def place_in_five_pool(cls, user, pool_type: str, amount: Decimal, source_type: str = "", source_id: str = ""):
+        parent_path = getattr(parent, "tree_path", "") or ""
+        acc = cls.objects.create(
+            owner=user,
+            username_key=uname,
+            entry_amount=amount,
+            pool_type=pool_type,
+            status="ACTIVE",
+            parent_account=parent,
+            level=(getattr(parent, "level", 0) or 0) + 1,
+            position=position,
+            source_type=source_type or "",
+            source_id=source_id or "",
+            tree_path=cls._child_path(parent_path, position),
+        )
+        cls.objects.filter(pk=parent.pk).update(child_count=F("child_count") + 1)
+        return acc
+
+    def ancestor_owners(self, depth: int) -> list:
         """
-        Preferred behavior:
-          - If user already has a base self account in this pool, place new self-accounts under that subtree (5-wide BFS).
-          - Else, fall back to upline BFS placement (legacy), which becomes the base.
+        Owners of ancestor accounts [L1 (parent owner), L2, ...], skipping repeated owners, up to `depth`.
+        Ancestors are the prefixes of tree_path, fetched in one query; falls back to walking parent_account.
         """
-        from collections import deque
+        depth = max(0, int(depth or 0))
+        if depth <= 0:
+            return []
+        path = getattr(self, "tree_path", "") or ""
+        nodes = []
+        if path and len(path) > self.ROOT_PATH_WIDTH:
+            prefixes = [
+                path[:end]
+                for end in range(len(path) - self.POSITION_PATH_WIDTH, self.ROOT_PATH_WIDTH - 1, -self.POSITION_PATH_WIDTH)
+            ]
+            by_path = {
+                a.tree_path: a
+                for a in AutoPoolAccount.objects.filter(pool_type=self.pool_type, tree_path__in=prefixes).select_related("owner")
+            }
+            nodes = [by_path[p] for p in prefixes if p in by_path]
+            if len(nodes) != len(prefixes):
+                nodes = []
+        if not nodes and getattr(self, "parent_account_id", None):
+            node = getattr(self, "parent_account", None)
+            seen_nodes = set()
+            while node and node.pk not in seen_nodes:
+                seen_nodes.add(node.pk)
+                nodes.append(node)
+                node = getattr(node, "parent_account", None)
+
+        chain = []
+        seen = set()
+        for node in nodes:
+            owner = getattr(node, "owner", None)
+            oid = getattr(owner, "id", None) if owner else None
+            if owner and oid and oid not in seen:
+                chain.append(owner)
+                seen.add(oid)
+                if len(chain) >= depth:
+                    break
+        return chain
+
+    @classmethod
+    def _place_in_pool(cls, user, pool_type: str, amount: Decimal, width: int, source_type: str = "", source_id: str = ""):
         from decimal import Decimal as D
         from django.db import transaction as _tx
         amt = D(amount or 0)
@@ -694,100 +884,45 @@ class AutoPoolAccount(models.Model):
             base_self = cls._base_self_account(user, pool_type)
             uname = cls._next_username_key(user, pool_type)
 
-            # If base exists, BFS within the user's own subtree (cluster under main)
-            if base_self:
-                q = deque([base_self])
-                while q:
-                    node = q.popleft()
-                    child_qs = cls.objects.filter(parent_account=node, pool_type=pool_type, status="ACTIVE").order_by("id")
-                    cnt = child_qs.count()
-                    if cnt < 5:
-                        return cls.objects.create(
-                            owner=user,
-                            username_key=uname,
-                            entry_amount=amt,
-                            pool_type=pool_type,
-                            status="ACTIVE",
-                            parent_account=node,
-                            level=(getattr(node, "level", 0) or 0) + 1,
-                            position=(cnt + 1),
-                            source_type=source_type or "",
-                            source_id=source_id or "",
-                        )
-                    for ch in child_qs:
-                        q.append(ch)
-
-                # Fallback: attach directly under base_self if traversal exhausted
-                child_qs2 = cls.objects.filter(parent_account=base_self, pool_type=pool_type, status="ACTIVE").order_by("id")
-                pos = child_qs2.count() + 1
-                return cls.objects.create(
-                    owner=user,
-                    username_key=uname,
-                    entry_amount=amt,
-                    pool_type=pool_type,
-                    status="ACTIVE",
-                    parent_account=base_self,
-                    level=(getattr(base_self, "level", 0) or 0) + 1,
-                    position=pos,
-                    source_type=source_type or "",
-                    source_id=source_id or "",
-                )
-
-            # No base exists yet: legacy placement under first upline account with capacity
-            root_acc = cls._first_upline_account(user, pool_type)
+            # If base exists, place within the user's own subtree (cluster under main);
+            # otherwise legacy placement under first upline account with capacity.
+            root_acc = base_self or cls._first_upline_account(user, pool_type)
 
-            # Root-level when no upline account exists
+            # If no upline account exists, create a root account (this becomes the base)
             if not root_acc:
-                return cls.objects.create(
-                    owner=user,
-                    username_key=uname,
-                    entry_amount=amt,
-                    pool_type=pool_type,
-                    status="ACTIVE",
-                    parent_account=None,
-                    level=1,
-                    position=None,
-                    source_type=source_type or "",
-                    source_id=source_id or "",
-                )
-
-            q = deque([root_acc])
-            while q:
-                node = q.popleft()
-                child_qs = cls.objects.filter(parent_account=node, pool_type=pool_type, status="ACTIVE").order_by("id")
-                cnt = child_qs.count()
-                if cnt < 5:
-                    return cls.objects.create(
-                        owner=user,
-                        username_key=uname,
-                        entry_amount=amt,
-                        pool_type=pool_type,
-                        status="ACTIVE",
-                        parent_account=node,
-                        level=(getattr(node, "level", 0) or 0) + 1,
-                        position=(cnt + 1),
-                        source_type=source_type or "",
-                        source_id=source_id or "",
-                    )
-                for ch in child_qs:
-                    q.append(ch)
-
-            # Fallback under root (shouldn't happen with BFS)
-            child_qs2 = cls.objects.filter(parent_account=root_acc, pool_type=pool_type, status="ACTIVE").order_by("id")
-            pos = child_qs2.count() + 1
-            return cls.objects.create(
-                owner=user,
-                username_key=uname,
-                entry_amount=amt,
-                pool_type=pool_type,
-                status="ACTIVE",
-                parent_account=root_acc,
-                level=(getattr(root_acc, "level", 0) or 0) + 1,
-                position=pos,
-                source_type=source_type or "",
-                source_id=source_id or "",
+                return cls._create_in_pool(user, pool_type, amt, uname, source_type=source_type, source_id=source_id)
+
+            node, pos = cls._find_open_slot(root_acc, pool_type, width)
+            if node is None:
+                # Fallback: attach directly under root if traversal exhausted (shouldn't happen with BFS)
+                node = root_acc
+                pos = cls._free_position(root_acc, pool_type)
+            return cls._create_in_pool(
+                user, pool_type, amt, uname,
+                parent=node, position=pos,
+                source_type=source_type, source_id=source_id,
             )
 
+    @classmethod
+    def place_in_three_pool(cls, user, pool_type: str, amount: Decimal, source_type: str = "", source_id: str = ""):
+        """
+        Preferred behavior:
+          - If user already has a base self account in this pool, place new self-accounts under that subtree (3-wide BFS).
+          - Else, fall back to upline BFS placement (legacy), which becomes the base.
+        Open slots are resolved through the frontier index (see _find_open_slot).
+        """
+        return cls._place_in_pool(user, pool_type, amount, 3, source_type=source_type, source_id=source_id)
+
+    @classmethod
+    def place_in_five_pool(cls, user, pool_type: str, amount: Decimal, source_type: str = "", source_id: str = ""):
+        """
+        Preferred behavior:
+          - If user already has a base self account in this pool, place new self-accounts under that subtree (5-wide BFS).
+          - Else, fall back to upline BFS placement (legacy), which becomes the base.
+        Open slots are resolved through the frontier index (see _find_open_slot).
+        """
+        return cls._place_in_pool(user, pool_type, amount, 5, source_type=source_type, source_id=source_id)
+
     @classmethod
     def place_three_150_for_user(cls, user, amount: Decimal | None = None):
         from decimal import Decimal as D
@@ -876,6 +1011,90 @@ class ReferralJoinPayout(models.Model):
         return f"ReferralJoinPayout<{self.user_new_id}>"
 
 
+class ProcessedEvent(models.Model):
+    """
+    Narrow "run once" marker for payout engines: unique (scope, key), claimed in the same
+    transaction as the payout so a failed payout releases the claim.
+
+    Scopes mirror the AuditTrail actions they replace as idempotency checks:
+      - coupon_activated:           key "<user_id>:<coupon_code_id>"
+      - coupon_matrix_distributed:  key source_id (coupon id)
+      - prime_150_distributed / prime_750_distributed / monthly_759_distributed: key coupon_code_id
+    AuditTrail rows are still written for history; migration 0027 seeded this table from them once
+    (`backfill_processed_events` repeats that seed on demand).
+    """
+    scope = models.CharField(max_length=64)
+    key = models.CharField(max_length=128)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["scope", "key"], name="uniq_processed_event_scope_key"),
+        ]
+
+    def __str__(self):
+        return f"ProcessedEvent<{self.scope}:{self.key}>"
+
+    @classmethod
+    def is_processed(cls, scope: str, key) -> bool:
+        return cls.objects.filter(scope=scope, key=str(key)).exists()
+
+    @classmethod
+    def claim(cls, scope: str, key) -> bool:
+        """
+        Insert the marker; False when it already exists. Savepoint-wrapped so a duplicate does not
+        break the caller's transaction.
+        """
+        from django.db import IntegrityError
+        try:
+            with transaction.atomic():
+                cls.objects.create(scope=scope, key=str(key))
+            return True
+        except IntegrityError:
+            return False
+
+    @classmethod
+    def mark(cls, scope: str, key) -> None:
+        cls.objects.bulk_create([cls(scope=scope, key=str(key))], ignore_conflicts=True)
+
+    @classmethod
+    @contextmanager
+    def run_once(cls, scope: str, key):
+        """
+        with ProcessedEvent.run_once("prime_150_distributed", code.id) as first:
+            if first:
+                ...payout...
+        The claim commits or rolls back together with the body.
+        """
+        with transaction.atomic():
+            yield cls.claim(scope, key)
+
+
+class GeoRecipientVersion(models.Model):
+    """
+    Single-row version stamp of the geo recipient index (business.services.geo_recipients), bumped in
+    the same transaction as AgencyRegionAssignment saves/deletes and geo-relevant user changes
+    (category / superuser / staff). Processes compare it against their index's stamp, like
+    CommissionConfig.updated_at for the config cache.
+    """
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"GeoRecipientVersion<{self.version}>"
+
+    @classmethod
+    def current(cls) -> int:
+        return cls.objects.filter(pk=1).values_list("version", flat=True).first() or 0
+
+    @classmethod
+    def bump(cls) -> None:
+        if not cls.objects.filter(pk=1).update(version=models.F("version") + 1, updated_at=timezone.now()):
+            obj, created = cls.objects.get_or_create(pk=1, defaults={"version": 1})
+            if not created:
+                cls.objects.filter(pk=1).update(version=models.F("version") + 1, updated_at=timezone.now())
+
+
 class FranchisePayout(models.Model):
     """
     Idempotency marker for franchise benefit distribution.
@@ -905,19 +1124,12 @@ class FranchisePayout(models.Model):
 # ---------------
 def _resolve_upline(user, depth: int = 5):
     """
-    Traverse registered_by chain up to `depth` levels (L1..L5).
+    registered_by chain up to `depth` levels: [sponsor (L1), L2, ...].
+    Single query via CustomUser.sponsor_path (see CustomUser.get_upline).
     """
-    chain = []
-    cur = user
-    visited = set()
-    for _ in range(depth):
-        parent = getattr(cur, "registered_by", None)
-        if not parent or parent.id in visited:
-            break
-        chain.append(parent)
-        visited.add(parent.id)
-        cur = parent
-    return chain
+    if not user:
+        return []
+    return user.get_upline(depth, tree="sponsor")
 
 
 def distribute_auto_pool_commissions(payer_user, base_amount: Decimal, fixed_key: str | None = None, source_type: str = "", source_id: str = "", extra_meta: dict | None = None):
@@ -928,8 +1140,9 @@ def distribute_auto_pool_commissions(payer_user, base_amount: Decimal, fixed_key
     then use fixed rupee amounts from CommissionConfig.master_commission_json["geo_fixed"][fixed_key] for geo roles.
     Optional source_type/source_id/extra_meta are forwarded to Wallet.credit for idempotent tracking/audit.
     """
-    from accounts.models import Wallet, CustomUser, AgencyRegionAssignment  # local import to avoid circulars
-    cfg = CommissionConfig.get_solo()
+    from business.services.ledger import CommissionBatch  # local import to avoid circulars
+    from business.services.geo_recipients import resolve_geo_recipients  # local import to avoid circulars
+    cfg = CommissionConfig.get_cached()
     if not cfg.enable_pool_distribution:
         return
     st = source_type or "AUTO_POOL_GEO"
@@ -945,6 +1158,8 @@ def distribute_auto_pool_commissions(payer_user, base_amount: Decimal, fixed_key
     ]
     upline = _resolve_upline(payer_user, depth=5)
 
+    # All credits of this distribution are posted together (one lock round, bulk ledger insert)
+    batch = CommissionBatch()
     with transaction.atomic():
         # Hierarchical L1..L5
         for idx, (label, pct) in enumerate(percents):
@@ -955,8 +1170,8 @@ def distribute_auto_pool_commissions(payer_user, base_amount: Decimal, fixed_key
             if amt <= 0:
                 continue
             try:
-                w = Wallet.get_or_create_for_user(recipient)
-                w.credit(
+                batch.add(
+                    recipient,
                     amt,
                     tx_type="COMMISSION_CREDIT",
                     meta={"level": label, "source": "AUTO_POOL", "payer": getattr(payer_user, "username", None)},
@@ -970,69 +1185,21 @@ def distribute_auto_pool_commissions(payer_user, base_amount: Decimal, fixed_key
         # Geo role distribution (best-effort; optional)
         try:
             if not cfg.enable_geo_distribution:
+                batch.post()
                 return
 
-            pin = (getattr(payer_user, "pincode", "") or "").strip()
-            state = getattr(payer_user, "state", None)
-
-            def first_qs(qs):
-                try:
-                    return qs.first()
-                except Exception:
-                    return None
-
             # Resolve agency recipients using region assignments (pincode/district/state) like franchise flow
+            geo = resolve_geo_recipients(payer_user, with_royalty=True)
             recipients = {
-                "Sub Franchise": None,
-                "Pincode": None,
-                "Pincode Coord": None,
-                "District": None,
-                "District Coord": None,
-                "State": None,
-                "State Coord": None,
+                "Sub Franchise": geo.get("sub_franchise"),
+                "Pincode": geo.get("pincode"),
+                "Pincode Coord": geo.get("pincode_coord"),
+                "District": geo.get("district"),
+                "District Coord": geo.get("district_coord"),
+                "State": geo.get("state"),
+                "State Coord": geo.get("state_coord"),
             }
 
-            # Pincode-level roles (exact pin)
-            if pin:
-                recipients["Sub Franchise"] = CustomUser.objects.filter(
-                    category="agency_sub_franchise",
-                    region_assignments__level="pincode",
-                    region_assignments__pincode=pin,
-                ).distinct().first()
-                recipients["Pincode"] = CustomUser.objects.filter(
-                    category="agency_pincode",
-                    region_assignments__level="pincode",
-                    region_assignments__pincode=pin,
-                ).distinct().first()
-                recipients["Pincode Coord"] = CustomUser.objects.filter(
-                    category="agency_pincode_coordinator",
-                    region_assignments__level="pincode",
-                    region_assignments__pincode=pin,
-                ).distinct().first()
-
-            # District/State-level roles (scoped by State best-effort)
-            if state:
-                recipients["District"] = CustomUser.objects.filter(
-                    category="agency_district",
-                    region_assignments__level="district",
-                    region_assignments__state=state,
-                ).distinct().first()
-                recipients["District Coord"] = CustomUser.objects.filter(
-                    category="agency_district_coordinator",
-                    region_assignments__level="district",
-                    region_assignments__state=state,
-                ).distinct().first()
-                recipients["State"] = CustomUser.objects.filter(
-                    category="agency_state",
-                    region_assignments__level="state",
-                    region_assignments__state=state,
-                ).distinct().first()
-                recipients["State Coord"] = CustomUser.objects.filter(
-                    category="agency_state_coordinator",
-                    region_assignments__level="state",
-                    region_assignments__state=state,
-                ).distinct().first()
-
             # Employee: prefer immediate registered_by if employee, else first employee in upline
             emp = None
             parent = getattr(payer_user, "registered_by", None)
@@ -1045,9 +1212,8 @@ def distribute_auto_pool_commissions(payer_user, base_amount: Decimal, fixed_key
                         break
             recipients["Employee"] = emp
 
-            # Royalty: pick first superuser (fallback to any staff)
-            royalty = CustomUser.objects.filter(is_superuser=True).first() or CustomUser.objects.filter(is_staff=True).first()
-            recipients["Royalty"] = royalty
+            # Royalty: first superuser (fallback to any staff), from the same index
+            recipients["Royalty"] = geo.get("royalty")
 
             # Decide fixed vs percent based on master_commission_json and fixed_key
             master = dict(getattr(cfg, "master_commission_json", {}) or {})
@@ -1084,7 +1250,6 @@ def distribute_auto_pool_commissions(payer_user, base_amount: Decimal, fixed_key
                     if amt <= 0:
                         continue
                     try:
-                        w = Wallet.get_or_create_for_user(user_obj)
                         meta2 = {
                             "layer": label,
                             "source": "AUTO_POOL_GEO_FIXED",
@@ -1096,7 +1261,8 @@ def distribute_auto_pool_commissions(payer_user, base_amount: Decimal, fixed_key
                                 meta2.update(dict(extra_meta))
                             except Exception:
                                 pass
-                        w.credit(
+                        batch.add(
+                            user_obj,
                             amt,
                             tx_type="COMMISSION_CREDIT",
                             meta=meta2,
@@ -1163,14 +1329,14 @@ def distribute_auto_pool_commissions(payer_user, base_amount: Decimal, fixed_key
                     if amt <= 0:
                         continue
                     try:
-                        w = Wallet.get_or_create_for_user(user_obj)
                         meta2 = {"layer": label, "source": "AUTO_POOL_GEO", "payer": getattr(payer_user, "username", None)}
                         if extra_meta:
                             try:
                                 meta2.update(dict(extra_meta))
                             except Exception:
                                 pass
-                        w.credit(
+                        batch.add(
+                            user_obj,
                             amt,
                             tx_type="COMMISSION_CREDIT",
                             meta=meta2,
@@ -1182,6 +1348,7 @@ def distribute_auto_pool_commissions(payer_user, base_amount: Decimal, fixed_key
         except Exception:
             # Do not break the main flow due to geo failure
             pass
+        batch.post()
 
 
 class ReportMetric(models.Model):
@@ -1847,7 +2014,7 @@ class TriAppProduct(models.Model):
     def __str__(self):
         return f"{getattr(self.app, 'slug', 'app')} → {self.name}"
 
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 
@@ -1866,3 +2033,18 @@ def activate_agency_on_any_payment(sender, instance: AgencyPackagePayment, creat
     except Exception:
         # best-effort; do not block payment save
         pass
+
+
+@receiver(post_delete, sender=AutoPoolAccount)
+def release_autopool_slot_on_delete(sender, instance: AutoPoolAccount, **kwargs):
+    # A deleted ACTIVE child frees its parent's slot (frontier child_count)
+    if instance.status == "ACTIVE" and instance.parent_account_id:
+        AutoPoolAccount._adjust_child_count(instance.parent_account_id, -1)
+
+
+@receiver(post_save, sender=CommissionConfig)
+@receiver(post_delete, sender=CommissionConfig)
+def invalidate_commission_config_cache(sender, instance, **kwargs):
+    CommissionConfig.invalidate_cache()
+    # A concurrent reader may re-cache the pre-commit row; drop it again once committed
+    transaction.on_commit(CommissionConfig.invalidate_cache)
@@ -13,22 +13,11 @@ from accounts.models import Wallet, CustomUser
 from business.models import (
     CommissionConfig,
     AutoPoolAccount,
+    ProcessedEvent,
     SubscriptionActivation,
+    _resolve_upline,
 )
-
-
-def _resolve_upline(user: CustomUser, depth: int) -> list[CustomUser]:
-    chain: list[CustomUser] = []
-    cur = user
-    seen = set()
-    for _ in range(max(0, depth)):
-        parent = getattr(cur, "registered_by", None)
-        if not parent or parent.id in seen:
-            break
-        chain.append(parent)
-        seen.add(parent.id)
-        cur = parent
-    return chain
+from business.services.ledger import CommissionBatch
 
 
 def _as_percents(lst: Any, length: int) -> list[Decimal]:
@@ -81,7 +70,7 @@ def _allow_agency_in_matrix() -> bool:
     Default behavior when not configured: ALLOW payouts (True).
     """
     try:
-        cfg = CommissionConfig.get_solo()
+        cfg = CommissionConfig.get_cached()
         master = dict(getattr(cfg, "master_commission_json", {}) or {})
         general = dict(master.get("general", {}) or {})
         if "allow_agency_in_matrix" in general:
@@ -122,6 +111,7 @@ def _update_matrix_progress(user: CustomUser, pool_type: str, level: int, amount
 
 def _distribute_levels(upline: Iterable[CustomUser], base_amount: Decimal, percents: list[Decimal], tx_type: str, meta: dict[str, Any], pool_type: Optional[str] = None):
     base_q = _q2(base_amount)
+    batch = CommissionBatch()
     for idx, user in enumerate(upline):
         if idx >= len(percents):
             break
@@ -134,30 +124,21 @@ def _distribute_levels(upline: Iterable[CustomUser], base_amount: Decimal, perce
             continue
         meta2 = dict(meta or {})
         meta2.update({"level_index": idx + 1, "percent": str(pct)})
-        _credit_wallet(user, amt, tx_type=tx_type, meta=meta2, source_type=meta2.get("source_type", ""), source_id=meta2.get("source_id", ""))
+        batch.add(user, amt, tx_type=tx_type, meta=meta2, source_type=meta2.get("source_type", ""), source_id=meta2.get("source_id", ""))
         if pool_type:
             _update_matrix_progress(user, pool_type=pool_type, level=idx + 1, amount=amt)
+    batch.post()
 
 
 def _matrix_ancestors(acc, depth: int):
     """
-    Walk AutoPoolAccount parent chain to collect ancestor owners up to `depth`.
+    Ancestor owners along the AutoPoolAccount parent chain up to `depth` (see AutoPoolAccount.ancestor_owners).
     Returns list of CustomUser recipients in order [L1..Ldepth] for matrix payouts.
     """
-    chain: list[CustomUser] = []
     try:
-        seen = set()
-        node = getattr(acc, "parent_account", None)
-        while node and len(chain) < max(0, depth):
-            owner = getattr(node, "owner", None)
-            oid = getattr(owner, "id", None) if owner else None
-            if owner and oid and oid not in seen:
-                chain.append(owner)
-                seen.add(oid)
-            node = getattr(node, "parent_account", None)
+        return acc.ancestor_owners(depth) if acc else []
     except Exception:
-        chain = []
-    return chain
+        return []
 
 
 def ensure_first_purchase_activation(user: CustomUser, source: Dict[str, Any]) -> None:
@@ -217,7 +198,7 @@ def ensure_first_purchase_activation(user: CustomUser, source: Dict[str, Any]) -
             pass
         try:
             from business.models import CommissionConfig
-            cfg = CommissionConfig.get_solo()
+            cfg = CommissionConfig.get_cached()
             if getattr(cfg, "enable_franchise_on_join", True):
                 from business.services.franchise import distribute_franchise_benefit
                 distribute_franchise_benefit(
@@ -245,7 +226,7 @@ def activate_150_active(user: CustomUser, source: Dict[str, Any]) -> bool:
     t0 = time.time()
     timings: Dict[str, Any] = {}
 
-    cfg = CommissionConfig.get_solo()
+    cfg = CommissionConfig.get_cached()
     src_type = str(source.get("type") or "")
     src_id = str(source.get("id") or source.get("code") or "")
 
@@ -356,18 +337,116 @@ def activate_150_active(user: CustomUser, source: Dict[str, Any]) -> bool:
             source_id=src_id,
         )
 
-    # Skip matrix/account creation/distribution if already distributed for this source (e.g., per‑coupon)
-    try:
-        from coupons.models import AuditTrail, CouponCode
-        skip_matrix_parts = False
-        if src_id:
-            code_obj = CouponCode.objects.filter(pk=str(src_id)).first()
-            if (code_obj and AuditTrail.objects.filter(action="coupon_matrix_distributed", coupon_code=code_obj).exists()) or AuditTrail.objects.filter(action="coupon_matrix_distributed", metadata__source_id=str(src_id)).exists():
-                skip_matrix_parts = True
-    except Exception:
-        skip_matrix_parts = False
+    # Claim the per-source matrix marker before opening accounts and distributing, in the same
+    # transaction as the payout: a concurrent activation for this source (e.g., per‑coupon) gets
+    # False and skips the matrix parts, and a failed payout releases the claim.
+    with transaction.atomic():
+        distribute_matrix = not src_id or ProcessedEvent.claim("coupon_matrix_distributed", src_id)
+        if distribute_matrix:
+            # Create 5-matrix and 3-matrix pool entries
+            t_open_start = time.time()
+            acc5 = None
+            acc3 = None
+            try:
+                acc5 = AutoPoolAccount.create_five_150_for_user(user, amount=base_product, source_type=src_type, source_id=src_id)
+            except Exception:
+                acc5 = None
+            try:
+                acc3 = AutoPoolAccount.place_in_three_pool(user, "THREE_150", base_product, source_type=src_type, source_id=src_id)
+            except Exception:
+                acc3 = None
+            timings["open_accounts"] = time.time() - t_open_start
+
+            # Distribute 5-matrix (L6) with fixed-amount override support
+            t5_start = time.time()
+            five_levels = int(getattr(cfg, "five_matrix_levels", 6) or 6)
+            upline6 = _matrix_ancestors(acc5, depth=five_levels) if 'acc5' in locals() and acc5 else []
+            if not upline6:
+                # Fallback to sponsor chain when genealogy has no ancestors yet
+                upline6 = _resolve_upline(user, depth=five_levels)
+            # Prefer admin master overrides: consumer_matrix_5["150"].fixed_amounts -> fallback to typed field
+            master = dict(getattr(cfg, "master_commission_json", {}) or {})
+            cm5 = dict(master.get("consumer_matrix_5", {}) or {})
+            cm3 = dict(master.get("consumer_matrix_3", {}) or {})
+            key = "750" if is_prime_750 else "150"
+            fixed_amounts5 = list((cm5.get(key, {}) or {}).get("fixed_amounts") or getattr(cfg, "five_matrix_amounts_json", []) or [])
+            if fixed_amounts5:
+                batch = CommissionBatch()
+                for idx, recipient in enumerate(upline6):
+                    if idx >= len(fixed_amounts5):
+                        break
+                    amt = _q2(fixed_amounts5[idx] or 0)
+                    if amt <= 0:
+                        continue
+                    # Skip matrix payout for agency/employee recipients
+                    if _is_agency_or_employee(recipient) and not _allow_agency_in_matrix():
+                        continue
+                    meta = {
+                        "source": "FIVE_MATRIX_150_FIXED",
+                        "source_type": src_type,
+                        "source_id": src_id,
+                        "level_index": idx + 1,
+                        "fixed": True,
+                    }
+                    batch.add(recipient, amt, tx_type="AUTOPOOL_BONUS_FIVE", meta=meta, source_type=src_type, source_id=src_id)
+                    _update_matrix_progress(recipient, pool_type="FIVE_150", level=idx + 1, amount=amt)
+                batch.post()
+            else:
+                five_percents = _as_percents(((cm5.get(key, {}) or {}).get("percents") or getattr(cfg, "five_matrix_percents_json", []) or []), five_levels)
+                _distribute_levels(
+                    upline6,
+                    base_amount=base_product,
+                    percents=five_percents,
+                    tx_type="AUTOPOOL_BONUS_FIVE",
+                    meta={"source": "FIVE_MATRIX_150", "source_type": src_type, "source_id": src_id},
+                    pool_type="FIVE_150",
+                )
+            timings["distribute_five"] = time.time() - t5_start
+
+            # Distribute 3-matrix (L15)
+            t3_start = time.time()
+            three_levels = int(getattr(cfg, "three_matrix_levels", 15) or 15)
+            upline15 = _matrix_ancestors(acc3, depth=three_levels) if 'acc3' in locals() and acc3 else []
+            if not upline15:
+                # Fallback to sponsor chain when genealogy has no ancestors yet
+                upline15 = _resolve_upline(user, depth=three_levels)
+
+            # Prefer fixed-amount overrides if configured, else fall back to percent distribution
+            fixed_amounts = list((cm3.get(key, {}) or {}).get("fixed_amounts") or getattr(cfg, "three_matrix_amounts_json", []) or [])
+            if fixed_amounts:
+                batch = CommissionBatch()
+                for idx, recipient in enumerate(upline15):
+                    if idx >= len(fixed_amounts):
+                        break
+                    amt = _q2(fixed_amounts[idx] or 0)
+                    if amt <= 0:
+                        continue
+                    # Skip matrix payout for agency/employee recipients
+                    if _is_agency_or_employee(recipient) and not _allow_agency_in_matrix():
+                        continue
+                    meta = {
+                        "source": "THREE_MATRIX_150_FIXED",
+                        "source_type": src_type,
+                        "source_id": src_id,
+                        "level_index": idx + 1,
+                        "fixed": True,
+                    }
+                    batch.add(recipient, amt, tx_type="AUTOPOOL_BONUS_THREE", meta=meta, source_type=src_type, source_id=src_id)
+                    _update_matrix_progress(recipient, pool_type="THREE_150", level=idx + 1, amount=amt)
+                batch.post()
+            else:
+                three_percents = _as_percents(((cm3.get(key, {}) or {}).get("percents") or getattr(cfg, "three_matrix_percents_json", []) or []), three_levels)
+                _distribute_levels(
+                    upline15,
+                    base_amount=base_product,
+                    percents=three_percents,
+                    tx_type="AUTOPOOL_BONUS_THREE",
+                    meta={"source": "THREE_MATRIX_150", "source_type": src_type, "source_id": src_id},
+                    pool_type="THREE_150",
+                )
+            timings["distribute_three"] = time.time() - t3_start
 
-    if skip_matrix_parts:
+    if not distribute_matrix:
         t_first_start = time.time()
         try:
             ensure_first_purchase_activation(user, source)
@@ -395,105 +474,6 @@ def activate_150_active(user: CustomUser, source: Dict[str, Any]) -> bool:
             pass
         return created
 
-    # Create 5-matrix and 3-matrix pool entries
-    t_open_start = time.time()
-    acc5 = None
-    acc3 = None
-    try:
-        acc5 = AutoPoolAccount.create_five_150_for_user(user, amount=base_product, source_type=src_type, source_id=src_id)
-    except Exception:
-        acc5 = None
-    try:
-        acc3 = AutoPoolAccount.place_in_three_pool(user, "THREE_150", base_product, source_type=src_type, source_id=src_id)
-    except Exception:
-        acc3 = None
-    timings["open_accounts"] = time.time() - t_open_start
-
-    # Distribute 5-matrix (L6) with fixed-amount override support
-    t5_start = time.time()
-    five_levels = int(getattr(cfg, "five_matrix_levels", 6) or 6)
-    upline6 = _matrix_ancestors(acc5, depth=five_levels) if 'acc5' in locals() and acc5 else []
-    if not upline6:
-        # Fallback to sponsor chain when genealogy has no ancestors yet
-        upline6 = _resolve_upline(user, depth=five_levels)
-    # Prefer admin master overrides: consumer_matrix_5["150"].fixed_amounts -> fallback to typed field
-    master = dict(getattr(cfg, "master_commission_json", {}) or {})
-    cm5 = dict(master.get("consumer_matrix_5", {}) or {})
-    cm3 = dict(master.get("consumer_matrix_3", {}) or {})
-    key = "750" if is_prime_750 else "150"
-    fixed_amounts5 = list((cm5.get(key, {}) or {}).get("fixed_amounts") or getattr(cfg, "five_matrix_amounts_json", []) or [])
-    if fixed_amounts5:
-        for idx, recipient in enumerate(upline6):
-            if idx >= len(fixed_amounts5):
-                break
-            amt = _q2(fixed_amounts5[idx] or 0)
-            if amt <= 0:
-                continue
-            # Skip matrix payout for agency/employee recipients
-            if _is_agency_or_employee(recipient) and not _allow_agency_in_matrix():
-                continue
-            meta = {
-                "source": "FIVE_MATRIX_150_FIXED",
-                "source_type": src_type,
-                "source_id": src_id,
-                "level_index": idx + 1,
-                "fixed": True,
-            }
-            _credit_wallet(recipient, amt, tx_type="AUTOPOOL_BONUS_FIVE", meta=meta, source_type=src_type, source_id=src_id)
-            _update_matrix_progress(recipient, pool_type="FIVE_150", level=idx + 1, amount=amt)
-    else:
-        five_percents = _as_percents(((cm5.get(key, {}) or {}).get("percents") or getattr(cfg, "five_matrix_percents_json", []) or []), five_levels)
-        _distribute_levels(
-            upline6,
-            base_amount=base_product,
-            percents=five_percents,
-            tx_type="AUTOPOOL_BONUS_FIVE",
-            meta={"source": "FIVE_MATRIX_150", "source_type": src_type, "source_id": src_id},
-            pool_type="FIVE_150",
-        )
-    timings["distribute_five"] = time.time() - t5_start
-
-    # Distribute 3-matrix (L15)
-    t3_start = time.time()
-    three_levels = int(getattr(cfg, "three_matrix_levels", 15) or 15)
-    upline15 = _matrix_ancestors(acc3, depth=three_levels) if 'acc3' in locals() and acc3 else []
-    if not upline15:
-        # Fallback to sponsor chain when genealogy has no ancestors yet
-        upline15 = _resolve_upline(user, depth=three_levels)
-
-    # Prefer fixed-amount overrides if configured, else fall back to percent distribution
-    fixed_amounts = list((cm3.get(key, {}) or {}).get("fixed_amounts") or getattr(cfg, "three_matrix_amounts_json", []) or [])
-    if fixed_amounts:
-        for idx, recipient in enumerate(upline15):
-            if idx >= len(fixed_amounts):
-                break
-            amt = _q2(fixed_amounts[idx] or 0)
-            if amt <= 0:
-                continue
-            # Skip matrix payout for agency/employee recipients
-            if _is_agency_or_employee(recipient) and not _allow_agency_in_matrix():
-                continue
-            meta = {
-                "source": "THREE_MATRIX_150_FIXED",
-                "source_type": src_type,
-                "source_id": src_id,
-                "level_index": idx + 1,
-                "fixed": True,
-            }
-            _credit_wallet(recipient, amt, tx_type="AUTOPOOL_BONUS_THREE", meta=meta, source_type=src_type, source_id=src_id)
-            _update_matrix_progress(recipient, pool_type="THREE_150", level=idx + 1, amount=amt)
-    else:
-        three_percents = _as_percents(((cm3.get(key, {}) or {}).get("percents") or getattr(cfg, "three_matrix_percents_json", []) or []), three_levels)
-        _distribute_levels(
-            upline15,
-            base_amount=base_product,
-            percents=three_percents,
-            tx_type="AUTOPOOL_BONUS_THREE",
-            meta={"source": "THREE_MATRIX_150", "source_type": src_type, "source_id": src_id},
-            pool_type="THREE_150",
-        )
-    timings["distribute_three"] = time.time() - t3_start
-
     # Geo (Agency) configurable payout for 150 Active
     t_geo_start = time.time()
     try:
@@ -550,7 +530,7 @@ def redeem_150(user: CustomUser, source: Dict[str, Any]) -> bool:
       - No pools opened
       - Idempotent via SubscriptionActivation(PRIME_150_REDEEM)
     """
-    cfg = CommissionConfig.get_solo()
+    cfg = CommissionConfig.get_cached()
     src_type = str(source.get("type") or "")
     src_id = str(source.get("id") or source.get("code") or "")
     try:
@@ -618,7 +598,7 @@ def activate_50(user: CustomUser, source: Dict[str, Any], package_code: str = "G
       - Distribute per three_matrix_percents_json
       - Idempotent via SubscriptionActivation(GLOBAL_50 or SELF_50)
     """
-    cfg = CommissionConfig.get_solo()
+    cfg = CommissionConfig.get_cached()
     src_type = str(source.get("type") or "")
     src_id = str(source.get("id") or source.get("code") or "")
     try:
@@ -681,6 +661,7 @@ def activate_50(user: CustomUser, source: Dict[str, Any], package_code: str = "G
     cm3 = dict(master.get("consumer_matrix_3", {}) or {})
     fixed_amounts50 = list((cm3.get("50", {}) or {}).get("fixed_amounts") or [])
     if fixed_amounts50:
+        batch = CommissionBatch()
         for idx, recipient in enumerate(upline15):
             if idx >= len(fixed_amounts50):
                 break
@@ -697,8 +678,9 @@ def activate_50(user: CustomUser, source: Dict[str, Any], package_code: str = "G
                 "level_index": idx + 1,
                 "fixed": True,
             }
-            _credit_wallet(recipient, amt, tx_type="AUTOPOOL_BONUS_THREE", meta=meta, source_type=src_type, source_id=src_id)
+            batch.add(recipient, amt, tx_type="AUTOPOOL_BONUS_THREE", meta=meta, source_type=src_type, source_id=src_id)
             _update_matrix_progress(recipient, pool_type="THREE_50", level=idx + 1, amount=amt)
+        batch.post()
     else:
         three_percents = _as_percents(((cm3.get("50", {}) or {}).get("percents") or getattr(cfg, "three_matrix_percents_json", []) or []), three_levels)
         _distribute_levels(
@@ -725,7 +707,7 @@ def product_purchase_activations(user: CustomUser, source: Dict[str, Any]) -> No
       - If product_opens_prime is False (default): open 3-matrix 50 only.
       - If True: also open 150 Active path.
     """
-    cfg = CommissionConfig.get_solo()
+    cfg = CommissionConfig.get_cached()
     try:
         if getattr(cfg, "product_opens_prime", False):
             activate_150_active(user, source)
@@ -740,6 +722,26 @@ def product_purchase_activations(user: CustomUser, source: Dict[str, Any]) -> No
         pass
 
 
+def _audit_coupon_matrix_created(user: CustomUser, coupon_id: int | str, src_id: str, trigger: str, already: bool = False) -> None:
+    try:
+        from coupons.models import AuditTrail, CouponCode
+        cobj = CouponCode.objects.filter(pk=str(coupon_id)).first()
+        notes = (
+            f"Matrix accounts already distributed earlier for coupon {src_id}"
+            if already
+            else f"Matrix accounts created for coupon {src_id}"
+        )
+        AuditTrail.objects.create(
+            action="coupon_matrix_created",
+            actor=user,
+            coupon_code=cobj if cobj else None,
+            notes=notes,
+            metadata={"source_type": "ECOUPON", "source_id": src_id, "trigger": trigger},
+        )
+    except Exception:
+        pass
+
+
 @transaction.atomic
 def open_matrix_accounts_for_coupon(user: CustomUser, coupon_id: int | str, amount_150: Decimal | None = None, distribute: bool = True, trigger: str = "promo_purchase", include_direct_self: bool = True, include_agency: bool = True) -> None:
     """
@@ -748,7 +750,7 @@ def open_matrix_accounts_for_coupon(user: CustomUser, coupon_id: int | str, amou
     If distribute=True, perform per-level commission payouts per pool with meta including coupon id and trigger.
     Idempotent per (user, pool, source).
     """
-    cfg = CommissionConfig.get_solo()
+    cfg = CommissionConfig.get_cached()
     src_type = "ECOUPON"
     src_id = str(coupon_id or "")
     base150 = _q2(amount_150 if amount_150 is not None else (cfg.prime_activation_amount or 150))
@@ -773,207 +775,189 @@ def open_matrix_accounts_for_coupon(user: CustomUser, coupon_id: int | str, amou
     except Exception:
         pass
 
-    # If distribution already recorded for this coupon, only audit creation and exit
-    try:
-        from coupons.models import AuditTrail, CouponCode
-        cobj = CouponCode.objects.filter(pk=str(coupon_id)).first()
-        already_distributed = False
-        if cobj and AuditTrail.objects.filter(action="coupon_matrix_distributed", coupon_code=cobj).exists():
-            already_distributed = True
-        elif AuditTrail.objects.filter(action="coupon_matrix_distributed", metadata__source_id=src_id).exists():
-            already_distributed = True
-        if already_distributed:
-            try:
-                AuditTrail.objects.create(
-                    action="coupon_matrix_created",
-                    actor=user,
-                    coupon_code=cobj if cobj else None,
-                    notes=f"Matrix accounts already distributed earlier for coupon {src_id}",
-                    metadata={"source_type": src_type, "source_id": src_id, "trigger": trigger},
-                )
-            except Exception:
-                pass
-            return
-    except Exception:
-        pass
-
     if not distribute or base150 <= 0:
         # Still audit creation best-effort
         try:
-            from coupons.models import AuditTrail, CouponCode
-            cobj = CouponCode.objects.filter(pk=str(coupon_id)).first()
-            AuditTrail.objects.create(
-                action="coupon_matrix_created",
-                actor=user,
-                coupon_code=cobj if cobj else None,
-                notes=f"Matrix accounts created for coupon {src_id}",
-                metadata={"source_type": src_type, "source_id": src_id, "trigger": trigger},
-            )
+            already = ProcessedEvent.is_processed("coupon_matrix_distributed", src_id)
         except Exception:
-            pass
+            already = False
+        _audit_coupon_matrix_created(user, coupon_id, src_id, trigger, already=already)
         return
 
-    # Coupon-specific Direct/Self bonuses for 150 (prefer master.direct_bonus["150"], fallback to legacy products.coupon150)
-    if include_direct_self:
-        try:
-            direct_amt = Decimal("0.00")
-            self_amt = Decimal("0.00")
-            master = dict(getattr(cfg, "master_commission_json", {}) or {})
-            # Preferred per-product mapping
-            direct_all = dict(master.get("direct_bonus", {}) or {})
-            row150 = dict(direct_all.get("150", {}) or {})
-            if "sponsor" in row150:
-                direct_amt = _q2(row150.get("sponsor"))
-            if "self" in row150:
-                self_amt = _q2(row150.get("self"))
-            # Fallback to legacy products.coupon150.direct_bonus if not provided above
-            if direct_amt == Decimal("0.00") and self_amt == Decimal("0.00"):
-                products = dict(master.get("products", {}) or {})
-                coupon150 = dict(products.get("coupon150", {}) or {})
-                db = dict(coupon150.get("direct_bonus", {}) or {})
-                if "sponsor" in db:
-                    direct_amt = _q2(db.get("sponsor"))
-                if "self" in db:
-                    self_amt = _q2(db.get("self"))
-            sponsor = getattr(user, "registered_by", None)
-            if sponsor and direct_amt > 0:
-                _credit_wallet(
-                    sponsor,
-                    direct_amt,
-                    tx_type="DIRECT_REF_BONUS",
-                    meta={"source": "ECOUPON_150", "source_type": src_type, "source_id": src_id},
-                    source_type=src_type,
-                    source_id=src_id,
-                )
-            if self_amt > 0:
-                _credit_wallet(
-                    user,
-                    self_amt,
-                    tx_type="SELF_BONUS_ACTIVE",
-                    meta={"source": "ECOUPON_150", "source_type": src_type, "source_id": src_id},
-                    source_type=src_type,
-                    source_id=src_id,
-                )
-        except Exception:
-            # best-effort
-            pass
-
-    # Distribute 5-matrix (support fixed-amount overrides)
-    try:
-        five_levels = int(getattr(cfg, "five_matrix_levels", 6) or 6)
-        # Use matrix genealogy: ancestors of the coupon-specific FIVE_150 account
-        try:
-            acc5 = AutoPoolAccount.objects.filter(
-                owner=user, pool_type="FIVE_150", status="ACTIVE", source_type=src_type, source_id=src_id
-            ).order_by("id").first()
-        except Exception:
-            acc5 = None
-        upline6 = _matrix_ancestors(acc5, depth=five_levels) if acc5 else []
-        if not upline6:
-            # Fallback to sponsor chain when genealogy has no ancestors yet
-            upline6 = _resolve_upline(user, depth=five_levels)
-        # Prefer admin master overrides for 150 path
-        master = dict(getattr(cfg, "master_commission_json", {}) or {})
-        cm5 = dict(master.get("consumer_matrix_5", {}) or {})
-        cm3 = dict(master.get("consumer_matrix_3", {}) or {})
-        fixed5 = list((cm5.get("150", {}) or {}).get("fixed_amounts") or getattr(cfg, "five_matrix_amounts_json", []) or [])
-        if fixed5:
-            for idx, recipient in enumerate(upline6):
-                if idx >= len(fixed5):
-                    break
-                amt = _q2(fixed5[idx] or 0)
-                if amt <= 0:
-                    continue
-                if _is_agency_or_employee(recipient) and not _allow_agency_in_matrix():
-                    continue
-                meta = {"source": "FIVE_MATRIX_COUPON_FIXED", "source_type": src_type, "source_id": src_id, "level_index": idx + 1, "fixed": True, "trigger": trigger}
-                _credit_wallet(recipient, amt, tx_type="AUTOPOOL_BONUS_FIVE", meta=meta, source_type=src_type, source_id=src_id)
-                _update_matrix_progress(recipient, pool_type="FIVE_150", level=idx + 1, amount=amt)
-        else:
-            five_percents = _as_percents(((cm5.get("150", {}) or {}).get("percents") or getattr(cfg, "five_matrix_percents_json", []) or []), five_levels)
-            _distribute_levels(
-                upline6,
-                base_amount=base150,
-                percents=five_percents,
-                tx_type="AUTOPOOL_BONUS_FIVE",
-                meta={"source": "FIVE_MATRIX_COUPON", "source_type": src_type, "source_id": src_id, "trigger": trigger},
-                pool_type="FIVE_150",
-            )
-    except Exception:
-        pass
+    # Claim the coupon's distribution marker before paying out, in the same transaction as the
+    # payout: a concurrent call for this coupon gets False and only audits, a failed payout
+    # releases the claim.
+    with transaction.atomic():
+        first = ProcessedEvent.claim("coupon_matrix_distributed", src_id)
+        if first:
+            # Coupon-specific Direct/Self bonuses for 150 (prefer master.direct_bonus["150"], fallback to legacy products.coupon150)
+            if include_direct_self:
+                try:
+                    direct_amt = Decimal("0.00")
+                    self_amt = Decimal("0.00")
+                    master = dict(getattr(cfg, "master_commission_json", {}) or {})
+                    # Preferred per-product mapping
+                    direct_all = dict(master.get("direct_bonus", {}) or {})
+                    row150 = dict(direct_all.get("150", {}) or {})
+                    if "sponsor" in row150:
+                        direct_amt = _q2(row150.get("sponsor"))
+                    if "self" in row150:
+                        self_amt = _q2(row150.get("self"))
+                    # Fallback to legacy products.coupon150.direct_bonus if not provided above
+                    if direct_amt == Decimal("0.00") and self_amt == Decimal("0.00"):
+                        products = dict(master.get("products", {}) or {})
+                        coupon150 = dict(products.get("coupon150", {}) or {})
+                        db = dict(coupon150.get("direct_bonus", {}) or {})
+                        if "sponsor" in db:
+                            direct_amt = _q2(db.get("sponsor"))
+                        if "self" in db:
+                            self_amt = _q2(db.get("self"))
+                    sponsor = getattr(user, "registered_by", None)
+                    if sponsor and direct_amt > 0:
+                        _credit_wallet(
+                            sponsor,
+                            direct_amt,
+                            tx_type="DIRECT_REF_BONUS",
+                            meta={"source": "ECOUPON_150", "source_type": src_type, "source_id": src_id},
+                            source_type=src_type,
+                            source_id=src_id,
+                        )
+                    if self_amt > 0:
+                        _credit_wallet(
+                            user,
+                            self_amt,
+                            tx_type="SELF_BONUS_ACTIVE",
+                            meta={"source": "ECOUPON_150", "source_type": src_type, "source_id": src_id},
+                            source_type=src_type,
+                            source_id=src_id,
+                        )
+                except Exception:
+                    # best-effort
+                    pass
+
+            # Distribute 5-matrix (support fixed-amount overrides)
+            try:
+                five_levels = int(getattr(cfg, "five_matrix_levels", 6) or 6)
+                # Use matrix genealogy: ancestors of the coupon-specific FIVE_150 account
+                try:
+                    acc5 = AutoPoolAccount.objects.filter(
+                        owner=user, pool_type="FIVE_150", status="ACTIVE", source_type=src_type, source_id=src_id
+                    ).order_by("id").first()
+                except Exception:
+                    acc5 = None
+                upline6 = _matrix_ancestors(acc5, depth=five_levels) if acc5 else []
+                if not upline6:
+                    # Fallback to sponsor chain when genealogy has no ancestors yet
+                    upline6 = _resolve_upline(user, depth=five_levels)
+                # Prefer admin master overrides for 150 path
+                master = dict(getattr(cfg, "master_commission_json", {}) or {})
+                cm5 = dict(master.get("consumer_matrix_5", {}) or {})
+                cm3 = dict(master.get("consumer_matrix_3", {}) or {})
+                fixed5 = list((cm5.get("150", {}) or {}).get("fixed_amounts") or getattr(cfg, "five_matrix_amounts_json", []) or [])
+                if fixed5:
+                    batch = CommissionBatch()
+                    for idx, recipient in enumerate(upline6):
+                        if idx >= len(fixed5):
+                            break
+                        amt = _q2(fixed5[idx] or 0)
+                        if amt <= 0:
+                            continue
+                        if _is_agency_or_employee(recipient) and not _allow_agency_in_matrix():
+                            continue
+                        meta = {"source": "FIVE_MATRIX_COUPON_FIXED", "source_type": src_type, "source_id": src_id, "level_index": idx + 1, "fixed": True, "trigger": trigger}
+                        batch.add(recipient, amt, tx_type="AUTOPOOL_BONUS_FIVE", meta=meta, source_type=src_type, source_id=src_id)
+                        _update_matrix_progress(recipient, pool_type="FIVE_150", level=idx + 1, amount=amt)
+                    batch.post()
+                else:
+                    five_percents = _as_percents(((cm5.get("150", {}) or {}).get("percents") or getattr(cfg, "five_matrix_percents_json", []) or []), five_levels)
+                    _distribute_levels(
+                        upline6,
+                        base_amount=base150,
+                        percents=five_percents,
+                        tx_type="AUTOPOOL_BONUS_FIVE",
+                        meta={"source": "FIVE_MATRIX_COUPON", "source_type": src_type, "source_id": src_id, "trigger": trigger},
+                        pool_type="FIVE_150",
+                    )
+            except Exception:
+                pass
 
-    # Distribute 3-matrix (support fixed-amount overrides)
-    try:
-        three_levels = int(getattr(cfg, "three_matrix_levels", 15) or 15)
-        # Use matrix genealogy: ancestors of the coupon-specific THREE_150 account
-        try:
-            acc3 = AutoPoolAccount.objects.filter(
-                owner=user, pool_type="THREE_150", status="ACTIVE", source_type=src_type, source_id=src_id
-            ).order_by("id").first()
-        except Exception:
-            acc3 = None
-        upline15 = _matrix_ancestors(acc3, depth=three_levels) if acc3 else []
-        if not upline15:
-            # Fallback to sponsor chain when genealogy has no ancestors yet
-            upline15 = _resolve_upline(user, depth=three_levels)
-        fixed3 = list((cm3.get("150", {}) or {}).get("fixed_amounts") or getattr(cfg, "three_matrix_amounts_json", []) or [])
-        if fixed3:
-            for idx, recipient in enumerate(upline15):
-                if idx >= len(fixed3):
-                    break
-                amt = _q2(fixed3[idx] or 0)
-                if amt <= 0:
-                    continue
-                if _is_agency_or_employee(recipient) and not _allow_agency_in_matrix():
-                    continue
-                meta = {"source": "THREE_MATRIX_COUPON_FIXED", "source_type": src_type, "source_id": src_id, "level_index": idx + 1, "fixed": True, "trigger": trigger}
-                _credit_wallet(recipient, amt, tx_type="AUTOPOOL_BONUS_THREE", meta=meta, source_type=src_type, source_id=src_id)
-                _update_matrix_progress(recipient, pool_type="THREE_150", level=idx + 1, amount=amt)
-        else:
-            three_percents = _as_percents(((cm3.get("150", {}) or {}).get("percents") or getattr(cfg, "three_matrix_percents_json", []) or []), three_levels)
-            _distribute_levels(
-                upline15,
-                base_amount=base150,
-                percents=three_percents,
-                tx_type="AUTOPOOL_BONUS_THREE",
-                meta={"source": "THREE_MATRIX_COUPON", "source_type": src_type, "source_id": src_id, "trigger": trigger},
-                pool_type="THREE_150",
-            )
-    except Exception:
-        pass
+            # Distribute 3-matrix (support fixed-amount overrides)
+            try:
+                three_levels = int(getattr(cfg, "three_matrix_levels", 15) or 15)
+                # Use matrix genealogy: ancestors of the coupon-specific THREE_150 account
+                try:
+                    acc3 = AutoPoolAccount.objects.filter(
+                        owner=user, pool_type="THREE_150", status="ACTIVE", source_type=src_type, source_id=src_id
+                    ).order_by("id").first()
+                except Exception:
+                    acc3 = None
+                upline15 = _matrix_ancestors(acc3, depth=three_levels) if acc3 else []
+                if not upline15:
+                    # Fallback to sponsor chain when genealogy has no ancestors yet
+                    upline15 = _resolve_upline(user, depth=three_levels)
+                fixed3 = list((cm3.get("150", {}) or {}).get("fixed_amounts") or getattr(cfg, "three_matrix_amounts_json", []) or [])
+                if fixed3:
+                    batch = CommissionBatch()
+                    for idx, recipient in enumerate(upline15):
+                        if idx >= len(fixed3):
+                            break
+                        amt = _q2(fixed3[idx] or 0)
+                        if amt <= 0:
+                            continue
+                        if _is_agency_or_employee(recipient) and not _allow_agency_in_matrix():
+                            continue
+                        meta = {"source": "THREE_MATRIX_COUPON_FIXED", "source_type": src_type, "source_id": src_id, "level_index": idx + 1, "fixed": True, "trigger": trigger}
+                        batch.add(recipient, amt, tx_type="AUTOPOOL_BONUS_THREE", meta=meta, source_type=src_type, source_id=src_id)
+                        _update_matrix_progress(recipient, pool_type="THREE_150", level=idx + 1, amount=amt)
+                    batch.post()
+                else:
+                    three_percents = _as_percents(((cm3.get("150", {}) or {}).get("percents") or getattr(cfg, "three_matrix_percents_json", []) or []), three_levels)
+                    _distribute_levels(
+                        upline15,
+                        base_amount=base150,
+                        percents=three_percents,
+                        tx_type="AUTOPOOL_BONUS_THREE",
+                        meta={"source": "THREE_MATRIX_COUPON", "source_type": src_type, "source_id": src_id, "trigger": trigger},
+                        pool_type="THREE_150",
+                    )
+            except Exception:
+                pass
 
-    # Geo (Agency) configurable payout for per-coupon 150 (ECOUPON)
-    if include_agency:
-        try:
-            from business.models import distribute_auto_pool_commissions
-            distribute_auto_pool_commissions(
-                user,
-                base_amount=base150,
-                fixed_key="150",
-                source_type=src_type,
-                source_id=src_id,
-                extra_meta={"trigger": "ECOUPON_150"},
-            )
-        except Exception:
-            pass
+            # Geo (Agency) configurable payout for per-coupon 150 (ECOUPON)
+            if include_agency:
+                try:
+                    from business.models import distribute_auto_pool_commissions
+                    distribute_auto_pool_commissions(
+                        user,
+                        base_amount=base150,
+                        fixed_key="150",
+                        source_type=src_type,
+                        source_id=src_id,
+                        extra_meta={"trigger": "ECOUPON_150"},
+                    )
+                except Exception:
+                    pass
+
+            # Reward points: credit base amount equal to 150 for this e‑coupon distribution
+            # Do not credit reward points on e‑coupon activation; points are credited on purchase approval.
+            try:
+                pass
+            except Exception:
+                pass
 
-    # Reward points: credit base amount equal to 150 for this e‑coupon distribution
-    # Do not credit reward points on e‑coupon activation; points are credited on purchase approval.
-    try:
-        pass
-    except Exception:
-        pass
+            # Audit (best-effort)
+            try:
+                from coupons.models import AuditTrail, CouponCode
+                cobj = CouponCode.objects.filter(pk=str(coupon_id)).first()
+                AuditTrail.objects.create(
+                    action="coupon_matrix_distributed",
+                    actor=user,
+                    coupon_code=cobj if cobj else None,
+                    notes=f"Matrix accounts created and distributed for coupon {src_id}",
+                    metadata={"source_type": src_type, "source_id": src_id, "trigger": trigger},
+                )
+            except Exception:
+                pass
 
-    # Audit (best-effort)
-    try:
-        from coupons.models import AuditTrail, CouponCode
-        cobj = CouponCode.objects.filter(pk=str(coupon_id)).first()
-        AuditTrail.objects.create(
-            action="coupon_matrix_distributed",
-            actor=user,
-            coupon_code=cobj if cobj else None,
-            notes=f"Matrix accounts created and distributed for coupon {src_id}",
-            metadata={"source_type": src_type, "source_id": src_id, "trigger": trigger},
-        )
-    except Exception:
-        pass
+    if not first:
+        _audit_coupon_matrix_created(user, coupon_id, src_id, trigger, already=True)
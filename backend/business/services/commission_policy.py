@@ -101,10 +101,34 @@ class CommissionPolicy:
         self._comm = dict(self._root.get("commissions") or {})
         if not self._comm:
             raise ConfigurationError("Commission policy missing at master_commission_json['commissions'].")
+        self._memo: Dict[str, Any] = {}
+
+    def _memoized(self, key: str, build):
+        # Section configs are frozen dataclasses; validate once per policy instance
+        try:
+            return self._memo[key]
+        except KeyError:
+            val = self._memo[key] = build()
+            return val
 
     @classmethod
     def load(cls) -> "CommissionPolicy":
-        cfg = CommissionConfig.get_solo()
+        """
+        Parsed policy for the current config version; cached per process alongside
+        CommissionConfig's cached row and rebuilt whenever its version stamp changes.
+        The returned object is shared: treat it (and raw_policy()) as read-only.
+        """
+        global _POLICY_CACHE
+        cfg, stamp = CommissionConfig._solo_cached()
+        cached = _POLICY_CACHE
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        policy = cls._from_config(cfg)
+        _POLICY_CACHE = (stamp, policy)
+        return policy
+
+    @classmethod
+    def _from_config(cls, cfg: CommissionConfig) -> "CommissionPolicy":
         data = dict(getattr(cfg, "master_commission_json", {}) or {})
         commissions = data.get("commissions")
         if not isinstance(commissions, dict) or not commissions:
@@ -130,6 +154,9 @@ class CommissionPolicy:
         return
 
     def prime150(self) -> Prime150Config:
+        return self._memoized("prime150", self._prime150)
+
+    def _prime150(self) -> Prime150Config:
         d = self._get("prime_150", "direct")
         m = self._get("prime_150", "matrix")
         c = self._get("prime_150", "coupons")
@@ -144,6 +171,9 @@ class CommissionPolicy:
         )
 
     def prime750(self) -> Prime750Config:
+        return self._memoized("prime750", self._prime750)
+
+    def _prime750(self) -> Prime750Config:
         b = self._get("prime_750", "base_package")
         mul = self._get("prime_750", "multiplier")
         bp = str(b).strip().lower()
@@ -155,6 +185,9 @@ class CommissionPolicy:
         return Prime750Config(base_package="prime_150", multiplier=m)
 
     def monthly759_first(self) -> Monthly759BoxConfig:
+        return self._memoized("monthly759_first", self._monthly759_first)
+
+    def _monthly759_first(self) -> Monthly759BoxConfig:
         fb = self._get("monthly_759", "first_box")
         d = fb.get("direct") or {}
         mx = fb.get("matrix") or {}
@@ -167,6 +200,9 @@ class CommissionPolicy:
         )
 
     def monthly759_recurring(self) -> Monthly759BoxConfig:
+        return self._memoized("monthly759_recurring", self._monthly759_recurring)
+
+    def _monthly759_recurring(self) -> Monthly759BoxConfig:
         rb = self._get("monthly_759", "recurring_box")
         d = rb.get("direct") or {}
         cp = rb.get("coupons") or {}
@@ -183,6 +219,9 @@ class CommissionPolicy:
 
     def policy_hash(self) -> str:
         # Stable hash of just the commissions block
+        return self._memoized("policy_hash", self._policy_hash)
+
+    def _policy_hash(self) -> str:
         payload = json.dumps(self._comm, sort_keys=True, separators=(",", ":"))
         return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
@@ -307,3 +346,7 @@ class CommissionPolicy:
         }
 
         return commissions
+
+
+# (CommissionConfig version stamp, CommissionPolicy) for the last loaded config
+_POLICY_CACHE: Optional[Tuple[Any, CommissionPolicy]] = None
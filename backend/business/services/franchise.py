@@ -7,6 +7,7 @@ from django.db import transaction, IntegrityError
 
 from accounts.models import Wallet, CustomUser
 from business.models import CommissionConfig, FranchisePayout
+from business.services.geo_recipients import resolve_geo_recipients
 
 
 def _q2(x) -> Decimal:
@@ -16,89 +17,12 @@ def _q2(x) -> Decimal:
         return Decimal("0.00")
 
 
-def _first(qs):
-    try:
-        return qs.first()
-    except Exception:
-        return None
-
-
 def _resolve_recipients(trigger_user: CustomUser) -> Dict[str, Optional[CustomUser]]:
     """
-    Resolve agency recipients for each franchise layer using AgencyRegionAssignment and user geo.
+    Resolve agency recipients for each franchise layer using AgencyRegionAssignment and user geo
+    (pincode layer by exact pincode, district/state layers scoped by State) via the cached geo index.
     """
-    from accounts.models import AgencyRegionAssignment  # local import to avoid circular refs
-    recipients: Dict[str, Optional[CustomUser]] = {
-        "sub_franchise": None,
-        "pincode": None,
-        "pincode_coord": None,
-        "district": None,
-        "district_coord": None,
-        "state": None,
-        "state_coord": None,
-    }
-    if not trigger_user:
-        return recipients
-
-    pin = (getattr(trigger_user, "pincode", "") or "").strip()
-    state = getattr(trigger_user, "state", None)
-
-    # Pincode layer (requires exact pincode)
-    if pin:
-        recipients["sub_franchise"] = _first(
-            CustomUser.objects.filter(
-                category="agency_sub_franchise",
-                region_assignments__level="pincode",
-                region_assignments__pincode=pin,
-            ).distinct()
-        )
-        recipients["pincode"] = _first(
-            CustomUser.objects.filter(
-                category="agency_pincode",
-                region_assignments__level="pincode",
-                region_assignments__pincode=pin,
-            ).distinct()
-        )
-        recipients["pincode_coord"] = _first(
-            CustomUser.objects.filter(
-                category="agency_pincode_coordinator",
-                region_assignments__level="pincode",
-                region_assignments__pincode=pin,
-            ).distinct()
-        )
-
-    # District/State (best-effort; scoped by State if available)
-    if state:
-        recipients["district"] = _first(
-            CustomUser.objects.filter(
-                category="agency_district",
-                region_assignments__level="district",
-                region_assignments__state=state,
-            ).distinct()
-        )
-        recipients["district_coord"] = _first(
-            CustomUser.objects.filter(
-                category="agency_district_coordinator",
-                region_assignments__level="district",
-                region_assignments__state=state,
-            ).distinct()
-        )
-        recipients["state"] = _first(
-            CustomUser.objects.filter(
-                category="agency_state",
-                region_assignments__level="state",
-                region_assignments__state=state,
-            ).distinct()
-        )
-        recipients["state_coord"] = _first(
-            CustomUser.objects.filter(
-                category="agency_state_coordinator",
-                region_assignments__level="state",
-                region_assignments__state=state,
-            ).distinct()
-        )
-
-    return recipients
+    return resolve_geo_recipients(trigger_user)
 
 
 def _credit(user: Optional[CustomUser], amount: Decimal, role_label: str, trigger_user: CustomUser, source_type: str, source_id: str):
@@ -153,7 +77,7 @@ def distribute_franchise_benefit(trigger_user: CustomUser, trigger: str, source:
     except IntegrityError:
         return False
 
-    cfg = CommissionConfig.get_solo()
+    cfg = CommissionConfig.get_cached()
     # Defaults as per spec
     defaults = {
         "sub_franchise": 15,
@@ -0,0 +1,172 @@
+"""
+In-process index of geo (agency) commission recipients, materialized from AgencyRegionAssignment.
+
+  - pincode -> sub_franchise / pincode / pincode_coord  (level=pincode assignments)
+  - state   -> district / district_coord                (level=district assignments)
+  - state   -> state / state_coord                      (level=state assignments)
+  - royalty: first superuser, else first staff user
+
+Each slot holds the lowest user id, matching the previous `.distinct().first()` lookups.
+AgencyRegionAssignment saves/deletes and geo-relevant user changes (category / superuser / staff) bump
+GeoRecipientVersion in their transaction and drop this process's index on commit; other processes
+re-check the version every GEO_RECIPIENT_CACHE_SECONDS and rebuild unconditionally after
+GEO_RECIPIENT_CACHE_MAX_AGE_SECONDS (backstop for queryset .update() calls that skip signals).
+"""
+from __future__ import annotations
+
+import threading
+from time import monotonic
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+
+# role key -> (assignment level, agency category)
+GEO_ROLES: Dict[str, Tuple[str, str]] = {
+    "sub_franchise": ("pincode", "agency_sub_franchise"),
+    "pincode": ("pincode", "agency_pincode"),
+    "pincode_coord": ("pincode", "agency_pincode_coordinator"),
+    "district": ("district", "agency_district"),
+    "district_coord": ("district", "agency_district_coordinator"),
+    "state": ("state", "agency_state"),
+    "state_coord": ("state", "agency_state_coordinator"),
+}
+PINCODE_ROLES = tuple(k for k, (lvl, _) in GEO_ROLES.items() if lvl == "pincode")
+STATE_ROLES = tuple(k for k, (lvl, _) in GEO_ROLES.items() if lvl != "pincode")
+
+
+class GeoRecipientIndex:
+    def __init__(self, by_pin: Dict[str, Dict[str, int]], by_state: Dict[int, Dict[str, int]], royalty_id: Optional[int], user_ids: set, stamp):
+        self.by_pin = by_pin
+        self.by_state = by_state
+        self.royalty_id = royalty_id
+        # Every user the index depends on (assignment holders + royalty): their changes invalidate it
+        self.user_ids = user_ids
+        self.stamp = stamp
+
+    @staticmethod
+    def current_stamp() -> int:
+        from business.models import GeoRecipientVersion
+        return GeoRecipientVersion.current()
+
+    @classmethod
+    def build(cls) -> "GeoRecipientIndex":
+        from accounts.models import AgencyRegionAssignment, CustomUser
+
+        stamp = cls.current_stamp()
+        category_roles: Dict[Tuple[str, str], str] = {v: k for k, v in GEO_ROLES.items()}
+        by_pin: Dict[str, Dict[str, int]] = {}
+        by_state: Dict[int, Dict[str, int]] = {}
+        user_ids = set()
+        rows = (
+            AgencyRegionAssignment.objects.filter(level__in=("pincode", "district", "state"))
+            .values_list("level", "pincode", "state_id", "user_id", "user__category")
+        )
+        for level, pin, state_id, uid, category in rows:
+            user_ids.add(uid)
+            role = category_roles.get((level, category))
+            if not role:
+                continue
+            if level == "pincode":
+                if not pin:
+                    continue
+                slot = by_pin.setdefault(pin, {})
+            else:
+                if not state_id:
+                    continue
+                slot = by_state.setdefault(state_id, {})
+            cur = slot.get(role)
+            if cur is None or uid < cur:
+                slot[role] = uid
+
+        royalty_id = (
+            CustomUser.objects.filter(is_superuser=True).order_by("pk").values_list("pk", flat=True).first()
+            or CustomUser.objects.filter(is_staff=True).order_by("pk").values_list("pk", flat=True).first()
+        )
+        if royalty_id:
+            user_ids.add(royalty_id)
+        return cls(by_pin, by_state, royalty_id, user_ids, stamp)
+
+    def recipient_ids(self, pincode: str = "", state_id: Optional[int] = None) -> Dict[str, Optional[int]]:
+        out: Dict[str, Optional[int]] = {k: None for k in GEO_ROLES}
+        pin = (pincode or "").strip()
+        if pin:
+            out.update(self.by_pin.get(pin, {}))
+        if state_id:
+            out.update(self.by_state.get(state_id, {}))
+        return out
+
+
+_lock = threading.Lock()
+_cache: dict = {}
+
+
+def get_index() -> GeoRecipientIndex:
+    now = monotonic()
+    idx = _cache.get("index")
+    if idx is not None and now < _cache.get("check_at", 0):
+        return idx
+    ttl = float(getattr(settings, "GEO_RECIPIENT_CACHE_SECONDS", 30) or 0)
+    max_age = float(getattr(settings, "GEO_RECIPIENT_CACHE_MAX_AGE_SECONDS", 300) or 0)
+    with _lock:
+        idx = _cache.get("index")
+        if idx is not None and now < _cache.get("check_at", 0):
+            return idx
+        if idx is not None and now < _cache.get("expires_at", 0):
+            if GeoRecipientIndex.current_stamp() == idx.stamp:
+                _cache["check_at"] = now + ttl
+                return idx
+        idx = GeoRecipientIndex.build()
+        _cache.update({"index": idx, "check_at": now + ttl, "expires_at": now + max_age})
+        return idx
+
+
+def invalidate() -> None:
+    _cache.clear()
+
+
+def bump_version() -> None:
+    """
+    Record a geo recipient change inside the caller's transaction: the version row moves with it and
+    this process's index is dropped once it commits (rolled-back changes keep the index).
+    """
+    from business.models import GeoRecipientVersion
+    with transaction.atomic():
+        GeoRecipientVersion.bump()
+    transaction.on_commit(invalidate)
+
+
+def is_geo_relevant(category: str, is_superuser: bool = False, is_staff: bool = False) -> bool:
+    """
+    Whether a user with these fields can hold a geo role or the royalty slot.
+    """
+    return bool(is_superuser) or bool(is_staff) or any(category == cat for _, cat in GEO_ROLES.values())
+
+
+def resolve_geo_recipients_bulk(payers: Iterable, with_royalty: bool = False) -> Dict[int, Dict[str, object]]:
+    """
+    {payer_id: {role_key: CustomUser|None}} for many payers: index lookups plus one user query.
+    Keys are GEO_ROLES (and "royalty" when with_royalty=True).
+    """
+    from accounts.models import CustomUser
+
+    idx = get_index()
+    id_maps: Dict[int, Dict[str, Optional[int]]] = {}
+    for p in payers:
+        if p is None or getattr(p, "pk", None) is None:
+            continue
+        ids = idx.recipient_ids(getattr(p, "pincode", "") or "", getattr(p, "state_id", None))
+        if with_royalty:
+            ids["royalty"] = idx.royalty_id
+        id_maps[p.pk] = ids
+    wanted = {uid for ids in id_maps.values() for uid in ids.values() if uid}
+    users = CustomUser.objects.in_bulk(list(wanted)) if wanted else {}
+    return {pid: {role: users.get(uid) if uid else None for role, uid in ids.items()} for pid, ids in id_maps.items()}
+
+
+def resolve_geo_recipients(payer, with_royalty: bool = False) -> Dict[str, object]:
+    out = resolve_geo_recipients_bulk([payer], with_royalty=with_royalty)
+    empty = {k: None for k in GEO_ROLES}
+    if with_royalty:
+        empty["royalty"] = None
+    return out.get(getattr(payer, "pk", None), empty)
@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import Wallet, WalletTransaction, TaxPoolEntry, CustomUser, EarningsRollup
+
+
+def _q2(x) -> Decimal:
+    return Decimal(str(x or 0)).quantize(Decimal("0.01"))
+
+
+@dataclass
+class _Credit:
+    user: CustomUser
+    amount: Decimal
+    tx_type: str
+    meta: Dict[str, Any] = field(default_factory=dict)
+    source_type: str = ""
+    source_id: str = ""
+
+
+class CommissionBatch:
+    """
+    Collects all wallet credits of one activation/distribution and posts them together.
+
+    post() produces the same balances and ledger rows as calling Wallet.credit per recipient:
+      - Commission types (Wallet.COMMISSION_WITHHOLD_TYPES) withhold cfg.tax_percent unless meta.no_withhold
+      - MAIN row (+ WITHDRAWABLE_CREDIT row for active users), pending_due_to_inactive for inactive users
+      - Withheld tax routed to the company via Wallet.route_tax_to_company semantics
+      - Auto 1k block rule evaluated once per touched active wallet
+    but with a fixed number of queries:
+      - one bulk get-or-create of missing wallets
+      - one SELECT ... FOR UPDATE over all wallets, ordered by id (deterministic lock order)
+      - one bulk UPDATE of wallets, one bulk INSERT of WalletTransaction, one bulk INSERT of TaxPoolEntry
+      - one EarningsRollup UPDATE per touched (user, type, bucket, day)
+
+    If the bulk path fails, credits fall back to per-recipient Wallet.credit (best-effort, as before).
+
+    Usage:
+        batch = CommissionBatch()
+        batch.add(user, amount, tx_type="COMMISSION_CREDIT", meta={...}, source_type=..., source_id=...)
+        batch.post()
+    """
+
+    def __init__(self):
+        self._items: List[_Credit] = []
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(
+        self,
+        user: Optional[CustomUser],
+        amount,
+        tx_type: str,
+        meta: Dict[str, Any] | None = None,
+        source_type: str = "",
+        source_id: str = "",
+    ) -> None:
+        if not user or getattr(user, "pk", None) is None:
+            return
+        try:
+            amt = _q2(amount)
+        except Exception:
+            return
+        if amt <= 0:
+            return
+        self._items.append(
+            _Credit(
+                user=user,
+                amount=amt,
+                tx_type=tx_type,
+                meta=dict(meta or {}),
+                source_type=source_type or "",
+                source_id=str(source_id or ""),
+            )
+        )
+
+    def post(self) -> int:
+        """
+        Post all collected credits. Returns the number of credits applied and clears the batch.
+        """
+        items, self._items = self._items, []
+        if not items:
+            return 0
+        try:
+            with transaction.atomic():
+                touched = self._post_bulk(items)
+        except Exception:
+            # Fallback: per-recipient credits (original behaviour)
+            for it in items:
+                try:
+                    w = Wallet.get_or_create_for_user(it.user)
+                    w.credit(it.amount, tx_type=it.tx_type, meta=it.meta, source_type=it.source_type, source_id=it.source_id)
+                except Exception:
+                    continue
+            return len(items)
+
+        # Auto 1k block rule (best-effort; same as Wallet.credit for active users)
+        for w in touched:
+            try:
+                w._apply_auto_block_rule(w)
+            except Exception:
+                pass
+        return len(items)
+
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _tax_context():
+        try:
+            from business.models import CommissionConfig
+            cfg = CommissionConfig.get_cached()
+            tax_percent = Decimal(getattr(cfg, "tax_percent", Decimal("10.00")) or Decimal("10.00"))
+            company_user = getattr(cfg, "tax_company_user", None)
+        except Exception:
+            tax_percent = Decimal("10.00")
+            company_user = None
+        if not company_user:
+            try:
+                company_user = CustomUser.objects.filter(category="company").first() or CustomUser.objects.filter(is_superuser=True).first()
+            except Exception:
+                company_user = None
+        return tax_percent, company_user
+
+    def _post_bulk(self, items: List[_Credit]) -> List[Wallet]:
+        user_ids = sorted({it.user.pk for it in items})
+
+        # Ensure wallets exist (one query + one bulk insert for missing ones)
+        existing = set(Wallet.objects.filter(user_id__in=user_ids).values_list("user_id", flat=True))
+        missing = [uid for uid in user_ids if uid not in existing]
+        if missing:
+            Wallet.objects.bulk_create(
+                [Wallet(user_id=uid, balance=Decimal("0.00")) for uid in missing],
+                ignore_conflicts=True,
+            )
+
+        # Lock every wallet in a single statement, deterministic id order
+        wallets = {
+            w.user_id: w
+            for w in Wallet.objects.select_for_update().filter(user_id__in=user_ids).order_by("id")
+        }
+
+        need_tax = any(
+            it.tx_type in Wallet.COMMISSION_WITHHOLD_TYPES and not bool(it.meta.get("no_withhold"))
+            for it in items
+        )
+        tax_percent, company_user = self._tax_context() if need_tax else (Decimal("0"), None)
+        deferred = bool(getattr(settings, "TAX_POOL_DEFERRED", True))
+
+        txs: List[WalletTransaction] = []
+        tax_entries: List[TaxPoolEntry] = []
+        sync_tax: List[tuple] = []
+        active_user_ids = set()
+
+        for it in items:
+            w = wallets[it.user.pk]
+            try:
+                inactive = not bool(getattr(it.user, "account_active", False))
+            except Exception:
+                inactive = False
+            if not inactive:
+                active_user_ids.add(it.user.pk)
+            amt = it.amount
+            meta = it.meta
+            st = it.source_type or ""
+            sid = it.source_id or ""
+
+            if it.tx_type in Wallet.COMMISSION_WITHHOLD_TYPES and not bool(meta.get("no_withhold")):
+                tax = (amt * tax_percent / Decimal("100")).quantize(Decimal("0.01"))
+                net = (amt - tax).quantize(Decimal("0.01"))
+                if net < 0:
+                    net = Decimal("0.00")
+
+                w.main_balance = (w.main_balance or Decimal("0")) + amt
+                if not inactive:
+                    w.withdrawable_balance = (w.withdrawable_balance or Decimal("0")) + net
+                w.balance = (w.balance or Decimal("0")) + amt
+
+                meta_main = {**meta, "ledger": "MAIN", "gross": str(amt), "net": str(net), "tax": str(tax), "tax_percent": str(tax_percent)}
+                if inactive:
+                    meta_main["pending_due_to_inactive"] = True
+                txs.append(WalletTransaction(
+                    user_id=it.user.pk, amount=amt, balance_after=w.balance, type=it.tx_type,
+                    source_type=st, source_id=sid, meta=meta_main, pending_release=inactive,
+                ))
+                if (not inactive) and net > 0:
+                    txs.append(WalletTransaction(
+                        user_id=it.user.pk, amount=net, balance_after=w.balance, type="WITHDRAWABLE_CREDIT",
+                        source_type=st, source_id=sid,
+                        meta={**meta, "ledger": "WITHDRAWAL", "gross": str(amt), "net": str(net), "tax": str(tax), "tax_percent": str(tax_percent)},
+                    ))
+
+                if company_user and tax > 0:
+                    tax_meta = {"from_user": getattr(it.user, "username", None), **meta}
+                    if deferred:
+                        tax_entries.append(TaxPoolEntry(
+                            company_user=company_user, from_user_id=it.user.pk, amount=tax,
+                            source_type=st or "TAX_POOL", source_id=sid, meta=tax_meta,
+                        ))
+                    else:
+                        sync_tax.append((tax, it.user, tax_meta, st or "TAX_POOL", sid))
+                continue
+
+            # Non-commission or withholding disabled
+            w.main_balance = (w.main_balance or Decimal("0")) + amt
+            w.balance = (w.balance or Decimal("0")) + amt
+            meta2 = dict(meta)
+            if inactive:
+                meta2["pending_due_to_inactive"] = True
+            txs.append(WalletTransaction(
+                user_id=it.user.pk, amount=amt, balance_after=w.balance, type=it.tx_type,
+                source_type=st, source_id=sid, meta=meta2, pending_release=inactive,
+            ))
+
+        now = timezone.now()
+        for w in wallets.values():
+            w.updated_at = now
+        Wallet.objects.bulk_update(list(wallets.values()), ["balance", "main_balance", "withdrawable_balance", "updated_at"])
+        try:
+            WalletTransaction.resolve_counterparties(txs)
+        except Exception:
+            pass
+        WalletTransaction.objects.bulk_create(txs)
+        try:
+            with transaction.atomic():
+                EarningsRollup.record(txs)
+        except Exception:
+            # best-effort; `rebuild_earnings_rollup` reconciles
+            pass
+        if tax_entries:
+            TaxPoolEntry.objects.bulk_create(tax_entries)
+        for tax, from_user, tax_meta, st, sid in sync_tax:
+            try:
+                Wallet.route_tax_to_company(company_user, tax, from_user=from_user, meta=tax_meta, source_type=st, source_id=sid)
+            except Exception:
+                pass
+
+        return [w for uid, w in wallets.items() if uid in active_user_ids]
@@ -3,56 +3,16 @@ from __future__ import annotations
 from decimal import Decimal
 from typing import Dict, Any, List, Optional
 
-from accounts.models import Wallet, CustomUser
-from business.models import CommissionConfig
+from accounts.models import CustomUser
+from business.models import CommissionConfig, _resolve_upline
 from .commission_policy import CommissionPolicy, ConfigurationError
+from .ledger import CommissionBatch
 
 
 def _q2(x) -> Decimal:
     return Decimal(str(x)).quantize(Decimal("0.01"))
 
 
-def _credit_wallet(
-    user: Optional[CustomUser],
-    amount: Decimal,
-    tx_type: str,
-    meta: Dict[str, Any] | None = None,
-    source_type: str = "",
-    source_id: str = "",
-):
-    """
-    Best-effort wallet credit. Business rules about whether to credit and how much
-    must be decided by the caller/policy before invoking this helper.
-    """
-    if not user or _q2(amount) <= 0:
-        return
-    w = Wallet.get_or_create_for_user(user)
-    w.credit(
-        _q2(amount),
-        tx_type=tx_type,
-        meta=meta or {},
-        source_type=source_type or "",
-        source_id=str(source_id or ""),
-    )
-
-
-def _resolve_upline(user: CustomUser, depth: int) -> List[CustomUser]:
-    """
-    registered_by chain: returns [sponsor (L1), L2, ..., up to depth]
-    """
-    chain: List[CustomUser] = []
-    cur = user
-    seen = set()
-    for _ in range(max(0, depth)):
-        parent = getattr(cur, "registered_by", None)
-        if not parent or parent.id in seen:
-            break
-        chain.append(parent)
-        seen.add(parent.id)
-        cur = parent
-    return chain
-
-
 def _load_monthly_759_runtime_cfg(cfg: CommissionConfig) -> Dict[str, Any]:
     """
     Strict loader for CommissionConfig.master_commission_json['monthly_759'] without defaults.
@@ -151,67 +111,73 @@ def distribute_monthly_759_payouts(
     src_type = str(source.get("type") or "MONTHLY_759")
     src_id = str(source.get("id") or "")
 
-    # 1) Direct sponsor and optional self from policy
-    direct_amt = _q2(box_cfg.direct_sponsor)
-    if sponsor and direct_amt > 0:
-        _credit_wallet(
-            sponsor,
-            direct_amt,
-            tx_type="MONTHLY_759_DIRECT",
-            meta={"source": "MONTHLY_759", "is_first_month": bool(is_first_month)},
-            source_type=src_type,
-            source_id=src_id,
-        )
-
-    # If admin configured self bonus for monthly in policy via first/recurring boxes (not required).
-    # We model this by allowing monthly_759.first_box/recurring_box.direct.self in the future policy.
-    # For now, self is derived only if present in policy raw payload to avoid hardcoding.
-    # This keeps engine future-proof without adding defaults here.
+    # 1) + 2) Direct/self and L1..L5 credits are posted together as one batch.
+    # Credits collected before a ConfigurationError are still posted (same as per-credit posting).
+    batch = CommissionBatch()
     try:
-        # Not required; safe lookup
-        raw = policy.raw_policy()
-        fb = (raw.get("commissions", {}).get("monthly_759", {}) or {})
-        dnode = (fb.get("first_box", {}) if is_first_month else fb.get("recurring_box", {})).get("direct", {}) or {}
-        if "self" in dnode:
-            self_amt = _q2(dnode.get("self"))
-            if self_amt > 0:
-                _credit_wallet(
-                    consumer,
-                    self_amt,
-                    tx_type="MONTHLY_759_SELF",
-                    meta={"source": "MONTHLY_759", "is_first_month": bool(is_first_month)},
-                    source_type=src_type,
-                    source_id=src_id,
-                )
-    except Exception:
-        # ignore optional self if not configured
-        pass
-
-    # 2) L1..L5 fixed amounts from master.monthly_759.levels_fixed (strict, no defaults)
-    cfg = CommissionConfig.get_solo()
-    runtime = _load_monthly_759_runtime_cfg(cfg)
-    levels_q: List[Decimal] = runtime["levels_fixed"]
-
-    upline = _resolve_upline(consumer, depth=5)
-    for idx, recipient in enumerate(upline):
-        if idx >= len(levels_q):
-            break
-        amt = _q2(levels_q[idx])
-        if amt <= 0:
-            continue
-        _credit_wallet(
-            recipient,
-            amt,
-            tx_type="MONTHLY_759_LEVEL",
-            meta={
-                "source": "MONTHLY_759",
-                "level": idx + 1,
-                "is_first_month": bool(is_first_month),
-                "fixed": True,
-            },
-            source_type=src_type,
-            source_id=src_id,
-        )
+        # 1) Direct sponsor and optional self from policy
+        direct_amt = _q2(box_cfg.direct_sponsor)
+        if sponsor and direct_amt > 0:
+            batch.add(
+                sponsor,
+                direct_amt,
+                tx_type="MONTHLY_759_DIRECT",
+                meta={"source": "MONTHLY_759", "is_first_month": bool(is_first_month)},
+                source_type=src_type,
+                source_id=src_id,
+            )
+
+        # If admin configured self bonus for monthly in policy via first/recurring boxes (not required).
+        # We model this by allowing monthly_759.first_box/recurring_box.direct.self in the future policy.
+        # For now, self is derived only if present in policy raw payload to avoid hardcoding.
+        # This keeps engine future-proof without adding defaults here.
+        try:
+            # Not required; safe lookup
+            raw = policy.raw_policy()
+            fb = (raw.get("commissions", {}).get("monthly_759", {}) or {})
+            dnode = (fb.get("first_box", {}) if is_first_month else fb.get("recurring_box", {})).get("direct", {}) or {}
+            if "self" in dnode:
+                self_amt = _q2(dnode.get("self"))
+                if self_amt > 0:
+                    batch.add(
+                        consumer,
+                        self_amt,
+                        tx_type="MONTHLY_759_SELF",
+                        meta={"source": "MONTHLY_759", "is_first_month": bool(is_first_month)},
+                        source_type=src_type,
+                        source_id=src_id,
+                    )
+        except Exception:
+            # ignore optional self if not configured
+            pass
+
+        # 2) L1..L5 fixed amounts from master.monthly_759.levels_fixed (strict, no defaults)
+        cfg = CommissionConfig.get_cached()
+        runtime = _load_monthly_759_runtime_cfg(cfg)
+        levels_q: List[Decimal] = runtime["levels_fixed"]
+
+        upline = _resolve_upline(consumer, depth=5)
+        for idx, recipient in enumerate(upline):
+            if idx >= len(levels_q):
+                break
+            amt = _q2(levels_q[idx])
+            if amt <= 0:
+                continue
+            batch.add(
+                recipient,
+                amt,
+                tx_type="MONTHLY_759_LEVEL",
+                meta={
+                    "source": "MONTHLY_759",
+                    "level": idx + 1,
+                    "is_first_month": bool(is_first_month),
+                    "fixed": True,
+                },
+                source_type=src_type,
+                source_id=src_id,
+            )
+    finally:
+        batch.post()
 
     # 3) Agency distribution via auto-pool (STRICT: must be configured)
     if runtime["agency_enabled"]:
@@ -3,38 +3,16 @@ from __future__ import annotations
 from decimal import Decimal
 from typing import Any, Dict, Optional
 
-from accounts.models import Wallet, CustomUser
+from accounts.models import CustomUser
 from business.models import CommissionConfig, AutoPoolAccount
 from .commission_policy import CommissionPolicy, ConfigurationError
+from .ledger import CommissionBatch
 
 
 def _q2(x) -> Decimal:
     return Decimal(str(x)).quantize(Decimal("0.01"))
 
 
-def _credit_wallet(
-    user: Optional[CustomUser],
-    amount: Decimal,
-    tx_type: str,
-    meta: Dict[str, Any] | None = None,
-    source_type: str = "",
-    source_id: str = "",
-) -> None:
-    """
-    Best-effort wallet credit. Payout decisioning must be handled by caller/policy.
-    """
-    if not user or _q2(amount) <= 0:
-        return
-    w = Wallet.get_or_create_for_user(user)
-    w.credit(
-        _q2(amount),
-        tx_type=tx_type,
-        meta=meta or {},
-        source_type=source_type or "",
-        source_id=str(source_id or ""),
-    )
-
-
 def _load_products_block(cfg: CommissionConfig) -> Dict[str, Any]:
     """
     Return a 'products' block that supports both nested and flattened admin JSON:
@@ -142,10 +120,11 @@ def distribute_prime_150_payouts(
     src_type = str(source.get("type") or "PRIME_150")
     src_id = str(source.get("id") or "")
 
-    # 1) Direct + Self (strict decimals)
+    # 1) Direct + Self (strict decimals), posted as one batch
+    batch = CommissionBatch()
     direct_amt = _q2(p150.direct_sponsor)
     if sponsor and direct_amt > 0:
-        _credit_wallet(
+        batch.add(
             sponsor,
             direct_amt,
             tx_type="PRIME_150_DIRECT",
@@ -156,7 +135,7 @@ def distribute_prime_150_payouts(
 
     self_amt = _q2(p150.direct_self)
     if self_amt > 0:
-        _credit_wallet(
+        batch.add(
             consumer,
             self_amt,
             tx_type="PRIME_150_SELF",
@@ -164,9 +143,10 @@ def distribute_prime_150_payouts(
             source_type=src_type,
             source_id=src_id,
         )
+    batch.post()
 
     # 2) Agency distribution (best-effort base_amount)
-    cfg = CommissionConfig.get_solo()
+    cfg = CommissionConfig.get_cached()
     base150: Optional[Decimal] = None
     try:
         v = _resolve_base_amount(cfg, "150", None)
@@ -267,7 +247,7 @@ def distribute_prime_750_payouts(
     override_direct = None
     override_self = None
     try:
-        cfg2 = CommissionConfig.get_solo()
+        cfg2 = CommissionConfig.get_cached()
         master = dict(getattr(cfg2, "master_commission_json", {}) or {})
         row750 = dict(master.get("direct_bonus", {}).get("750", {}) or {})
         if "sponsor" in row750:
@@ -281,8 +261,9 @@ def distribute_prime_750_payouts(
     pay_direct = override_direct if override_direct is not None else default_direct
     pay_self = override_self if override_self is not None else default_self
 
+    batch = CommissionBatch()
     if sponsor and pay_direct > 0:
-        _credit_wallet(
+        batch.add(
             sponsor,
             pay_direct,
             tx_type="PRIME_750_DIRECT",
@@ -292,7 +273,7 @@ def distribute_prime_750_payouts(
         )
 
     if pay_self > 0:
-        _credit_wallet(
+        batch.add(
             consumer,
             pay_self,
             tx_type="PRIME_750_SELF",
@@ -300,9 +281,10 @@ def distribute_prime_750_payouts(
             source_type=src_type,
             source_id=src_id,
         )
+    batch.post()
 
     # 2) Agency distribution (best-effort base)
-    cfg = CommissionConfig.get_solo()
+    cfg = CommissionConfig.get_cached()
     base750: Optional[Decimal] = None
     try:
         v = _resolve_base_amount(cfg, "750", multiplier=mul)
@@ -11,6 +11,7 @@ from business.models import (
     AutoPoolAccount,
     ReferralJoinPayout,
     UserMatrixProgress,
+    _resolve_upline,
 )
 
 
@@ -21,20 +22,6 @@ def _q2(x) -> Decimal:
         return Decimal("0.00")
 
 
-def _resolve_upline(user: CustomUser, depth: int) -> List[CustomUser]:
-    chain: List[CustomUser] = []
-    cur = user
-    seen = set()
-    for _ in range(max(0, depth)):
-        parent = getattr(cur, "registered_by", None)
-        if not parent or parent.id in seen:
-            break
-        chain.append(parent)
-        seen.add(parent.id)
-        cur = parent
-    return chain
-
-
 def _credit_wallet(user: CustomUser, amount: Decimal, tx_type: str, meta: dict | None = None, source_type: str = "", source_id: str = ""):
     if not user or _q2(amount) <= 0:
         return
@@ -89,7 +76,7 @@ def _distribute_three_matrix(user: CustomUser, base_amount: Decimal, source: Dic
     Distribute 15-level autopool income for THREE_50 using fixed amounts if configured,
     else fall back to percent-based distribution from CommissionConfig.
     """
-    cfg = CommissionConfig.get_solo()
+    cfg = CommissionConfig.get_cached()
     src_type = str(source.get("type") or "")
     src_id = str(source.get("id") or source.get("code") or "")
 
@@ -173,18 +160,11 @@ def _update_matrix_progress(user: CustomUser, pool_type: str, level: int, amount
 
 def _resolve_upline_matrix(user: CustomUser, depth: int) -> List[CustomUser]:
     """
-    Traverse genealogy chain via `parent` up to `depth` levels (L1..depth).
+    Genealogy chain via `parent` up to `depth` levels (L1..depth); single query via CustomUser.matrix_path.
     """
-    chain: List[CustomUser] = []
-    cur = getattr(user, "parent", None)
-    seen = set()
-    for _ in range(max(0, depth)):
-        if not cur or getattr(cur, "id", None) in seen:
-            break
-        chain.append(cur)
-        seen.add(cur.id)
-        cur = getattr(cur, "parent", None)
-    return chain
+    if not user:
+        return []
+    return user.get_upline(depth, tree="matrix")
 
 
 def _first_missing_position(children_qs) -> int | None:
@@ -234,7 +214,7 @@ def _distribute_five_matrix(new_user: CustomUser, source: Dict[str, Any]):
     """
     if not getattr(new_user, "parent_id", None):
         return
-    cfg = CommissionConfig.get_solo()
+    cfg = CommissionConfig.get_cached()
     try:
         levels = int(getattr(cfg, "five_matrix_levels", 6) or 6)
     except Exception:
@@ -300,7 +280,7 @@ def on_user_join(new_user: CustomUser, source: Dict[str, Any] | None = None) ->
         # best-effort
         pass
 
-    cfg = CommissionConfig.get_solo()
+    cfg = CommissionConfig.get_cached()
     fixed = getattr(cfg, "referral_join_fixed_json", {}) or {}
     # Defaults if not configured (universal ₹15 unless admin overrides in config)
     direct_amt = _q2(fixed.get("direct", 15))
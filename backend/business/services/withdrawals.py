@@ -54,7 +54,7 @@ def compute_withdraw_distribution(user: CustomUser, gross_amount: Decimal | int
       ]
     }
     """
-    cfg = CommissionConfig.get_solo()
+    cfg = CommissionConfig.get_cached()
     gross = _q2(gross_amount)
 
     sponsor_percent = cfg.get_withdrawal_sponsor_percent()
@@ -144,7 +144,7 @@ def apply_withdraw_distribution(
         if key == "sponsor_bonus":
             recipient = getattr(user, "registered_by", None)
         elif key == "tds":
-            recipient = CommissionConfig.get_solo().get_company_user()
+            recipient = CommissionConfig.get_cached().get_company_user()
 
         if not recipient:
             continue
@@ -0,0 +1,221 @@
+import json
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import TestCase, override_settings
+
+from accounts.models import AgencyRegionAssignment, EarningsRollup, TaxPoolEntry, Wallet, WalletTransaction
+from business.models import AutoPoolAccount, GeoRecipientVersion, ProcessedEvent
+from business.services import geo_recipients
+from business.services.activation import open_matrix_accounts_for_coupon
+from business.services.ledger import CommissionBatch
+from coupons.models import AuditTrail
+
+
+class ProcessedEventTests(TestCase):
+    def test_run_once_releases_claim_when_body_fails(self):
+        with self.assertRaises(RuntimeError):
+            with ProcessedEvent.run_once("prime_150_distributed", 7) as first:
+                self.assertTrue(first)
+                raise RuntimeError("payout failed")
+        self.assertFalse(ProcessedEvent.is_processed("prime_150_distributed", 7))
+
+        with ProcessedEvent.run_once("prime_150_distributed", 7) as first:
+            self.assertTrue(first)
+        with ProcessedEvent.run_once("prime_150_distributed", 7) as first:
+            self.assertFalse(first)
+        self.assertTrue(ProcessedEvent.is_processed("prime_150_distributed", 7))
+
+    def test_duplicate_claim_keeps_outer_transaction_usable(self):
+        with transaction.atomic():
+            self.assertTrue(ProcessedEvent.claim("coupon_matrix_distributed", "9"))
+            self.assertFalse(ProcessedEvent.claim("coupon_matrix_distributed", "9"))
+            self.assertEqual(ProcessedEvent.objects.filter(key="9").count(), 1)
+
+
+class CouponMatrixDistributionTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="buyer", password="x")
+
+    def _actions(self):
+        return list(AuditTrail.objects.filter(metadata__source_id="41").order_by("id").values_list("action", flat=True))
+
+    def test_distributes_once_per_coupon(self):
+        open_matrix_accounts_for_coupon(self.user, 41, trigger="test")
+        open_matrix_accounts_for_coupon(self.user, 41, trigger="test")
+
+        self.assertTrue(ProcessedEvent.is_processed("coupon_matrix_distributed", "41"))
+        self.assertEqual(self._actions(), ["coupon_matrix_distributed", "coupon_matrix_created"])
+
+    def test_audit_only_call_does_not_claim(self):
+        open_matrix_accounts_for_coupon(self.user, 41, distribute=False, trigger="test")
+
+        self.assertFalse(ProcessedEvent.is_processed("coupon_matrix_distributed", "41"))
+        self.assertEqual(self._actions(), ["coupon_matrix_created"])
+
+
+@override_settings(GEO_RECIPIENT_CACHE_SECONDS=0)
+class GeoRecipientIndexTests(TestCase):
+    def setUp(self):
+        geo_recipients.invalidate()
+        self.addCleanup(geo_recipients.invalidate)
+        self.agent = get_user_model().objects.create_user(username="pinagent", password="x", category="agency_pincode")
+        self.assignment = AgencyRegionAssignment.objects.create(user=self.agent, level="pincode", pincode="560001")
+
+    def _pincode_holder(self, pin):
+        return geo_recipients.get_index().recipient_ids(pincode=pin)["pincode"]
+
+    def test_in_place_assignment_edit_bumps_version(self):
+        self.assertEqual(self._pincode_holder("560001"), self.agent.pk)
+        version = GeoRecipientVersion.current()
+
+        self.assignment.pincode = "560002"
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.assignment.save()
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(GeoRecipientVersion.current(), version + 1)
+        # Another process: its cached index is stale by version and gets rebuilt on the next check
+        self.assertIsNone(self._pincode_holder("560001"))
+        self.assertEqual(self._pincode_holder("560002"), self.agent.pk)
+
+    def test_agency_category_change_bumps_version(self):
+        self.assertEqual(self._pincode_holder("560001"), self.agent.pk)
+        version = GeoRecipientVersion.current()
+
+        self.agent.category = "agency_sub_franchise"
+        self.agent.save(update_fields=["category"])
+        self.assertEqual(GeoRecipientVersion.current(), version + 1)
+        ids = geo_recipients.get_index().recipient_ids(pincode="560001")
+        self.assertIsNone(ids["pincode"])
+        self.assertEqual(ids["sub_franchise"], self.agent.pk)
+
+        consumer = get_user_model().objects.create_user(username="plain", password="x", category="consumer")
+        consumer.first_name = "Renamed"
+        consumer.save()
+        self.assertEqual(GeoRecipientVersion.current(), version + 1)
+
+
+class AutoPoolFrontierTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.owner = User.objects.create_user(username="poolowner", password="x")
+        self.other = User.objects.create_user(username="otherowner", password="x")
+
+    def _place(self, user):
+        return AutoPoolAccount.place_in_three_pool(user, "THREE_150", 150)
+
+    def _refresh(self, acc):
+        return AutoPoolAccount.objects.get(pk=acc.pk)
+
+    def test_placement_fills_own_subtree_breadth_first(self):
+        root = self._place(self.owner)
+        other_root = self._place(self.other)
+        kids = [self._place(self.owner) for _ in range(3)]
+        grandchild = self._place(self.owner)
+
+        self.assertEqual([k.parent_account_id for k in kids], [root.pk] * 3)
+        self.assertEqual([k.position for k in kids], [1, 2, 3])
+        self.assertEqual(grandchild.parent_account_id, kids[0].pk)
+        self.assertTrue(grandchild.tree_path.startswith(kids[0].tree_path))
+        self.assertEqual(self._refresh(root).child_count, 3)
+        self.assertEqual(self._refresh(other_root).child_count, 0)
+
+    def test_child_leaving_active_frees_a_slot(self):
+        root = self._place(self.owner)
+        kids = [self._place(self.owner) for _ in range(3)]
+
+        kids[1].status = "CLOSED"
+        kids[1].save(update_fields=["status"])
+        self.assertEqual(self._refresh(root).child_count, 2)
+
+        refill = self._place(self.owner)
+        self.assertEqual(refill.parent_account_id, root.pk)
+        self.assertEqual(refill.position, 4)
+        self.assertEqual(self._refresh(root).child_count, 3)
+
+        kids[2].delete()
+        self.assertEqual(self._refresh(root).child_count, 2)
+        kids[1].status = "ACTIVE"
+        kids[1].save(update_fields=["status"])
+        self.assertEqual(self._refresh(root).child_count, 3)
+
+
+@override_settings(TAX_POOL_DEFERRED=True)
+class CommissionBatchTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.company = User.objects.create_user(username="company", password="x", category="company")
+        self.active = User.objects.create_user(username="earner", password="x", account_active=True)
+        self.inactive = User.objects.create_user(username="dormant", password="x", account_active=False)
+        self.credits = [
+            (self.active, "120.00", "COMMISSION_CREDIT", {"level": 1}, "ACTIVATION", "11"),
+            (self.active, "35.50", "LEVEL_BONUS", {"level": 2, "no_withhold": True}, "ACTIVATION", "11"),
+            (self.active, "20.00", "ADJUSTMENT_CREDIT", {}, "ADMIN", "12"),
+            (self.inactive, "80.00", "DIRECT_REF_BONUS", {}, "ACTIVATION", "11"),
+            (self.inactive, "15.00", "ADJUSTMENT_CREDIT", {}, "ADMIN", "12"),
+        ]
+
+    def _per_credit(self):
+        for user, amount, tx_type, meta, source_type, source_id in self.credits:
+            Wallet.get_or_create_for_user(user).credit(
+                Decimal(amount), tx_type=tx_type, meta=meta, source_type=source_type, source_id=source_id
+            )
+
+    def _batched(self):
+        batch = CommissionBatch()
+        for user, amount, tx_type, meta, source_type, source_id in self.credits:
+            batch.add(user, amount, tx_type=tx_type, meta=meta, source_type=source_type, source_id=source_id)
+        self.assertEqual(batch.post(), len(self.credits))
+        self.assertEqual(len(batch), 0)
+
+    def _snapshot(self):
+        wallets = sorted(
+            Wallet.objects.values_list("user_id", "balance", "main_balance", "withdrawable_balance")
+        )
+        rows = sorted(
+            (t.user_id, t.amount, t.balance_after, t.type, t.source_type, t.source_id, json.dumps(t.meta, sort_keys=True))
+            for t in WalletTransaction.objects.all()
+        )
+        taxes = sorted(
+            TaxPoolEntry.objects.values_list("company_user_id", "from_user_id", "amount", "source_type", "source_id")
+        )
+        return wallets, rows, taxes
+
+    def _reset(self):
+        TaxPoolEntry.objects.all().delete()
+        WalletTransaction.objects.all().delete()
+        EarningsRollup.objects.all().delete()
+        Wallet.objects.all().delete()
+
+    def _assert_matches_per_credit(self, post):
+        self._per_credit()
+        expected = self._snapshot()
+        self._reset()
+
+        post()
+        self.assertEqual(self._snapshot(), expected)
+        return expected
+
+    def test_bulk_post_matches_per_credit_ledger(self):
+        wallets, rows, taxes = self._assert_matches_per_credit(self._batched)
+
+        by_user = {uid: (bal, main, wd) for uid, bal, main, wd in wallets}
+        self.assertEqual(by_user[self.active.pk], (Decimal("175.50"), Decimal("175.50"), Decimal("108.00")))
+        self.assertEqual(by_user[self.inactive.pk], (Decimal("95.00"), Decimal("95.00"), Decimal("0.00")))
+        self.assertEqual(
+            [r[3] for r in rows if r[0] == self.inactive.pk], ["ADJUSTMENT_CREDIT", "DIRECT_REF_BONUS"]
+        )
+        self.assertTrue(all('"pending_due_to_inactive": true' in r[6] for r in rows if r[3] == "DIRECT_REF_BONUS"))
+        self.assertEqual(
+            taxes,
+            [
+                (self.company.pk, self.active.pk, Decimal("12.00"), "ACTIVATION", "11"),
+                (self.company.pk, self.inactive.pk, Decimal("8.00"), "ACTIVATION", "11"),
+            ],
+        )
+
+    def test_failed_bulk_post_falls_back_to_per_credit(self):
+        with mock.patch.object(CommissionBatch, "_post_bulk", side_effect=RuntimeError("bulk failed")):
+            self._assert_matches_per_credit(self._batched)
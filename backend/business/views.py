@@ -550,36 +550,11 @@ class AdminPromoPurchaseApproveView(APIView):
                     CouponCode = None
 
                 if CouponCode is not None:
-                    base_qs = CouponCode.objects.filter(
-                        issued_channel="e_coupon",
-                        value=denom,
-                        status="AVAILABLE",
-                        assigned_agency__isnull=True,
-                        assigned_employee__isnull=True,
-                        assigned_consumer__isnull=True,
-                    )
-                    try:
-                        locking_qs = base_qs.select_for_update(skip_locked=True)
-                    except Exception:
-                        locking_qs = base_qs
-
-                    pick_ids = list(locking_qs.order_by("serial", "id").values_list("id", flat=True)[:need])
-
-                    write_qs = CouponCode.objects.filter(id__in=pick_ids).filter(
-                        issued_channel="e_coupon",
-                        status="AVAILABLE",
-                        assigned_agency__isnull=True,
-                        assigned_employee__isnull=True,
-                        assigned_consumer__isnull=True,
-                    )
-                    affected = write_qs.update(assigned_consumer_id=obj.user_id, status="SOLD")
-                    allocated_ids = pick_ids[:affected] if affected else []
-                    try:
-                        sample_codes = list(
-                            CouponCode.objects.filter(id__in=allocated_ids).values_list("code", flat=True)[:5]
-                        )
-                    except Exception:
-                        sample_codes = []
+                    # Reservation-block allocator: concurrent approvals take codes from different blocks
+                    from coupons.allocator import allocate_pool_codes
+                    picks = allocate_pool_codes(need, value=denom, assigned_consumer_id=obj.user_id, status="SOLD")
+                    allocated_ids = [pid for pid, _ in picks]
+                    sample_codes = [code for _, code in picks[:5]]
 
                     # Debug allocation (150)
                     try:
@@ -604,44 +579,13 @@ class AdminPromoPurchaseApproveView(APIView):
             # Allocate ₹759 e‑coupon(s) for PRIME 759 (one per quantity)
             if is_prime_759:
                 try:
-                    from coupons.models import CouponCode
+                    from coupons.allocator import allocate_pool_codes
                     denom_759 = D("759.00")
-                    base_qs_759 = CouponCode.objects.filter(
-                        issued_channel="e_coupon",
-                        value=denom_759,
-                        status="AVAILABLE",
-                        assigned_agency__isnull=True,
-                        assigned_employee__isnull=True,
-                        assigned_consumer__isnull=True,
-                    )
-                    try:
-                        locking_qs_759 = base_qs_759.select_for_update(skip_locked=True)
-                    except Exception:
-                        locking_qs_759 = base_qs_759
-                    pick_ids_759 = list(
-                        locking_qs_759.order_by("serial", "id").values_list("id", flat=True)[:qty_in]
-                    )
-                    write_qs_759 = CouponCode.objects.filter(id__in=pick_ids_759).filter(
-                        issued_channel="e_coupon",
-                        status="AVAILABLE",
-                        assigned_agency__isnull=True,
-                        assigned_employee__isnull=True,
-                        assigned_consumer__isnull=True,
-                    )
-                    affected_759 = write_qs_759.update(assigned_consumer_id=obj.user_id, status="SOLD")
-                    if affected_759:
-                        allocated_759_count = int(affected_759 or 0)
-                        allocated_ids.extend(pick_ids_759[:allocated_759_count])
-                        try:
-                            sample_codes.extend(
-                                list(
-                                    CouponCode.objects.filter(id__in=pick_ids_759[:allocated_759_count]).values_list(
-                                        "code", flat=True
-                                    )[:5]
-                                )
-                            )
-                        except Exception:
-                            pass
+                    picks_759 = allocate_pool_codes(qty_in, value=denom_759, assigned_consumer_id=obj.user_id, status="SOLD")
+                    if picks_759:
+                        allocated_759_count = len(picks_759)
+                        allocated_ids.extend(pid for pid, _ in picks_759)
+                        sample_codes.extend(code for _, code in picks_759[:5])
                     # Debug allocation (759)
                     try:
                         logger.info("Approve#%s: alloc759 count=%s", obj.id, allocated_759_count)
@@ -815,31 +759,12 @@ class AdminPromoPurchaseApproveView(APIView):
                     # Allocate E‑coupon(s) of ₹759 for each selected monthly box (best‑effort)
                     try:
                         if boxes:
-                            from coupons.models import CouponCode
+                            from coupons.allocator import allocate_pool_codes
                             denom_759 = D("759.00")
-                            base_qs2 = CouponCode.objects.filter(
-                                issued_channel="e_coupon",
-                                value=denom_759,
-                                status="AVAILABLE",
-                                assigned_agency__isnull=True,
-                                assigned_employee__isnull=True,
-                                assigned_consumer__isnull=True,
-                            )
-                            try:
-                                locking2 = base_qs2.select_for_update(skip_locked=True)
-                            except Exception:
-                                locking2 = base_qs2
-                            pick_759 = list(locking2.order_by("serial", "id").values_list("id", flat=True)[: len(boxes)])
-                            affected_759 = CouponCode.objects.filter(id__in=pick_759).filter(
-                                issued_channel="e_coupon",
-                                status="AVAILABLE",
-                                assigned_agency__isnull=True,
-                                assigned_employee__isnull=True,
-                                assigned_consumer__isnull=True,
-                            ).update(assigned_consumer_id=obj.user_id, status="SOLD")
-                            allocated_759_count = int(affected_759 or 0)
+                            picks_759 = allocate_pool_codes(len(boxes), value=denom_759, assigned_consumer_id=obj.user_id, status="SOLD")
+                            allocated_759_count = len(picks_759)
                             if allocated_759_count > 0:
-                                allocated_ids.extend(pick_759[:allocated_759_count])
+                                allocated_ids.extend(pid for pid, _ in picks_759)
                     except Exception:
                         # allocation best‑effort
                         pass
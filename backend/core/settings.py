@@ -212,3 +212,71 @@ NOTIFICATIONS_PUSH_ENABLED = os.environ.get('NOTIFICATIONS_PUSH_ENABLED', 'False
 # Dev-performance flag: skip heavy allocation/distribution during promo purchase approval.
 # Default True in DEBUG to avoid long requests against remote databases; override via env in prod.
 SKIP_HEAVY_ON_APPROVE = os.environ.get('SKIP_HEAVY_ON_APPROVE', 'True' if DEBUG else 'False').lower() in ('1', 'true', 'yes')
+
+# Route withheld commission tax through the append-only TaxPoolEntry table instead of
+# locking the single company wallet on every credit; the worker (process_tasks) rolls it up.
+TAX_POOL_DEFERRED = os.environ.get('TAX_POOL_DEFERRED', 'True').lower() in ('1', 'true', 'yes')
+
+# Background worker (process_tasks): max concurrently RUNNING tasks per type across all workers.
+# Env format: "assign_consumer_count=2,bulk_assign_agencies=1"
+BACKGROUND_TASK_TYPE_LIMITS = {}
+for _spec in (os.environ.get('BACKGROUND_TASK_TYPE_LIMITS', '') or '').split(','):
+    if '=' in _spec:
+        _t, _n = _spec.split('=', 1)
+        try:
+            BACKGROUND_TASK_TYPE_LIMITS[_t.strip()] = max(0, int(_n))
+        except ValueError:
+            pass
+
+# CommissionConfig.get_solo() / CommissionPolicy.load() are cached per process; each process re-checks
+# the config row's version (updated_at) at most this often, so edits made elsewhere converge within it.
+COMMISSION_CONFIG_CACHE_SECONDS = float(os.environ.get('COMMISSION_CONFIG_CACHE_SECONDS', '5'))
+
+# Geo commission recipient index (business.services.geo_recipients): per-process; other processes'
+# changes are picked up within CHECK seconds via the GeoRecipientVersion row, and MAX_AGE forces a
+# rebuild as a backstop for bulk updates that bypass model signals.
+GEO_RECIPIENT_CACHE_SECONDS = float(os.environ.get('GEO_RECIPIENT_CACHE_SECONDS', '30'))
+GEO_RECIPIENT_CACHE_MAX_AGE_SECONDS = float(os.environ.get('GEO_RECIPIENT_CACHE_MAX_AGE_SECONDS', '300'))
+
+# Random e-coupon codes (coupons.codegen): permutation key (defaults to SECRET_KEY; keep it stable)
+# and the largest create-ecoupons batch generated inside the request (larger ones run as a job).
+COUPON_CODE_SECRET = os.environ.get('COUPON_CODE_SECRET', '')
+ECOUPON_SYNC_MAX_CODES = int(os.environ.get('ECOUPON_SYNC_MAX_CODES', '5000'))
+
+# E-coupon reservation blocks (coupons.allocator): CouponCode ids per block. Larger blocks mean fewer
+# carves; smaller ones spread concurrent allocators over more blocks.
+COUPON_STOCK_BLOCK_SPAN = int(os.environ.get('COUPON_STOCK_BLOCK_SPAN', '256'))
+
+# Lucky draw participants report: read the maintained LuckyDrawParticipant table (False = aggregate
+# LuckyDrawEligibility per request, e.g. until `rebuild_lucky_draw_participants` has run).
+LUCKY_DRAW_PARTICIPANT_TABLE = os.environ.get('LUCKY_DRAW_PARTICIPANT_TABLE', 'True').lower() in ('1', 'true', 'yes')
+
+# Notifications unread-count long-poll (notifications/unread-count/wait/): longest wait per request and
+# concurrent waiters per process (each holds a gunicorn thread; 0 disables waiting). Waiters wake on
+# Postgres NOTIFY (jobs.notify CHANNEL_UNREAD). Off by default: with 2 gthreads per worker one open tab
+# would pin half of each process; the endpoint then answers at once and clients poll after retry_after
+# (60s). Enable only with spare threads (gunicorn --threads), sized for the expected open tabs.
+NOTIFICATIONS_LONGPOLL_SECONDS = float(os.environ.get('NOTIFICATIONS_LONGPOLL_SECONDS', '25'))
+NOTIFICATIONS_LONGPOLL_MAX_WAITERS = int(os.environ.get('NOTIFICATIONS_LONGPOLL_MAX_WAITERS', '0'))
+
+# External location lookups (locations.geocache): cache lifetimes for answers with data, "no data"
+# answers and upstream failures, the per-call upstream timeout and the client class (swap in
+# locations.geocache.StubClient to run without network).
+LOCATIONS_LOOKUP_TTL_SECONDS = int(os.environ.get('LOCATIONS_LOOKUP_TTL_SECONDS', str(30 * 86400)))
+LOCATIONS_LOOKUP_NEGATIVE_TTL_SECONDS = int(os.environ.get('LOCATIONS_LOOKUP_NEGATIVE_TTL_SECONDS', '86400'))
+LOCATIONS_LOOKUP_ERROR_TTL_SECONDS = int(os.environ.get('LOCATIONS_LOOKUP_ERROR_TTL_SECONDS', '120'))
+LOCATIONS_LOOKUP_TIMEOUT_SECONDS = float(os.environ.get('LOCATIONS_LOOKUP_TIMEOUT_SECONDS', '6'))
+LOCATIONS_LOOKUP_CLIENT = os.environ.get('LOCATIONS_LOOKUP_CLIENT', 'locations.geocache.HttpClient')
+# Lookups not read for this many days are deleted; the worker queues the prune this often (0 disables either).
+LOCATIONS_LOOKUP_RETENTION_DAYS = int(os.environ.get('LOCATIONS_LOOKUP_RETENTION_DAYS', '90'))
+LOCATIONS_LOOKUP_PRUNE_SECONDS = int(os.environ.get('LOCATIONS_LOOKUP_PRUNE_SECONDS', '86400'))
+
+# Inventory counters (coupons.InventoryCounter): the worker queues `rebuild_inventory_counters` (delta
+# corrections under counter row locks) this often to repair drift (0 disables).
+INVENTORY_RECONCILE_SECONDS = int(os.environ.get('INVENTORY_RECONCILE_SECONDS', str(6 * 3600)))
+
+# Background task status long-poll (jobs/<id>/status/?wait=N): concurrent waiters per process (0 disables
+# waiting). Same trade-off as NOTIFICATIONS_LONGPOLL_MAX_WAITERS: each waiter holds a gunicorn thread
+# (2 workers x 2 threads), so it is off by default and the endpoint answers at once with retry_after=2;
+# clients poll the status every 2s. Enable only with spare threads (gunicorn --threads).
+JOBS_STATUS_LONGPOLL_MAX_WAITERS = int(os.environ.get('JOBS_STATUS_LONGPOLL_MAX_WAITERS', '0'))
@@ -0,0 +1,185 @@
+"""
+Reservation-block allocator for the free e-coupon pool (issued_channel=e_coupon, AVAILABLE, no
+agency/employee/consumer), per denomination and optionally per coupon (season).
+
+  - the id space is cut into fixed spans (COUPON_STOCK_BLOCK_SPAN ids); CouponStockBlock rows are
+    carved lazily for spans that hold pool codes
+  - a caller claims the lowest free block with select_for_update(skip_locked): concurrent callers get
+    different blocks, so they never queue on the same code rows or index pages
+  - inside a block: one pick over [cursor, id_hi] by primary key and one guarded UPDATE; the cursor
+    moves past what was taken
+  - the claim lasts for the caller's transaction; a rollback also rewinds the cursor, so nothing leaks
+  - once no block is left, exhausted blocks that have regained stock (revocations, rolled-back
+    allocations) are rescanned; the old skip_locked scan picks up anything still missing
+
+Must run inside the caller's transaction (allocation and the caller's writes commit together).
+"""
+from __future__ import annotations
+
+from decimal import Decimal
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+
+POOL_FILTER = dict(
+    issued_channel="e_coupon",
+    status="AVAILABLE",
+    assigned_agency__isnull=True,
+    assigned_employee__isnull=True,
+    assigned_consumer__isnull=True,
+)
+CARVE_AHEAD = 16
+RESCAN_LIMIT = 5000
+
+
+class InsufficientStock(Exception):
+    def __init__(self, allocated: int, needed: int):
+        super().__init__(f"allocated {allocated} of {needed}")
+        self.allocated = allocated
+        self.needed = needed
+
+
+def _span() -> int:
+    return max(16, int(getattr(settings, "COUPON_STOCK_BLOCK_SPAN", 256) or 256))
+
+
+def _pool_qs(value: Decimal, coupon_id: int):
+    from coupons.models import CouponCode
+
+    qs = CouponCode.objects.filter(value=value, **POOL_FILTER)
+    if coupon_id:
+        qs = qs.filter(coupon_id=coupon_id)
+    return qs
+
+
+def _block(value: Decimal, coupon_id: int, block_no: int, span: int):
+    from coupons.models import CouponStockBlock
+
+    lo = block_no * span
+    return CouponStockBlock(value=value, coupon_id=coupon_id, block_no=block_no, id_lo=lo, id_hi=lo + span - 1, cursor=lo)
+
+
+def _carve(value: Decimal, coupon_id: int) -> int:
+    """
+    Create blocks for the next spans (after the highest carved one) that contain pool codes.
+    """
+    from coupons.models import CouponStockBlock
+
+    span = _span()
+    last = CouponStockBlock.objects.filter(value=value, coupon_id=coupon_id).aggregate(m=Max("block_no"))["m"]
+    probe = (last + 1) * span if last is not None else 0
+    pool = _pool_qs(value, coupon_id)
+    new = []
+    for _ in range(CARVE_AHEAD):
+        first = pool.filter(id__gte=probe).order_by("id").values_list("id", flat=True).first()
+        if first is None:
+            break
+        bno = first // span
+        new.append(_block(value, coupon_id, bno, span))
+        probe = (bno + 1) * span
+    if new:
+        CouponStockBlock.objects.bulk_create(new, ignore_conflicts=True)
+    return len(new)
+
+
+def _rescan(value: Decimal, coupon_id: int) -> int:
+    """
+    Reopen (or create) blocks for spans that still hold pool codes. Only runs once carving found
+    nothing, i.e. when the remaining pool is small.
+    """
+    from coupons.models import CouponStockBlock
+
+    span = _span()
+    ids = list(_pool_qs(value, coupon_id).values_list("id", flat=True)[:RESCAN_LIMIT])
+    nos = sorted({i // span for i in ids})
+    if not nos:
+        return 0
+    CouponStockBlock.objects.bulk_create([_block(value, coupon_id, n, span) for n in nos], ignore_conflicts=True)
+    # Locked (in-use) blocks are left alone; they are reopened by a later rescan if still holding stock
+    reopen = list(
+        CouponStockBlock.objects.select_for_update(skip_locked=True)
+        .filter(value=value, coupon_id=coupon_id, exhausted=True, block_no__in=nos)
+        .values_list("id", "id_lo")
+    )
+    for pk, lo in reopen:
+        CouponStockBlock.objects.filter(pk=pk).update(exhausted=False, cursor=lo)
+    return len(nos)
+
+
+def _take(block, value: Decimal, coupon_id: int, k: int, assign: dict) -> List[Tuple[int, str]]:
+    from coupons.models import CouponCode
+
+    picks = list(
+        _pool_qs(value, coupon_id)
+        .filter(id__gte=block.cursor, id__lte=block.id_hi)
+        .select_for_update(skip_locked=True)
+        .order_by("id")
+        .values_list("id", "code")[:k]
+    )
+    if picks:
+        CouponCode.objects.filter(id__in=[pid for pid, _ in picks]).filter(**POOL_FILTER).update(**assign)
+    if len(picks) < k:
+        block.exhausted = True
+        block.cursor = block.id_hi + 1
+    else:
+        block.cursor = picks[-1][0] + 1
+    block.save(update_fields=["cursor", "exhausted", "updated_at"])
+    return picks
+
+
+def _scan(value: Decimal, coupon_id: int, k: int, assign: dict) -> List[Tuple[int, str]]:
+    """
+    Legacy fallback: skip_locked pick in (serial, id) order.
+    """
+    from coupons.models import CouponCode
+
+    picks = list(
+        _pool_qs(value, coupon_id).select_for_update(skip_locked=True).order_by("serial", "id").values_list("id", "code")[:k]
+    )
+    if picks:
+        CouponCode.objects.filter(id__in=[pid for pid, _ in picks]).filter(**POOL_FILTER).update(**assign)
+    return picks
+
+
+def allocate_pool_codes(n: int, *, value, coupon_id: Optional[int] = None, exact: bool = False, **assign) -> List[Tuple[int, str]]:
+    """
+    Move up to n free e-coupons of denomination `value` (optionally of one coupon) to the state given by
+    assign (e.g. assigned_consumer_id=..., status="SOLD"). Returns [(id, code)] actually allocated.
+    exact=True allocates all n or nothing (raises InsufficientStock; partial work is rolled back).
+    """
+    from coupons.models import CouponStockBlock, _inventory_value
+
+    n = int(n or 0)
+    if n <= 0:
+        return []
+    value = _inventory_value(value)
+    coupon_id = int(coupon_id or 0)
+    got: List[Tuple[int, str]] = []
+    with transaction.atomic():
+        carved = rescanned = False
+        while len(got) < n:
+            block = (
+                CouponStockBlock.objects.select_for_update(skip_locked=True)
+                .filter(value=value, coupon_id=coupon_id, exhausted=False)
+                .order_by("block_no")
+                .first()
+            )
+            if block is None:
+                if not carved:
+                    carved = True
+                    if _carve(value, coupon_id):
+                        continue
+                if not rescanned:
+                    rescanned = True
+                    if _rescan(value, coupon_id):
+                        continue
+                break
+            got.extend(_take(block, value, coupon_id, n - len(got), assign))
+            carved = False
+        if len(got) < n:
+            got.extend(_scan(value, coupon_id, n - len(got), assign))
+        if exact and len(got) < n:
+            raise InsufficientStock(len(got), n)
+    return got
@@ -0,0 +1,177 @@
+"""
+Random-looking, collision-free e-coupon codes: PREFIX + 7 chars of A-Z0-9.
+
+  - codes come from a per-prefix sequence (CouponCodeSequence) pushed through a keyed permutation of
+    [0, 36^7): distinct indices give distinct codes, so nothing has to be loaded or retried
+  - permutation: 6-round unbalanced (18/19-bit) Feistel over 37 bits, blake2b round function keyed
+    from COUPON_CODE_SECRET / SECRET_KEY and the prefix, cycle-walking back into the 36^7 domain
+  - generate_codes() streams inserts in chunks: COPY on Postgres, bulk_create elsewhere; codes that
+    already exist (legacy random codes with the same prefix) are skipped and replaced from the sequence
+
+Keep COUPON_CODE_SECRET stable: a new key is a new permutation (still unique within it, and clashes
+with earlier codes are skipped, but the guarantee no longer spans both).
+"""
+from __future__ import annotations
+
+import csv
+import hashlib
+import io
+from decimal import Decimal
+from typing import Callable, Iterator, List, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+SUFFIX_LEN = 7
+DOMAIN = len(ALPHABET) ** SUFFIX_LEN  # 78,364,164,096
+_LEFT_BITS, _RIGHT_BITS = 18, 19  # 2^37 >= DOMAIN; ~1.75 Feistel passes per code on average
+_ROUNDS = 6  # even, so the split is back to (left, right) after each pass
+
+
+class CodePermutation:
+    """
+    Keyed bijection on [0, DOMAIN).
+    """
+
+    def __init__(self, prefix: str, secret: Optional[str] = None):
+        secret = secret if secret is not None else (
+            getattr(settings, "COUPON_CODE_SECRET", "") or settings.SECRET_KEY
+        )
+        self._key = hashlib.blake2b(f"coupon-code:{prefix}".encode(), key=str(secret).encode()[:64]).digest()[:32]
+
+    def _feistel(self, x: int) -> int:
+        key = self._key
+        blake = hashlib.blake2b
+        lbits, rbits = _LEFT_BITS, _RIGHT_BITS
+        left, right = x >> rbits, x & ((1 << rbits) - 1)
+        for i in range(_ROUNDS):
+            f = int.from_bytes(blake(bytes((i,)) + right.to_bytes(3, "big"), key=key, digest_size=4).digest(), "big")
+            # (left, right) of widths (l, r) -> (right, left ^ F(right)) of widths (r, l)
+            left, right = right, left ^ (f & ((1 << lbits) - 1))
+            lbits, rbits = rbits, lbits
+        return (left << rbits) | right
+
+    def permute(self, index: int) -> int:
+        if not 0 <= index < DOMAIN:
+            raise ValueError("index out of range")
+        x = self._feistel(index)
+        # Cycle-walk: a permutation of 2^37 restricted to its orbit through [0, DOMAIN) stays a bijection
+        while x >= DOMAIN:
+            x = self._feistel(x)
+        return x
+
+
+def encode(n: int) -> str:
+    out = []
+    for _ in range(SUFFIX_LEN):
+        n, r = divmod(n, len(ALPHABET))
+        out.append(ALPHABET[r])
+    return "".join(reversed(out))
+
+
+def iter_codes(prefix: str, start: int, count: int, perm: Optional[CodePermutation] = None) -> Iterator[str]:
+    perm = perm or CodePermutation(prefix)
+    for i in range(start, start + count):
+        yield prefix + encode(perm.permute(i))
+
+
+_COPY_COLUMNS = ("code", "coupon_id", "issued_channel", "batch_id", "value", "issued_by_id", "status", "created_at")
+
+
+def _copy_rows(rows: List[tuple]) -> bool:
+    """
+    COPY rows into coupons_couponcode. False when the driver has no COPY API (caller falls back).
+    """
+    from coupons.models import CouponCode
+
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    sql = 'COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(
+        connection.ops.quote_name(CouponCode._meta.db_table),
+        ", ".join(connection.ops.quote_name(c) for c in _COPY_COLUMNS),
+    )
+    with connection.cursor() as cur:
+        raw = cur.cursor
+        if hasattr(raw, "copy_expert"):  # psycopg2
+            buf.seek(0)
+            raw.copy_expert(sql, buf)
+            return True
+        if hasattr(raw, "copy"):  # psycopg 3
+            with raw.copy(sql) as cp:
+                cp.write(buf.getvalue())
+            return True
+    return False
+
+
+def _insert_chunk(codes: List[str], *, coupon, batch, value: Decimal, issued_by) -> int:
+    """
+    Insert codes not already present; returns the number inserted. Runs in its own transaction.
+    """
+    from coupons.models import CouponCode, InventoryCounter, _inventory_keys
+
+    with transaction.atomic():
+        taken = set(CouponCode.objects.filter(code__in=codes).values_list("code", flat=True))
+        fresh = [c for c in codes if c not in taken]
+        if not fresh:
+            return 0
+        copied = False
+        if connection.vendor == "postgresql":
+            now = timezone.now().isoformat()
+            rows = [(c, coupon.pk, "e_coupon", batch.pk, str(value), issued_by.pk, "AVAILABLE", now) for c in fresh]
+            copied = _copy_rows(rows)
+            if copied:
+                # COPY bypasses CouponCodeQuerySet; account for the new pool codes here
+                key = _inventory_keys(("e_coupon", value, batch.pk, "AVAILABLE", None, None, None))[0]
+                InventoryCounter.apply_on_commit({key: len(fresh)})
+        if not copied:
+            CouponCode.objects.bulk_create(
+                [
+                    CouponCode(
+                        code=c,
+                        coupon=coupon,
+                        issued_channel="e_coupon",
+                        batch=batch,
+                        serial=None,
+                        value=value,
+                        issued_by=issued_by,
+                        status="AVAILABLE",
+                    )
+                    for c in fresh
+                ],
+                batch_size=1000,
+            )
+        return len(fresh)
+
+
+def generate_codes(
+    *,
+    coupon,
+    batch,
+    prefix: str,
+    count: int,
+    value: Decimal,
+    issued_by,
+    chunk_size: int = 10000,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> int:
+    """
+    Create count new AVAILABLE e-coupon codes in batch; returns how many were created.
+    Each chunk reserves its own sequence range and commits separately, so a retry after a crash
+    resumes by generating the remainder (callers pass count minus codes already in the batch).
+    """
+    chunk_size = max(1, int(chunk_size))
+    perm = CodePermutation(prefix)
+    from coupons.models import CouponCodeSequence
+
+    created = 0
+    while created < count:
+        want = min(chunk_size, count - created)
+        start = CouponCodeSequence.allocate(prefix, want)
+        if start + want > DOMAIN:
+            raise ValueError(f"Code space exhausted for prefix {prefix}")
+        created += _insert_chunk(list(iter_codes(prefix, start, want, perm)), coupon=coupon, batch=batch, value=value, issued_by=issued_by)
+        if on_progress:
+            on_progress(created, count)
+    return created
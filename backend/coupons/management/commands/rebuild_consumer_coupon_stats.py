@@ -0,0 +1,77 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import transaction
+from django.db.models import Count
+
+from coupons.models import AuditTrail, ConsumerCouponStats, CouponCode, _inventory_value
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute ConsumerCouponStats (owned/redeemed/activated/transferred per consumer and denomination) "
+        "from CouponCode and AuditTrail with grouped scans. Safe to re-run; use after writes that bypass the "
+        "ORM. Run in a quiet window: activity committed during the scan can be overwritten."
+    )
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument("--batch-size", type=int, default=2000, help="bulk upsert batch size (default: 2000)")
+        parser.add_argument("--dry-run", action="store_true", help="Report changes only; do not write.")
+        parser.add_argument("--if-empty", action="store_true", help="Only run when no stats rows exist yet (deploy hook).")
+
+    def handle(self, *args, **options):
+        batch_size = max(1, int(options.get("batch_size") or 2000))
+        dry_run = bool(options.get("dry_run"))
+
+        if options.get("if_empty") and ConsumerCouponStats.objects.exists():
+            self.stdout.write("Stats present; skipping (--if-empty).")
+            return
+
+        fields = ConsumerCouponStats.FIELDS
+        expected = defaultdict(lambda: dict.fromkeys(fields, 0))
+
+        codes = (
+            CouponCode.objects.filter(issued_channel="e_coupon", assigned_consumer__isnull=False, status__in=("SOLD", "REDEEMED"))
+            .order_by()
+            .values_list("assigned_consumer_id", "value", "status")
+            .annotate(n=Count("id"))
+        )
+        for uid, value, st, n in codes.iterator(chunk_size=5000):
+            expected[(uid, _inventory_value(value))][ConsumerCouponStats._STATUS_FIELDS[st]] += n
+
+        audits = AuditTrail.objects.filter(actor__isnull=False).order_by()
+        # Mirrors the post_save receiver: activations count once per (actor, code); code-less rows each count
+        grouped = (
+            (audits.filter(action="coupon_activated", coupon_code__isnull=False), "activated", Count("coupon_code_id", distinct=True)),
+            (audits.filter(action="coupon_activated", coupon_code__isnull=True), "activated", Count("id")),
+            (audits.filter(action="consumer_transfer"), "transferred", Count("id")),
+        )
+        for qs, field, agg in grouped:
+            for uid, value, n in qs.values_list("actor_id", "coupon_code__value").annotate(n=agg).iterator(chunk_size=5000):
+                expected[(uid, _inventory_value(value))][field] += n
+
+        existing = {
+            (r[0], r[1]): dict(zip(fields, r[2:]))
+            for r in ConsumerCouponStats.objects.values_list("user_id", "value", *fields)
+        }
+        changed = []
+        for key in set(expected) | set(existing):
+            want = expected.get(key) or dict.fromkeys(fields, 0)
+            if existing.get(key) == want:
+                continue
+            changed.append(ConsumerCouponStats(user_id=key[0], value=key[1], **want))
+
+        self.stdout.write(self.style.NOTICE(
+            f"rows={len(expected)} existing={len(existing)} changed={len(changed)}"
+        ))
+        if not dry_run:
+            for i in range(0, len(changed), batch_size):
+                with transaction.atomic():
+                    ConsumerCouponStats.objects.bulk_create(
+                        changed[i:i + batch_size],
+                        update_conflicts=True,
+                        unique_fields=["user", "value"],
+                        update_fields=[*fields, "updated_at"],
+                    )
+
+        self.stdout.write(self.style.SUCCESS(f"Done. dry_run={dry_run}"))
@@ -0,0 +1,44 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db.models import Count
+
+from coupons.models import INVENTORY_FIELDS, CouponCode, InventoryCounter, _inventory_keys
+
+
+def expected_counts() -> Counter:
+    """
+    Counter key -> number of CouponCode rows in that bucket, from one grouped scan.
+    """
+    expected = Counter()
+    rows = CouponCode.objects.order_by().values_list(*INVENTORY_FIELDS).annotate(n=Count("id"))
+    for row in rows.iterator(chunk_size=5000):
+        n = row[-1]
+        for key in _inventory_keys(row[:-1]):
+            expected[key] += n
+    return expected
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconcile InventoryCounter rows (per holder/channel/value/batch/status) with CouponCode using one "
+        "grouped scan. Corrections are added as deltas while the counter rows are locked, so counter "
+        "updates from concurrent allocations are kept. Safe to re-run; the worker queues it periodically."
+    )
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument("--dry-run", action="store_true", help="Report changes only; do not write.")
+        parser.add_argument("--if-empty", action="store_true", help="Only run when no counters exist yet (deploy hook).")
+
+    def handle(self, *args, **options):
+        dry_run = bool(options.get("dry_run"))
+
+        if options.get("if_empty") and InventoryCounter.objects.exists():
+            self.stdout.write("Counters present; skipping (--if-empty).")
+            return
+
+        corrections = InventoryCounter.reconcile(expected_counts, dry_run=dry_run)
+        self.stdout.write(self.style.NOTICE(
+            f"changed={len(corrections)} net={sum(corrections.values())}"
+        ))
+        self.stdout.write(self.style.SUCCESS(f"Done. dry_run={dry_run}"))
@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import transaction
+
+from coupons.models import LuckyDrawEligibility, LuckyDrawParticipant
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild LuckyDrawParticipant rows (per season and user) from LuckyDrawEligibility with one "
+        "GROUP BY per season, streamed in user order. Safe to re-run."
+    )
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument("--coupon", type=int, help="Only this Season (Coupon master) id.")
+        parser.add_argument("--batch-size", type=int, default=2000, help="bulk upsert batch size (default: 2000)")
+        parser.add_argument("--dry-run", action="store_true", help="Count rows only; do not write.")
+        parser.add_argument("--if-empty", action="store_true", help="Only run when no participant rows exist yet (deploy hook).")
+
+    def handle(self, *args, **options):
+        batch_size = max(1, int(options.get("batch_size") or 2000))
+        dry_run = bool(options.get("dry_run"))
+
+        if options.get("if_empty") and LuckyDrawParticipant.objects.exists():
+            self.stdout.write("Participants present; skipping (--if-empty).")
+            return
+
+        seasons = set(LuckyDrawEligibility.objects.order_by().values_list("coupon_id", flat=True).distinct())
+        seasons |= set(LuckyDrawParticipant.objects.order_by().values_list("coupon_id", flat=True).distinct())
+        if options.get("coupon"):
+            seasons &= {options["coupon"]}
+
+        total = 0
+        fields = ["has_150", "has_759", "eligible", "created_at_150", "created_at_759", "updated_at"]
+        for coupon_id in sorted(seasons):
+            rows = LuckyDrawParticipant.aggregate(
+                LuckyDrawEligibility.objects.filter(coupon_id=coupon_id)
+            ).order_by("user_id")
+            seen = 0
+            buf = []
+
+            def flush():
+                if buf and not dry_run:
+                    with transaction.atomic():
+                        LuckyDrawParticipant.objects.bulk_create(
+                            buf, update_conflicts=True, unique_fields=["coupon", "user"], update_fields=fields
+                        )
+                buf.clear()
+
+            for row in rows.iterator(chunk_size=5000):
+                buf.append(LuckyDrawParticipant.from_row(coupon_id, row))
+                seen += 1
+                if len(buf) >= batch_size:
+                    flush()
+            flush()
+            # Drop rows whose eligibility is gone
+            stale = LuckyDrawParticipant.objects.filter(coupon_id=coupon_id).exclude(
+                user_id__in=LuckyDrawEligibility.objects.filter(coupon_id=coupon_id).values("user_id")
+            )
+            stale_n = stale.count()
+            if stale_n and not dry_run:
+                stale.delete()
+            total += seen
+            self.stdout.write(f"  season={coupon_id} participants={seen} stale={stale_n}")
+
+        self.stdout.write(self.style.SUCCESS(f"Done. participants={total} dry_run={dry_run}"))
@@ -0,0 +1,30 @@
+# Generated by Django 6.1.2 on 2026-10-17 03:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coupons', '0010_couponcode_coupons_cou_issued__5c9e40_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('holder_role', models.CharField(choices=[('pool', 'pool'), ('agency', 'agency'), ('employee', 'employee'), ('consumer', 'consumer')], max_length=16)),
+                ('holder_id', models.BigIntegerField(default=0)),
+                ('channel', models.CharField(blank=True, default='', max_length=20)),
+                ('value', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('batch_id', models.BigIntegerField(default=0)),
+                ('status', models.CharField(max_length=20)),
+                ('count', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('holder_role', 'holder_id', 'status', 'value', 'batch_id', 'channel'), name='uniq_inventory_counter_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.1.2 on 2026-10-17 03:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coupons', '0012_couponcodesequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CouponStockBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('coupon_id', models.BigIntegerField(default=0)),
+                ('block_no', models.BigIntegerField()),
+                ('id_lo', models.BigIntegerField()),
+                ('id_hi', models.BigIntegerField()),
+                ('cursor', models.BigIntegerField()),
+                ('exhausted', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['value', 'coupon_id', 'exhausted', 'block_no'], name='coupon_stock_block_pick_idx')],
+                'constraints': [models.UniqueConstraint(fields=('value', 'coupon_id', 'block_no'), name='uniq_coupon_stock_block')],
+            },
+        ),
+    ]
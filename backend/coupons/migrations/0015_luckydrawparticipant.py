@@ -0,0 +1,50 @@
+# Generated by Django 6.1.2 on 2026-10-17 03:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coupons', '0014_consumercouponstats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LuckyDrawParticipant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('has_150', models.BooleanField(default=False)),
+                ('has_759', models.BooleanField(default=False)),
+                ('eligible', models.BooleanField(default=False)),
+                ('created_at_150', models.DateTimeField(blank=True, null=True)),
+                ('created_at_759', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='luckydraweligibility',
+            index=models.Index(fields=['coupon', 'user'], name='luckyelig_coupon_user_idx'),
+        ),
+        migrations.AddField(
+            model_name='luckydrawparticipant',
+            name='coupon',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lucky_draw_participants', to='coupons.coupon'),
+        ),
+        migrations.AddField(
+            model_name='luckydrawparticipant',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lucky_draw_participations', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='luckydrawparticipant',
+            index=models.Index(fields=['coupon', 'eligible', 'user'], name='luckypart_coupon_elig_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='luckydrawparticipant',
+            constraint=models.UniqueConstraint(fields=('coupon', 'user'), name='uniq_lucky_draw_participant'),
+        ),
+    ]
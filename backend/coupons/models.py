@@ -1,3 +1,7 @@
+import logging
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
@@ -5,6 +9,8 @@ from django.utils import timezone
 
 UserModel = settings.AUTH_USER_MODEL
 
+logger = logging.getLogger(__name__)
+
 # Optional Cloudinary storages for images/files (align with uploads app pattern)
 try:
     from cloudinary_storage.storage import RawMediaCloudinaryStorage, MediaCloudinaryStorage
@@ -33,6 +39,185 @@ class Coupon(models.Model):
         return f"{self.code} - {self.title}"
 
 
+# CouponCode columns that place a code in InventoryCounter buckets (attnames, in key-row order)
+INVENTORY_FIELDS = (
+    "issued_channel",
+    "value",
+    "batch_id",
+    "status",
+    "assigned_agency_id",
+    "assigned_employee_id",
+    "assigned_consumer_id",
+)
+# update()/save(update_fields=...) names -> attname
+_INVENTORY_NAMES = {f: f for f in INVENTORY_FIELDS}
+_INVENTORY_NAMES.update({f[:-3]: f for f in INVENTORY_FIELDS if f.endswith("_id")})
+
+
+def _inventory_value(v) -> Decimal:
+    try:
+        return Decimal(str(v if v is not None else 0)).quantize(Decimal("0.01"))
+    except (InvalidOperation, TypeError, ValueError):
+        return Decimal("0.00")
+
+
+def _inventory_keys(row) -> list:
+    """
+    Counter keys (holder_role, holder_id, channel, value, batch_id, status) a code contributes to.
+    row: values in INVENTORY_FIELDS order. A code counts once for each of its agency/employee/consumer
+    holders, or once in the unowned "pool" bucket.
+    """
+    channel, value, batch_id, status, agency_id, employee_id, consumer_id = row
+    base = (channel or "", _inventory_value(value), int(batch_id or 0), status or "")
+    keys = []
+    if agency_id:
+        keys.append(("agency", int(agency_id)) + base)
+    if employee_id:
+        keys.append(("employee", int(employee_id)) + base)
+    if consumer_id:
+        keys.append(("consumer", int(consumer_id)) + base)
+    if not keys:
+        keys.append(("pool", 0) + base)
+    return keys
+
+
+def _inventory_delta(before, after) -> Counter:
+    delta = Counter()
+    for row in before:
+        for k in _inventory_keys(row):
+            delta[k] -= 1
+    for row in after:
+        for k in _inventory_keys(row):
+            delta[k] += 1
+    return delta
+
+
+def _inventory_group_delta(rows, new_vals: dict) -> Counter:
+    """
+    rows: INVENTORY_FIELDS values of the updated rows; new_vals: {attname: value} written to all of them.
+    """
+    delta = Counter()
+    for row, n in Counter(rows).items():
+        after = [new_vals.get(f, v) for f, v in zip(INVENTORY_FIELDS, row)]
+        for k in _inventory_keys(row):
+            delta[k] -= n
+        for k in _inventory_keys(after):
+            delta[k] += n
+    return delta
+
+
+class CouponCodeQuerySet(models.QuerySet):
+    """
+    Keeps InventoryCounter in sync for bulk writes: update() (also used by bulk_update()) and bulk_create().
+    Single-row save() is handled by CouponCode.save(), deletes by the post_delete receiver.
+    Deltas are applied after commit (InventoryCounter.apply_on_commit).
+    """
+    CHUNK = 2000
+
+    def _locked_rows(self) -> list:
+        """
+        (pk, *INVENTORY_FIELDS) of the matched rows, locked until the caller's transaction ends; rows a
+        concurrent writer took out of the filter first are not returned.
+        """
+        from django.db import connections
+
+        if connections[self.db].features.has_select_for_update_of:
+            locking = self.select_for_update(of=("self",))
+        else:
+            locking = self.select_for_update()
+        return list(locking.order_by().values_list("pk", *INVENTORY_FIELDS))
+
+    def _update_locked(self, ids, **kwargs) -> int:
+        updated = 0
+        for i in range(0, len(ids), self.CHUNK):
+            chunk_qs = self.model._base_manager.using(self.db).filter(pk__in=ids[i:i + self.CHUNK])
+            updated += models.QuerySet.update(chunk_qs, **kwargs)
+        return updated
+
+    def update(self, **kwargs):
+        touched = {_INVENTORY_NAMES[k] for k in kwargs if k in _INVENTORY_NAMES}
+        if not touched:
+            return super().update(**kwargs)
+        if any(hasattr(kwargs[k], "resolve_expression") for k in kwargs if k in _INVENTORY_NAMES):
+            return self._update_reading_rows(**kwargs)
+        from django.db import transaction
+
+        new_vals = {_INVENTORY_NAMES[k]: getattr(v, "pk", v) for k, v in kwargs.items() if k in _INVENTORY_NAMES}
+        with transaction.atomic(using=self.db):
+            # Lock the matched rows and write exactly those, so the delta covers the rows actually updated
+            # (a concurrent allocation that won some of them is excluded here rather than double counted)
+            before = self._locked_rows()
+            if not before:
+                return 0
+            updated = self._update_locked([r[0] for r in before], **kwargs)
+            InventoryCounter.apply_on_commit(_inventory_group_delta([r[1:] for r in before], new_vals), using=self.db)
+        return updated
+
+    def _update_reading_rows(self, **kwargs):
+        """
+        update() with expressions in inventory columns: the new values are only known after the write,
+        so matched rows are locked and re-read.
+        """
+        from django.db import transaction
+
+        with transaction.atomic(using=self.db):
+            before = self._locked_rows()
+            if not before:
+                return 0
+            ids = [r[0] for r in before]
+            updated = self._update_locked(ids, **kwargs)
+
+            after = []
+            for i in range(0, len(ids), self.CHUNK):
+                after.extend(
+                    self.model._base_manager.using(self.db)
+                    .filter(pk__in=ids[i:i + self.CHUNK])
+                    .values_list("pk", *INVENTORY_FIELDS)
+                )
+            InventoryCounter.apply_on_commit(_inventory_delta([r[1:] for r in before], [r[1:] for r in after]), using=self.db)
+        return updated
+
+    def bulk_create(self, objs, batch_size=None, ignore_conflicts=False, update_conflicts=False, update_fields=None, unique_fields=None):
+        objs = list(objs)
+        if not objs:
+            return objs
+        from django.db import transaction
+
+        with transaction.atomic(using=self.db):
+            existing = {}
+            if ignore_conflicts or update_conflicts:
+                codes = [o.code for o in objs]
+                for i in range(0, len(codes), self.CHUNK):
+                    for row in self.model._base_manager.using(self.db).filter(code__in=codes[i:i + self.CHUNK]).values_list("code", *INVENTORY_FIELDS):
+                        existing[row[0]] = row[1:]
+            created = super().bulk_create(
+                objs,
+                batch_size=batch_size,
+                ignore_conflicts=ignore_conflicts,
+                update_conflicts=update_conflicts,
+                update_fields=update_fields,
+                unique_fields=unique_fields,
+            )
+            before = list(existing.values()) if update_conflicts else []
+            after = []
+            seen = set()
+            for o in objs:
+                if o.code in seen or o.code in existing:
+                    continue
+                seen.add(o.code)
+                after.append(o._inventory_row())
+            if update_conflicts and existing:
+                # Conflicting rows now hold whatever the upsert wrote; re-read them
+                codes = list(existing)
+                for i in range(0, len(codes), self.CHUNK):
+                    after.extend(
+                        row[1:] for row in self.model._base_manager.using(self.db)
+                        .filter(code__in=codes[i:i + self.CHUNK]).values_list("code", *INVENTORY_FIELDS)
+                    )
+            InventoryCounter.apply_on_commit(_inventory_delta(before, after), using=self.db)
+        return created
+
+
 class CouponCode(models.Model):
     CHANNEL_CHOICES = (
         ("physical", "Physical"),
@@ -61,6 +246,8 @@ class CouponCode(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="AVAILABLE", db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = CouponCodeQuerySet.as_manager()
+
     class Meta:
         ordering = ["-created_at"]
         indexes = [
@@ -78,6 +265,29 @@ class CouponCode(models.Model):
     def __str__(self):
         return f"{self.code} [{self.status}]"
 
+    def _inventory_row(self) -> tuple:
+        return tuple(getattr(self, f) for f in INVENTORY_FIELDS)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        touched = None
+        if update_fields is not None:
+            touched = {_INVENTORY_NAMES[f] for f in update_fields if f in _INVENTORY_NAMES}
+            if not touched:
+                return super().save(*args, **kwargs)
+        from django.db import transaction
+
+        with transaction.atomic():
+            old = None
+            if not self._state.adding and self.pk:
+                # The row as it is now (not as this instance loaded it), locked until the save commits
+                old = type(self)._base_manager.select_for_update().filter(pk=self.pk).values_list(*INVENTORY_FIELDS).first()
+            super().save(*args, **kwargs)
+            new = self._inventory_row()
+            if touched is not None and old is not None:
+                new = tuple(new[i] if f in touched else old[i] for i, f in enumerate(INVENTORY_FIELDS))
+            InventoryCounter.apply_on_commit(_inventory_delta([old] if old else [], [new]))
+
     def mark_assigned(self, employee):
         # Backwards compatibility: assign to employee
         self.assigned_employee = employee
@@ -100,6 +310,253 @@ class CouponCode(models.Model):
         self.status = "REDEEMED"
 
 
+class InventoryCounter(models.Model):
+    """
+    Maintained CouponCode counts per bucket, so pool availability and agency dashboards are
+    single-row (or few-row) lookups instead of COUNT(*) over CouponCode.
+      - holder_role/holder_id: "agency"/"employee"/"consumer" + user id from the code's assigned_* columns
+        (a code counts once per holder it has), or "pool"/0 for unowned codes
+      - channel, value, batch_id (0 = no batch), status: the code's own columns
+
+    Kept in sync by CouponCodeQuerySet.update()/bulk_create(), CouponCode.save() and the post_delete
+    receiver, applied after the writing transaction commits (counter rows, e.g. the pool bucket every
+    allocation touches, stay locked only for their own UPDATE). Raw SQL bypasses them; the worker runs
+    `rebuild_inventory_counters` every INVENTORY_RECONCILE_SECONDS, which adds corrections as deltas
+    (see reconcile()).
+    Note: an agency's ASSIGNED_AGENCY count is its assignable pool as long as such codes carry no
+    employee/consumer (the allocation paths keep that invariant); pickers still filter exactly.
+    """
+    ROLE_CHOICES = (
+        ("pool", "pool"),
+        ("agency", "agency"),
+        ("employee", "employee"),
+        ("consumer", "consumer"),
+    )
+    KEY_FIELDS = ("holder_role", "holder_id", "channel", "value", "batch_id", "status")
+
+    holder_role = models.CharField(max_length=16, choices=ROLE_CHOICES)
+    holder_id = models.BigIntegerField(default=0)
+    channel = models.CharField(max_length=20, blank=True, default="")
+    value = models.DecimalField(max_digits=8, decimal_places=2)
+    batch_id = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=20)
+    count = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["holder_role", "holder_id", "status", "value", "batch_id", "channel"], name="uniq_inventory_counter_key"),
+        ]
+
+    def __str__(self):
+        return f"{self.holder_role}:{self.holder_id} {self.channel} ₹{self.value} b{self.batch_id} {self.status}={self.count}"
+
+    @classmethod
+    def apply(cls, deltas, stats: bool = True) -> None:
+        """
+        Add {key: delta} (key in KEY_FIELDS order) to the counters; rows are created on first use.
+        Keys are applied in sorted order so concurrent writers lock counter rows consistently.
+        stats=False leaves ConsumerCouponStats alone (counter-only corrections).
+        """
+        from django.db import IntegrityError, transaction
+        from django.db.models import F
+
+        for key in sorted(k for k, d in deltas.items() if d):
+            d = deltas[key]
+            lookup = dict(zip(cls.KEY_FIELDS, key))
+            now = timezone.now()
+            if cls.objects.filter(**lookup).update(count=F("count") + d, updated_at=now):
+                continue
+            try:
+                with transaction.atomic():
+                    cls.objects.create(count=d, **lookup)
+            except IntegrityError:
+                cls.objects.filter(**lookup).update(count=F("count") + d, updated_at=now)
+        if stats:
+            ConsumerCouponStats.apply_inventory(deltas)
+
+    @classmethod
+    def reconcile(cls, expected_fn, dry_run: bool = False) -> Counter:
+        """
+        Bring counters to expected_fn() (a Counter of key -> code count) by adding `expected - existing`
+        as deltas, never by overwriting counts. Existing counter rows are locked first, so deltas from
+        writes committing meanwhile wait and then add on top instead of being lost. Returns the
+        corrections (applied unless dry_run).
+        """
+        from django.db import transaction
+
+        with transaction.atomic():
+            existing = {
+                tuple(r[:-1]): r[-1]
+                for r in cls.objects.select_for_update().order_by(*cls.KEY_FIELDS).values_list(*cls.KEY_FIELDS, "count")
+            }
+            expected = expected_fn()
+            corrections = Counter()
+            for key in set(expected) | set(existing):
+                d = int(expected.get(key, 0)) - int(existing.get(key, 0))
+                if d:
+                    corrections[key] = d
+            if corrections and not dry_run:
+                cls.apply(corrections, stats=False)
+        return corrections
+
+    @classmethod
+    def apply_on_commit(cls, deltas, using=None) -> None:
+        """
+        apply() once the caller's transaction commits, in its own short transaction (immediately in
+        autocommit). Writes that roll back never reach the counters.
+        """
+        from django.db import transaction
+
+        deltas = Counter({k: d for k, d in deltas.items() if d})
+        if not deltas:
+            return
+
+        def _apply():
+            try:
+                with transaction.atomic(using=using):
+                    cls.apply(deltas)
+            except Exception:
+                # Reconciled by the periodic `rebuild_inventory_counters`
+                logger.exception("InventoryCounter apply failed for %s buckets", len(deltas))
+
+        transaction.on_commit(_apply, using=using)
+
+    @classmethod
+    def _filtered(cls, holder_role: str, holder_id=0, status=None, value=None, batch_id=None, channel=None):
+        qs = cls.objects.filter(holder_role=holder_role, holder_id=int(holder_id or 0))
+        if status:
+            qs = qs.filter(status=status)
+        if value is not None:
+            qs = qs.filter(value=_inventory_value(value))
+        if batch_id:
+            qs = qs.filter(batch_id=int(batch_id))
+        if channel:
+            qs = qs.filter(channel=channel)
+        return qs
+
+    @classmethod
+    def total(cls, holder_role: str, holder_id=0, status=None, value=None, batch_id=None, channel=None) -> int:
+        from django.db.models import Sum
+        qs = cls._filtered(holder_role, holder_id, status=status, value=value, batch_id=batch_id, channel=channel)
+        return max(0, int(qs.aggregate(n=Sum("count")).get("n") or 0))
+
+    @classmethod
+    def by_status(cls, holder_role: str, holder_id=0, **filters) -> dict:
+        from django.db.models import Sum
+        rows = cls._filtered(holder_role, holder_id, **filters).values("status").annotate(n=Sum("count"))
+        return {r["status"]: max(0, int(r["n"] or 0)) for r in rows}
+
+    @classmethod
+    def pool_available(cls, user, value=None, batch_id=None) -> int:
+        """
+        Codes an employee (ASSIGNED_EMPLOYEE) or agency (ASSIGNED_AGENCY) can hand out by count.
+        """
+        role = getattr(user, "role", None)
+        category = getattr(user, "category", None) or ""
+        if role == "employee" or category == "employee":
+            return cls.total("employee", user.pk, status="ASSIGNED_EMPLOYEE", value=value, batch_id=batch_id)
+        return cls.total("agency", user.pk, status="ASSIGNED_AGENCY", value=value, batch_id=batch_id)
+
+
+class ConsumerCouponStats(models.Model):
+    """
+    Per-consumer, per-denomination e-coupon figures behind consumer_summary/consumer_overview:
+      - owned: codes assigned to the consumer with status SOLD
+      - redeemed: codes assigned to the consumer with status REDEEMED
+      - activated: distinct codes the consumer activated (coupon_activated audits)
+      - transferred: consumer_transfer audits by the consumer
+    owned/redeemed follow InventoryCounter.apply(); activated/transferred follow AuditTrail inserts.
+    Audits without a code land in the value 0.00 row (counted in totals only).
+    Reconcile with `rebuild_consumer_coupon_stats`.
+    """
+    FIELDS = ("owned", "redeemed", "activated", "transferred")
+    _STATUS_FIELDS = {"SOLD": "owned", "REDEEMED": "redeemed"}
+
+    user = models.ForeignKey(UserModel, on_delete=models.CASCADE, related_name="coupon_stats")
+    value = models.DecimalField(max_digits=8, decimal_places=2)
+    owned = models.IntegerField(default=0)
+    redeemed = models.IntegerField(default=0)
+    activated = models.IntegerField(default=0)
+    transferred = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "value"], name="uniq_consumer_coupon_stats"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} ₹{self.value} owned={self.owned} redeemed={self.redeemed} activated={self.activated} transferred={self.transferred}"
+
+    @classmethod
+    def apply(cls, deltas) -> None:
+        """
+        deltas: {(user_id, value): {field: delta}}. Rows are created on first use; keys are applied in
+        sorted order so concurrent writers lock rows consistently.
+        """
+        from django.db import IntegrityError, transaction
+        from django.db.models import F
+
+        for key in sorted(deltas):
+            changes = {f: d for f, d in deltas[key].items() if d}
+            if not changes:
+                continue
+            user_id, value = key
+            lookup = {"user_id": user_id, "value": value}
+            now = timezone.now()
+            exprs = {f: F(f) + d for f, d in changes.items()}
+            if cls.objects.filter(**lookup).update(updated_at=now, **exprs):
+                continue
+            try:
+                with transaction.atomic():
+                    cls.objects.create(**lookup, **changes)
+            except IntegrityError:
+                cls.objects.filter(**lookup).update(updated_at=now, **exprs)
+
+    @classmethod
+    def apply_inventory(cls, deltas) -> None:
+        """
+        Fold InventoryCounter deltas (consumer-held e-coupons, SOLD/REDEEMED) into owned/redeemed.
+        """
+        out = {}
+        for (role, holder_id, channel, value, _batch, status), d in deltas.items():
+            field = cls._STATUS_FIELDS.get(status)
+            if not d or role != "consumer" or channel != "e_coupon" or not field:
+                continue
+            ent = out.setdefault((int(holder_id), value), {})
+            ent[field] = ent.get(field, 0) + d
+        if out:
+            cls.apply(out)
+
+    @classmethod
+    def summary_for(cls, user) -> dict:
+        """
+        { available, redeemed, activated, transferred, by_value } for My E-Coupons, one indexed read.
+        available = owned minus activated (overall and per value, never negative).
+        """
+        totals = dict.fromkeys(cls.FIELDS, 0)
+        by_value = {}
+        for r in cls.objects.filter(user=user).values("value", *cls.FIELDS):
+            for f in cls.FIELDS:
+                totals[f] += int(r[f] or 0)
+            if not r["value"]:
+                continue
+            by_value[str(r["value"])] = {
+                "available": max(0, int(r["owned"] or 0) - int(r["activated"] or 0)),
+                "redeemed": int(r["redeemed"] or 0),
+                "activated": int(r["activated"] or 0),
+                "transferred": int(r["transferred"] or 0),
+            }
+        return {
+            "available": max(0, totals["owned"] - totals["activated"]),
+            "redeemed": totals["redeemed"],
+            "activated": totals["activated"],
+            "transferred": totals["transferred"],
+            "by_value": by_value,
+        }
+
+
 class CouponAssignment(models.Model):
     ASSIGNMENT_STATUS = (
         ("ASSIGNED", "ASSIGNED"),
@@ -215,6 +672,71 @@ class CouponBatch(models.Model):
         return f"{self.prefix}{str(self.serial_start).zfill(self.serial_width)}-{self.prefix}{str(self.serial_end).zfill(self.serial_width)}"
 
 
+class CouponCodeSequence(models.Model):
+    """
+    Per-prefix counter feeding coupons.codegen: every generated code consumes one index, and the
+    keyed permutation maps distinct indices to distinct codes. Ranges are handed out with allocate().
+    """
+    prefix = models.CharField(max_length=20, unique=True)
+    next_index = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.prefix} next={self.next_index}"
+
+    @classmethod
+    def allocate(cls, prefix: str, n: int) -> int:
+        """
+        Reserve n consecutive indices for prefix and return the first one (committed on its own, so a
+        failed insert only leaves a gap).
+        """
+        from django.db import IntegrityError, transaction
+
+        n = max(0, int(n))
+        with transaction.atomic():
+            seq = cls.objects.select_for_update().filter(prefix=prefix).first()
+            if seq is None:
+                try:
+                    with transaction.atomic():
+                        seq = cls.objects.create(prefix=prefix)
+                except IntegrityError:
+                    pass
+                seq = cls.objects.select_for_update().get(prefix=prefix)
+            start = int(seq.next_index)
+            seq.next_index = start + n
+            seq.save(update_fields=["next_index", "updated_at"])
+        return start
+
+
+class CouponStockBlock(models.Model):
+    """
+    Reservation block over the free e-coupon pool (coupons.allocator): a fixed span of CouponCode ids
+    for one (value, coupon) pool, with a cursor. Allocators claim a block with
+    select_for_update(skip_locked), so concurrent callers work on different blocks. A block stays
+    reserved until the claiming transaction ends (commit or rollback; a rollback also rewinds cursor).
+    coupon_id = 0 is the any-coupon pool for the denomination.
+    """
+    value = models.DecimalField(max_digits=8, decimal_places=2)
+    coupon_id = models.BigIntegerField(default=0)
+    block_no = models.BigIntegerField()
+    id_lo = models.BigIntegerField()
+    id_hi = models.BigIntegerField()
+    cursor = models.BigIntegerField()
+    exhausted = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["value", "coupon_id", "block_no"], name="uniq_coupon_stock_block"),
+        ]
+        indexes = [
+            models.Index(fields=["value", "coupon_id", "exhausted", "block_no"], name="coupon_stock_block_pick_idx"),
+        ]
+
+    def __str__(self):
+        return f"₹{self.value} c{self.coupon_id} #{self.block_no} [{self.cursor}..{self.id_hi}]"
+
+
 class ECouponPaymentConfig(models.Model):
     title = models.CharField(max_length=100)
     upi_qr_image = models.ImageField(upload_to="uploads/ecoupon_payment/", null=True, blank=True, storage=MEDIA_STORAGE)
@@ -371,12 +893,92 @@ class LuckyDrawEligibility(models.Model):
             models.Index(fields=["user"]),
             models.Index(fields=["coupon"]),
             models.Index(fields=["value"]),
+            # participants(): GROUP BY user within a season, walked in user order
+            models.Index(fields=["coupon", "user"], name="luckyelig_coupon_user_idx"),
         ]
 
     def __str__(self):
         return f"Eligible: {getattr(self.user, 'username', self.user_id)} ₹{self.value} @ {getattr(self.coupon, 'title', self.coupon_id)}"
 
 
+class LuckyDrawParticipant(models.Model):
+    """
+    Materialized per-season participant row (one per user with any LuckyDrawEligibility in the season):
+      - created_at_150 / created_at_759: first eligibility timestamps (759 also covers legacy 750)
+      - has_* and eligible (both denominations) derive from them
+    Refreshed from LuckyDrawEligibility on insert/delete; rebuild with `rebuild_lucky_draw_participants`.
+    """
+    VALUES_150 = (Decimal("150"),)
+    VALUES_759 = (Decimal("759"), Decimal("750"))
+
+    coupon = models.ForeignKey(Coupon, on_delete=models.CASCADE, related_name="lucky_draw_participants")
+    user = models.ForeignKey(UserModel, on_delete=models.CASCADE, related_name="lucky_draw_participations")
+    has_150 = models.BooleanField(default=False)
+    has_759 = models.BooleanField(default=False)
+    eligible = models.BooleanField(default=False)
+    created_at_150 = models.DateTimeField(null=True, blank=True)
+    created_at_759 = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["coupon", "user"], name="uniq_lucky_draw_participant"),
+        ]
+        indexes = [
+            models.Index(fields=["coupon", "eligible", "user"], name="luckypart_coupon_elig_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} @ {self.coupon_id} 150={self.has_150} 759={self.has_759}"
+
+    @classmethod
+    def aggregate(cls, eligibility_qs):
+        """
+        GROUP BY user over LuckyDrawEligibility rows -> values(user_id, created_at_150, created_at_759).
+        """
+        from django.db.models import Min, Q
+
+        return (
+            eligibility_qs.order_by()
+            .values("user_id")
+            .annotate(
+                created_at_150=Min("created_at", filter=Q(value__in=cls.VALUES_150)),
+                created_at_759=Min("created_at", filter=Q(value__in=cls.VALUES_759)),
+            )
+        )
+
+    @classmethod
+    def from_row(cls, coupon_id: int, row: dict) -> "LuckyDrawParticipant":
+        has_150 = row["created_at_150"] is not None
+        has_759 = row["created_at_759"] is not None
+        return cls(
+            coupon_id=coupon_id,
+            user_id=row["user_id"],
+            has_150=has_150,
+            has_759=has_759,
+            eligible=has_150 and has_759,
+            created_at_150=row["created_at_150"],
+            created_at_759=row["created_at_759"],
+        )
+
+    @classmethod
+    def refresh(cls, coupon_id: int, user_id: int) -> None:
+        """
+        Recompute one (season, user) row from its (at most a few) eligibility rows.
+        """
+        row = cls.aggregate(LuckyDrawEligibility.objects.filter(coupon_id=coupon_id, user_id=user_id)).order_by("user_id").first()
+        if row is None:
+            cls.objects.filter(coupon_id=coupon_id, user_id=user_id).delete()
+            return
+        obj = cls.from_row(coupon_id, row)
+        cls.objects.bulk_create(
+            [obj],
+            update_conflicts=True,
+            unique_fields=["coupon", "user"],
+            update_fields=["has_150", "has_759", "eligible", "created_at_150", "created_at_759", "updated_at"],
+        )
+
+
 def record_lucky_draw_eligibility_for_code(code: "CouponCode"):
     """
     Idempotently record LuckyDrawEligibility when a code of denomination 150/750/759
@@ -411,9 +1013,57 @@ def record_lucky_draw_eligibility_for_code(code: "CouponCode"):
         pass
 
 # Signals for side-effects on approvals
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from decimal import Decimal
+
+
+@receiver(post_delete, sender=CouponCode)
+def release_inventory_on_code_delete(sender, instance: "CouponCode", **kwargs):
+    try:
+        InventoryCounter.apply_on_commit(_inventory_delta([instance._inventory_row()], []))
+    except Exception:
+        # best-effort; `rebuild_inventory_counters` reconciles
+        pass
+
+
+@receiver(post_save, sender=AuditTrail)
+def update_consumer_stats_on_audit(sender, instance: "AuditTrail", created: bool, **kwargs):
+    """
+    Count coupon_activated (once per actor and code) and consumer_transfer audits in ConsumerCouponStats.
+    """
+    if not created or not instance.actor_id or instance.action not in ("coupon_activated", "consumer_transfer"):
+        return
+    try:
+        field = "activated" if instance.action == "coupon_activated" else "transferred"
+        if field == "activated" and instance.coupon_code_id:
+            repeat = (
+                AuditTrail.objects.filter(action=instance.action, actor_id=instance.actor_id, coupon_code_id=instance.coupon_code_id)
+                .exclude(pk=instance.pk)
+                .exists()
+            )
+            if repeat:
+                return
+        value = None
+        if instance.coupon_code_id:
+            value = CouponCode.objects.filter(pk=instance.coupon_code_id).values_list("value", flat=True).first()
+        ConsumerCouponStats.apply({(instance.actor_id, _inventory_value(value)): {field: 1}})
+    except Exception:
+        # best-effort; `rebuild_consumer_coupon_stats` reconciles
+        pass
+
+
+@receiver(post_save, sender=LuckyDrawEligibility)
+@receiver(post_delete, sender=LuckyDrawEligibility)
+def refresh_lucky_draw_participant(sender, instance: "LuckyDrawEligibility", **kwargs):
+    if kwargs.get("created") is False:
+        return
+    try:
+        from django.db import transaction
+        with transaction.atomic():
+            LuckyDrawParticipant.refresh(instance.coupon_id, instance.user_id)
+    except Exception:
+        # best-effort (never blocks the eligibility write); `rebuild_lucky_draw_participants` reconciles
+        logger.exception("LuckyDrawParticipant refresh failed for coupon=%s user=%s", instance.coupon_id, instance.user_id)
 
 
 @receiver(post_save, sender=CouponSubmission)
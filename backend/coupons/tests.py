@@ -1,3 +1,141 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
 
-# Create your tests here.
+from coupons.models import Coupon, CouponCode, InventoryCounter, LuckyDrawEligibility, LuckyDrawParticipant
+
+
+class LuckyDrawParticipantRefreshTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.issuer = User.objects.create_user(username="issuer", password="x")
+        self.consumer = User.objects.create_user(username="consumer", password="x")
+        self.coupon = Coupon.objects.create(code="SEASON1", title="Season 1", issuer=self.issuer)
+
+    def _participant(self):
+        return LuckyDrawParticipant.objects.filter(coupon=self.coupon, user=self.consumer).first()
+
+    def _eligibility(self, value):
+        return LuckyDrawEligibility.objects.create(user=self.consumer, coupon=self.coupon, value=Decimal(value))
+
+    def test_insert_creates_then_updates_participant(self):
+        self._eligibility("150")
+        p = self._participant()
+        self.assertIsNotNone(p)
+        self.assertTrue(p.has_150)
+        self.assertFalse(p.has_759)
+        self.assertFalse(p.eligible)
+
+        self._eligibility("759")
+        p = self._participant()
+        self.assertTrue(p.has_150)
+        self.assertTrue(p.has_759)
+        self.assertTrue(p.eligible)
+
+    def test_delete_updates_then_removes_participant(self):
+        e150 = self._eligibility("150")
+        e759 = self._eligibility("759")
+
+        e759.delete()
+        p = self._participant()
+        self.assertTrue(p.has_150)
+        self.assertFalse(p.has_759)
+        self.assertFalse(p.eligible)
+
+        e150.delete()
+        self.assertIsNone(self._participant())
+
+
+class InventoryCounterTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.issuer = User.objects.create_user(username="issuer", password="x")
+        self.agency = User.objects.create_user(username="agency", password="x")
+        self.consumer = User.objects.create_user(username="consumer", password="x")
+        self.coupon = Coupon.objects.create(code="INV1", title="Inventory", issuer=self.issuer)
+
+    def _code(self, code, **kwargs):
+        kwargs.setdefault("issued_channel", "e_coupon")
+        return CouponCode(code=code, coupon=self.coupon, issued_by=self.issuer, value=Decimal("150"), **kwargs)
+
+    def _count(self, role, holder_id=0, status="AVAILABLE"):
+        return InventoryCounter.total(role, holder_id, status=status)
+
+    def _expected(self):
+        from coupons.management.commands.rebuild_inventory_counters import expected_counts
+
+        return {k: v for k, v in expected_counts().items() if v}
+
+    def _counters(self):
+        return {tuple(r[:-1]): r[-1] for r in InventoryCounter.objects.exclude(count=0).values_list(*InventoryCounter.KEY_FIELDS, "count")}
+
+    def test_bulk_create_update_save_delete_keep_counters_exact(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            CouponCode.objects.bulk_create([self._code(f"C{i}") for i in range(5)])
+        self.assertEqual(self._count("pool"), 5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            n = CouponCode.objects.filter(code__in=["C0", "C1", "C2"]).update(assigned_agency=self.agency, status="ASSIGNED_AGENCY")
+        self.assertEqual(n, 3)
+        self.assertEqual(self._count("pool"), 2)
+        self.assertEqual(self._count("agency", self.agency.id, "ASSIGNED_AGENCY"), 3)
+
+        # Rows no longer matching the filter are neither updated nor counted
+        with self.captureOnCommitCallbacks(execute=True):
+            n = CouponCode.objects.filter(code__in=["C0", "C3"], status="AVAILABLE").update(status="REVOKED")
+        self.assertEqual(n, 1)
+        self.assertEqual(self._count("pool", status="REVOKED"), 1)
+
+        code = CouponCode.objects.get(code="C1")
+        code.assigned_consumer = self.consumer
+        code.status = "SOLD"
+        with self.captureOnCommitCallbacks(execute=True):
+            code.save(update_fields=["assigned_consumer", "status"])
+        self.assertEqual(self._count("agency", self.agency.id, "ASSIGNED_AGENCY"), 2)
+        self.assertEqual(self._count("agency", self.agency.id, "SOLD"), 1)
+        self.assertEqual(self._count("consumer", self.consumer.id, "SOLD"), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CouponCode.objects.get(code="C4").delete()
+        self.assertEqual(self._count("pool"), 0)
+        self.assertEqual(self._counters(), self._expected())
+
+    def test_rolled_back_write_does_not_reach_counters(self):
+        from django.db import transaction
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CouponCode.objects.bulk_create([self._code("R0")])
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    CouponCode.objects.filter(code="R0").update(status="REVOKED")
+                    raise RuntimeError("rollback")
+            except RuntimeError:
+                pass
+        self.assertEqual(self._count("pool"), 1)
+        self.assertEqual(self._count("pool", status="REVOKED"), 0)
+
+    def test_reconcile_adds_corrections_as_deltas(self):
+        from coupons.management.commands.rebuild_inventory_counters import expected_counts
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CouponCode.objects.bulk_create([self._code(f"D{i}") for i in range(3)])
+        key = ("pool", 0, "e_coupon", Decimal("150.00"), 0, "AVAILABLE")
+        InventoryCounter.objects.update(count=10)
+        stale = ("agency", self.agency.id, "e_coupon", Decimal("150.00"), 0, "SOLD")
+        InventoryCounter.apply({stale: 2}, stats=False)
+
+        corrections = InventoryCounter.reconcile(expected_counts)
+        self.assertEqual(corrections[key], -7)
+        self.assertEqual(corrections[stale], -2)
+        self.assertEqual(self._counters(), self._expected())
+
+        # A delta landing after the scan is added on top rather than overwritten
+        def expected_then_concurrent_delta():
+            expected = expected_counts()
+            InventoryCounter.apply({key: 1}, stats=False)
+            return expected
+
+        InventoryCounter.reconcile(expected_then_concurrent_delta)
+        self.assertEqual(self._count("pool"), 4)
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.utils import timezone
 from django.db import transaction
 from django.db.models import Q, Count, Sum, Value
@@ -23,7 +24,10 @@ from .models import (
     ECouponPaymentConfig,
     ECouponProduct,
     ECouponOrder,
+    InventoryCounter,
+    ConsumerCouponStats,
     LuckyDrawEligibility,
+    LuckyDrawParticipant,
     record_lucky_draw_eligibility_for_code,
 )
 from .serializers import (
@@ -283,91 +287,11 @@ class CouponCodeViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
         if not is_consumer_user(request.user):
             return Response({"detail": "Only consumers can access."}, status=status.HTTP_403_FORBIDDEN)
 
-        # Restrict to e‑coupons owned by this consumer
-        assigned_qs = CouponCode.objects.filter(assigned_consumer=request.user, issued_channel="e_coupon")
-
-        # Overall counts (status based)
-        try:
-            sold_assigned = assigned_qs.filter(status="SOLD").count()
-        except Exception:
-            sold_assigned = 0
-        try:
-            redeemed_assigned = assigned_qs.filter(status="REDEEMED").count()
-        except Exception:
-            redeemed_assigned = 0
-
-        # Audits (actor scoped)
-        try:
-            activated_count = (AuditTrail.objects
-                               .filter(action="coupon_activated", actor_id=request.user.id)
-                               .values("coupon_code_id")
-                               .distinct()
-                               .count())
-        except Exception:
-            activated_count = 0
-        try:
-            transferred_count = AuditTrail.objects.filter(action="consumer_transfer", actor_id=request.user.id).count()
-        except Exception:
-            transferred_count = 0
-
-        # Overall "available" = SOLD minus my activations (cannot go negative)
-        available_overall = sold_assigned - activated_count
-        if available_overall < 0:
-            available_overall = 0
-
-        # Denomination-wise breakdown
-        by_value = {}
-        try:
-            # Base counts per value and status (SOLD / REDEEMED)
-            rows = (assigned_qs.values("value", "status")
-                            .annotate(c=Count("id")))
-            for r in rows:
-                v = str(r.get("value"))
-                st = (r.get("status") or "").upper()
-                ent = by_value.get(v) or {"available": 0, "redeemed": 0, "activated": 0, "transferred": 0}
-                if st == "SOLD":
-                    ent["available"] += int(r.get("c") or 0)
-                elif st == "REDEEMED":
-                    ent["redeemed"] += int(r.get("c") or 0)
-                by_value[v] = ent
-
-            # Activations by this consumer grouped by value
-            act_rows = (AuditTrail.objects
-                            .filter(action="coupon_activated", actor_id=request.user.id)
-                        .values("coupon_code__value")
-                        .annotate(c=Count("id")))
-            for r in act_rows:
-                v = str(r.get("coupon_code__value"))
-                ent = by_value.get(v) or {"available": 0, "redeemed": 0, "activated": 0, "transferred": 0}
-                ent["activated"] += int(r.get("c") or 0)
-                by_value[v] = ent
-
-            # Transfers initiated by this consumer grouped by value
-            tr_rows = (AuditTrail.objects
-                           .filter(action="consumer_transfer", actor_id=request.user.id)
-                       .values("coupon_code__value")
-                       .annotate(c=Count("id")))
-            for r in tr_rows:
-                v = str(r.get("coupon_code__value"))
-                ent = by_value.get(v) or {"available": 0, "redeemed": 0, "activated": 0, "transferred": 0}
-                ent["transferred"] += int(r.get("c") or 0)
-                by_value[v] = ent
-
-            # Adjust available per value by subtracting activations (cannot go negative)
-            for v, ent in list(by_value.items()):
-                avail = int(ent.get("available") or 0) - int(ent.get("activated") or 0)
-                ent["available"] = avail if avail > 0 else 0
-                by_value[v] = ent
-        except Exception:
-            by_value = {}
-
-        summary = {
-            "available": available_overall,
-            "redeemed": redeemed_assigned,
-            "activated": activated_count,
-            "transferred": transferred_count,
-            "by_value": by_value,
-        }
+        # Maintained per-denomination stats row(s): one indexed read instead of COUNTs over codes/audits
+        try:
+            summary = ConsumerCouponStats.summary_for(request.user)
+        except Exception:
+            summary = {"available": 0, "redeemed": 0, "activated": 0, "transferred": 0, "by_value": {}}
         return Response(summary, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=["get"], url_path="consumer-overview", permission_classes=[IsAuthenticated])
@@ -386,82 +310,12 @@ class CouponCodeViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
         # Base queryset for this consumer's e-coupons
         assigned_qs = CouponCode.objects.filter(assigned_consumer=request.user, issued_channel="e_coupon")
 
-        # Build summary (same logic as consumer_summary)
-        try:
-            sold_assigned = assigned_qs.filter(status="SOLD").count()
-        except Exception:
-            sold_assigned = 0
-        try:
-            redeemed_assigned = assigned_qs.filter(status="REDEEMED").count()
-        except Exception:
-            redeemed_assigned = 0
-
-        try:
-            activated_count = (AuditTrail.objects
-                               .filter(action="coupon_activated", actor_id=request.user.id)
-                               .values("coupon_code_id")
-                               .distinct()
-                               .count())
-        except Exception:
-            activated_count = 0
-        try:
-            transferred_count = AuditTrail.objects.filter(action="consumer_transfer", actor_id=request.user.id).count()
-        except Exception:
-            transferred_count = 0
-
-        available_overall = sold_assigned - activated_count
-        if available_overall < 0:
-            available_overall = 0
-
-        by_value = {}
-        try:
-            rows = (assigned_qs.values("value", "status").annotate(c=Count("id")))
-            for r in rows:
-                v = str(r.get("value"))
-                st = (r.get("status") or "").upper()
-                ent = by_value.get(v) or {"available": 0, "redeemed": 0, "activated": 0, "transferred": 0}
-                if st == "SOLD":
-                    ent["available"] += int(r.get("c") or 0)
-                elif st == "REDEEMED":
-                    ent["redeemed"] += int(r.get("c") or 0)
-                by_value[v] = ent
-
-            # Optionally include heavy per-value details (activations/transfers) only when requested
-            if str(self.request.query_params.get("by_value_details") or "0").lower() in ("1", "true", "yes"):
-                act_rows = (AuditTrail.objects
-                            .filter(action="coupon_activated", actor_id=request.user.id)
-                            .values("coupon_code__value")
-                            .annotate(c=Count("id")))
-                for r in act_rows:
-                    v = str(r.get("coupon_code__value"))
-                    ent = by_value.get(v) or {"available": 0, "redeemed": 0, "activated": 0, "transferred": 0}
-                    ent["activated"] += int(r.get("c") or 0)
-                    by_value[v] = ent
-
-                tr_rows = (AuditTrail.objects
-                           .filter(action="consumer_transfer", actor_id=request.user.id)
-                           .values("coupon_code__value")
-                           .annotate(c=Count("id")))
-                for r in tr_rows:
-                    v = str(r.get("coupon_code__value"))
-                    ent = by_value.get(v) or {"available": 0, "redeemed": 0, "activated": 0, "transferred": 0}
-                    ent["transferred"] += int(r.get("c") or 0)
-                    by_value[v] = ent
-
-            for v, ent in list(by_value.items()):
-                avail = int(ent.get("available") or 0) - int(ent.get("activated") or 0)
-                ent["available"] = avail if avail > 0 else 0
-                by_value[v] = ent
-        except Exception:
-            by_value = {}
-
-        summary = {
-            "available": available_overall,
-            "redeemed": redeemed_assigned,
-            "activated": activated_count,
-            "transferred": transferred_count,
-            "by_value": by_value,
-        }
+        # Summary from ConsumerCouponStats (same as consumer_summary); by_value now always includes
+        # activations/transfers, so by_value_details is ignored
+        try:
+            summary = ConsumerCouponStats.summary_for(request.user)
+        except Exception:
+            summary = {"available": 0, "redeemed": 0, "activated": 0, "transferred": 0, "by_value": {}}
 
         # Codes list (optional): include_codes=0 to skip for ultra-light responses
         include_codes = str(self.request.query_params.get("include_codes") or "1").lower() in ("1", "true", "yes")
@@ -892,23 +746,12 @@ class CouponCodeViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
         if code_value is not None:
             base_qs = base_qs.filter(value=code_value)
 
-        available_before = base_qs.count()
-        if available_before <= 0:
-            return Response(
-                {
-                    "available_before": 0,
-                    "assigned": 0,
-                    "available_after": 0,
-                    "detail": "No eligible codes in your pool.",
-                },
-                status=status.HTTP_200_OK,
-            )
+        # Pool sizes come from maintained counters; the pick below still filters exactly
+        available_before = InventoryCounter.pool_available(user, value=code_value, batch_id=batch_id)
 
         from django.db import transaction
         with transaction.atomic():
             # Try to lock rows to avoid double-pick in concurrent calls (Postgres)
-            # Precompute current allocatable inventory for this product's coupon + denomination
-            available_before = base_qs.count()
             try:
                 locking_qs = base_qs.select_for_update(skip_locked=True)
             except Exception:
@@ -918,14 +761,13 @@ class CouponCodeViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
                 locking_qs.order_by("serial", "id").values_list("id", flat=True)[:count]
             )
             if not pick_ids:
-                # Could happen under contention
-                available_after = base_qs.count()
+                # Empty pool, or everything locked under contention
                 return Response(
                     {
                         "available_before": available_before,
                         "assigned": 0,
-                        "available_after": available_after,
-                        "detail": "No eligible codes available now.",
+                        "available_after": InventoryCounter.pool_available(user, value=code_value, batch_id=batch_id),
+                        "detail": "No eligible codes available now." if available_before > 0 else "No eligible codes in your pool.",
                     },
                     status=status.HTTP_200_OK,
                 )
@@ -967,7 +809,7 @@ class CouponCodeViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
             )
 
         # Compute remaining and sample of actually assigned codes
-        available_after = base_qs.count()
+        available_after = InventoryCounter.pool_available(user, value=code_value, batch_id=batch_id)
         sample_codes = list(
             CouponCode.objects.filter(id__in=pick_ids, assigned_consumer=consumer)
             .values_list("code", flat=True)[:5]
@@ -1100,17 +942,7 @@ class CouponCodeViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
         if code_value is not None:
             base_qs = base_qs.filter(value=code_value)
 
-        available_before = base_qs.count()
-        if available_before <= 0:
-            return Response(
-                {
-                    "available_before": 0,
-                    "assigned": 0,
-                    "available_after": 0,
-                    "detail": "No eligible codes in your pool.",
-                },
-                status=status.HTTP_200_OK,
-            )
+        available_before = InventoryCounter.total("agency", user.id, status="ASSIGNED_AGENCY", value=code_value, batch_id=batch_id)
 
         with transaction.atomic():
             try:
@@ -1120,13 +952,12 @@ class CouponCodeViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
 
             pick_ids = list(locking_qs.order_by("serial", "id").values_list("id", flat=True)[:cnt])
             if not pick_ids:
-                available_after = base_qs.count()
                 return Response(
                     {
                         "available_before": available_before,
                         "assigned": 0,
-                        "available_after": available_after,
-                        "detail": "No eligible codes available now.",
+                        "available_after": InventoryCounter.total("agency", user.id, status="ASSIGNED_AGENCY", value=code_value, batch_id=batch_id),
+                        "detail": "No eligible codes available now." if available_before > 0 else "No eligible codes in your pool.",
                     },
                     status=status.HTTP_200_OK,
                 )
@@ -1150,7 +981,7 @@ class CouponCodeViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
                 },
             )
 
-        available_after = base_qs.count()
+        available_after = InventoryCounter.total("agency", user.id, status="ASSIGNED_AGENCY", value=code_value, batch_id=batch_id)
         sample_codes = list(
             CouponCode.objects.filter(id__in=pick_ids, assigned_employee=employee)
             .values_list("code", flat=True)[:5]
@@ -1172,26 +1003,24 @@ class CouponCodeViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
         if not is_agency_user(request.user):
             return Response({"detail": "Only agency users can access."}, status=status.HTTP_403_FORBIDDEN)
 
-        agg = (CouponCode.objects
-               .filter(assigned_agency=request.user)
-               .values("status")
-               .annotate(c=Count("id")))
+        # Maintained per-agency counters (a handful of rows) instead of grouping CouponCode
+        agg = InventoryCounter.by_status("agency", request.user.id)
 
         metrics = {"available": 0, "assigned_employee": 0, "sold": 0, "redeemed": 0, "revoked": 0}
         total = 0
-        for row in agg:
-            st = (row.get("status") or "").upper()
+        for st, c in agg.items():
+            st = (st or "").upper()
             if st == "ASSIGNED_AGENCY":
-                metrics["available"] = row["c"]
+                metrics["available"] = c
             elif st == "ASSIGNED_EMPLOYEE":
-                metrics["assigned_employee"] = row["c"]
+                metrics["assigned_employee"] = c
             elif st == "SOLD":
-                metrics["sold"] = row["c"]
+                metrics["sold"] = c
             elif st == "REDEEMED":
-                metrics["redeemed"] = row["c"]
+                metrics["redeemed"] = c
             elif st == "REVOKED":
-                metrics["revoked"] = row["c"]
-            total += int(row["c"] or 0)
+                metrics["revoked"] = c
+            total += int(c or 0)
         metrics["total"] = total
         return Response(metrics, status=status.HTTP_200_OK)
 
@@ -1579,6 +1408,8 @@ class CouponBatchViewSet(mixins.CreateModelMixin,
           "prefix": "LDGR"           # optional, defaults to 'LDGR'
         }
         Generates codes like: LDGR + 7-char uppercase alphanumeric (e.g., LDGRX7K9A2B).
+        Counts above ECOUPON_SYNC_MAX_CODES return 202 {"status": "queued", "task_id", ...batch} and are
+        generated by the ecoupon_generate background task.
         """
         if not is_admin_user(request.user):
             return Response({"detail": "Only admin can create e-coupon batches."}, status=status.HTTP_403_FORBIDDEN)
@@ -1612,56 +1443,56 @@ class CouponBatchViewSet(mixins.CreateModelMixin,
         except Coupon.DoesNotExist:
             return Response({"coupon": ["Invalid coupon id."]}, status=status.HTTP_400_BAD_REQUEST)
 
-        with transaction.atomic():
-            # Create a grouping batch record (serials are placeholders; codes will not use serial)
-            batch = CouponBatch.objects.create(
-                coupon=coupon,
-                prefix=prefix,
-                serial_start=1,
-                serial_end=count,
-                serial_width=0,
-                created_by=request.user,
-            )
-
-            # Generate unique random codes: PREFIX + 7-char A-Z0-9
-            import random, string
-            alphabet = string.ascii_uppercase + string.digits
-
-            def gen_one():
-                return prefix + "".join(random.choices(alphabet, k=7))
+        # Create a grouping batch record (serials are placeholders; codes will not use serial)
+        batch = CouponBatch.objects.create(
+            coupon=coupon,
+            prefix=prefix,
+            serial_start=1,
+            serial_end=count,
+            serial_width=0,
+            created_by=request.user,
+        )
 
-            to_create = []
-            # Prefetch existing codes with this prefix to reduce collisions
-            existing = set(CouponCode.objects.filter(code__startswith=prefix).values_list("code", flat=True))
-            seen = set()
-            while len(to_create) < count:
-                candidate = gen_one()
-                if candidate in existing or candidate in seen:
-                    continue
-                seen.add(candidate)
-                to_create.append(CouponCode(
-                    code=candidate,
-                    coupon=coupon,
-                    issued_channel="e_coupon",
-                    assigned_employee=None,
-                    assigned_agency=None,
-                    batch=batch,
-                    serial=None,
-                    value=code_value,
-                    issued_by=request.user,
-                    status="AVAILABLE",
-                ))
+        # Large batches run in the background (progress via /api/jobs/<id>/status/)
+        if count > int(getattr(settings, "ECOUPON_SYNC_MAX_CODES", 5000) or 0):
+            try:
+                from jobs.models import BackgroundTask
+                task = BackgroundTask.enqueue(
+                    task_type="ecoupon_generate",
+                    payload={
+                        "actor_id": int(request.user.id),
+                        "batch_id": int(batch.id),
+                        "count": int(count),
+                        "value": str(code_value),
+                        "prefix": prefix,
+                    },
+                    idempotency_key=f"ecoupon_generate:{batch.id}",
+                )
+                data = dict(self.get_serializer(batch).data)
+                data.update({"status": "queued", "task_id": task.id, "detail": f"Generating {count} codes in background."})
+                return Response(data, status=status.HTTP_202_ACCEPTED)
+            except Exception:
+                # Fallback to synchronous generation if enqueue fails
+                pass
 
-            if to_create:
-                CouponCode.objects.bulk_create(to_create, batch_size=1000)
+        # Codes: PREFIX + 7-char A-Z0-9 from a keyed permutation of a per-prefix sequence (unique by construction)
+        from .codegen import generate_codes
+        created = generate_codes(
+            coupon=coupon,
+            batch=batch,
+            prefix=prefix,
+            count=count,
+            value=code_value,
+            issued_by=request.user,
+        )
 
-            AuditTrail.objects.create(
-                action="batch_created_random_ecoupons",
-                actor=request.user,
-                batch=batch,
-                notes=f"Generated {len(to_create)} random e-codes",
-                metadata={"prefix": prefix, "count": len(to_create), "value": str(code_value)},
-            )
+        AuditTrail.objects.create(
+            action="batch_created_random_ecoupons",
+            actor=request.user,
+            batch=batch,
+            notes=f"Generated {created} random e-codes",
+            metadata={"prefix": prefix, "count": created, "value": str(code_value)},
+        )
 
         return Response(self.get_serializer(batch).data, status=status.HTTP_201_CREATED)
 
@@ -2750,7 +2581,10 @@ class LuckyDrawEligibilityViewSet(viewsets.GenericViewSet):
           - coupon: Coupon (Season/Coupon master) id [required]
           - eligible_only: 1/0 (default 0)
           - search: username/phone contains (optional)
-        Response: paginated list with has_150, has_759, eligible flags and first timestamps.
+          - cursor: next_cursor from the previous page (optional); page_size (default 25, max 100)
+        Response: { results, next_cursor } with has_150, has_759, eligible flags and first timestamps,
+        newest users first. Keyset-paginated: rows come from LuckyDrawParticipant (or, when
+        LUCKY_DRAW_PARTICIPANT_TABLE is off, a GROUP BY user over LuckyDrawEligibility), never the whole season.
         """
         if not is_admin_user(request.user):
             return Response({"detail": "Only admin can access."}, status=status.HTTP_403_FORBIDDEN)
@@ -2760,56 +2594,56 @@ class LuckyDrawEligibilityViewSet(viewsets.GenericViewSet):
             return Response({"coupon": ["coupon query param is required (int)."]}, status=status.HTTP_400_BAD_REQUEST)
 
         eligible_only = str(request.query_params.get("eligible_only") or "0").lower() in ("1", "true", "yes")
-        search = (request.query_params.get("search") or "").strip().lower()
-
-        rows = LuckyDrawEligibility.objects.filter(coupon_id=coupon_id).values("user_id", "value", "created_at")
-        user_ids = sorted(list({r["user_id"] for r in rows}))
-        user_map = {}
-        for u in CustomUser.objects.filter(id__in=user_ids).only("id", "username", "phone", "pincode"):
-            user_map[u.id] = {"username": u.username, "phone": getattr(u, "phone", "") or "", "pincode": getattr(u, "pincode", "") or ""}
-
-        from decimal import Decimal as D
-        by_user = {}
-        for r in rows:
-            uid = r["user_id"]; created = r["created_at"]
-            try:
-                v = D(str(r["value"]))
-            except Exception:
-                v = D("0")
-            ent = by_user.get(uid) or {
-                "user_id": uid,
-                "username": user_map.get(uid, {}).get("username"),
-                "phone": user_map.get(uid, {}).get("phone"),
-                "pincode": user_map.get(uid, {}).get("pincode"),
-                "has_150": False,
-                "has_759": False,
-                "created_at_150": None,
-                "created_at_759": None,
-            }
-            if v == D("150"):
-                ent["has_150"] = True
-                ent["created_at_150"] = created if (ent["created_at_150"] is None or created < ent["created_at_150"]) else ent["created_at_150"]
-            elif v in (D("759"), D("750")):
-                ent["has_759"] = True
-                ent["created_at_759"] = created if (ent["created_at_759"] is None or created < ent["created_at_759"]) else ent["created_at_759"]
-            by_user[uid] = ent
+        search = (request.query_params.get("search") or "").strip()
+        try:
+            cursor = int(request.query_params.get("cursor") or 0)
+        except Exception:
+            cursor = 0
+        try:
+            page_size = int(request.query_params.get("page_size") or StandardResultsSetPagination.page_size)
+        except Exception:
+            page_size = StandardResultsSetPagination.page_size
+        page_size = max(1, min(page_size, StandardResultsSetPagination.max_page_size))
 
+        if getattr(settings, "LUCKY_DRAW_PARTICIPANT_TABLE", True):
+            qs = LuckyDrawParticipant.objects.filter(coupon_id=coupon_id)
+            if eligible_only:
+                qs = qs.filter(eligible=True)
+            qs = qs.values("user_id", "created_at_150", "created_at_759")
+        else:
+            qs = LuckyDrawParticipant.aggregate(LuckyDrawEligibility.objects.filter(coupon_id=coupon_id))
+            if eligible_only:
+                qs = qs.filter(created_at_150__isnull=False, created_at_759__isnull=False)
+        if search:
+            qs = qs.filter(Q(user__username__icontains=search) | Q(user__phone__icontains=search))
+        if cursor:
+            qs = qs.filter(user_id__lt=cursor)
+        rows = list(qs.order_by("-user_id")[:page_size + 1])
+        more = len(rows) > page_size
+        rows = rows[:page_size]
+
+        user_map = {
+            u["id"]: u
+            for u in CustomUser.objects.filter(id__in=[r["user_id"] for r in rows]).values("id", "username", "phone", "pincode")
+        }
         out = []
-        for ent in by_user.values():
-            ent["eligible"] = bool(ent["has_150"] and ent["has_759"])
-            if eligible_only and not ent["eligible"]:
-                continue
-            if search:
-                uname = (ent.get("username") or "").lower()
-                phone = str(ent.get("phone") or "").lower()
-                if (search not in uname) and (search not in phone):
-                    continue
-            out.append(ent)
-
-        page = self.paginate_queryset(out)
-        if page is not None:
-            return self.get_paginated_response(page)
-        return Response({"results": out}, status=status.HTTP_200_OK)
+        for r in rows:
+            u = user_map.get(r["user_id"], {})
+            has_150 = r["created_at_150"] is not None
+            has_759 = r["created_at_759"] is not None
+            out.append({
+                "user_id": r["user_id"],
+                "username": u.get("username"),
+                "phone": u.get("phone") or "",
+                "pincode": u.get("pincode") or "",
+                "has_150": has_150,
+                "has_759": has_759,
+                "created_at_150": r["created_at_150"],
+                "created_at_759": r["created_at_759"],
+                "eligible": has_150 and has_759,
+            })
+        next_cursor = rows[-1]["user_id"] if (more and rows) else None
+        return Response({"results": out, "next_cursor": next_cursor}, status=status.HTTP_200_OK)
 
 
 # ===========================
@@ -2818,6 +2652,7 @@ class LuckyDrawEligibilityViewSet(viewsets.GenericViewSet):
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from business.services.activation import activate_150_active, activate_50, redeem_150, ensure_first_purchase_activation
+from business.models import ProcessedEvent
 
 
 class CouponActivateView(APIView):
@@ -2938,14 +2773,15 @@ class CouponActivateView(APIView):
             if code_str and ch == "e_coupon":
                 code_obj = CouponCode.objects.filter(code=code_str).first()
                 if code_obj and code_obj.assigned_consumer_id == request.user.id:
-                    if not AuditTrail.objects.filter(action="coupon_activated", actor=request.user, coupon_code=code_obj).exists():
-                        AuditTrail.objects.create(
-                            action="coupon_activated",
-                            actor=request.user,
-                            coupon_code=code_obj,
-                            notes="",
-                            metadata={"type": t},
-                        )
+                    with ProcessedEvent.run_once("coupon_activated", f"{request.user.id}:{code_obj.id}") as first:
+                        if first:
+                            AuditTrail.objects.create(
+                                action="coupon_activated",
+                                actor=request.user,
+                                coupon_code=code_obj,
+                                notes="",
+                                metadata={"type": t},
+                            )
         except Exception:
             pass
 
@@ -2964,29 +2800,22 @@ class CouponActivateView(APIView):
                     except Exception:
                         val = None
                     if val == D("759"):
-                        # Idempotent per code
-                        if not AuditTrail.objects.filter(action="monthly_759_distributed", coupon_code=code_obj).exists():
-                            # Determine if this is the consumer's first 759 activation (exclude this code itself)
-                            prev_exists = AuditTrail.objects.filter(
-                                action="coupon_activated",
-                                actor=request.user,
-                                coupon_code__value=D("759")
-                            ).exclude(coupon_code_id=code_obj.id).exists()
-                            dist_ok = False
-                            try:
-                                from business.services.monthly import distribute_monthly_759_payouts
-                                distribute_monthly_759_payouts(
-                                    request.user,
-                                    is_first_month=(not prev_exists),
-                                    source={"type": "ECOUPON_759", "id": code_obj.id, "code": code_obj.code},
-                                )
-                                dist_ok = True
-                            except Exception:
-                                # Do not stamp audit on failure so that a retry can re-attempt distribution
-                                dist_ok = False
-                            # Stamp audit so we don't double-pay for this code only on success
-                            if dist_ok:
-                                try:
+                        # Idempotent per code; claim + payout + audit commit together so a failure can be retried
+                        try:
+                            with ProcessedEvent.run_once("monthly_759_distributed", code_obj.id) as first:
+                                if first:
+                                    # Determine if this is the consumer's first 759 activation (exclude this code itself)
+                                    prev_exists = AuditTrail.objects.filter(
+                                        action="coupon_activated",
+                                        actor=request.user,
+                                        coupon_code__value=D("759")
+                                    ).exclude(coupon_code_id=code_obj.id).exists()
+                                    from business.services.monthly import distribute_monthly_759_payouts
+                                    distribute_monthly_759_payouts(
+                                        request.user,
+                                        is_first_month=(not prev_exists),
+                                        source={"type": "ECOUPON_759", "id": code_obj.id, "code": code_obj.code},
+                                    )
                                     AuditTrail.objects.create(
                                         action="monthly_759_distributed",
                                         actor=request.user,
@@ -2994,25 +2823,32 @@ class CouponActivateView(APIView):
                                         notes="Monthly 759 commission distribution applied",
                                         metadata={"first_month": bool(not prev_exists)},
                                     )
-                                except Exception:
-                                    pass
+                        except Exception:
+                            pass
                         # Skip generic 15/30 path for 759 as monthly plan handles distribution
                     else:
                         # New config-driven commission engine for Prime 150/750 activations (no hardcoded amounts).
                         from decimal import Decimal as D
                         # Idempotent per code and denomination
                         if val == D("150"):
-                            if not AuditTrail.objects.filter(action="prime_150_distributed", coupon_code=code_obj).exists():
-                                dist_ok = False
+                            if not ProcessedEvent.is_processed("prime_150_distributed", code_obj.id):
                                 try:
-                                    from business.services.prime import distribute_prime_150_payouts
-                                    distribute_prime_150_payouts(
-                                        request.user,
-                                        source={"type": "ECOUPON_150", "id": code_obj.id, "code": code_obj.code}
-                                    )
-                                    dist_ok = True
+                                    with ProcessedEvent.run_once("prime_150_distributed", code_obj.id) as first:
+                                        if first:
+                                            from business.services.prime import distribute_prime_150_payouts
+                                            distribute_prime_150_payouts(
+                                                request.user,
+                                                source={"type": "ECOUPON_150", "id": code_obj.id, "code": code_obj.code}
+                                            )
+                                            AuditTrail.objects.create(
+                                                action="prime_150_distributed",
+                                                actor=request.user,
+                                                coupon_code=code_obj,
+                                                notes="Prime 150 commission distribution applied",
+                                                metadata={"denomination": "150"},
+                                            )
                                 except Exception:
-                                    dist_ok = False
+                                    pass
                                 # Also perform consumer matrix distribution per admin config (exclude direct/self & agency here to avoid duplication)
                                 try:
                                     from business.services.activation import open_matrix_accounts_for_coupon
@@ -3027,31 +2863,15 @@ class CouponActivateView(APIView):
                                     )
                                 except Exception:
                                     pass
-                                if dist_ok:
-                                    try:
-                                        AuditTrail.objects.create(
-                                            action="prime_150_distributed",
-                                            actor=request.user,
-                                            coupon_code=code_obj,
-                                            notes="Prime 150 commission distribution applied",
-                                            metadata={"denomination": "150"},
-                                        )
-                                    except Exception:
-                                        pass
                         elif val == D("750"):
-                            if not AuditTrail.objects.filter(action="prime_750_distributed", coupon_code=code_obj).exists():
-                                dist_ok = False
-                                try:
-                                    from business.services.prime import distribute_prime_750_payouts
-                                    distribute_prime_750_payouts(
-                                        request.user,
-                                        source={"type": "ECOUPON_750", "id": code_obj.id, "code": code_obj.code}
-                                    )
-                                    dist_ok = True
-                                except Exception:
-                                    dist_ok = False
-                                if dist_ok:
-                                    try:
+                            try:
+                                with ProcessedEvent.run_once("prime_750_distributed", code_obj.id) as first:
+                                    if first:
+                                        from business.services.prime import distribute_prime_750_payouts
+                                        distribute_prime_750_payouts(
+                                            request.user,
+                                            source={"type": "ECOUPON_750", "id": code_obj.id, "code": code_obj.code}
+                                        )
                                         AuditTrail.objects.create(
                                             action="prime_750_distributed",
                                             actor=request.user,
@@ -3059,8 +2879,8 @@ class CouponActivateView(APIView):
                                             notes="Prime 750 commission distribution applied",
                                             metadata={"denomination": "750"},
                                         )
-                                    except Exception:
-                                        pass
+                            except Exception:
+                                pass
                         else:
                             # For other denominations (e.g., 50), no commission is applied here.
                             # 50 path is handled by activate_50 service earlier; skip any legacy fixed splits.
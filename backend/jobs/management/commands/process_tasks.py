@@ -1,11 +1,15 @@
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
 from django.utils import timezone
-from django.db.models import F
+from django.db.models import F, Q
 
 from jobs.models import BackgroundTask
+from jobs.notify import CHANNEL_QUEUE, Listener
 
 
 class Command(BaseCommand):
@@ -20,6 +24,31 @@ class Command(BaseCommand):
         parser.add_argument("--backoff-max", type=float, default=60.0, help="Max backoff seconds (default: 60.0)")
         parser.add_argument("--reap-stuck-seconds", type=int, default=300, help="Requeue RUNNING tasks stuck longer than this many seconds (0 to disable)")
         parser.add_argument("--reap-on-start", action="store_true", help="Run stuck-task reaper once on startup")
+        parser.add_argument("--tax-rollup-seconds", type=int, default=30, help="Roll up deferred tax pool entries every N seconds (0 to disable)")
+        parser.add_argument("--team-rollup-seconds", type=int, default=30, help="Fold deferred team counter deltas every N seconds (0 to disable)")
+        parser.add_argument(
+            "--inventory-reconcile-seconds",
+            type=int,
+            default=None,
+            help="Queue an inventory_reconcile task every N seconds (0 to disable; default: settings.INVENTORY_RECONCILE_SECONDS)",
+        )
+        parser.add_argument(
+            "--lookup-prune-seconds",
+            type=int,
+            default=None,
+            help="Queue an external_lookup_prune task every N seconds (0 to disable; default: settings.LOCATIONS_LOOKUP_PRUNE_SECONDS)",
+        )
+        parser.add_argument("--no-listen", action="store_true", help="Disable Postgres LISTEN wakeups; poll every --sleep seconds")
+        parser.add_argument("--idle-max-seconds", type=float, default=30.0, help="With LISTEN: max idle wait before re-polling (default: 30)")
+        parser.add_argument("--workers", type=int, default=1, help="Concurrent worker threads (default: 1)")
+        parser.add_argument("--batch-size", type=int, default=0, help="Max tasks claimed per poll, never more than idle workers (default: --workers)")
+        parser.add_argument(
+            "--type-limit",
+            action="append",
+            default=None,
+            help="Max concurrently RUNNING tasks of a type across all workers, as type=N (repeatable). "
+                 "Defaults come from settings.BACKGROUND_TASK_TYPE_LIMITS.",
+        )
 
     def handle(self, *args, **opts):
         once = opts["once"]
@@ -35,18 +64,50 @@ class Command(BaseCommand):
 
         reap_stuck_secs = int(opts["reap_stuck_seconds"] or 0)
         reap_on_start = bool(opts["reap_on_start"])
+        reap_interval = max(sleep_s, min(30.0, reap_stuck_secs / 10.0))
+        last_reap = None
+
+        tax_rollup_secs = int(opts["tax_rollup_seconds"] or 0)
+        last_tax_rollup = None
+
+        team_rollup_secs = int(opts["team_rollup_seconds"] or 0)
+        last_team_rollup = None
+
+        reconcile_secs = opts.get("inventory_reconcile_seconds")
+        if reconcile_secs is None:
+            reconcile_secs = getattr(settings, "INVENTORY_RECONCILE_SECONDS", 0)
+        reconcile_secs = max(0, int(reconcile_secs or 0))
+        last_reconcile = timezone.now()
+
+        prune_secs = opts.get("lookup_prune_seconds")
+        if prune_secs is None:
+            prune_secs = getattr(settings, "LOCATIONS_LOOKUP_PRUNE_SECONDS", 0)
+        prune_secs = max(0, int(prune_secs or 0))
+        last_prune = timezone.now()
+
+        workers = max(1, int(opts["workers"] or 1))
+        batch_size = max(1, int(opts["batch_size"] or workers))
+        type_limits = dict(getattr(settings, "BACKGROUND_TASK_TYPE_LIMITS", {}) or {})
+        for spec in opts.get("type_limit") or []:
+            try:
+                t, n = spec.split("=", 1)
+                type_limits[t.strip()] = max(0, int(n))
+            except Exception:
+                raise CommandError(f"Invalid --type-limit {spec!r}; expected type=N")
 
         def reap_stuck():
             if reap_stuck_secs <= 0:
                 return 0, 0
             try:
                 stale_before = timezone.now() - timedelta(seconds=reap_stuck_secs)
+                # Tasks reporting progress are stuck only once their heartbeat goes stale
+                stale = (Q(heartbeat_at__isnull=True, started_at__lt=stale_before) | Q(heartbeat_at__lt=stale_before))
                 requeued = (BackgroundTask.objects
-                            .filter(status=BackgroundTask.STATUS_RUNNING, started_at__lt=stale_before)
+                            .filter(stale, status=BackgroundTask.STATUS_RUNNING)
                             .filter(attempts__lt=F("max_attempts"))
                             .update(status=BackgroundTask.STATUS_PENDING, scheduled_at=timezone.now()))
                 failed = (BackgroundTask.objects
-                          .filter(status=BackgroundTask.STATUS_RUNNING, started_at__lt=stale_before)
+                          .filter(stale, status=BackgroundTask.STATUS_RUNNING)
                           .filter(attempts__gte=F("max_attempts"))
                           .update(status=BackgroundTask.STATUS_FAILED, finished_at=timezone.now(), last_error="Watchdog: stuck RUNNING marked FAILED"))
                 if requeued or failed:
@@ -56,33 +117,44 @@ class Command(BaseCommand):
                 self.stdout.write(self.style.ERROR(f"Reaper exception: {e!r}"))
                 return 0, 0
 
-        self.stdout.write(self.style.SUCCESS("Worker started"))
-
-        if reap_stuck_secs > 0 and reap_on_start:
-            reap_stuck()
-
-        while True:
-            if max_iter and iterations >= max_iter:
-                self.stdout.write(self.style.WARNING("Max iterations reached; exiting"))
-                break
-            if max_runtime and (timezone.now() - start).total_seconds() >= max_runtime:
-                self.stdout.write(self.style.WARNING("Max runtime reached; exiting"))
-                break
-
-            iterations += 1
+        def rollup_tax_pool():
+            try:
+                from accounts.models import TaxPoolEntry
+                done = TaxPoolEntry.rollup()
+                if done:
+                    self.stdout.write(self.style.SUCCESS(f"Rolled up {done} tax pool entries"))
+                return done
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"Tax pool rollup exception: {e!r}"))
+                return 0
 
-            if reap_stuck_secs > 0:
-                reap_stuck()
+        def rollup_team_counters():
+            try:
+                from accounts.models import TeamCounterDelta
+                done = TeamCounterDelta.rollup()
+                if done:
+                    self.stdout.write(self.style.SUCCESS(f"Rolled up {done} team counter deltas"))
+                return done
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"Team counter rollup exception: {e!r}"))
+                return 0
 
-            task = BackgroundTask.fetch_next()
-            if not task:
-                idle_streak += 1
-                time.sleep(sleep_s)
-                continue
+        def queue_inventory_reconcile():
+            # One task per interval across worker processes (idempotency key = interval bucket)
+            try:
+                bucket = int(time.time() // reconcile_secs)
+                BackgroundTask.enqueue("inventory_reconcile", {}, idempotency_key=f"inventory_reconcile:{bucket}", max_attempts=1)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"Inventory reconcile enqueue exception: {e!r}"))
 
-            # Reset idle streak on work
-            idle_streak = 0
+        def queue_lookup_prune():
+            try:
+                bucket = int(time.time() // prune_secs)
+                BackgroundTask.enqueue("external_lookup_prune", {}, idempotency_key=f"external_lookup_prune:{bucket}", max_attempts=1)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"Lookup prune enqueue exception: {e!r}"))
 
+        def run_task(task):
             try:
                 self.stdout.write(f"Running task {task.id} type={task.type} attempt={task.attempts}/{task.max_attempts}")
                 task.run()
@@ -101,7 +173,119 @@ class Command(BaseCommand):
             except Exception as e:
                 self.stdout.write(self.style.ERROR(f"Worker exception while running task: {e!r}"))
 
-            if once:
-                break
+        def run_in_thread(task):
+            # Each pool thread owns its DB connection; drop it when the task ends
+            try:
+                run_task(task)
+            finally:
+                connection.close()
+
+        self.stdout.write(self.style.SUCCESS(f"Worker started (workers={workers}, batch_size={batch_size}, type_limits={type_limits or {}})"))
+
+        if reap_stuck_secs > 0 and reap_on_start:
+            reap_stuck()
+
+        # Idle wakeups: block on LISTEN bgtask_queue (Postgres); SQLite/other drivers poll every --sleep seconds
+        idle_max = max(sleep_s, float(opts["idle_max_seconds"] or 30.0))
+        listener = None
+        if not opts.get("no_listen") and not once:
+            listener = Listener(CHANNEL_QUEUE)
+            if listener.start():
+                self.stdout.write(self.style.SUCCESS(f"Listening on {CHANNEL_QUEUE} (idle max {idle_max:.0f}s)"))
+            else:
+                listener = None
+
+        def idle_wait():
+            if listener is None:
+                time.sleep(sleep_s)
+                return
+            # Wake for NOTIFY, the next scheduled (delayed/backoff) task, or periodic maintenance
+            timeout = idle_max
+            try:
+                due = BackgroundTask.next_due_at()
+                if due is not None:
+                    timeout = min(timeout, max(0.0, (due - timezone.now()).total_seconds()))
+            except Exception:
+                timeout = sleep_s
+            if tax_rollup_secs > 0:
+                timeout = min(timeout, float(tax_rollup_secs))
+            if team_rollup_secs > 0:
+                timeout = min(timeout, float(team_rollup_secs))
+            if reap_stuck_secs > 0:
+                timeout = min(timeout, reap_interval)
+            listener.wait(max(0.05, timeout))
+
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bgtask") if workers > 1 else None
+        in_flight = set()
+        try:
+            while True:
+                if max_iter and iterations >= max_iter:
+                    self.stdout.write(self.style.WARNING("Max iterations reached; exiting"))
+                    break
+                if max_runtime and (timezone.now() - start).total_seconds() >= max_runtime:
+                    self.stdout.write(self.style.WARNING("Max runtime reached; exiting"))
+                    break
+
+                iterations += 1
+                close_old_connections()
+
+                # Throttled: the loop no longer sleeps between tasks while work remains
+                if reap_stuck_secs > 0 and (last_reap is None or (timezone.now() - last_reap).total_seconds() >= reap_interval):
+                    last_reap = timezone.now()
+                    reap_stuck()
+
+                if tax_rollup_secs > 0 and (last_tax_rollup is None or (timezone.now() - last_tax_rollup).total_seconds() >= tax_rollup_secs):
+                    last_tax_rollup = timezone.now()
+                    rollup_tax_pool()
+
+                if team_rollup_secs > 0 and (last_team_rollup is None or (timezone.now() - last_team_rollup).total_seconds() >= team_rollup_secs):
+                    last_team_rollup = timezone.now()
+                    rollup_team_counters()
+
+                if reconcile_secs > 0 and (timezone.now() - last_reconcile).total_seconds() >= reconcile_secs:
+                    last_reconcile = timezone.now()
+                    queue_inventory_reconcile()
+
+                if prune_secs > 0 and (timezone.now() - last_prune).total_seconds() >= prune_secs:
+                    last_prune = timezone.now()
+                    queue_lookup_prune()
+
+                free = workers - len(in_flight)
+                tasks = []
+                if free > 0:
+                    try:
+                        tasks = BackgroundTask.fetch_batch(limit=1 if once else min(free, batch_size), type_limits=type_limits)
+                    except Exception as e:
+                        self.stdout.write(self.style.ERROR(f"Claim exception: {e!r}"))
+                        tasks = []
+
+                if not tasks:
+                    if in_flight:
+                        # Pool busy or capped: wake as soon as any task finishes
+                        _, in_flight = wait(in_flight, timeout=sleep_s, return_when=FIRST_COMPLETED)
+                        continue
+                    if once:
+                        break
+                    idle_streak += 1
+                    idle_wait()
+                    continue
+
+                # Reset idle streak on work; no sleep while the queue has ready tasks
+                idle_streak = 0
+
+                if pool is None:
+                    for task in tasks:
+                        run_task(task)
+                else:
+                    for task in tasks:
+                        in_flight.add(pool.submit(run_in_thread, task))
 
-            time.sleep(sleep_s)
+                if once:
+                    if in_flight:
+                        wait(in_flight)
+                    break
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True)
+            if listener is not None:
+                listener.close()
@@ -0,0 +1,22 @@
+# Generated by Django 6.1.2 on 2026-10-17 03:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backgroundtask',
+            name='priority',
+            field=models.SmallIntegerField(default=100),
+        ),
+        migrations.AddIndex(
+            model_name='backgroundtask',
+            index=models.Index(fields=['status', 'priority', 'scheduled_at', 'id'], name='bgtask_claim_idx'),
+        ),
+    ]
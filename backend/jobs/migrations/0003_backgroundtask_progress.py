@@ -0,0 +1,23 @@
+# Generated by Django 6.1.2 on 2026-10-17 03:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0002_backgroundtask_priority'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backgroundtask',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='backgroundtask',
+            name='progress',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -1,12 +1,15 @@
 from __future__ import annotations
 
+import zlib
 from dataclasses import dataclass
 from decimal import Decimal
-from typing import Any, Callable, Dict, Optional, Sequence
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence
 
-from django.db import models, transaction
+from django.db import connection, models, transaction
 from django.utils import timezone
 
+from .notify import notify_enqueued, notify_finished
+
 
 class BackgroundTask(models.Model):
     """
@@ -22,11 +25,15 @@ class BackgroundTask(models.Model):
 
       - Worker loop (management command 'process_tasks' will call this):
           while True:
-              task = BackgroundTask.fetch_next()
-              if not task:
+              tasks = BackgroundTask.fetch_batch(limit=free_slots, type_limits={...})
+              if not tasks:
                   sleep(1)
                   continue
-              task.run()
+              for task in tasks:
+                  task.run()
+
+    Priority: lower value runs first (TYPE_PRIORITIES per type, PRIORITY_DEFAULT otherwise);
+    interactive work like coupon_activate is claimed before bulk assign_* jobs.
     """
 
     STATUS_PENDING = "PENDING"
@@ -41,9 +48,29 @@ class BackgroundTask(models.Model):
         (STATUS_FAILED, "Failed"),
     ]
 
+    PRIORITY_DEFAULT = 100
+    TYPE_PRIORITIES = {
+        "coupon_activate": 10,
+        "ecoupon_order_approve": 20,
+        "monthly_759": 30,
+        "prime_150_units": 30,
+        "coupon_dist": 50,
+        "assign_consumer_count": 200,
+        "assign_employee_count": 200,
+        "assign_agency_count": 200,
+        "admin_assign_employee_count": 200,
+        "bulk_assign_agencies": 200,
+        "ecoupon_generate": 250,
+        "external_lookup_refresh": 150,
+        "inventory_reconcile": 300,
+        "external_lookup_prune": 300,
+        "earnings_rollup_build": 150,
+    }
+
     type = models.CharField(max_length=100, db_index=True)
     payload = models.JSONField(null=True, blank=True)
     status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
+    priority = models.SmallIntegerField(default=PRIORITY_DEFAULT)
     attempts = models.PositiveSmallIntegerField(default=0)
     max_attempts = models.PositiveSmallIntegerField(default=5)
     idempotency_key = models.CharField(max_length=255, unique=True, null=True, blank=True, db_index=True)
@@ -51,12 +78,17 @@ class BackgroundTask(models.Model):
     scheduled_at = models.DateTimeField(default=timezone.now, db_index=True)
     started_at = models.DateTimeField(null=True, blank=True)
     finished_at = models.DateTimeField(null=True, blank=True)
+    # Long-running handlers report {"done": n, "total": m, ...}; heartbeat_at keeps the stuck-task reaper away
+    progress = models.JSONField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ["scheduled_at", "id"]
         indexes = [
             models.Index(fields=["type", "status", "scheduled_at"]),
+            # Claim order: pending tasks by priority, then schedule
+            models.Index(fields=["status", "priority", "scheduled_at", "id"], name="bgtask_claim_idx"),
         ]
 
     def __str__(self) -> str:
@@ -72,12 +104,16 @@ class BackgroundTask(models.Model):
         idempotency_key: Optional[str] = None,
         scheduled_at=None,
         max_attempts: int = 5,
+        priority: Optional[int] = None,
     ) -> "BackgroundTask":
         """
         Create a new task or return existing by idempotency_key.
+        priority defaults to TYPE_PRIORITIES[task_type] (lower runs first).
         """
         if scheduled_at is None:
             scheduled_at = timezone.now()
+        if priority is None:
+            priority = cls.TYPE_PRIORITIES.get(task_type, cls.PRIORITY_DEFAULT)
         if idempotency_key:
             obj, created = cls.objects.get_or_create(
                 idempotency_key=idempotency_key,
@@ -87,6 +123,7 @@ class BackgroundTask(models.Model):
                     "status": cls.STATUS_PENDING,
                     "scheduled_at": scheduled_at,
                     "max_attempts": max(1, int(max_attempts or 1)),
+                    "priority": int(priority),
                 },
             )
             # If it exists but was FAILED and attempts < max_attempts, allow requeue by resetting status
@@ -95,36 +132,120 @@ class BackgroundTask(models.Model):
                 obj.scheduled_at = scheduled_at
                 obj.payload = payload or obj.payload or {}
                 obj.save(update_fields=["status", "scheduled_at", "payload"])
+                created = True
+            if created:
+                notify_enqueued(task_type)
             return obj
-        return cls.objects.create(
+        obj = cls.objects.create(
             type=task_type,
             payload=payload or {},
             status=cls.STATUS_PENDING,
             scheduled_at=scheduled_at,
             max_attempts=max(1, int(max_attempts or 1)),
+            priority=int(priority),
+        )
+        # Wakes LISTENing workers when this transaction commits
+        notify_enqueued(task_type)
+        return obj
+
+    @classmethod
+    def next_due_at(cls):
+        """
+        scheduled_at of the earliest PENDING task (None when the queue is empty).
+        """
+        return (
+            cls.objects.filter(status=cls.STATUS_PENDING)
+            .order_by("scheduled_at")
+            .values_list("scheduled_at", flat=True)
+            .first()
         )
 
     @classmethod
-    @transaction.atomic
     def fetch_next(cls) -> Optional["BackgroundTask"]:
         """
         Atomically fetch one pending task ready to run and mark it RUNNING.
         Uses select_for_update(skip_locked) to avoid worker contention.
         """
+        tasks = cls.fetch_batch(limit=1)
+        return tasks[0] if tasks else None
+
+    @classmethod
+    @transaction.atomic
+    def fetch_batch(cls, limit: int = 1, *, type_limits: Optional[Dict[str, int]] = None) -> list:
+        """
+        Claim up to `limit` ready tasks (priority, scheduled_at, id order) and mark them RUNNING.
+          - select_for_update(skip_locked): concurrent workers never claim the same row
+          - type_limits {type: max RUNNING}: types at their limit are skipped; a batch never
+            exceeds the remaining slots of a type (counted across all workers). On Postgres the
+            count-and-claim is serialized per capped type with a transaction-scoped advisory lock,
+            so concurrent workers cannot both fill the last slot; elsewhere the cap is a soft limit.
+        """
+        limit = max(1, int(limit or 1))
         now = timezone.now()
         qs = (
             cls.objects.select_for_update(skip_locked=True)
             .filter(status=cls.STATUS_PENDING, scheduled_at__lte=now)
-            .order_by("scheduled_at", "id")
+            .order_by("priority", "scheduled_at", "id")
         )
-        obj = qs.first()
-        if not obj:
-            return None
-        obj.status = cls.STATUS_RUNNING
-        obj.started_at = now
-        obj.attempts = (obj.attempts or 0) + 1
-        obj.save(update_fields=["status", "started_at", "attempts"])
-        return obj
+        remaining: Dict[str, int] = {}
+        if type_limits:
+            cls._lock_type_slots(type_limits.keys())
+            running = dict(
+                cls.objects.filter(status=cls.STATUS_RUNNING, type__in=list(type_limits.keys()))
+                .values("type")
+                .annotate(n=models.Count("id"))
+                .values_list("type", "n")
+            )
+            for t, cap in type_limits.items():
+                remaining[t] = max(0, int(cap) - int(running.get(t, 0)))
+            full = [t for t, left in remaining.items() if left <= 0]
+            if full:
+                qs = qs.exclude(type__in=full)
+
+        claimed = []
+        # Over-fetch a little so capped types do not starve the batch
+        for obj in qs[: limit * 2 if remaining else limit]:
+            if obj.type in remaining:
+                if remaining[obj.type] <= 0:
+                    continue
+                remaining[obj.type] -= 1
+            claimed.append(obj)
+            if len(claimed) >= limit:
+                break
+        if not claimed:
+            return []
+        for obj in claimed:
+            obj.status = cls.STATUS_RUNNING
+            obj.started_at = now
+            obj.attempts = (obj.attempts or 0) + 1
+            obj.heartbeat_at = None
+        cls.objects.bulk_update(claimed, ["status", "started_at", "attempts", "heartbeat_at"])
+        return claimed
+
+    # pg_advisory_xact_lock(namespace, key) namespace for per-type slot locks
+    TYPE_SLOT_LOCK_NAMESPACE = 0x4A4F4253
+
+    @classmethod
+    def _lock_type_slots(cls, types: Iterable[str]) -> None:
+        """
+        Hold a per-type advisory lock until the caller's transaction ends (Postgres only). Locks are
+        taken in sorted order so workers with overlapping type_limits cannot deadlock.
+        """
+        if connection.vendor != "postgresql":
+            return
+        with connection.cursor() as cur:
+            for t in sorted(set(types)):
+                # crc32 is unsigned; advisory keys are int4
+                key = zlib.crc32(t.encode("utf-8")) - (1 << 31)
+                cur.execute("SELECT pg_advisory_xact_lock(%s, %s)", [cls.TYPE_SLOT_LOCK_NAMESPACE, key])
+
+    def set_progress(self, done: int, total: int, **extra) -> None:
+        """
+        Record progress (committed immediately when called outside a transaction) and refresh heartbeat_at.
+        """
+        self.progress = {"done": int(done), "total": int(total), **extra}
+        self.heartbeat_at = timezone.now()
+        type(self).objects.filter(pk=self.pk).update(progress=self.progress, heartbeat_at=self.heartbeat_at)
 
     def run(self) -> None:
         """
@@ -150,6 +271,8 @@ class BackgroundTask(models.Model):
             except Exception:
                 self.last_error = "Task failed"
             self.save(update_fields=["status", "finished_at", "last_error"])
+        # Wake long-polling status requests
+        notify_finished(self.id)
 
 
 # -----------------------
@@ -353,6 +476,7 @@ def handle_coupon_activate(task: BackgroundTask) -> None:
 
     from accounts.models import CustomUser, Wallet
     from coupons.models import CouponCode, AuditTrail
+    from business.models import ProcessedEvent
     from decimal import Decimal as D
     from business.services.activation import activate_150_active, activate_50, ensure_first_purchase_activation
 
@@ -470,14 +594,15 @@ def handle_coupon_activate(task: BackgroundTask) -> None:
 
         if has_ref and ch_ok:
             if code_obj and code_obj.assigned_consumer_id == user.id:
-                if not AuditTrail.objects.filter(action="coupon_activated", actor=user, coupon_code=code_obj).exists():
-                    AuditTrail.objects.create(
-                        action="coupon_activated",
-                        actor=user,
-                        coupon_code=code_obj,
-                        notes="",
-                        metadata={"type": t},
-                    )
+                with ProcessedEvent.run_once("coupon_activated", f"{user.id}:{code_obj.id}") as first:
+                    if first:
+                        AuditTrail.objects.create(
+                            action="coupon_activated",
+                            actor=user,
+                            coupon_code=code_obj,
+                            notes="",
+                            metadata={"type": t},
+                        )
     except Exception:
         pass
 
@@ -519,102 +644,111 @@ def handle_coupon_activate(task: BackgroundTask) -> None:
             val = None
 
         if val == D("759"):
-            if not AuditTrail.objects.filter(action="monthly_759_distributed", coupon_code=code_obj).exists():
-                prev_exists = AuditTrail.objects.filter(
-                    action="coupon_activated",
-                    actor=user,
-                    coupon_code__value=D("759")
-                ).exclude(coupon_code_id=code_obj.id).exists()
-                try:
-                    from business.services.monthly import distribute_monthly_759_payouts
-                    distribute_monthly_759_payouts(
-                        user,
-                        is_first_month=(not prev_exists),
-                        source={"type": "ECOUPON_759", "id": code_obj.id, "code": code_obj.code},
-                    )
-                    AuditTrail.objects.create(
-                        action="monthly_759_distributed",
-                        actor=user,
-                        coupon_code=code_obj,
-                        notes="Monthly 759 commission distribution applied",
-                        metadata={"first_month": bool(not prev_exists)},
-                    )
-                except Exception:
-                    pass
+            try:
+                # Claim, payout and audit commit together; a failed payout leaves the code retryable
+                with ProcessedEvent.run_once("monthly_759_distributed", code_obj.id) as first:
+                    if first:
+                        prev_exists = AuditTrail.objects.filter(
+                            action="coupon_activated",
+                            actor=user,
+                            coupon_code__value=D("759")
+                        ).exclude(coupon_code_id=code_obj.id).exists()
+                        from business.services.monthly import distribute_monthly_759_payouts
+                        distribute_monthly_759_payouts(
+                            user,
+                            is_first_month=(not prev_exists),
+                            source={"type": "ECOUPON_759", "id": code_obj.id, "code": code_obj.code},
+                        )
+                        AuditTrail.objects.create(
+                            action="monthly_759_distributed",
+                            actor=user,
+                            coupon_code=code_obj,
+                            notes="Monthly 759 commission distribution applied",
+                            metadata={"first_month": bool(not prev_exists)},
+                        )
+            except Exception:
+                pass
         elif (val == D("150") or is_150_fallback):
             # If legacy per-coupon distribution already happened (order approval path), avoid double-paying.
-            legacy_done = AuditTrail.objects.filter(action="coupon_matrix_distributed", coupon_code=code_obj).exists()
+            legacy_done = ProcessedEvent.is_processed("coupon_matrix_distributed", code_obj.id)
             if legacy_done:
-                if not AuditTrail.objects.filter(action="prime_150_distributed", coupon_code=code_obj).exists():
+                try:
+                    with ProcessedEvent.run_once("prime_150_distributed", code_obj.id) as first:
+                        if first:
+                            AuditTrail.objects.create(
+                                action="prime_150_distributed",
+                                actor=user,
+                                coupon_code=code_obj,
+                                notes="Backfilled from legacy coupon_matrix_distributed",
+                                metadata={"denomination": "150", "backfilled": True},
+                            )
+                except Exception:
+                    pass
+            else:
+                distributed = False
+                try:
+                    with ProcessedEvent.run_once("prime_150_distributed", code_obj.id) as first:
+                        if first:
+                            from business.services.prime import distribute_prime_150_payouts
+                            distribute_prime_150_payouts(
+                                user,
+                                source={"type": "ECOUPON_150", "id": code_obj.id, "code": code_obj.code},
+                            )
+                            AuditTrail.objects.create(
+                                action="prime_150_distributed",
+                                actor=user,
+                                coupon_code=code_obj,
+                                notes="Prime 150 commission distribution applied",
+                                metadata={"denomination": "150"},
+                            )
+                    distributed = first
+                except Exception:
+                    # stamp failure audit for observability
                     try:
                         AuditTrail.objects.create(
-                            action="prime_150_distributed",
+                            action="prime_150_distribution_failed",
                             actor=user,
                             coupon_code=code_obj,
-                            notes="Backfilled from legacy coupon_matrix_distributed",
-                            metadata={"denomination": "150", "backfilled": True},
+                            notes="Prime 150 engine failed during e-coupon activation",
+                            metadata={"denomination": "150"},
                         )
                     except Exception:
                         pass
-            else:
-                if not AuditTrail.objects.filter(action="prime_150_distributed", coupon_code=code_obj).exists():
+                # Consumer matrix distribution per admin config (exclude direct/self & agency here to avoid duplication).
+                # Runs after run_once has committed, as in CouponActivateView, so it does not extend that transaction.
+                if distributed:
                     try:
-                        from business.services.prime import distribute_prime_150_payouts
-                        distribute_prime_150_payouts(
+                        from business.services.activation import open_matrix_accounts_for_coupon
+                        open_matrix_accounts_for_coupon(
                             user,
-                            source={"type": "ECOUPON_150", "id": code_obj.id, "code": code_obj.code},
+                            code_obj.id,
+                            amount_150=D("150.00"),
+                            distribute=True,
+                            trigger="ecoupon_activate",
+                            include_direct_self=False,
+                            include_agency=False,
+                        )
+                    except Exception:
+                        # best-effort: prime 150 distribution is already recorded
+                        pass
+        elif val == D("750"):
+            try:
+                with ProcessedEvent.run_once("prime_750_distributed", code_obj.id) as first:
+                    if first:
+                        from business.services.prime import distribute_prime_750_payouts
+                        distribute_prime_750_payouts(
+                            user,
+                            source={"type": "ECOUPON_750", "id": code_obj.id, "code": code_obj.code}
                         )
-                        # Also perform consumer matrix distribution per admin config (exclude direct/self & agency here to avoid duplication)
-                        try:
-                            from business.services.activation import open_matrix_accounts_for_coupon
-                            open_matrix_accounts_for_coupon(
-                                user,
-                                code_obj.id,
-                                amount_150=D("150.00"),
-                                distribute=True,
-                                trigger="ecoupon_activate",
-                                include_direct_self=False,
-                                include_agency=False,
-                            )
-                        except Exception:
-                            # best-effort: do not fail the prime engine audit if matrix distribution errors
-                            pass
                         AuditTrail.objects.create(
-                            action="prime_150_distributed",
+                            action="prime_750_distributed",
                             actor=user,
                             coupon_code=code_obj,
-                            notes="Prime 150 commission distribution applied",
-                            metadata={"denomination": "150"},
+                            notes="Prime 750 commission distribution applied",
+                            metadata={"denomination": "750"},
                         )
-                    except Exception:
-                        # stamp failure audit for observability
-                        try:
-                            AuditTrail.objects.create(
-                                action="prime_150_distribution_failed",
-                                actor=user,
-                                coupon_code=code_obj,
-                                notes="Prime 150 engine failed during e-coupon activation",
-                                metadata={"denomination": "150"},
-                            )
-                        except Exception:
-                            pass
-        elif val == D("750"):
-            if not AuditTrail.objects.filter(action="prime_750_distributed", coupon_code=code_obj).exists():
-                try:
-                    from business.services.prime import distribute_prime_750_payouts
-                    distribute_prime_750_payouts(
-                        user,
-                        source={"type": "ECOUPON_750", "id": code_obj.id, "code": code_obj.code}
-                    )
-                    AuditTrail.objects.create(
-                        action="prime_750_distributed",
-                        actor=user,
-                        coupon_code=code_obj,
-                        notes="Prime 750 commission distribution applied",
-                        metadata={"denomination": "750"},
-                    )
-                except Exception:
-                    pass
+            except Exception:
+                pass
         else:
             # Other denominations or parse failures: no commission here
             try:
@@ -647,7 +781,7 @@ def handle_ecoupon_order_approve(task: BackgroundTask) -> None:
         "review_note": str
       }
     Steps:
-      - Allocate codes (product-specific pool, fallback to global by denomination) with select_for_update(skip_locked)
+      - Allocate codes (product-specific pool, fallback to global by denomination) via coupons.allocator reservation blocks
       - Update assignment fields/status based on role_at_purchase
       - For consumer orders: per-code eligibility + matrix/opening per denomination
       - Mark order APPROVED, set reviewer and audit
@@ -677,74 +811,51 @@ def handle_ecoupon_order_approve(task: BackgroundTask) -> None:
 
     reviewer = CustomUser.objects.filter(id=int(reviewer_id)).first() if reviewer_id else None
 
+    # Assign based on purchaser role
+    if role == "consumer":
+        update_kwargs = {"assigned_consumer_id": order.buyer_id, "status": "SOLD"}
+    elif role == "agency":
+        update_kwargs = {"assigned_agency_id": order.buyer_id, "status": "ASSIGNED_AGENCY"}
+    else:  # employee
+        update_kwargs = {"assigned_employee_id": order.buyer_id, "status": "ASSIGNED_EMPLOYEE"}
+
+    from coupons.allocator import InsufficientStock, allocate_pool_codes
+
+    need = int(order.quantity or 0)
     with transaction.atomic():
-        # Try product-scoped pool first
-        specific_qs = CouponCode.objects.filter(
-            issued_channel="e_coupon",
-            coupon=order.product.coupon,
-            value=order.denomination_snapshot,
-            status="AVAILABLE",
-            assigned_agency__isnull=True,
-            assigned_employee__isnull=True,
-            assigned_consumer__isnull=True,
-        )
-        available_before = specific_qs.count()
+        # Product-scoped pool first, then the global pool by denomination; all or nothing
         try:
-            specific_locking = specific_qs.select_for_update(skip_locked=True)
-        except Exception:
-            specific_locking = specific_qs
-
-        need = int(order.quantity or 0)
-        pick_ids = list(specific_locking.order_by("serial", "id").values_list("id", flat=True)[:need])
-
-        # Fallback to global pool by denomination
-        if len(pick_ids) < need:
-            missing = need - len(pick_ids)
-            global_qs = CouponCode.objects.filter(
-                issued_channel="e_coupon",
-                value=order.denomination_snapshot,
-                status="AVAILABLE",
-                assigned_agency__isnull=True,
-                assigned_employee__isnull=True,
-                assigned_consumer__isnull=True,
-            ).exclude(id__in=pick_ids)
-            try:
-                global_locking = global_qs.select_for_update(skip_locked=True)
-            except Exception:
-                global_locking = global_qs
-            fallback_ids = list(global_locking.order_by("serial", "id").values_list("id", flat=True)[:missing])
-            pick_ids.extend(fallback_ids)
-
-        if len(pick_ids) < need:
-            # Insufficient stock; record and exit gracefully
+            with transaction.atomic():
+                picks = allocate_pool_codes(need, value=order.denomination_snapshot, coupon_id=order.product.coupon_id, **update_kwargs)
+                if len(picks) < need:
+                    picks += allocate_pool_codes(need - len(picks), value=order.denomination_snapshot, **update_kwargs)
+                if len(picks) < need:
+                    raise InsufficientStock(len(picks), need)
+        except InsufficientStock as e:
+            # Insufficient stock; record and exit gracefully (partial allocation rolled back)
             try:
+                available_before = CouponCode.objects.filter(
+                    issued_channel="e_coupon",
+                    coupon=order.product.coupon,
+                    value=order.denomination_snapshot,
+                    status="AVAILABLE",
+                    assigned_agency__isnull=True,
+                    assigned_employee__isnull=True,
+                    assigned_consumer__isnull=True,
+                ).count()
                 AuditTrail.objects.create(
                     action="store_order_approve_insufficient",
                     actor=reviewer,
                     notes=f"Insufficient e-coupon inventory for order #{order.id}",
-                    metadata={"order_id": order.id, "needed": need, "allocated": len(pick_ids), "available_before": int(available_before or 0)},
+                    metadata={"order_id": order.id, "needed": need, "allocated": e.allocated, "available_before": int(available_before or 0)},
                 )
             except Exception:
                 pass
             return
 
-        # Assign based on purchaser role
-        if role == "consumer":
-            update_kwargs = {"assigned_consumer_id": order.buyer_id, "status": "SOLD"}
-        elif role == "agency":
-            update_kwargs = {"assigned_agency_id": order.buyer_id, "status": "ASSIGNED_AGENCY"}
-        else:  # employee
-            update_kwargs = {"assigned_employee_id": order.buyer_id, "status": "ASSIGNED_EMPLOYEE"}
-
-        write_qs = CouponCode.objects.filter(id__in=pick_ids).filter(
-            issued_channel="e_coupon",
-            status="AVAILABLE",
-            assigned_agency__isnull=True,
-            assigned_employee__isnull=True,
-            assigned_consumer__isnull=True,
-        )
-        affected = write_qs.update(**update_kwargs)
-        sample_codes = list(CouponCode.objects.filter(id__in=pick_ids).values_list("code", flat=True)[:5])
+        pick_ids = [pid for pid, _ in picks]
+        affected = len(picks)
+        sample_codes = [code for _, code in picks[:5]]
 
         # For consumer allocations: eligibility only. Activation is performed later by consumer.
         if role == "consumer" and affected:
@@ -825,7 +936,7 @@ def handle_assign_consumer_count(task: BackgroundTask) -> None:
 
     from decimal import Decimal, InvalidOperation
     from accounts.models import CustomUser
-    from coupons.models import CouponCode, AuditTrail, record_lucky_draw_eligibility_for_code
+    from coupons.models import CouponCode, AuditTrail, InventoryCounter, record_lucky_draw_eligibility_for_code
 
     # Load users
     actor = CustomUser.objects.filter(id=int(actor_id)).first()
@@ -878,18 +989,8 @@ def handle_assign_consumer_count(task: BackgroundTask) -> None:
     if code_value is not None:
         base_qs = base_qs.filter(value=code_value)
 
-    available_before = base_qs.count()
-    if available_before <= 0:
-        try:
-            AuditTrail.objects.create(
-                action="assign_consumer_count_skipped",
-                actor=actor,
-                notes="No eligible codes in pool",
-                metadata={"consumer_username": consumer.username, "requested": count, "available_before": 0},
-            )
-        except Exception:
-            pass
-        return
+    # Pool size from maintained counters (audit only); the pick below filters exactly
+    available_before = InventoryCounter.pool_available(actor, value=code_value, batch_id=batch_id)
 
     # Choose and update rows under lock
     with transaction.atomic():
@@ -900,12 +1001,12 @@ def handle_assign_consumer_count(task: BackgroundTask) -> None:
 
         pick_ids = list(locking_qs.order_by("serial", "id").values_list("id", flat=True)[:count])
         if not pick_ids:
-            available_after = base_qs.count()
+            available_after = InventoryCounter.pool_available(actor, value=code_value, batch_id=batch_id)
             try:
                 AuditTrail.objects.create(
                     action="assign_consumer_count_skipped",
                     actor=actor,
-                    notes="No eligible codes available at lock time",
+                    notes="No eligible codes available at lock time" if available_before > 0 else "No eligible codes in pool",
                     metadata={"consumer_username": consumer.username, "requested": count, "available_before": available_before, "available_after": available_after},
                 )
             except Exception:
@@ -992,7 +1093,7 @@ def handle_assign_employee_count(task: BackgroundTask) -> None:
 
     from decimal import Decimal, InvalidOperation
     from accounts.models import CustomUser
-    from coupons.models import CouponCode, AuditTrail
+    from coupons.models import CouponCode, AuditTrail, InventoryCounter
 
     actor = CustomUser.objects.filter(id=int(actor_id)).first()
     employee = CustomUser.objects.filter(id=int(employee_id)).first()
@@ -1025,18 +1126,7 @@ def handle_assign_employee_count(task: BackgroundTask) -> None:
     if code_value is not None:
         base_qs = base_qs.filter(value=code_value)
 
-    available_before = base_qs.count()
-    if available_before <= 0:
-        try:
-            AuditTrail.objects.create(
-                action="assign_employee_count_skipped",
-                actor=actor,
-                notes="No eligible codes in agency pool",
-                metadata={"employee_id": employee.id, "requested": count, "available_before": 0},
-            )
-        except Exception:
-            pass
-        return
+    available_before = InventoryCounter.total("agency", actor.id, status="ASSIGNED_AGENCY", value=code_value, batch_id=batch_id)
 
     with transaction.atomic():
         try:
@@ -1046,12 +1136,12 @@ def handle_assign_employee_count(task: BackgroundTask) -> None:
 
         pick_ids = list(locking_qs.order_by("serial", "id").values_list("id", flat=True)[:count])
         if not pick_ids:
-            available_after = base_qs.count()
+            available_after = InventoryCounter.total("agency", actor.id, status="ASSIGNED_AGENCY", value=code_value, batch_id=batch_id)
             try:
                 AuditTrail.objects.create(
                     action="assign_employee_count_skipped",
                     actor=actor,
-                    notes="No eligible codes available at lock time",
+                    notes="No eligible codes available at lock time" if available_before > 0 else "No eligible codes in agency pool",
                     metadata={"employee_id": employee.id, "requested": count, "available_before": available_before, "available_after": available_after},
                 )
             except Exception:
@@ -1320,6 +1410,124 @@ def handle_bulk_assign_agencies(task: BackgroundTask) -> None:
         except Exception:
             pass
 
+def handle_ecoupon_generate(task: BackgroundTask) -> None:
+    """
+    Background: fill a random e-coupon batch (created by CouponBatchViewSet.create_ecoupons) up to count.
+
+    Payload:
+      {
+        "actor_id": int,
+        "batch_id": int,
+        "count": int,
+        "value": str,
+        "prefix": str
+      }
+    Resumable: codes already in the batch are counted and only the remainder is generated.
+    """
+    payload = task.payload or {}
+    try:
+        count = int(payload.get("count") or 0)
+    except Exception:
+        count = 0
+    batch_id = payload.get("batch_id")
+    actor_id = payload.get("actor_id")
+    if not batch_id or not actor_id or count <= 0:
+        return
+
+    from decimal import Decimal
+    from accounts.models import CustomUser
+    from coupons.codegen import generate_codes
+    from coupons.models import AuditTrail, CouponBatch, CouponCode
+
+    actor = CustomUser.objects.filter(id=int(actor_id)).first()
+    batch = CouponBatch.objects.select_related("coupon").filter(id=int(batch_id)).first()
+    if not actor or not batch:
+        return
+    prefix = (payload.get("prefix") or batch.prefix or "LDGR").strip().upper()
+    value = Decimal(str(payload.get("value") or "150"))
+
+    done = CouponCode.objects.filter(batch=batch).count()
+    task.set_progress(done, count)
+    if done < count:
+        generate_codes(
+            coupon=batch.coupon,
+            batch=batch,
+            prefix=prefix,
+            count=count - done,
+            value=value,
+            issued_by=actor,
+            on_progress=lambda n, _t: task.set_progress(done + n, count),
+        )
+    total = CouponCode.objects.filter(batch=batch).count()
+    task.set_progress(total, count)
+    try:
+        AuditTrail.objects.create(
+            action="batch_created_random_ecoupons",
+            actor=actor,
+            batch=batch,
+            notes=f"Generated {total} random e-codes",
+            metadata={"prefix": prefix, "count": total, "value": str(value), "task_id": task.id},
+        )
+    except Exception:
+        pass
+
+
+def handle_external_lookup_refresh(task: BackgroundTask) -> None:
+    """
+    Background: re-fetch an expired ExternalLookup row (served stale meanwhile, see locations.geocache).
+
+    Payload:
+      {
+        "provider": str,
+        "key": str
+      }
+    """
+    from locations import geocache
+
+    payload = task.payload or {}
+    provider = str(payload.get("provider") or "")
+    key = str(payload.get("key") or "")
+    if provider and key:
+        geocache.refresh(provider, key)
+
+
+def handle_inventory_reconcile(task: BackgroundTask) -> None:
+    """
+    Periodic (queued by process_tasks): reconcile InventoryCounter with CouponCode to repair drift from
+    raw SQL or lost after-commit deltas. Corrections are added as deltas under a lock on the counter rows
+    (InventoryCounter.reconcile), so concurrent allocations keep their updates.
+    """
+    from django.core.management import call_command
+
+    call_command("rebuild_inventory_counters")
+
+
+def handle_external_lookup_prune(task: BackgroundTask) -> None:
+    """
+    Periodic (queued by process_tasks): delete ExternalLookup rows not read for LOCATIONS_LOOKUP_RETENTION_DAYS.
+    """
+    from locations import geocache
+
+    geocache.prune()
+
+
+def handle_earnings_rollup_build(task: BackgroundTask) -> None:
+    """
+    Background: build one user's EarningsRollup history (queued by EarningsRollup.totals on first read,
+    which serves the ledger aggregate until the build lands).
+
+    Payload:
+      {
+        "user_id": int
+      }
+    """
+    from accounts.models import EarningsRollup, EarningsRollupState
+
+    user_id = int((task.payload or {}).get("user_id") or 0)
+    if user_id and not EarningsRollupState.objects.filter(user_id=user_id).exists():
+        EarningsRollup.build_for_user(user_id)
+
+
 # Register built-in handlers
 register_handler("coupon_dist", handle_coupon_dist)
 register_handler("monthly_759", handle_monthly_759)
@@ -1331,6 +1539,11 @@ register_handler("assign_employee_count", handle_assign_employee_count)
 register_handler("assign_agency_count", handle_assign_agency_count)
 register_handler("admin_assign_employee_count", handle_admin_assign_employee_count)
 register_handler("bulk_assign_agencies", handle_bulk_assign_agencies)
+register_handler("ecoupon_generate", handle_ecoupon_generate)
+register_handler("external_lookup_refresh", handle_external_lookup_refresh)
+register_handler("inventory_reconcile", handle_inventory_reconcile)
+register_handler("external_lookup_prune", handle_external_lookup_prune)
+register_handler("earnings_rollup_build", handle_earnings_rollup_build)
 
 
 # -----------------------
@@ -0,0 +1,221 @@
+"""
+Push wakeups for BackgroundTask via Postgres LISTEN/NOTIFY.
+
+  - notify_enqueued(): pg_notify on CHANNEL_QUEUE (delivered when the enqueuing transaction commits)
+  - notify_finished(): pg_notify on CHANNEL_DONE with the task id
+  - Listener: dedicated connection blocked on LISTEN (workers)
+  - wait_for_task_done(): long-poll helper for the status endpoint; one shared listener thread per process
+  - notify_unread() / wait_for_unread_change(): the same for notification unread counts (CHANNEL_UNREAD,
+    payload "<user id>,<user id>..." or "*" for everyone, e.g. a new broadcast)
+
+On non-Postgres databases (SQLite dev) notifications are no-ops and waits fall back to polling.
+"""
+from __future__ import annotations
+
+import select
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+from django.db import connection, connections
+
+CHANNEL_QUEUE = "bgtask_queue"
+CHANNEL_DONE = "bgtask_done"
+CHANNEL_UNREAD = "notif_unread"
+# pg_notify payloads are capped at 8000 bytes; bigger user sets are sent as "*"
+_MAX_PAYLOAD = 7000
+
+
+def _is_postgres(conn=None) -> bool:
+    return getattr(conn or connection, "vendor", "") == "postgresql"
+
+
+def _notify(channel: str, payload: str = "") -> None:
+    if not _is_postgres():
+        return
+    try:
+        with connection.cursor() as cur:
+            cur.execute("SELECT pg_notify(%s, %s)", [channel, str(payload or "")])
+    except Exception:
+        # best-effort; workers and waiters still poll
+        pass
+
+
+def notify_enqueued(task_type: str = "") -> None:
+    _notify(CHANNEL_QUEUE, task_type)
+
+
+def notify_finished(task_id) -> None:
+    _notify(CHANNEL_DONE, str(task_id))
+
+
+def notify_unread(user_ids=None) -> None:
+    """
+    Wake unread-count waiters of user_ids (None = everyone). Delivered when the transaction commits.
+    """
+    if user_ids is None:
+        _notify(CHANNEL_UNREAD, "*")
+        return
+    payload = ",".join(str(int(u)) for u in sorted(set(user_ids)) if u)
+    if payload:
+        _notify(CHANNEL_UNREAD, payload if len(payload) <= _MAX_PAYLOAD else "*")
+
+
+class Listener:
+    """
+    LISTEN on channels over a dedicated connection (never the request/worker connection, which may be
+    inside a transaction). wait() returns notification payloads, or [] after the timeout.
+    Falls back to sleep(timeout) when LISTEN is unavailable.
+    """
+
+    def __init__(self, *channels: str, alias: str = "default"):
+        self.channels = channels
+        self.alias = alias
+        self._wrapper = None
+        self._raw = None
+
+    @property
+    def active(self) -> bool:
+        return self._raw is not None
+
+    def start(self) -> bool:
+        if self._raw is not None:
+            return True
+        try:
+            if not _is_postgres(connections[self.alias]):
+                return False
+            wrapper = connections.create_connection(self.alias)
+            wrapper.ensure_connection()
+            raw = wrapper.connection
+            if not hasattr(raw, "poll"):
+                # psycopg2 API (poll()/notifies list) only; other drivers poll instead
+                wrapper.close()
+                return False
+            raw.autocommit = True
+            with raw.cursor() as cur:
+                for ch in self.channels:
+                    cur.execute(f'LISTEN "{ch}"')
+            self._wrapper, self._raw = wrapper, raw
+            return True
+        except Exception:
+            self.close()
+            return False
+
+    def close(self) -> None:
+        try:
+            if self._wrapper is not None:
+                self._wrapper.close()
+        except Exception:
+            pass
+        self._wrapper = None
+        self._raw = None
+
+    def wait(self, timeout: float) -> List[str]:
+        timeout = max(0.0, float(timeout))
+        if self._raw is None and not self.start():
+            time.sleep(timeout)
+            return []
+        raw = self._raw
+        try:
+            if not raw.notifies:
+                ready, _, _ = select.select([raw], [], [], timeout)
+                if ready:
+                    raw.poll()
+            else:
+                raw.poll()
+            payloads = [n.payload for n in raw.notifies]
+            raw.notifies.clear()
+            return payloads
+        except Exception:
+            # Connection dropped: reconnect on next wait
+            self.close()
+            return []
+
+
+class _Hub:
+    """
+    Process-wide LISTEN on one channel; long-poll requests wait on per-key events. A payload is a
+    comma-separated list of keys; "*" wakes every waiter.
+    """
+
+    def __init__(self, channel: str):
+        self.channel = channel
+        self._lock = threading.Lock()
+        self._waiters: Dict[str, Set[threading.Event]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._listening = False
+
+    def _ensure_thread(self) -> bool:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return self._listening
+            listener = Listener(self.channel)
+            if not listener.start():
+                return False
+            self._listening = True
+            self._thread = threading.Thread(target=self._loop, args=(listener,), name=f"{self.channel}-hub", daemon=True)
+            self._thread.start()
+            return True
+
+    def _loop(self, listener: Listener) -> None:
+        try:
+            while listener.active:
+                for payload in listener.wait(30.0):
+                    with self._lock:
+                        if payload == "*":
+                            events = [ev for evs in self._waiters.values() for ev in evs]
+                        else:
+                            events = [ev for key in payload.split(",") for ev in self._waiters.get(key, ())]
+                    for ev in events:
+                        ev.set()
+        finally:
+            self._listening = False
+            listener.close()
+            # Wake everyone so they re-check the database
+            with self._lock:
+                for events in self._waiters.values():
+                    for ev in events:
+                        ev.set()
+
+    def wait(self, key, timeout: float, is_done: Callable[[], bool], poll_interval: float = 1.0) -> bool:
+        key = str(key)
+        deadline = time.monotonic() + max(0.0, timeout)
+        pushed = self._ensure_thread()
+        ev = threading.Event()
+        with self._lock:
+            self._waiters.setdefault(key, set()).add(ev)
+        try:
+            while True:
+                if is_done():
+                    return True
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return False
+                # With LISTEN the DB re-check is only a safety net against missed notifications
+                ev.wait(min(left, 5.0 if pushed else poll_interval))
+                ev.clear()
+        finally:
+            with self._lock:
+                events = self._waiters.get(key)
+                if events is not None:
+                    events.discard(ev)
+                    if not events:
+                        self._waiters.pop(key, None)
+
+
+_done_hub = _Hub(CHANNEL_DONE)
+_unread_hub = _Hub(CHANNEL_UNREAD)
+
+
+def wait_for_task_done(task_id, timeout: float, is_done: Callable[[], bool]) -> bool:
+    """
+    Block up to timeout seconds until is_done() is True (woken by CHANNEL_DONE, else polled).
+    """
+    return _done_hub.wait(task_id, timeout, is_done)
+
+
+def wait_for_unread_change(user_id, timeout: float, changed: Callable[[], bool]) -> bool:
+    """
+    Block up to timeout seconds until changed() is True (woken by CHANNEL_UNREAD, else polled every 2s).
+    """
+    return _unread_hub.wait(user_id, timeout, changed, poll_interval=2.0)
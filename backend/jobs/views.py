@@ -1,3 +1,6 @@
+import threading
+
+from django.conf import settings
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
@@ -5,12 +8,24 @@ from rest_framework import status as drf_status
 
 from .models import BackgroundTask
 
+# Long-poll waiters per process: each holds a gunicorn thread, so keep most threads for normal requests
+_WAIT_MAX_WAITERS = int(getattr(settings, "JOBS_STATUS_LONGPOLL_MAX_WAITERS", 0) or 0)
+_wait_slots = threading.BoundedSemaphore(_WAIT_MAX_WAITERS) if _WAIT_MAX_WAITERS > 0 else None
+WAIT_BUSY_RETRY_SECONDS = 2
+
 
 class BackgroundTaskStatusView(APIView):
     """
-    GET /api/jobs/<id>/status/
+    GET /api/jobs/<id>/status/[?wait=<seconds>]
     Returns lightweight status for a background task so clients can poll.
 
+    Long-poll: with wait=N (capped at MAX_WAIT_SECONDS) a PENDING/RUNNING task is held until it
+    reaches DONE/FAILED or N seconds pass, then the current status is returned. Wakeups come from
+    Postgres NOTIFY (jobs.notify); other databases re-check about once per second. Waiters are capped
+    per process (JOBS_STATUS_LONGPOLL_MAX_WAITERS, 0 by default); without a free slot the status is
+    returned at once with retry_after > 0 and the client should wait that long before asking again,
+    i.e. by default clients poll every WAIT_BUSY_RETRY_SECONDS.
+
     Response:
     {
       "id": 18,
@@ -21,20 +36,53 @@ class BackgroundTaskStatusView(APIView):
       "max_attempts": 5,
       "scheduled_at": "...",
       "started_at": "...",
-      "finished_at": "..."
+      "finished_at": "...",
+      "progress": {"done": 1200, "total": 5000} | null,  # long-running tasks (e.g. ecoupon_generate)
+      "retry_after": 0                                    # seconds before the next poll
     }
     """
     permission_classes = [IsAuthenticated]
+    MAX_WAIT_SECONDS = 25
+    TERMINAL = (BackgroundTask.STATUS_DONE, BackgroundTask.STATUS_FAILED)
 
-    def get(self, request, pk: int):
-        task = (
+    @staticmethod
+    def _load(pk: int):
+        return (
             BackgroundTask.objects
             .filter(pk=int(pk))
-            .only("id", "type", "status", "last_error", "attempts", "max_attempts", "scheduled_at", "started_at", "finished_at")
+            .only("id", "type", "status", "last_error", "attempts", "max_attempts", "scheduled_at", "started_at", "finished_at", "progress")
             .first()
         )
+
+    def get(self, request, pk: int):
+        task = self._load(pk)
         if not task:
             return Response({"detail": "Not found."}, status=drf_status.HTTP_404_NOT_FOUND)
+
+        try:
+            wait_s = float(request.query_params.get("wait") or 0)
+        except Exception:
+            wait_s = 0.0
+        wait_s = max(0.0, min(wait_s, float(self.MAX_WAIT_SECONDS)))
+        retry_after = 0
+        if wait_s > 0 and task.status not in self.TERMINAL:
+            if _wait_slots is None or not _wait_slots.acquire(blocking=False):
+                retry_after = WAIT_BUSY_RETRY_SECONDS
+            else:
+                try:
+                    from .notify import wait_for_task_done
+                    latest = {"task": task}
+
+                    def _done() -> bool:
+                        t = self._load(pk)
+                        if t is not None:
+                            latest["task"] = t
+                        return t is None or t.status in self.TERMINAL
+
+                    wait_for_task_done(task.id, wait_s, _done)
+                    task = latest["task"]
+                finally:
+                    _wait_slots.release()
         return Response(
             {
                 "id": task.id,
@@ -46,6 +94,8 @@ class BackgroundTaskStatusView(APIView):
                 "scheduled_at": task.scheduled_at,
                 "started_at": task.started_at,
                 "finished_at": task.finished_at,
+                "progress": task.progress,
+                "retry_after": retry_after,
             },
             status=drf_status.HTTP_200_OK,
         )
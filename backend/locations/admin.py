@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.conf import settings
-from .models import Country, State, City
+from .models import City, Country, ExternalLookup, State
 
 # Hide Locations (Country/State/City) from Django Admin by default
 # Set HIDE_LOCATIONS_IN_ADMIN = False in settings.py to re-enable.
@@ -23,3 +23,11 @@ if not HIDE_LOCATIONS_IN_ADMIN:
     class CityAdmin(admin.ModelAdmin):
         list_display = ("name", "state")
         list_filter = ("state",)
+
+
+@admin.register(ExternalLookup)
+class ExternalLookupAdmin(admin.ModelAdmin):
+    list_display = ("provider", "key", "ok", "status_code", "failures", "fetched_at", "expires_at", "last_used_at")
+    list_filter = ("provider", "ok")
+    search_fields = ("key",)
+    readonly_fields = ("payload",)
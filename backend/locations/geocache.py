@@ -0,0 +1,285 @@
+"""
+Persistent, coalescing cache for the external location APIs used by locations.views
+(api.postalpincode.in and Nominatim).
+
+  - one ExternalLookup row per (provider, key) holds the upstream JSON and an expiry: answers with data
+    live LOCATIONS_LOOKUP_TTL_SECONDS, "no data" answers (negative cache) LOCATIONS_LOOKUP_NEGATIVE_TTL_SECONDS
+  - a miss calls upstream once per process: concurrent identical misses wait for that call (single flight)
+  - an expired row is still served and an external_lookup_refresh job re-fetches it in the worker,
+    so only first-time lookups wait on upstream
+  - failures (timeouts, 5xx) never replace cached data; they are remembered for
+    LOCATIONS_LOOKUP_ERROR_TTL_SECONDS so a slow upstream is not called again per keystroke
+  - the HTTP client is pluggable: LOCATIONS_LOOKUP_CLIENT (dotted path) or set_client(), e.g. StubClient
+  - rows unread for LOCATIONS_LOOKUP_RETENTION_DAYS are deleted by prune() (external_lookup_prune job)
+"""
+from __future__ import annotations
+
+import threading
+from datetime import timedelta
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import quote
+
+import requests
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+POSTAL_PINCODE = "postal_pincode"
+POSTAL_OFFICE = "postal_office"
+NOMINATIM_REVERSE = "nominatim_reverse"
+NOMINATIM_SEARCH = "nominatim_search"
+
+EXTERNAL_UA = "TrikonektApp/1.0 (contact: admin@trikonekt.local)"
+POSTAL_HEADERS = {"User-Agent": EXTERNAL_UA}
+# Per Nominatim usage policy, include a valid identifying UA with contact
+NOMINATIM_HEADERS = {"User-Agent": EXTERNAL_UA, "Accept-Language": "en-IN"}
+
+REFRESH_TASK = "external_lookup_refresh"
+PRUNE_TASK = "external_lookup_prune"
+TOUCH_INTERVAL = timedelta(hours=1)
+
+_client = None
+_client_lock = threading.Lock()
+_inflight: Dict[Tuple[str, str], "_Flight"] = {}
+_inflight_lock = threading.Lock()
+_scheduled: set = set()
+
+
+class HttpClient:
+    """
+    Upstream client: short timeout and a single retry (the refresher retries later), so a slow
+    upstream holds a request thread for seconds rather than the old 3 x 10-15s.
+    """
+
+    def __init__(self):
+        self.session = requests.Session()
+        retries = Retry(total=1, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504], allowed_methods=["GET"])
+        adapter = HTTPAdapter(max_retries=retries)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get_json(self, url: str, params: Optional[dict], headers: dict, timeout: float) -> Tuple[int, Any]:
+        r = self.session.get(url, params=params, headers=headers, timeout=timeout)
+        return r.status_code, (r.json() if r.status_code == 200 else None)
+
+
+class StubClient:
+    """
+    Local stand-in for tests/offline setups: answers from responses {url: json}, 404 otherwise.
+    """
+
+    def __init__(self, responses: Optional[Dict[str, Any]] = None):
+        self.responses = dict(responses or {})
+        self.calls = []
+
+    def get_json(self, url: str, params: Optional[dict], headers: dict, timeout: float) -> Tuple[int, Any]:
+        self.calls.append((url, params))
+        if url in self.responses:
+            return 200, self.responses[url]
+        return 404, None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                path = getattr(settings, "LOCATIONS_LOOKUP_CLIENT", "") or "locations.geocache.HttpClient"
+                _client = import_string(path)()
+    return _client
+
+
+def set_client(client) -> None:
+    """
+    Swap the upstream client (None = rebuild from settings on next use).
+    """
+    global _client
+    with _client_lock:
+        _client = client
+
+
+def _seconds(name: str, default: float) -> float:
+    return float(getattr(settings, name, default) or 0)
+
+
+def normalize_key(key: str) -> str:
+    return " ".join(str(key or "").split()).lower()
+
+
+def _request(provider: str, key: str) -> Tuple[str, Optional[dict], dict]:
+    if provider == POSTAL_PINCODE:
+        return f"https://api.postalpincode.in/pincode/{quote(key)}", None, POSTAL_HEADERS
+    if provider == POSTAL_OFFICE:
+        return f"https://api.postalpincode.in/postoffice/{quote(key)}", None, POSTAL_HEADERS
+    if provider == NOMINATIM_REVERSE:
+        lat, lon = key.split(",", 1)
+        params = {"format": "jsonv2", "lat": lat, "lon": lon, "addressdetails": 1, "zoom": 18}
+        return "https://nominatim.openstreetmap.org/reverse", params, NOMINATIM_HEADERS
+    if provider == NOMINATIM_SEARCH:
+        # key: "postalcode:<pin>" or "q:<text>"
+        field, value = key.split(":", 1)
+        params = {"format": "jsonv2", field: value, "countrycodes": "in", "addressdetails": 1, "limit": 50}
+        return "https://nominatim.openstreetmap.org/search", params, NOMINATIM_HEADERS
+    raise ValueError(f"Unknown lookup provider '{provider}'")
+
+
+def _has_data(provider: str, data) -> bool:
+    if provider in (POSTAL_PINCODE, POSTAL_OFFICE):
+        entry = (data[0] or {}) if isinstance(data, list) and data else {}
+        return entry.get("Status") == "Success"
+    if provider == NOMINATIM_REVERSE:
+        return isinstance(data, dict) and not data.get("error")
+    return bool(data)
+
+
+def _store(provider: str, key: str, status_code: Optional[int], data) -> Any:
+    """
+    Save a fetch result and return what callers should see (the cached payload when the fetch failed).
+    """
+    from locations.models import ExternalLookup
+
+    now = timezone.now()
+    row = ExternalLookup.objects.filter(provider=provider, key=key).first()
+    if status_code == 200:
+        ok = _has_data(provider, data)
+        ttl = _seconds("LOCATIONS_LOOKUP_TTL_SECONDS" if ok else "LOCATIONS_LOOKUP_NEGATIVE_TTL_SECONDS", 86400)
+        fields = dict(payload=data, ok=ok, status_code=200, failures=0, fetched_at=now, expires_at=now + timedelta(seconds=ttl))
+    else:
+        # Keep whatever was cached; just hold off upstream for a while
+        fields = dict(
+            status_code=status_code,
+            failures=min(32767, (row.failures if row else 0) + 1),
+            expires_at=now + timedelta(seconds=_seconds("LOCATIONS_LOOKUP_ERROR_TTL_SECONDS", 120)),
+        )
+    try:
+        if row is None:
+            ExternalLookup.objects.create(provider=provider, key=key, **fields)
+        else:
+            ExternalLookup.objects.filter(pk=row.pk).update(last_used_at=now, **fields)
+    except Exception:
+        # Another process stored it first; its answer is as good as ours
+        pass
+    if status_code == 200:
+        return data
+    return row.payload if row is not None else None
+
+
+def refresh(provider: str, key: str) -> Any:
+    """
+    Call upstream now and store the result; returns the payload callers should see.
+    """
+    key = normalize_key(key)
+    url, params, headers = _request(provider, key)
+    try:
+        status_code, data = get_client().get_json(url, params, headers, _seconds("LOCATIONS_LOOKUP_TIMEOUT_SECONDS", 6))
+    except Exception:
+        status_code, data = None, None
+    try:
+        return _store(provider, key, status_code, data)
+    except Exception:
+        return data if status_code == 200 else None
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+def _fetch_once(provider: str, key: str) -> Any:
+    fk = (provider, key)
+    with _inflight_lock:
+        flight = _inflight.get(fk)
+        leader = flight is None
+        if leader:
+            flight = _inflight[fk] = _Flight()
+    if not leader:
+        # Bounded by the leader's own (timeout + one retry)
+        flight.done.wait(_seconds("LOCATIONS_LOOKUP_TIMEOUT_SECONDS", 6) * 2 + 1)
+        return flight.result
+    try:
+        flight.result = refresh(provider, key)
+    finally:
+        with _inflight_lock:
+            _inflight.pop(fk, None)
+        flight.done.set()
+    return flight.result
+
+
+def _schedule_refresh(row) -> None:
+    from jobs.models import BackgroundTask
+
+    ikey = f"{REFRESH_TASK}:{row.pk}:{int(row.expires_at.timestamp())}"
+    if ikey in _scheduled:
+        return
+    if len(_scheduled) > 10000:
+        _scheduled.clear()
+    _scheduled.add(ikey)
+    try:
+        BackgroundTask.enqueue(REFRESH_TASK, {"provider": row.provider, "key": row.key}, idempotency_key=ikey, max_attempts=1)
+    except Exception:
+        pass
+
+
+def _uncached(provider: str, key: str) -> Any:
+    url, params, headers = _request(provider, key)
+    try:
+        status_code, data = get_client().get_json(url, params, headers, _seconds("LOCATIONS_LOOKUP_TIMEOUT_SECONDS", 6))
+    except Exception:
+        return None
+    return data if status_code == 200 else None
+
+
+def prune(days: Optional[float] = None, batch_size: int = 1000, dry_run: bool = False) -> int:
+    """
+    Delete lookups not read for `days` (default LOCATIONS_LOOKUP_RETENTION_DAYS; <= 0 keeps everything).
+    Deletes in pk batches so no single statement holds locks over the whole table. Returns rows removed
+    (or that would be, with dry_run).
+    """
+    from locations.models import ExternalLookup
+
+    if days is None:
+        days = _seconds("LOCATIONS_LOOKUP_RETENTION_DAYS", 90)
+    if days <= 0:
+        return 0
+    stale = ExternalLookup.objects.filter(last_used_at__lt=timezone.now() - timedelta(days=days))
+    if dry_run:
+        return stale.count()
+    removed = 0
+    while True:
+        pks = list(stale.order_by("pk").values_list("pk", flat=True)[:max(1, int(batch_size))])
+        if not pks:
+            return removed
+        removed += ExternalLookup.objects.filter(pk__in=pks).delete()[0]
+
+
+def get_json(provider: str, key: str) -> Any:
+    """
+    Upstream JSON for (provider, key) as it would come from a 200 response, or None when unavailable.
+    """
+    from locations.models import ExternalLookup
+
+    key = normalize_key(key)
+    if not key:
+        return None
+    if len(key) > 255:
+        return _uncached(provider, key)
+    try:
+        row = ExternalLookup.objects.filter(provider=provider, key=key).first()
+    except Exception:
+        row = None
+    if row is None:
+        return _fetch_once(provider, key)
+    now = timezone.now()
+    if row.expires_at <= now:
+        if row.payload is None:
+            return _fetch_once(provider, key)
+        _schedule_refresh(row)
+    if row.last_used_at <= now - TOUCH_INTERVAL:
+        try:
+            ExternalLookup.objects.filter(pk=row.pk).update(last_used_at=now)
+        except Exception:
+            pass
+    return row.payload
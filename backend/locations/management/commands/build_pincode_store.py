@@ -0,0 +1,28 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from locations import pincode_store
+
+
+class Command(BaseCommand):
+    help = (
+        "Compile locations/data/pincodes_offline.json into the read-only SQLite store workers share "
+        "(locations/data/pincodes_offline.sqlite3). Run at build time; skips when the JSON is absent."
+    )
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument("--json", default=pincode_store.JSON_PATH, help="Source JSON (default: bundled dataset)")
+        parser.add_argument("--out", default=pincode_store.STORE_PATH, help="Store path (default: next to the JSON)")
+
+    def handle(self, *args, **options):
+        src = options.get("json") or pincode_store.JSON_PATH
+        out = options.get("out") or pincode_store.STORE_PATH
+        if not os.path.exists(src):
+            self.stdout.write(f"{src} not found; skipping.")
+            return
+        counts = pincode_store.compile_store(src, out)
+        self.stdout.write(self.style.SUCCESS(
+            "Done. pincodes={pincodes} district_pins={district_pins} records={records} places={places} "
+            "place_terms={place_terms} -> ".format(**counts) + out
+        ))
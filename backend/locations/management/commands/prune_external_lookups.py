@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandParser
+
+from locations import geocache
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete cached external location lookups (ExternalLookup) not read for --days "
+        "(default: settings.LOCATIONS_LOOKUP_RETENTION_DAYS). The worker queues this daily."
+    )
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument("--days", type=float, default=None, help="Retention in days (default: settings)")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows deleted per statement (default: 1000)")
+        parser.add_argument("--dry-run", action="store_true", help="Only count stale rows; do not delete.")
+
+    def handle(self, *args, **options):
+        dry_run = bool(options.get("dry_run"))
+        removed = geocache.prune(days=options.get("days"), batch_size=options.get("batch_size") or 1000, dry_run=dry_run)
+        self.stdout.write(self.style.SUCCESS(f"Done. stale={removed} dry_run={dry_run}"))
@@ -0,0 +1,31 @@
+# Generated by Django 6.1.2 on 2026-10-17 03:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0004_remove_country_iso3_alter_country_iso2'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExternalLookup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(max_length=32)),
+                ('key', models.CharField(max_length=255)),
+                ('payload', models.JSONField(blank=True, null=True)),
+                ('ok', models.BooleanField(default=False)),
+                ('status_code', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('failures', models.PositiveSmallIntegerField(default=0)),
+                ('fetched_at', models.DateTimeField(blank=True, null=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('last_used_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('provider', 'key'), name='uniq_external_lookup')],
+            },
+        ),
+    ]
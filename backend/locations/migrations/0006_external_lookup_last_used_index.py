@@ -0,0 +1,18 @@
+# Generated by Django 6.1.2 on 2026-10-17 04:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0005_external_lookup'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='externallookup',
+            name='last_used_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
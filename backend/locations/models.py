@@ -21,3 +21,28 @@ class City(models.Model):
 
     def __str__(self):
         return f"{self.name}, {self.state.name}"
+
+
+class ExternalLookup(models.Model):
+    """
+    Cached response of an external location API (India Post / Nominatim), see locations.geocache.
+    payload is the upstream JSON (None when the last fetch failed and nothing was cached before).
+    """
+    provider = models.CharField(max_length=32)
+    key = models.CharField(max_length=255)
+    payload = models.JSONField(null=True, blank=True)
+    # True: upstream returned data; False: "no data" answer (negative cache) or failure
+    ok = models.BooleanField(default=False)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    failures = models.PositiveSmallIntegerField(default=0)
+    fetched_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(db_index=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)  # pruned when stale (prune_external_lookups)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["provider", "key"], name="uniq_external_lookup"),
+        ]
+
+    def __str__(self):
+        return f"{self.provider}:{self.key}"
@@ -0,0 +1,492 @@
+"""
+Compiled offline pincode dataset (replaces loading pincodes_offline.json into every worker).
+
+  - `build_pincode_store` compiles pincodes_offline.json into a read-only SQLite file
+    (pincodes_offline.sqlite3) at build time; workers open it lazily, read-only and mmap'd, so the pages
+    are shared through the OS page cache instead of being a per-process dict
+  - tables: pincode (pin -> meta JSON, for pincode_lookup), district_pin (the (state, district) -> pin index
+    that _build_district_index used to build per worker) and record (pin/state/district/office rows for
+    the deep-scan and post-office fallbacks)
+  - place / place_term: autocomplete index over post offices, villages, gram panchayats and districts
+    (with legacy/modern name variants); every word-suffix of a name is a term, so a prefix range scan
+    on place_term finds "road" in "MG Road S.O" without scanning rows (suffixes starting at office-type
+    tails such as "S.O"/"B.O" or single letters are skipped: they would match every office)
+  - if the compiled file is missing, older than the JSON or from an older SCHEMA_VERSION, the first
+    caller compiles it (atomic replace); with neither present every lookup is empty, as before
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+from collections.abc import Mapping
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+
+JSON_PATH = os.path.join(settings.BASE_DIR, "locations", "data", "pincodes_offline.json")
+STORE_PATH = os.path.join(settings.BASE_DIR, "locations", "data", "pincodes_offline.sqlite3")
+MMAP_BYTES = 256 * 1024 * 1024
+SCHEMA_VERSION = 3
+
+PLACE_KINDS = ("office", "village", "gram_panchayat", "district")
+
+_STATE_KEYS = ("statename", "stateName", "STATE_NAME", "state", "State", "STATE")
+_DISTRICT_KEYS = ("district", "District", "DISTRICT", "city", "City")
+_PIN_KEYS = ("pincode", "Pincode", "PIN", "Pin")
+_OFFICE_KEYS = ("officename", "OfficeName", "name", "Name")
+_BLOCK_KEYS = ("block", "Block", "taluk", "Taluk")
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+# Words that never start a suffix term: post office type tails ("S.O", "B.O", "H.O", "G.P.O") and initials
+_NO_SUFFIX_WORDS = frozenset(("so", "bo", "ho", "po", "gpo", "ro", "sub", "branch", "head"))
+# search_places reads at most this many index entries per pass (times the requested limit)
+CANDIDATE_FACTOR = 5
+
+_local = threading.local()
+_build_lock = threading.Lock()
+
+
+def _first(meta: dict, keys) -> str:
+    for k in keys:
+        v = meta.get(k)
+        if v:
+            return str(v)
+    return ""
+
+
+def _pin_digits(v) -> str:
+    s = "".join(c for c in str(v or "").strip() if c.isdigit())
+    return s if len(s) == 6 else ""
+
+
+def norm_district(s: str) -> str:
+    s = (s or "").strip()
+    if s.lower().endswith(" district"):
+        s = s[:-8].strip()
+    return s.lower()
+
+
+def _unwrap_records(raw):
+    obj = raw
+    # Repeatedly unwrap common container keys until we reach a list of rows or a dict keyed by pincode
+    keys = ("records", "data", "rows", "items", "result", "list", "entries")
+    for _ in range(4):
+        if not isinstance(obj, dict):
+            break
+        for k in keys:
+            v = obj.get(k)
+            if isinstance(v, (list, dict)):
+                obj = v
+                break
+        else:
+            break
+    return obj
+
+
+def search_terms(name: str) -> List[str]:
+    """
+    Normalized name from each word on, except office-type tails and single letters
+    ("MG Road S.O" -> ["mg road s o", "road s o"]). The full name is always the first term.
+    """
+    words = _NON_WORD.sub(" ", str(name or "").lower()).split()
+    return [
+        " ".join(words[i:]) for i in range(len(words))
+        if i == 0 or (len(words[i]) > 1 and words[i] not in _NO_SUFFIX_WORDS)
+    ]
+
+
+def _places(meta: dict, pin: str):
+    """
+    Yield (kind, display name, pin, block) autocomplete entries found in one record.
+    """
+    office = _first(meta, _OFFICE_KEYS).strip()
+    if office:
+        yield "office", office, pin, _first(meta, _BLOCK_KEYS).strip()
+    for po in meta.get("post_offices") or []:
+        if isinstance(po, dict):
+            name = _first(po, _OFFICE_KEYS).strip()
+            if name:
+                yield "office", name, pin, _first(po, _BLOCK_KEYS).strip()
+    for kind, key in (("village", "villages"), ("gram_panchayat", "gram_panchayats")):
+        for name in meta.get(key) or []:
+            if isinstance(name, str) and name.strip():
+                yield kind, name.strip(), pin, ""
+
+
+def _iter_rows(raw):
+    """
+    Yield (pin_key, meta, pins) for each usable record; pin_key is the dict key (dict datasets) or None.
+    """
+    records = _unwrap_records(raw)
+    if isinstance(records, dict):
+        for k, meta in records.items():
+            if not isinstance(meta, dict):
+                continue
+            pins = [k]
+            alt = _first(meta, _PIN_KEYS)
+            if alt and str(alt) != str(k):
+                pins.append(alt)
+            yield str(k), meta, pins
+    elif isinstance(records, list):
+        for row in records:
+            if isinstance(row, dict):
+                yield None, row, [_first(row, _PIN_KEYS)]
+
+
+def compile_store(json_path: str = JSON_PATH, store_path: str = STORE_PATH) -> Dict[str, int]:
+    """
+    Compile json_path into store_path (written to a temp file, then atomically replaced).
+    """
+    with open(json_path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+
+    pincodes = []
+    index: Set[tuple] = set()
+    records: Set[tuple] = set()
+    places: Dict[tuple, tuple] = {}
+    for pin_key, meta, pins in _iter_rows(raw):
+        if pin_key is not None:
+            pincodes.append((pin_key, json.dumps(meta, separators=(",", ":"), ensure_ascii=False)))
+        state = _first(meta, _STATE_KEYS).strip()
+        district = _first(meta, _DISTRICT_KEYS)
+        office = _first(meta, _OFFICE_KEYS).strip().lower()
+        for p in pins:
+            pin = _pin_digits(p)
+            if not pin:
+                continue
+            dkey = norm_district(district)
+            if dkey:
+                index.add((state.lower(), dkey, pin))
+                # also index without state to allow district-only lookups
+                index.add(("", dkey, pin))
+            records.add((pin, state.lower(), dkey, office))
+            for kind, name, ppin, block in _places(meta, pin):
+                places.setdefault((kind, name.lower(), ppin, state.lower()), (kind, name, ppin, block, district.strip(), state))
+            if dkey:
+                places.setdefault(("district", dkey, "", state.lower()), ("district", district.strip(), "", "", district.strip(), state))
+
+    # Districts also answer to their legacy/modern names (Gulbarga -> Kalaburagi)
+    from locations.views import india_place_variants
+
+    place_rows = []
+    term_rows = set()
+    for place_id, (kind, name, pin, block, district, state) in enumerate(sorted(places.values()), start=1):
+        place_rows.append((place_id, kind, name, pin, block, district, state))
+        names = [name] + (india_place_variants(name) if kind == "district" else [])
+        for n in names:
+            for pos, term in enumerate(search_terms(n)):
+                term_rows.add((term, place_id, pos))
+
+    fd, tmp = tempfile.mkstemp(prefix=".pincodes-", suffix=".sqlite3", dir=os.path.dirname(store_path))
+    os.close(fd)
+    try:
+        con = sqlite3.connect(tmp)
+        con.executescript(
+            """
+            PRAGMA journal_mode=OFF;
+            PRAGMA synchronous=OFF;
+            CREATE TABLE pincode (pin TEXT PRIMARY KEY, meta TEXT NOT NULL) WITHOUT ROWID;
+            CREATE TABLE district_pin (
+                district TEXT NOT NULL, state TEXT NOT NULL, pin TEXT NOT NULL,
+                PRIMARY KEY (district, state, pin)
+            ) WITHOUT ROWID;
+            CREATE TABLE record (pin TEXT NOT NULL, state TEXT NOT NULL, district TEXT NOT NULL, office TEXT NOT NULL);
+            CREATE TABLE place (
+                id INTEGER PRIMARY KEY, kind TEXT NOT NULL, name TEXT NOT NULL, pin TEXT NOT NULL,
+                block TEXT NOT NULL, district TEXT NOT NULL, state TEXT NOT NULL
+            );
+            CREATE TABLE place_term (
+                term TEXT NOT NULL, place_id INTEGER NOT NULL, pos INTEGER NOT NULL,
+                PRIMARY KEY (term, place_id, pos)
+            ) WITHOUT ROWID;
+            """
+        )
+        con.executemany("INSERT OR IGNORE INTO pincode VALUES (?, ?)", pincodes)
+        con.executemany("INSERT INTO district_pin (state, district, pin) VALUES (?, ?, ?)", sorted(index))
+        con.executemany("INSERT INTO record VALUES (?, ?, ?, ?)", sorted(records))
+        con.executemany("INSERT INTO place VALUES (?, ?, ?, ?, ?, ?, ?)", place_rows)
+        con.executemany("INSERT INTO place_term VALUES (?, ?, ?)", sorted(term_rows))
+        con.executescript(
+            """
+            CREATE INDEX record_district_idx ON record (district, state);
+            CREATE INDEX district_pin_state_idx ON district_pin (state, district);
+            CREATE INDEX district_pin_pin_idx ON district_pin (pin);
+            """
+        )
+        con.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        con.commit()
+        con.execute("VACUUM")
+        con.close()
+        os.replace(tmp, store_path)
+    except Exception:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return {
+        "pincodes": len(pincodes),
+        "district_pins": len(index),
+        "records": len(records),
+        "places": len(place_rows),
+        "place_terms": len(term_rows),
+    }
+
+
+def _stale() -> bool:
+    try:
+        js = os.stat(JSON_PATH).st_mtime
+    except OSError:
+        return False
+    try:
+        return os.stat(STORE_PATH).st_mtime < js
+    except OSError:
+        return True
+
+
+def _compile_locked() -> None:
+    with _build_lock:
+        try:
+            compile_store()
+        except Exception:
+            pass
+
+
+def _connection(_recompiled: bool = False) -> Optional[sqlite3.Connection]:
+    """
+    Per-thread read-only connection; reopened when the file is replaced (rebuild), None when absent.
+    """
+    if _stale():
+        with _build_lock:
+            if _stale():
+                try:
+                    compile_store()
+                except Exception:
+                    pass
+    try:
+        st = os.stat(STORE_PATH)
+    except OSError:
+        return None
+    sig = (st.st_ino, st.st_mtime_ns)
+    con = getattr(_local, "con", None)
+    if con is not None and getattr(_local, "sig", None) == sig:
+        return con
+    if con is not None:
+        con.close()
+    con = sqlite3.connect(f"file:{STORE_PATH}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+    if not _recompiled and os.path.exists(JSON_PATH):
+        if con.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            # Compiled by an older release; rebuild once, else keep serving what is there
+            con.close()
+            _compile_locked()
+            return _connection(_recompiled=True)
+    con.execute(f"PRAGMA mmap_size={MMAP_BYTES}")
+    _local.con, _local.sig = con, sig
+    return con
+
+
+def _rows(sql: str, params: Iterable = ()) -> List[tuple]:
+    try:
+        con = _connection()
+        if con is None:
+            return []
+        return con.execute(sql, tuple(params)).fetchall()
+    except Exception:
+        return []
+
+
+def lookup(pin: str) -> Optional[dict]:
+    """
+    Offline record for a pincode (what PINCODES_OFFLINE.get(pin) returned), or None.
+    """
+    rows = _rows("SELECT meta FROM pincode WHERE pin = ?", (str(pin),))
+    if not rows:
+        return None
+    try:
+        return json.loads(rows[0][0])
+    except Exception:
+        return None
+
+
+def district_pins(state_key: str, district_key: str) -> Set[str]:
+    return {r[0] for r in _rows("SELECT pin FROM district_pin WHERE district = ? AND state = ?", (district_key, state_key))}
+
+
+def district_keys(state_key: str = "") -> Set[str]:
+    """
+    Indexed district names under state_key ("" = district-only keys, i.e. all districts).
+    """
+    if state_key:
+        sql, params = "SELECT DISTINCT district FROM district_pin WHERE state IN (?, '')", (state_key,)
+    else:
+        sql, params = "SELECT DISTINCT district FROM district_pin", ()
+    return {r[0] for r in _rows(sql, params)}
+
+
+def index_size() -> int:
+    rows = _rows("SELECT COUNT(*) FROM (SELECT DISTINCT state, district FROM district_pin)")
+    return int(rows[0][0]) if rows else 0
+
+
+def record_pins(districts: Iterable[str], state_key: str = "") -> Set[str]:
+    """
+    Pins of records whose normalized district is in districts; rows without a state pass the state filter.
+    """
+    ds = sorted({d for d in districts if d})
+    if not ds:
+        return set()
+    sql = f"SELECT pin FROM record WHERE district IN ({','.join('?' * len(ds))})"
+    params = list(ds)
+    if state_key:
+        sql += " AND (state = '' OR state = ?)"
+        params.append(state_key)
+    return {r[0] for r in _rows(sql, params)}
+
+
+def record_districts(state_key: str = "") -> Set[str]:
+    if state_key:
+        sql, params = "SELECT DISTINCT district FROM record WHERE state = ? AND district != ''", (state_key,)
+    else:
+        sql, params = "SELECT DISTINCT district FROM record WHERE district != ''", ()
+    return {r[0] for r in _rows(sql, params)}
+
+
+def _term_range(q: str) -> Optional[Tuple[str, str]]:
+    terms = search_terms(q)
+    if not terms:
+        return None
+    return terms[0], terms[0] + "\U0010ffff"
+
+
+def office_pins(variants: Iterable[str], state_key: str = "") -> Set[str]:
+    """
+    Pins of post offices with a word in their name starting with any variant (autocomplete index).
+    """
+    pins: Set[str] = set()
+    for v in variants:
+        rng = _term_range(v)
+        if not rng:
+            continue
+        sql = (
+            "SELECT DISTINCT p.pin FROM place_term t JOIN place p ON p.id = t.place_id "
+            "WHERE t.term >= ? AND t.term < ? AND p.kind = 'office'"
+        )
+        params = list(rng)
+        if state_key:
+            sql += " AND (p.state = '' OR lower(p.state) = ?)"
+            params.append(state_key)
+        pins.update(r[0] for r in _rows(sql, params))
+    return pins
+
+
+def search_places(q: str, kinds: Iterable[str] = (), state_key: str = "", limit: int = 20) -> List[dict]:
+    """
+    Autocomplete: places with a word starting with q (matches at the start of the name rank first,
+    then shorter names). kinds narrows to PLACE_KINDS entries; state_key to one state (lower-cased).
+
+    The term range is read in index order and cut off after limit * CANDIDATE_FACTOR entries, first
+    for name-start matches (pos = 0), then for later words only if those did not fill the page, so a
+    short prefix never groups/sorts the whole range. Ranking applies within those candidates.
+    """
+    rng = _term_range(q)
+    if not rng:
+        return []
+    limit = max(1, int(limit))
+    base = (
+        "SELECT p.id, p.kind, p.name, p.pin, p.block, p.district, p.state, t.pos "
+        "FROM place_term t JOIN place p ON p.id = t.place_id WHERE t.term >= ? AND t.term < ?"
+    )
+    filters = ""
+    extra: list = []
+    ks = [k for k in kinds if k in PLACE_KINDS]
+    if ks:
+        filters += f" AND p.kind IN ({','.join('?' * len(ks))})"
+        extra.extend(ks)
+    if state_key:
+        filters += " AND lower(p.state) = ?"
+        extra.append(state_key)
+
+    found: Dict[int, tuple] = {}
+    for pos_filter in (" AND t.pos = 0", " AND t.pos > 0"):
+        rows = _rows(base + pos_filter + filters + " LIMIT ?", [*rng, *extra, limit * CANDIDATE_FACTOR])
+        for place_id, *rest in rows:
+            if place_id not in found or rest[-1] < found[place_id][-1]:
+                found[place_id] = tuple(rest)
+        if len(found) >= limit:
+            break
+    ranked = sorted(found.values(), key=lambda r: (r[-1] > 0, len(r[1]), r[1], r[2]))[:limit]
+    return [
+        {"kind": kind, "name": name, "pincode": pin, "block": block, "district": district, "state": state}
+        for kind, name, pin, block, district, state, _pos in ranked
+    ]
+
+
+class OfflinePincodes(Mapping):
+    """
+    Read-only {pin: meta} view over the store (drop-in for the old PINCODES_OFFLINE dict).
+    """
+
+    def __getitem__(self, pin):
+        meta = lookup(pin)
+        if meta is None:
+            raise KeyError(pin)
+        return meta
+
+    def __iter__(self):
+        return iter([r[0] for r in _rows("SELECT pin FROM pincode ORDER BY pin")])
+
+    def __len__(self):
+        rows = _rows("SELECT COUNT(*) FROM pincode")
+        return int(rows[0][0]) if rows else 0
+
+    def __bool__(self):
+        return bool(_rows("SELECT 1 FROM pincode LIMIT 1"))
+
+
+class DistrictIndex(Mapping):
+    """
+    Read-only {(state_key, district_key): set(pins)} view over district_pin (what _build_district_index
+    used to build per worker). Prefer the helpers below over scanning items().
+    """
+
+    def __getitem__(self, key):
+        state_key, district_key = key
+        pins = district_pins(state_key, district_key)
+        if not pins:
+            raise KeyError(key)
+        return pins
+
+    def __iter__(self):
+        return iter([tuple(r) for r in _rows("SELECT DISTINCT state, district FROM district_pin ORDER BY state, district")])
+
+    def __len__(self):
+        return index_size()
+
+    def __bool__(self):
+        return bool(_rows("SELECT 1 FROM district_pin LIMIT 1"))
+
+    def items(self):
+        # One ordered pass instead of a query per key
+        out = {}
+        for state_key, district_key, pin in _rows("SELECT state, district, pin FROM district_pin ORDER BY state, district"):
+            out.setdefault((state_key, district_key), set()).add(pin)
+        return out.items()
+
+    def pins_in_state(self, state_key: str) -> Set[str]:
+        if not state_key:
+            return set()
+        return {r[0] for r in _rows("SELECT pin FROM district_pin WHERE state = ?", (state_key,))}
+
+    def state_of_pin(self, pin: str) -> Optional[str]:
+        rows = _rows("SELECT state FROM district_pin WHERE pin = ? AND state != '' ORDER BY state LIMIT 1", (str(pin),))
+        return rows[0][0] if rows else None
+
+    def all_pins(self) -> Set[str]:
+        return {r[0] for r in _rows("SELECT pin FROM district_pin WHERE state = ''")}
+
+
+OFFLINE_PINCODES = OfflinePincodes()
+DISTRICT_INDEX = DistrictIndex()
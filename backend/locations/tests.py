@@ -0,0 +1,90 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from locations import geocache, pincode_store
+from locations.models import ExternalLookup
+
+
+class ExternalLookupPruneTests(TestCase):
+    def _lookup(self, key, days_unused):
+        row = ExternalLookup.objects.create(
+            provider=geocache.POSTAL_PINCODE,
+            key=key,
+            payload=[{"Status": "Success"}],
+            ok=True,
+            expires_at=timezone.now() + timedelta(days=1),
+        )
+        ExternalLookup.objects.filter(pk=row.pk).update(last_used_at=timezone.now() - timedelta(days=days_unused))
+        return row
+
+    def _keys(self):
+        return set(ExternalLookup.objects.values_list("key", flat=True))
+
+    @override_settings(LOCATIONS_LOOKUP_RETENTION_DAYS=30)
+    def test_prune_removes_only_stale_rows(self):
+        self._lookup("560001", 45)
+        self._lookup("560002", 31)
+        self._lookup("560003", 2)
+
+        self.assertEqual(geocache.prune(batch_size=1), 2)
+        self.assertEqual(self._keys(), {"560003"})
+
+    @override_settings(LOCATIONS_LOOKUP_RETENTION_DAYS=0)
+    def test_zero_retention_keeps_everything(self):
+        self._lookup("560001", 400)
+
+        self.assertEqual(geocache.prune(), 0)
+        self.assertEqual(self._keys(), {"560001"})
+
+    def test_command_days_and_dry_run(self):
+        self._lookup("560001", 10)
+        self._lookup("560002", 1)
+
+        out = StringIO()
+        call_command("prune_external_lookups", "--days", "5", "--dry-run", stdout=out)
+        self.assertIn("stale=1 dry_run=True", out.getvalue())
+        self.assertEqual(self._keys(), {"560001", "560002"})
+
+        call_command("prune_external_lookups", "--days", "5", stdout=StringIO())
+        self.assertEqual(self._keys(), {"560002"})
+
+
+class PlaceSearchTests(TestCase):
+    DATA = {
+        "560001": {"officename": "MG Road S.O", "district": "Bangalore", "statename": "Karnataka", "villages": ["Ramnagar"]},
+        "560002": {"officename": "Rajaji Nagar B.O", "district": "Bangalore", "statename": "Karnataka"},
+        "585101": {"officename": "Gulbarga H.O", "district": "Gulbarga", "statename": "Karnataka", "villages": ["Old Ramapur"]},
+    }
+
+    def setUp(self):
+        tmp = tempfile.mkdtemp()
+        json_path = os.path.join(tmp, "pincodes.json")
+        store_path = os.path.join(tmp, "pincodes.sqlite3")
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(self.DATA, f)
+        pincode_store.compile_store(json_path, store_path)
+        for name, value in (("JSON_PATH", json_path), ("STORE_PATH", store_path)):
+            patcher = mock.patch.object(pincode_store, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _names(self, q, kinds=(), limit=20):
+        return [p["name"] for p in pincode_store.search_places(q, kinds, limit=limit)]
+
+    def test_office_type_tails_are_not_search_terms(self):
+        self.assertEqual(pincode_store.search_terms("MG Road S.O"), ["mg road s o", "road s o"])
+        self.assertEqual(self._names("s o"), [])
+        self.assertEqual(self._names("road"), ["MG Road S.O"])
+
+    def test_name_start_matches_rank_before_later_words(self):
+        self.assertEqual(self._names("ra"), ["Ramnagar", "Rajaji Nagar B.O", "Old Ramapur"])
+        self.assertEqual(self._names("ra", kinds=("office",)), ["Rajaji Nagar B.O"])
+        self.assertEqual(self._names("ra", limit=1), ["Ramnagar"])
@@ -4,10 +4,8 @@ from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 import requests
-from urllib.parse import quote
 from .models import Country, State, City
 from .serializers import CountrySerializer, StateSerializer, CitySerializer
-import json
 import os
 from django.conf import settings
 from requests.adapters import HTTPAdapter
@@ -28,35 +26,15 @@ adapter = HTTPAdapter(max_retries=retries)
 session.mount("https://", adapter)
 session.mount("http://", adapter)
 
-# Offline pincode fallback cache
-OFFLINE_PINCODES_PATH = os.path.join(settings.BASE_DIR, 'locations', 'data', 'pincodes_offline.json')
-try:
-    with open(OFFLINE_PINCODES_PATH, 'r', encoding='utf-8') as f:
-        PINCODES_OFFLINE = json.load(f)
-except Exception:
-    PINCODES_OFFLINE = {}
+# Offline pincode fallback: compiled, read-only store shared by workers (see locations/pincode_store.py).
+# PINCODES_OFFLINE / _build_district_index() keep their old dict-style interface for other apps.
+from . import geocache, pincode_store
 
-def _unwrap_records(raw):
-    try:
-        obj = raw
-        # Repeatedly unwrap common container keys until we reach a list of rows or a dict keyed by pincode
-        keys = ("records", "data", "rows", "items", "result", "list", "entries")
-        for _ in range(4):
-            if isinstance(obj, dict):
-                found = False
-                for k in keys:
-                    v = obj.get(k)
-                    if isinstance(v, list) or isinstance(v, dict):
-                        obj = v
-                        found = True
-                        break
-                if not found:
-                    break
-            else:
-                break
-        return obj
-    except Exception:
-        return raw
+PINCODES_OFFLINE = pincode_store.OFFLINE_PINCODES
+
+
+def _build_district_index():
+    return pincode_store.DISTRICT_INDEX
 
 # Normalization helpers for India Post searches (legacy vs current names)
 def india_place_variants(name: str):
@@ -183,21 +161,6 @@ def reverse_geocode(request):
     except (TypeError, ValueError):
         return Response({"detail": "lat and lon are required as numbers"}, status=status.HTTP_400_BAD_REQUEST)
 
-    # Call Nominatim
-    nominatim_url = "https://nominatim.openstreetmap.org/reverse"
-    headers = {
-        # Per Nominatim usage policy, include a valid identifying UA with contact
-        "User-Agent": "TrikonektApp/1.0 (contact: admin@trikonekt.local)",
-        "Accept-Language": "en-IN"
-    }
-    params = {
-        "format": "jsonv2",
-        "lat": lat,
-        "lon": lon,
-        "addressdetails": 1,
-        "zoom": 18,
-    }
-
     nominatim_ok = False
     postal_ok = False
     address = {}
@@ -211,10 +174,10 @@ def reverse_geocode(request):
     postal_raw = None
     nominatim_raw = None
 
+    # Call Nominatim (cached per ~1m grid cell, see locations/geocache.py)
     try:
-        r = session.get(nominatim_url, params=params, headers=headers, timeout=8)
-        if r.status_code == 200:
-            data = r.json()
+        data = geocache.get_json(geocache.NOMINATIM_REVERSE, f"{lat:.5f},{lon:.5f}")
+        if isinstance(data, dict):
             nominatim_raw = data
             address = data.get("address", {}) or {}
 
@@ -248,9 +211,8 @@ def reverse_geocode(request):
     # If we have a pincode, enrich via India Post
     if pincode:
         try:
-            pr = session.get(f"https://api.postalpincode.in/pincode/{pincode}", headers=POSTAL_HEADERS, timeout=8)
-            if pr.status_code == 200:
-                arr = pr.json()
+            arr = geocache.get_json(geocache.POSTAL_PINCODE, pincode)
+            if arr is not None:
                 if isinstance(arr, list) and arr:
                     entry = arr[0] or {}
                     postal_raw = entry
@@ -305,230 +267,29 @@ def debug_counts(request):
         "cities": City.objects.count(),
     }, status=status.HTTP_200_OK)
 
-# District -> pincodes lookup using offline cache with in-memory index
-DISTRICT_INDEX = None
-
-def _build_district_index():
-    global DISTRICT_INDEX
-    if DISTRICT_INDEX is not None:
-        return DISTRICT_INDEX
-    idx = {}
-    try:
-        raw = _unwrap_records(PINCODES_OFFLINE or {})
-
-        def add_record(pin_val, state_val, district_val):
-            try:
-                pin_s = str(pin_val or "").strip()
-                # keep only digits; ensure 6-digit pincode
-                pin_s = "".join(c for c in pin_s if c.isdigit())
-                if len(pin_s) != 6:
-                    return
-                d = (district_val or "").strip()
-                s = (state_val or "").strip()
-                if not d:
-                    return
-                # normalize common suffix
-                if d.lower().endswith(" district"):
-                    d = d[:-8].strip()
-                dkey = d.lower()
-                skey = s.lower()
-                key = (skey, dkey)
-                sset = idx.get(key)
-                if sset is None:
-                    sset = set()
-                    idx[key] = sset
-                sset.add(pin_s)
-                # also index without state to allow district-only lookups
-                key2 = ("", dkey)
-                sset2 = idx.get(key2)
-                if sset2 is None:
-                    sset2 = set()
-                    idx[key2] = sset2
-                sset2.add(pin_s)
-            except Exception:
-                pass
-
-        if isinstance(raw, dict):
-            # Assume dict keyed by pincode -> meta
-            for k, meta in raw.items():
-                try:
-                    if not isinstance(meta, dict):
-                        continue
-                    state = (
-                        meta.get("statename") or meta.get("stateName") or meta.get("STATE_NAME")
-                        or meta.get("state") or meta.get("State") or meta.get("STATE") or ""
-                    ).strip()
-                    district = (
-                        meta.get("district") or meta.get("District") or meta.get("DISTRICT")
-                        or meta.get("city") or meta.get("City") or ""
-                    )
-                    add_record(k, state, district)
-                    # some datasets also include pincode inside the meta object
-                    alt_pin = meta.get("pincode") or meta.get("Pincode") or meta.get("PIN") or meta.get("Pin")
-                    if alt_pin and str(alt_pin) != str(k):
-                        add_record(alt_pin, state, district)
-                except Exception:
-                    continue
-        elif isinstance(raw, list):
-            for row in raw:
-                try:
-                    if not isinstance(row, dict):
-                        continue
-                    pin = row.get("pincode") or row.get("Pincode") or row.get("PIN") or row.get("Pin")
-                    state = (
-                        row.get("statename") or row.get("stateName") or row.get("STATE_NAME")
-                        or row.get("state") or row.get("State") or row.get("STATE")
-                    )
-                    district = (
-                        row.get("district") or row.get("District") or row.get("DISTRICT")
-                        or row.get("city") or row.get("City")
-                    )
-                    add_record(pin, state, district)
-                except Exception:
-                    continue
-        else:
-            # Unknown format; leave index empty
-            pass
-    except Exception:
-        idx = {}
-    DISTRICT_INDEX = idx
-    return DISTRICT_INDEX
-
 def _scan_raw_for_pincodes(district_name: str, state_name: str):
     """
-    Fallback scan over raw PINCODES_OFFLINE for datasets that are wrapped or not captured by the index.
+    Fallback scan over the offline records for datasets not captured by the district index.
     Matches district by synonyms and case-insensitive equals; filters by state when provided.
     """
     try:
-        raw = _unwrap_records(PINCODES_OFFLINE or {})
-
-        # normalize inputs
         st_filter = (state_name or "").strip().lower()
-        # create variant set for district, remove optional " district" suffix
-        def _norm_d(s: str):
-            s = (s or "").strip()
-            if s.lower().endswith(" district"):
-                s = s[:-8].strip()
-            return s.lower()
-
-        variants = set(_norm_d(x) for x in (india_place_variants(district_name) or [district_name]))
+        variants = set(pincode_store.norm_district(x) for x in (india_place_variants(district_name) or [district_name]))
+        variants.discard("")
         if not variants:
             return set()
 
-        pins = set()
-
-        def consider(pin_val, state_val, district_val):
-            # state filter
-            sv = (state_val or "").strip().lower()
-            if st_filter and sv and st_filter != sv:
-                return
-            dv = _norm_d(district_val)
-            if not dv:
-                return
-            if dv in variants:
-                pin_s = "".join(c for c in str(pin_val or "").strip() if c.isdigit())
-                if len(pin_s) == 6:
-                    pins.add(pin_s)
-
-        if isinstance(raw, dict):
-            # dict keyed by pincode -> meta
-            for k, meta in raw.items():
-                if not isinstance(meta, dict):
-                    continue
-                pin = k
-                state = (
-                    meta.get("statename") or meta.get("stateName") or meta.get("STATE_NAME")
-                    or meta.get("state") or meta.get("State") or meta.get("STATE")
-                )
-                district = (
-                    meta.get("district") or meta.get("District") or meta.get("DISTRICT")
-                    or meta.get("city") or meta.get("City")
-                )
-                consider(pin, state, district)
-                alt_pin = meta.get("pincode") or meta.get("Pincode") or meta.get("PIN") or meta.get("Pin")
-                if alt_pin and str(alt_pin) != str(pin):
-                    consider(alt_pin, state, district)
-        elif isinstance(raw, list):
-            for row in raw:
-                if not isinstance(row, dict):
-                    continue
-                pin = row.get("pincode") or row.get("Pincode") or row.get("PIN") or row.get("Pin")
-                state = (
-                    row.get("statename") or row.get("stateName") or row.get("STATE_NAME")
-                    or row.get("state") or row.get("State") or row.get("STATE")
-                )
-                district = (
-                    row.get("district") or row.get("District") or row.get("DISTRICT")
-                    or row.get("city") or row.get("City")
-                )
-                consider(pin, state, district)
-        else:
-            # unknown format
-            return set()
+        pins = pincode_store.record_pins(variants, st_filter)
 
         # If still empty, attempt fuzzy on district field values present
         if not pins:
             try:
                 import difflib
-                # collect all distinct district values under (optional) state
-                dvals = set()
-                # re-iterate minimally to collect district names
-                if isinstance(raw, dict):
-                    for _, meta in raw.items():
-                        if not isinstance(meta, dict):
-                            continue
-                        sv = (meta.get("statename") or meta.get("stateName") or meta.get("STATE_NAME")
-                              or meta.get("state") or meta.get("State") or meta.get("STATE") or "")
-                        if st_filter and sv.strip().lower() != st_filter:
-                            continue
-                        dv = _norm_d(meta.get("district") or meta.get("District") or meta.get("DISTRICT")
-                                     or meta.get("city") or meta.get("City") or "")
-                        if dv:
-                            dvals.add(dv)
-                elif isinstance(raw, list):
-                    for row in raw:
-                        if not isinstance(row, dict):
-                            continue
-                        sv = (row.get("statename") or row.get("stateName") or row.get("STATE_NAME")
-                              or row.get("state") or row.get("State") or row.get("STATE") or "")
-                        if st_filter and sv.strip().lower() != st_filter:
-                            continue
-                        dv = _norm_d(row.get("district") or row.get("District") or row.get("DISTRICT")
-                                     or row.get("city") or row.get("City") or "")
-                        if dv:
-                            dvals.add(dv)
-                # try close matches against any variant
+                dvals = list(pincode_store.record_districts(st_filter))
+                close = set()
                 for v in variants:
-                    for ck in difflib.get_close_matches(v, list(dvals), n=5, cutoff=0.75):
-                        # scan again but only collect rows with dv == ck
-                        if isinstance(raw, dict):
-                            for k, meta in raw.items():
-                                if not isinstance(meta, dict):
-                                    continue
-                                sv = (meta.get("statename") or meta.get("stateName") or meta.get("STATE_NAME")
-                                      or meta.get("state") or meta.get("State") or meta.get("STATE") or "")
-                                if st_filter and sv.strip().lower() != st_filter:
-                                    continue
-                                dv = _norm_d(meta.get("district") or meta.get("District") or meta.get("DISTRICT")
-                                             or meta.get("city") or meta.get("City") or "")
-                                if dv != ck:
-                                    continue
-                                p = meta.get("pincode") or meta.get("Pincode") or meta.get("PIN") or meta.get("Pin") or k
-                                consider(p, sv, dv)
-                        else:
-                            for row in raw:
-                                if not isinstance(row, dict):
-                                    continue
-                                sv = (row.get("statename") or row.get("stateName") or row.get("STATE_NAME")
-                                      or row.get("state") or row.get("State") or row.get("STATE") or "")
-                                if st_filter and sv.strip().lower() != st_filter:
-                                    continue
-                                dv = _norm_d(row.get("district") or row.get("District") or row.get("DISTRICT")
-                                             or row.get("city") or row.get("City") or "")
-                                if dv != ck:
-                                    continue
-                                p = row.get("pincode") or row.get("Pincode") or row.get("PIN") or row.get("Pin")
-                                consider(p, sv, dv)
+                    close.update(difflib.get_close_matches(v, dvals, n=5, cutoff=0.75))
+                pins = pincode_store.record_pins(close, st_filter)
             except Exception:
                 pass
 
@@ -561,31 +322,30 @@ def pincodes_by_district(request):
         except Exception:
             pass
 
-    idx = _build_district_index()
     variants = india_place_variants(district_name) or [district_name]
     pins = set()
     skey = (state_name or "").strip().lower()
     for d in variants:
         dkey = (d or "").strip().lower()
         if skey:
-            pins.update(idx.get((skey, dkey), set()))
+            pins.update(pincode_store.district_pins(skey, dkey))
         # Also allow district-only matches (when state not provided or no hits with state)
-        pins.update(idx.get(("", dkey), set()))
+        pins.update(pincode_store.district_pins("", dkey))
 
     # Fuzzy fallback for near-miss spellings (e.g., "Kalaburgi" vs "Kalaburagi")
     if not pins:
       try:
         import difflib
         # consider district keys available under given state or globally
-        available_dkeys = set(d for s, d in idx.keys() if (not skey or s == skey or s == ""))
+        available_dkeys = list(pincode_store.district_keys(skey))
         # try fuzzy match against each variant
         for d in variants:
             dkey = (d or "").strip().lower()
-            close = difflib.get_close_matches(dkey, list(available_dkeys), n=5, cutoff=0.75)
+            close = difflib.get_close_matches(dkey, available_dkeys, n=5, cutoff=0.75)
             for ck in close:
                 if skey:
-                    pins.update(idx.get((skey, ck), set()))
-                pins.update(idx.get(("", ck), set()))
+                    pins.update(pincode_store.district_pins(skey, ck))
+                pins.update(pincode_store.district_pins("", ck))
       except Exception:
         pass
 
@@ -597,7 +357,6 @@ def pincodes_by_district(request):
     # This helps when UI passes a Taluk/City name like "Chincholi" whereas the dataset's "district" is "Kalaburagi".
     if not pins:
         try:
-            raw = _unwrap_records(PINCODES_OFFLINE or {})
             st_filter = (state_name or "").strip().lower()
 
             # Build ordered, de-duplicated variants of the provided place
@@ -609,44 +368,7 @@ def pincodes_by_district(request):
                     seen.add(key)
                     ordered_variants.append(key)
 
-            def _state_ok(meta_state):
-                sv = (str(meta_state or "")).strip().lower()
-                return (not st_filter) or (not sv) or (sv == st_filter)
-
-            def _match_office(val: str) -> bool:
-                s = (str(val or "")).strip().lower()
-                if not s:
-                    return False
-                for v in ordered_variants:
-                    if s == v or v in s:
-                        return True
-                return False
-
-            tmp = set()
-            if isinstance(raw, dict):
-                for k, meta in raw.items():
-                    if not isinstance(meta, dict):
-                        continue
-                    if not _state_ok(meta.get("statename") or meta.get("stateName") or meta.get("STATE_NAME") or meta.get("state") or meta.get("State") or meta.get("STATE")):
-                        continue
-                    office = meta.get("officename") or meta.get("OfficeName") or meta.get("name") or meta.get("Name")
-                    if _match_office(office):
-                        p = meta.get("pincode") or meta.get("Pincode") or meta.get("PIN") or meta.get("Pin") or k
-                        pstr = "".join(c for c in str(p or "").strip() if c.isdigit())
-                        if len(pstr) == 6:
-                            tmp.add(pstr)
-            elif isinstance(raw, list):
-                for row in raw:
-                    if not isinstance(row, dict):
-                        continue
-                    if not _state_ok(row.get("statename") or row.get("stateName") or row.get("STATE_NAME") or row.get("state") or row.get("State") or row.get("STATE")):
-                        continue
-                    office = row.get("officename") or row.get("OfficeName") or row.get("name") or row.get("Name")
-                    if _match_office(office):
-                        p = row.get("pincode") or row.get("Pincode") or row.get("PIN") or row.get("Pin")
-                        pstr = "".join(c for c in str(p or "").strip() if c.isdigit())
-                        if len(pstr) == 6:
-                            tmp.add(pstr)
+            tmp = pincode_store.office_pins(ordered_variants, st_filter)
             if tmp:
                 pins = tmp
         except Exception:
@@ -666,9 +388,8 @@ def pincodes_by_district(request):
 
             for place in ordered_variants:
                 try:
-                    r = session.get(f"https://api.postalpincode.in/postoffice/{quote(place)}", headers=POSTAL_HEADERS, timeout=10)
-                    if r.status_code == 200:
-                        arr = r.json()
+                    arr = geocache.get_json(geocache.POSTAL_OFFICE, place)
+                    if arr is not None:
                         if isinstance(arr, list) and arr:
                             entry = arr[0] or {}
                             if entry.get("Status") == "Success":
@@ -697,7 +418,7 @@ def pincodes_by_district(request):
         payload["debug"] = {
             "variants": variants,
             "state_key": skey,
-            "index_size": len(idx or {}),
+            "index_size": pincode_store.index_size(),
             "index_hits": len(pins),
         }
     return Response(payload, status=status.HTTP_200_OK)
@@ -725,10 +446,36 @@ def postoffice_search(request):
     postal_ok = False
     message = None
 
+    # Offline-first: answer from the autocomplete index when it knows post offices for the place;
+    # village/gram panchayat-only hits are merged with the upstream lookup below
+    places = pincode_store.search_places(q, ("office", "village", "gram_panchayat"), limit=200)
+    if pin and pin.isdigit() and len(pin) == 6:
+        places = [p for p in places if p["pincode"] == pin]
+    for p in places:
+        if p["kind"] == "office":
+            offices_out.append({
+                "name": p["name"],
+                "block": p["block"] or None,
+                "district": p["district"] or None,
+                "state": p["state"] or None,
+                "pincode": p["pincode"],
+            })
+    offline_villages = {p["name"] for p in places if p["kind"] in ("office", "village")}
+    offline_gps = {p["name"] for p in places if p["kind"] == "gram_panchayat"} | {p["block"] for p in places if p["block"]}
+    if offices_out:
+        return Response({
+            "offices": offices_out,
+            "villages": sorted(offline_villages),
+            "gram_panchayats": sorted(offline_gps),
+            "message": "Filled from offline index",
+            "source": {"postal_ok": False, "offline_ok": True}
+        }, status=status.HTTP_200_OK)
+
     try:
-        r = session.get(f"https://api.postalpincode.in/postoffice/{quote(q)}", headers=POSTAL_HEADERS, timeout=10)
-        if r.status_code == 200:
-            arr = r.json()
+        arr = geocache.get_json(geocache.POSTAL_OFFICE, q)
+        if arr is None:
+            message = "Lookup failed"
+        else:
             if isinstance(arr, list) and arr:
                 entry = arr[0] or {}
                 if entry.get("Status") == "Success":
@@ -759,15 +506,55 @@ def postoffice_search(request):
     except Exception:
         message = "Lookup failed"
 
+    if places:
+        villages = sorted(set(villages) | offline_villages)
+        gram_panchayats = sorted(set(gram_panchayats) | offline_gps)
+        if not postal_ok:
+            message = "Filled from offline index"
+
     return Response({
         "offices": offices_out,
         "villages": villages,
         "gram_panchayats": gram_panchayats,
         "message": message,
-        "source": {"postal_ok": postal_ok}
+        "source": {"postal_ok": postal_ok, "offline_ok": bool(places)}
     }, status=status.HTTP_200_OK)
 
 
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def place_autocomplete(request):
+    """
+    Autocomplete over the offline index (post offices, villages, gram panchayats, districts).
+    Query params:
+      - q: required, at least 2 characters; matches the start of any word in the name
+      - kind: optional, comma-separated subset of office,village,gram_panchayat,district
+      - state_name / state_id: optional state filter
+      - limit: optional, default 20, max 50
+    Returns results: [{kind, name, pincode, block, district, state}]
+    """
+    q = (request.query_params.get("q") or "").strip()
+    if len(q) < 2:
+        return Response({"detail": "q must be at least 2 characters"}, status=status.HTTP_400_BAD_REQUEST)
+    kinds = [k.strip() for k in (request.query_params.get("kind") or "").split(",") if k.strip()]
+    state_name = (request.query_params.get("state_name") or "").strip()
+    state_id = (request.query_params.get("state_id") or "").strip()
+    if state_id and not state_name:
+        try:
+            st = State.objects.filter(pk=state_id).first()
+            if st:
+                state_name = st.name or ""
+        except Exception:
+            pass
+    try:
+        limit = min(50, max(1, int(request.query_params.get("limit") or 20)))
+    except (TypeError, ValueError):
+        limit = 20
+
+    results = pincode_store.search_places(q, kinds, state_name.lower(), limit)
+    return Response({"results": results}, status=status.HTTP_200_OK)
+
+
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def pincode_lookup(request, pin: str):
@@ -797,7 +584,7 @@ def pincode_lookup(request, pin: str):
     message = None
 
     # Offline-first fast path to avoid slow external lookups and make the endpoint responsive
-    offline = PINCODES_OFFLINE.get(pin)
+    offline = pincode_store.lookup(pin)
     if offline:
         district = district or offline.get("district")
         state = state or offline.get("state")
@@ -832,9 +619,10 @@ def pincode_lookup(request, pin: str):
         return Response(result, status=status.HTTP_200_OK)
 
     try:
-        pr = session.get(f"https://api.postalpincode.in/pincode/{pin}", headers=POSTAL_HEADERS, timeout=15)
-        if pr.status_code == 200:
-            arr = pr.json()
+        arr = geocache.get_json(geocache.POSTAL_PINCODE, pin)
+        if arr is None:
+            message = "Lookup failed"
+        else:
             if isinstance(arr, list) and arr:
                 entry = arr[0] or {}
                 if entry.get("Status") == "Success":
@@ -875,20 +663,9 @@ def pincode_lookup(request, pin: str):
     # Fallback: try Nominatim search by postal code if India Post data missing
     if not postal_ok:
         try:
-            nom_headers = {
-                "User-Agent": "TrikonektApp/1.0 (contact: admin@trikonekt.local)",
-                "Accept-Language": "en-IN",
-            }
-            nom_params = {
-                "format": "jsonv2",
-                "postalcode": pin,
-                "countrycodes": "in",
-                "addressdetails": 1,
-                "limit": 50,
-            }
-            sr = session.get("https://nominatim.openstreetmap.org/search", params=nom_params, headers=nom_headers, timeout=15)
-            if sr.status_code == 200:
-                arr = sr.json() or []
+            arr = geocache.get_json(geocache.NOMINATIM_SEARCH, f"postalcode:{pin}")
+            if arr is not None:
+                arr = arr or []
                 # Collect suggestions and best-guess region info
                 vset = set()
                 gpset = set()
@@ -928,20 +705,9 @@ def pincode_lookup(request, pin: str):
         # Additional OSM fallback using generic query when postalcode filter yields no results
         if not postal_ok and not villages:
             try:
-                nom_headers = {
-                    "User-Agent": "TrikonektApp/1.0 (contact: admin@trikonekt.local)",
-                    "Accept-Language": "en-IN",
-                }
-                nom_params_q = {
-                    "format": "jsonv2",
-                    "q": pin,
-                    "countrycodes": "in",
-                    "addressdetails": 1,
-                    "limit": 50,
-                }
-                sr2 = session.get("https://nominatim.openstreetmap.org/search", params=nom_params_q, headers=nom_headers, timeout=15)
-                if sr2.status_code == 200:
-                    arr2 = sr2.json() or []
+                arr2 = geocache.get_json(geocache.NOMINATIM_SEARCH, f"q:{pin}")
+                if arr2 is not None:
+                    arr2 = arr2 or []
                     vset2 = set()
                     gpset2 = set()
                     dist2 = None
@@ -994,9 +760,8 @@ def pincode_lookup(request, pin: str):
                         ordered_tries.append(t)
 
                 for place in ordered_tries:
-                    pr2 = session.get(f"https://api.postalpincode.in/postoffice/{quote(place)}", headers=POSTAL_HEADERS, timeout=10)
-                    if pr2.status_code == 200:
-                        arr2 = pr2.json()
+                    arr2 = geocache.get_json(geocache.POSTAL_OFFICE, place)
+                    if arr2 is not None:
                         if isinstance(arr2, list) and arr2:
                             entry2 = arr2[0] or {}
                             if entry2.get("Status") == "Success":
@@ -1037,7 +802,7 @@ def pincode_lookup(request, pin: str):
 
     # Offline fallback when network lookups fail
     if not postal_ok:
-        offline = PINCODES_OFFLINE.get(pin) or PINCODES_OFFLINE.get(pincode)
+        offline = pincode_store.lookup(pin) or pincode_store.lookup(pincode)
         if offline:
             district = district or offline.get("district")
             state = state or offline.get("state")
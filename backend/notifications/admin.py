@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import DeviceToken, Notification, NotificationBatch, NotificationEventTemplate
+from .models import Broadcast, DeviceToken, Notification, NotificationBatch, NotificationEventTemplate
 from .services import dispatch_template_now
 
 
@@ -67,4 +67,12 @@ class NotificationAdmin(admin.ModelAdmin):
     list_filter = ("channel", "priority", "is_broadcast", "read_at")
     search_fields = ("user__username", "title", "body", "deep_link", "provider_message_id")
     autocomplete_fields = ("user", "batch")
-    readonly_fields = ("delivered_at", "read_at", "created_at")
+    readonly_fields = ("delivered_at", "read_at", "dismissed_at", "created_at")
+
+
+@admin.register(Broadcast)
+class BroadcastAdmin(admin.ModelAdmin):
+    list_display = ("id", "title", "priority", "pinned_until", "dedupe", "batch", "created_at")
+    list_filter = ("priority", "dedupe")
+    search_fields = ("title", "body", "deep_link")
+    readonly_fields = ("batch", "audience", "created_at")
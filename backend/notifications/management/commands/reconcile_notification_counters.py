@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandParser
+from django.db.models import Count
+
+from notifications.models import Notification, NotificationCursor
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconcile the cached unread counters on NotificationCursor: recount unread targeted "
+        "notifications with one grouped scan and mark broadcast counts for recompute on next read. "
+        "Safe to re-run."
+    )
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument("--user", type=int, help="Only this user id.")
+        parser.add_argument("--batch-size", type=int, default=2000, help="bulk update batch size (default: 2000)")
+        parser.add_argument("--dry-run", action="store_true", help="Report drift only; do not write.")
+
+    def handle(self, *args, **options):
+        batch_size = max(1, int(options.get("batch_size") or 2000))
+        dry_run = bool(options.get("dry_run"))
+
+        unread = Notification.objects.filter(read_at__isnull=True, dismissed_at__isnull=True)
+        cursors = NotificationCursor.objects.order_by("id")
+        if options.get("user"):
+            unread = unread.filter(user_id=options["user"])
+            cursors = cursors.filter(user_id=options["user"])
+        counts = dict(unread.order_by().values_list("user_id").annotate(n=Count("id")))
+
+        seen = drift = 0
+        buf = []
+        for cur in cursors.iterator(chunk_size=5000):
+            seen += 1
+            want = int(counts.get(cur.user_id, 0))
+            if cur.unread_targeted != want:
+                drift += 1
+            cur.unread_targeted = want
+            cur.broadcast_checked_id = -1
+            buf.append(cur)
+            if len(buf) >= batch_size:
+                if not dry_run:
+                    NotificationCursor.objects.bulk_update(buf, ["unread_targeted", "broadcast_checked_id"])
+                buf = []
+        if buf and not dry_run:
+            NotificationCursor.objects.bulk_update(buf, ["unread_targeted", "broadcast_checked_id"])
+
+        self.stdout.write(self.style.SUCCESS(f"Done. cursors={seen} drift={drift} dry_run={dry_run}"))
@@ -0,0 +1,28 @@
+# Generated by Django 6.1.2 on 2026-10-17 03:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0002_broadcasts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationcursor',
+            name='broadcast_checked_id',
+            field=models.BigIntegerField(default=-1),
+        ),
+        migrations.AddField(
+            model_name='notificationcursor',
+            name='broadcast_unread',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='notificationcursor',
+            name='unread_targeted',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.1.2 on 2026-10-17 04:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0003_unread_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='broadcast',
+            name='audience_roles',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='broadcast',
+            name='require_active',
+            field=models.BooleanField(blank=True, null=True),
+        ),
+    ]
@@ -99,6 +99,8 @@ class NotificationBatch(models.Model):
 class Notification(models.Model):
     """
     Per-recipient in-app record (also acts as the dashboard "event").
+    New dispatches only write these for targeted audiences (explicit user_ids); broadcasts are stored
+    once as Broadcast. Rows with is_broadcast=True predate that.
     """
     CHANNEL_CHOICES = [
         ("in_app", "In App"),
@@ -124,6 +126,7 @@ class Notification(models.Model):
 
     delivered_at = models.DateTimeField(null=True, blank=True)
     read_at = models.DateTimeField(null=True, blank=True)
+    dismissed_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     provider_message_id = models.CharField(max_length=255, blank=True)
@@ -148,3 +151,65 @@ class Notification(models.Model):
 
     def __str__(self):
         return f"Notif<{self.id}> {getattr(self, 'title', '')}"
+
+
+class Broadcast(models.Model):
+    """
+    A broadcast stored once (fan-out on read): content snapshot + audience predicate.
+      - shown to users matching audience at read time who had joined before it was sent
+      - per-user state lives in BroadcastReceipt (read/dismissed) and NotificationCursor (read-all)
+    """
+    batch = models.OneToOneField(NotificationBatch, on_delete=models.CASCADE, related_name="broadcast")
+    title = models.CharField(max_length=150)
+    body = models.TextField()
+    deep_link = models.CharField(max_length=255, blank=True)
+    priority = models.CharField(max_length=12, choices=Notification.PRIORITY_CHOICES, default="normal")
+    pinned_until = models.DateTimeField(null=True, blank=True)
+    audience = models.JSONField(default=dict, blank=True)  # normalized: roles, require_active, exclude_user_ids
+    # SQL-filterable copy of audience (NULL on rows written before these columns existed: not pre-filtered)
+    audience_roles = models.CharField(max_length=255, null=True, blank=True)  # ",consumer,agency," or "" (any role)
+    require_active = models.BooleanField(null=True, blank=True)
+    dedupe = models.BooleanField(default=False)  # template had a dedupe_key: repeats within 7 days are hidden
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ["-created_at", "-id"]
+
+    def __str__(self):
+        return f"Broadcast<{self.id}> {self.title}"
+
+
+class BroadcastReceipt(models.Model):
+    """
+    Per-user read/dismiss marker for one Broadcast; written only when the user acts on it.
+    """
+    broadcast = models.ForeignKey(Broadcast, on_delete=models.CASCADE, related_name="receipts")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="broadcast_receipts")
+    read_at = models.DateTimeField(null=True, blank=True)
+    dismissed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "broadcast"], name="uniq_broadcast_receipt"),
+        ]
+
+    def __str__(self):
+        return f"Receipt<{self.broadcast_id}:{self.user_id}>"
+
+
+class NotificationCursor(models.Model):
+    """
+    Per-user read cursor: every Broadcast with id <= read_through_id counts as read ("mark all read").
+    Also carries the cached unread counters behind unread-count (see services.unread_count):
+      - unread_targeted: unread, undismissed Notification rows; NULL = unknown, recounted on next read
+      - broadcast_unread: unread visible broadcasts as of broadcast_checked_id (-1 = recompute)
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="notification_cursor")
+    read_through_id = models.BigIntegerField(default=0)
+    unread_targeted = models.IntegerField(null=True, blank=True)
+    broadcast_unread = models.IntegerField(default=0)
+    broadcast_checked_id = models.BigIntegerField(default=-1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Cursor<{self.user_id}> read_through={self.read_through_id}"
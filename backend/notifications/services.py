@@ -4,18 +4,29 @@ from datetime import timedelta
 from typing import Iterable, Optional, Tuple, List, Dict
 
 from django.conf import settings
-from django.db import transaction
-from django.db.models import Q
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max, Q
 from django.utils import timezone
 
 from accounts.models import CustomUser
+from jobs.notify import notify_unread
 from .models import (
+    Broadcast,
+    BroadcastReceipt,
     DeviceToken,
     Notification,
     NotificationBatch,
+    NotificationCursor,
     NotificationEventTemplate,
 )
 
+DEDUPE_WINDOW = timedelta(days=7)
+# Newest broadcasts considered per read (older ones drop out of inboxes)
+BROADCAST_READ_LIMIT = 500
+# Per-process cache of the newest Broadcast id (new broadcasts reach cached counters within this)
+LATEST_BROADCAST_TTL = 5.0
+_latest_broadcast = {"id": 0, "at": 0.0}
+
 
 def _effective_role_for_user(role: str, category: str) -> str:
     """
@@ -54,6 +65,71 @@ def _q_for_role_token(token: str) -> Q:
     return Q(role__iexact=t)
 
 
+def _role_token_matches(token: str, role: str, category: str) -> bool:
+    """
+    In-memory twin of _q_for_role_token (keep both in step).
+    """
+    t = (token or "").strip().lower()
+    r = (role or "").lower()
+    c = category or ""
+    if t in ("all", "*"):
+        return True
+    if t in ("consumer", "user"):
+        return r == "user" and c.lower() == "consumer"
+    if t in ("business", "merchant"):
+        return c in ("business", "merchant")
+    if t == "agency":
+        return r == "agency" or c.lower().startswith("agency")
+    if t == "employee":
+        return r == "employee"
+    if t == "company":
+        return c.lower() == "company"
+    return r == t
+
+
+# Role tokens _q_for_role_token understands besides raw CustomUser.role values
+ROLE_TOKENS = ("all", "*", "consumer", "user", "business", "merchant", "agency", "employee", "company")
+
+
+def _role_tokens_for(user) -> List[str]:
+    """
+    Audience role tokens that select user (what a Broadcast.audience_roles must contain for them).
+    """
+    role, category = getattr(user, "role", ""), getattr(user, "category", "")
+    candidates = set(ROLE_TOKENS)
+    if role:
+        candidates.add(str(role).strip().lower())
+    return sorted(t for t in candidates if _role_token_matches(t, role, category))
+
+
+def _audience_roles_column(roles: List[str]) -> Optional[str]:
+    """
+    Broadcast.audience_roles for normalized roles: ",consumer,agency," ("" = any role, None = too long to index).
+    """
+    tokens = [str(r).strip().lower() for r in roles or [] if str(r).strip()]
+    value = f",{','.join(tokens)}," if tokens else ""
+    return value if len(value) <= 255 else None
+
+
+def audience_matches(user, audience: dict | None) -> bool:
+    """
+    Whether user falls inside a (normalized) audience, evaluated now; mirrors _build_audience_q.
+    """
+    aud = dict(audience or {})
+    roles = aud.get("roles") or []
+    if roles and not any(_role_token_matches(t, getattr(user, "role", ""), getattr(user, "category", "")) for t in roles):
+        return False
+    user_ids = [int(x) for x in (aud.get("user_ids") or []) if str(x).isdigit()]
+    if user_ids and user.id not in user_ids:
+        return False
+    exclude_ids = [int(x) for x in (aud.get("exclude_user_ids") or []) if str(x).isdigit()]
+    if user.id in exclude_ids:
+        return False
+    if aud.get("require_active", True) and not getattr(user, "account_active", False):
+        return False
+    return True
+
+
 def _build_audience_q(audience: dict | None) -> Tuple[Q, Dict]:
     """
     Convert template.audience into a Q filter and normalized config.
@@ -98,15 +174,14 @@ def _dedupe_user_ids(template: NotificationEventTemplate, user_ids: Iterable[int
     if not (template.dedupe_key or "").strip():
         return ids
 
-    cutoff = timezone.now() - timedelta(days=7)
-    # Find users who already have a similar recent broadcast
+    cutoff = timezone.now() - DEDUPE_WINDOW
+    # Broadcasts are stored once (deduped at read time), so only per-user rows are matched here
     existing = set(
         Notification.objects.filter(
             user_id__in=ids,
-            is_broadcast=True,
             title=template.title,
             body=template.body,
-            deep_link=template.deep_link,
+            deep_link=template.deep_link or "",
             created_at__gte=cutoff,
         ).values_list("user_id", flat=True)
     )
@@ -191,16 +266,14 @@ def upsert_device_token(
 @transaction.atomic
 def dispatch_template_now(*, template: NotificationEventTemplate, actor: Optional[CustomUser] = None) -> NotificationBatch:
     """
-    Dispatch an admin-configured template as an in-app broadcast (and optionally push stub).
+    Dispatch an admin-configured template as an in-app notification (and optionally push stub).
     Steps:
-      - Compute audience (roles, ids, require_active)
       - Create NotificationBatch (status=processing)
-      - Bulk-create Notification rows for recipients (respect dedupe_key)
+      - Audience without user_ids: store one Broadcast (content + audience); inboxes merge it at read time
+      - Targeted audience (user_ids): bulk-create Notification rows for those recipients (respect dedupe_key)
       - Optionally integrate push provider in future; currently stubbed
       - Mark batch completed with target counts
     """
-    template = NotificationEventTemplate.objects.select_for_update().get(pk=template.pk)  # lock row for consistency
-
     batch = NotificationBatch.objects.create(
         template=template,
         created_by=actor if (actor and getattr(actor, "id", None)) else None,
@@ -208,11 +281,35 @@ def dispatch_template_now(*, template: NotificationEventTemplate, actor: Optiona
         started_at=timezone.now(),
     )
 
-    # Build audience queryset
-    audience_q, _aud_norm = _build_audience_q(template.audience)
-    base_qs = CustomUser.objects.filter(audience_q).only("id", "username", "role", "category")
+    audience_q, aud_norm = _build_audience_q(template.audience)
+    in_app_enabled = _should_send_in_app(template)
+
+    if not aud_norm["user_ids"]:
+        audience_qs = CustomUser.objects.filter(audience_q)
+        if in_app_enabled:
+            Broadcast.objects.create(
+                batch=batch,
+                title=template.title,
+                body=template.body,
+                deep_link=template.deep_link or "",
+                priority=template.priority or "normal",
+                pinned_until=template.pinned_until,
+                audience=aud_norm,
+                audience_roles=_audience_roles_column(aud_norm["roles"]),
+                require_active=aud_norm["require_active"],
+                dedupe=bool((template.dedupe_key or "").strip()),
+            )
+            notify_unread()
+        devices = 0
+        if _should_send_push(template):
+            devices = DeviceToken.objects.filter(subscribed=True, user__in=audience_qs.values("id")).count()
+        batch.target_counts = {"users": audience_qs.count(), "devices": devices}
+        batch.status = "completed"
+        batch.finished_at = timezone.now()
+        batch.save(update_fields=["target_counts", "status", "finished_at"])
+        return batch
 
-    user_ids = list(base_qs.values_list("id", flat=True))
+    user_ids = list(CustomUser.objects.filter(audience_q).values_list("id", flat=True))
     user_ids = _dedupe_user_ids(template, user_ids)
 
     # Early complete when nothing to do
@@ -223,38 +320,30 @@ def dispatch_template_now(*, template: NotificationEventTemplate, actor: Optiona
         batch.save(update_fields=["target_counts", "status", "finished_at"])
         return batch
 
-    # Prepare Notification rows
-    in_app_enabled = _should_send_in_app(template)
-    to_create: List[Notification] = []
-    now = timezone.now()
-
     if in_app_enabled:
-        # Fetch roles/categories for caching in notifications
-        role_map = dict(CustomUser.objects.filter(id__in=user_ids).values_list("id", "role"))
-        cat_map = dict(CustomUser.objects.filter(id__in=user_ids).values_list("id", "category"))
-
-        for uid in user_ids:
-            role_cached = _effective_role_for_user(role_map.get(uid, ""), cat_map.get(uid, ""))
-            to_create.append(
-                Notification(
-                    batch=batch,
-                    user_id=uid,
-                    role_cached=role_cached,
-                    channel="in_app",
-                    is_broadcast=True,
-                    title=template.title,
-                    body=template.body,
-                    deep_link=template.deep_link or "",
-                    priority=template.priority or "normal",
-                    pinned_until=template.pinned_until,
-                    delivered_at=now,
-                )
+        now = timezone.now()
+        to_create: List[Notification] = [
+            Notification(
+                batch=batch,
+                user_id=uid,
+                role_cached=_effective_role_for_user(role, category),
+                channel="in_app",
+                is_broadcast=False,
+                title=template.title,
+                body=template.body,
+                deep_link=template.deep_link or "",
+                priority=template.priority or "normal",
+                pinned_until=template.pinned_until,
+                delivered_at=now,
             )
-
-        # Bulk insert in chunks
-        chunk = 1000
-        for i in range(0, len(to_create), chunk):
-            Notification.objects.bulk_create(to_create[i:i + chunk], ignore_conflicts=True)
+            for uid, role, category in CustomUser.objects.filter(id__in=user_ids).values_list("id", "role", "category")
+        ]
+        Notification.objects.bulk_create(to_create, batch_size=1000, ignore_conflicts=True)
+        # Known counters move with the insert; unknown (NULL) ones are recounted on next read
+        NotificationCursor.objects.filter(user_id__in=user_ids, unread_targeted__isnull=False).update(
+            unread_targeted=F("unread_targeted") + 1
+        )
+        notify_unread(user_ids)
 
     # Push channel stub (provider integration can be added later)
     device_count = estimated_target_device_counts(user_ids) if _should_send_push(template) else 0
@@ -265,3 +354,195 @@ def dispatch_template_now(*, template: NotificationEventTemplate, actor: Optiona
     batch.save(update_fields=["target_counts", "status", "finished_at"])
 
     return batch
+
+
+def visible_broadcasts(user) -> List[Broadcast]:
+    """
+    Broadcasts in user's inbox, newest first, each with .read_at set (receipt or read cursor).
+      - audience evaluated now; only broadcasts sent since the user joined
+      - dedupe broadcasts repeating identical content within 7 days are hidden (as dispatch used to skip them)
+      - dismissed ones are dropped
+    """
+    qs = Broadcast.objects.all()
+    joined = getattr(user, "date_joined", None)
+    if joined:
+        qs = qs.filter(created_at__gte=joined)
+    # Role/active audience in SQL so the read window only holds broadcasts meant for this user
+    role_q = Q(audience_roles__isnull=True) | Q(audience_roles="")
+    for t in _role_tokens_for(user):
+        role_q |= Q(audience_roles__contains=f",{t},")
+    qs = qs.filter(role_q)
+    if not getattr(user, "account_active", False):
+        qs = qs.filter(Q(require_active__isnull=True) | Q(require_active=False))
+    items = [b for b in qs.order_by("-id")[:BROADCAST_READ_LIMIT] if audience_matches(user, b.audience)]
+    if not items:
+        return []
+
+    shown = {}
+    keep = []
+    for b in reversed(items):
+        if b.dedupe:
+            key = (b.title, b.body, b.deep_link)
+            prev = shown.get(key)
+            if prev is not None and b.created_at - prev < DEDUPE_WINDOW:
+                continue
+            shown[key] = b.created_at
+        keep.append(b)
+    keep.reverse()
+
+    receipts = {
+        r.broadcast_id: r
+        for r in BroadcastReceipt.objects.filter(user=user, broadcast_id__in=[b.id for b in keep])
+    }
+    cursor = NotificationCursor.objects.filter(user=user).first()
+    out = []
+    for b in keep:
+        r = receipts.get(b.id)
+        if r is not None and r.dismissed_at:
+            continue
+        b.read_at = r.read_at if (r is not None and r.read_at) else None
+        if b.read_at is None and cursor is not None and b.id <= cursor.read_through_id:
+            b.read_at = cursor.updated_at
+        out.append(b)
+    return out
+
+
+def broadcast_item(b: Broadcast) -> Dict:
+    """
+    Broadcast in NotificationSerializer shape; ids are "b<id>" so mark-read/dismiss can tell them apart.
+    """
+    return {
+        "id": f"b{b.id}",
+        "title": b.title,
+        "body": b.body,
+        "deep_link": b.deep_link,
+        "priority": b.priority,
+        "pinned_until": b.pinned_until,
+        "delivered_at": b.created_at,
+        "read_at": getattr(b, "read_at", None),
+        "created_at": b.created_at,
+        "channel": "in_app",
+        "is_broadcast": True,
+        "batch": b.batch_id,
+        "is_read": bool(getattr(b, "read_at", None)),
+    }
+
+
+def split_item_ids(ids) -> Tuple[List[int], List[int]]:
+    """
+    Inbox ids -> (Notification ids, Broadcast ids); broadcast ids come as "b<id>".
+    """
+    notif_ids, broadcast_ids = [], []
+    for x in ids or []:
+        sx = str(x).strip().lower()
+        if sx.isdigit():
+            notif_ids.append(int(sx))
+        elif sx.startswith("b") and sx[1:].isdigit():
+            broadcast_ids.append(int(sx[1:]))
+    return notif_ids, broadcast_ids
+
+
+def _mark_broadcasts(user, broadcast_ids: List[int], field: str) -> int:
+    """
+    Stamp field (read_at / dismissed_at) on the user's receipts for these broadcasts; returns how many changed.
+    """
+    ids = set(Broadcast.objects.filter(id__in=broadcast_ids).values_list("id", flat=True))
+    if not ids:
+        return 0
+    now = timezone.now()
+    changed = BroadcastReceipt.objects.filter(user=user, broadcast_id__in=ids, **{f"{field}__isnull": True}).update(**{field: now})
+    have = set(BroadcastReceipt.objects.filter(user=user, broadcast_id__in=ids).values_list("broadcast_id", flat=True))
+    missing = [BroadcastReceipt(user=user, broadcast_id=i, **{field: now}) for i in ids - have]
+    if missing:
+        try:
+            with transaction.atomic():
+                BroadcastReceipt.objects.bulk_create(missing)
+            changed += len(missing)
+        except IntegrityError:
+            # A concurrent request created them; stamp what is still unset
+            changed += BroadcastReceipt.objects.filter(user=user, broadcast_id__in=ids, **{f"{field}__isnull": True}).update(**{field: now})
+    return changed
+
+
+def _adjust_counters(user, targeted_read: int = 0, broadcasts_touched: bool = False) -> None:
+    """
+    Keep the cached unread counters in step after mark-read/dismiss.
+    """
+    if targeted_read:
+        NotificationCursor.objects.filter(user=user, unread_targeted__isnull=False).update(
+            unread_targeted=F("unread_targeted") - targeted_read
+        )
+    if broadcasts_touched:
+        # Receipts may hit broadcasts that were already read or not visible; recount on next read
+        NotificationCursor.objects.filter(user=user).update(broadcast_checked_id=-1)
+    if targeted_read or broadcasts_touched:
+        notify_unread([user.pk])
+
+
+def mark_read(user, ids=None, mark_all: bool = False) -> int:
+    """
+    Mark inbox items read. mark_all moves the user's broadcast read cursor instead of writing receipts.
+    """
+    qs = Notification.objects.filter(user=user, read_at__isnull=True)
+    if mark_all:
+        updated = qs.update(read_at=timezone.now())
+        unread = sum(1 for b in visible_broadcasts(user) if not b.read_at)
+        top = Broadcast.objects.aggregate(m=Max("id"))["m"] or 0
+        NotificationCursor.objects.update_or_create(
+            user=user,
+            defaults={"read_through_id": top, "unread_targeted": 0, "broadcast_unread": 0, "broadcast_checked_id": top},
+        )
+        notify_unread([user.pk])
+        return int(updated) + unread
+    notif_ids, broadcast_ids = split_item_ids(ids)
+    updated = qs.filter(id__in=notif_ids).update(read_at=timezone.now()) if notif_ids else 0
+    changed = _mark_broadcasts(user, broadcast_ids, "read_at")
+    _adjust_counters(user, targeted_read=updated, broadcasts_touched=bool(changed))
+    return int(updated) + changed
+
+
+def dismiss(user, ids) -> int:
+    notif_ids, broadcast_ids = split_item_ids(ids)
+    updated = unread = 0
+    if notif_ids:
+        qs = Notification.objects.filter(user=user, id__in=notif_ids, dismissed_at__isnull=True)
+        unread = qs.filter(read_at__isnull=True).count()
+        updated = qs.update(dismissed_at=timezone.now())
+    changed = _mark_broadcasts(user, broadcast_ids, "dismissed_at")
+    _adjust_counters(user, targeted_read=unread, broadcasts_touched=bool(changed))
+    return int(updated) + changed
+
+
+def _latest_broadcast_id(fresh: bool = False) -> int:
+    import time
+
+    now = time.monotonic()
+    if fresh or now - _latest_broadcast["at"] >= LATEST_BROADCAST_TTL:
+        _latest_broadcast["id"] = Broadcast.objects.aggregate(m=Max("id"))["m"] or 0
+        _latest_broadcast["at"] = now
+    return _latest_broadcast["id"]
+
+
+def unread_count(user, fresh: bool = False) -> int:
+    """
+    Unread targeted rows + unread visible broadcasts, served from the user's NotificationCursor:
+      - unread_targeted: maintained on insert/mark-read/dismiss; recounted when NULL
+      - broadcast_unread: recomputed only when a newer Broadcast exists (or the user acted on broadcasts)
+    Steady state is a primary-key read (plus the newest broadcast id, cached per process; fresh=True
+    re-reads it, for waiters woken by a new broadcast).
+    """
+    cur, _ = NotificationCursor.objects.get_or_create(user=user)
+    changes = {}
+    if cur.unread_targeted is None:
+        changes["unread_targeted"] = Notification.objects.filter(
+            user=user, read_at__isnull=True, dismissed_at__isnull=True
+        ).count()
+    latest = _latest_broadcast_id(fresh)
+    if cur.broadcast_checked_id < 0 or cur.broadcast_checked_id < latest:
+        changes["broadcast_unread"] = sum(1 for b in visible_broadcasts(user) if not b.read_at)
+        changes["broadcast_checked_id"] = latest
+    if changes:
+        NotificationCursor.objects.filter(pk=cur.pk).update(**changes)
+        for f, v in changes.items():
+            setattr(cur, f, v)
+    return max(0, int(cur.unread_targeted or 0)) + max(0, int(cur.broadcast_unread or 0))
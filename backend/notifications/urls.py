@@ -3,8 +3,10 @@ from .views import (
     DeviceTokenRegisterView,
     InboxListView,
     MarkReadView,
+    DismissView,
     PinnedListView,
     UnreadCountView,
+    UnreadCountWaitView,
     AdminTemplateDispatchView,
     AdminTemplateBulkDispatchView,
 )
@@ -13,8 +15,10 @@ urlpatterns = [
     path("device-token/", DeviceTokenRegisterView.as_view()),
     path("inbox/", InboxListView.as_view()),
     path("mark-read/", MarkReadView.as_view()),
+    path("dismiss/", DismissView.as_view()),
     path("pinned/", PinnedListView.as_view()),
     path("unread-count/", UnreadCountView.as_view()),
+    path("unread-count/wait/", UnreadCountWaitView.as_view()),
     # Admin dispatch endpoints
     path("admin/templates/<int:pk>/dispatch/", AdminTemplateDispatchView.as_view()),
     path("admin/templates/bulk-dispatch/", AdminTemplateBulkDispatchView.as_view()),
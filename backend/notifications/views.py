@@ -1,3 +1,6 @@
+import threading
+
+from django.conf import settings
 from django.utils import timezone
 from django.db.models import Q
 from rest_framework.views import APIView
@@ -9,7 +12,15 @@ from adminapi.permissions import IsAdminOrStaff
 
 from .models import Notification, NotificationEventTemplate
 from .serializers import NotificationSerializer, DeviceTokenSerializer
-from .services import upsert_device_token, dispatch_template_now
+from .services import (
+    upsert_device_token,
+    dispatch_template_now,
+    visible_broadcasts,
+    broadcast_item,
+    mark_read,
+    dismiss,
+    unread_count,
+)
 
 
 class DeviceTokenRegisterView(APIView):
@@ -45,9 +56,20 @@ class DeviceTokenRegisterView(APIView):
             return Response({"detail": str(e)}, status=400)
 
 
+def _merge_sort_key(field: str):
+    """
+    Sort key over Notification instances and Broadcasts for an ordering field; None sorts lowest.
+    """
+    def key(obj):
+        v = getattr(obj, field, None)
+        return (v is not None, v if v is not None else 0)
+    return key
+
+
 class InboxListView(ListAPIView):
     """
-    GET: List in-app notifications for the current user.
+    GET: List in-app notifications for the current user: targeted Notification rows merged with
+    broadcasts (stored once, ids "b<id>").
     Query params:
       - page (default 1), page_size (default 25, max 200)
       - read: 1|true => only read, 0|false|unread => only unread (default: all)
@@ -58,33 +80,67 @@ class InboxListView(ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = NotificationSerializer
 
+    def _read_filter(self):
+        read = (self.request.query_params.get("read") or "").strip().lower()
+        if read in ("1", "true", "yes", "read"):
+            return True
+        if read in ("0", "false", "no", "unread"):
+            return False
+        return None
+
+    def _pinned_only(self):
+        return (self.request.query_params.get("pinned") or "").strip().lower() in ("1", "true", "yes")
+
+    def _since(self):
+        return (self.request.query_params.get("since") or "").strip()
+
+    def _ordering(self):
+        return (self.request.query_params.get("ordering") or "-created_at").strip()
+
     def get_queryset(self):
         u = self.request.user
-        qs = Notification.objects.filter(user=u).order_by("-created_at")
+        qs = Notification.objects.filter(user=u, dismissed_at__isnull=True).order_by("-created_at")
 
-        read = (self.request.query_params.get("read") or "").strip().lower()
-        if read in ("1", "true", "yes", "read"):
+        read = self._read_filter()
+        if read is True:
             qs = qs.filter(read_at__isnull=False)
-        elif read in ("0", "false", "no", "unread"):
+        elif read is False:
             qs = qs.filter(read_at__isnull=True)
 
-        pinned = (self.request.query_params.get("pinned") or "").strip().lower()
-        if pinned in ("1", "true", "yes"):
+        if self._pinned_only():
             now = timezone.now()
             qs = qs.filter(Q(pinned_until__isnull=True) | Q(pinned_until__gte=now))
 
-        since = (self.request.query_params.get("since") or "").strip()
+        since = self._since()
         if since:
             try:
                 qs = qs.filter(created_at__date__gte=since)
             except Exception:
                 pass
 
-        ordering = (self.request.query_params.get("ordering") or "-created_at").strip()
+        ordering = self._ordering()
         if ordering:
             qs = qs.order_by(ordering)
         return qs
 
+    def get_broadcasts(self):
+        items = visible_broadcasts(self.request.user)
+        read = self._read_filter()
+        if read is not None:
+            items = [b for b in items if bool(b.read_at) == read]
+        if self._pinned_only():
+            now = timezone.now()
+            items = [b for b in items if b.pinned_until is None or b.pinned_until >= now]
+        since = self._since()
+        if since:
+            try:
+                from datetime import date
+                day = date.fromisoformat(since[:10])
+                items = [b for b in items if timezone.localdate(b.created_at) >= day]
+            except Exception:
+                pass
+        return items
+
     def list(self, request, *args, **kwargs):
         qs = self.get_queryset()
         try:
@@ -97,19 +153,30 @@ class InboxListView(ListAPIView):
             page_size = 25
         page = max(1, page)
         page_size = max(1, min(page_size, 200))
-        total = qs.count()
         start = (page - 1) * page_size
         end = start + page_size
-        ser = self.get_serializer(qs[start:end], many=True)
-        return Response({"count": total, "results": ser.data}, status=200)
+
+        broadcasts = self.get_broadcasts()
+        total = qs.count() + len(broadcasts)
+
+        ordering = self._ordering() or "-created_at"
+        field = ordering.lstrip("-")
+        merged = sorted(list(qs[:end]) + broadcasts, key=_merge_sort_key(field), reverse=ordering.startswith("-"))
+        results = []
+        for obj in merged[start:end]:
+            if isinstance(obj, Notification):
+                results.append(self.get_serializer(obj).data)
+            else:
+                results.append(broadcast_item(obj))
+        return Response({"count": total, "results": results}, status=200)
 
 
 class MarkReadView(APIView):
     """
     PATCH: Mark notifications as read for current user.
     Body:
-      - {"ids": [1,2,3]}  => mark selected
-      - {"all": true}     => mark all unread as read
+      - {"ids": [1, "b2", 3]}  => mark selected ("b<id>" = broadcast)
+      - {"all": true}          => mark all unread as read (broadcasts via the read cursor)
     """
     permission_classes = [IsAuthenticated]
 
@@ -118,22 +185,29 @@ class MarkReadView(APIView):
         ids = data.get("ids") or []
         mark_all = bool(data.get("all"))
 
-        qs = Notification.objects.filter(user=request.user, read_at__isnull=True)
         if ids and isinstance(ids, list):
-            try:
-                ids = [int(x) for x in ids if str(x).isdigit()]
-            except Exception:
-                ids = []
-            if ids:
-                qs = qs.filter(id__in=ids)
-        elif not mark_all:
+            updated = mark_read(request.user, ids=ids)
+        elif mark_all:
+            updated = mark_read(request.user, mark_all=True)
+        else:
             return Response({"detail": "Provide ids or set all=true"}, status=400)
-
-        now = timezone.now()
-        updated = qs.update(read_at=now)
         return Response({"updated": int(updated)}, status=200)
 
 
+class DismissView(APIView):
+    """
+    PATCH: Hide notifications from the current user's inbox.
+    Body: {"ids": [1, "b2"]}
+    """
+    permission_classes = [IsAuthenticated]
+
+    def patch(self, request):
+        ids = (request.data or {}).get("ids") or []
+        if not (ids and isinstance(ids, list)):
+            return Response({"detail": "Provide ids"}, status=400)
+        return Response({"updated": int(dismiss(request.user, ids))}, status=200)
+
+
 class PinnedListView(ListAPIView):
     """
     GET: List currently pinned announcements for the current user.
@@ -145,27 +219,87 @@ class PinnedListView(ListAPIView):
         now = timezone.now()
         return (
             Notification.objects
-            .filter(user=self.request.user)
+            .filter(user=self.request.user, dismissed_at__isnull=True)
             .filter(Q(pinned_until__isnull=True) | Q(pinned_until__gte=now))
             .order_by("-priority", "-created_at")
         )
 
     def list(self, request, *args, **kwargs):
-        qs = self.get_queryset()
+        now = timezone.now()
         # Keep this lightweight; max 20 items
-        ser = self.get_serializer(qs[:20], many=True)
-        return Response({"results": ser.data}, status=200)
+        rows = list(self.get_queryset()[:20]) + [
+            b for b in visible_broadcasts(request.user) if b.pinned_until is None or b.pinned_until >= now
+        ]
+        rows.sort(key=lambda o: (o.priority or "", o.created_at), reverse=True)
+        results = [
+            self.get_serializer(o).data if isinstance(o, Notification) else broadcast_item(o)
+            for o in rows[:20]
+        ]
+        return Response({"results": results}, status=200)
 
 
 class UnreadCountView(APIView):
     """
-    GET: Return unread notifications count for the current user.
+    GET: Return unread notifications count for the current user (targeted + broadcasts), from the
+    cached per-user counters.
     """
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        c = Notification.objects.filter(user=request.user, read_at__isnull=True).count()
-        return Response({"unread": c}, status=200)
+        return Response({"unread": unread_count(request.user)}, status=200)
+
+
+# Long-poll waiters per process: each holds a gunicorn thread, so keep most threads for normal requests
+_LONGPOLL_MAX_WAITERS = int(getattr(settings, "NOTIFICATIONS_LONGPOLL_MAX_WAITERS", 0) or 0)
+_longpoll_slots = threading.BoundedSemaphore(_LONGPOLL_MAX_WAITERS) if _LONGPOLL_MAX_WAITERS > 0 else None
+LONGPOLL_BUSY_RETRY_SECONDS = 60
+# After a wait that saw no change: pause before the next wait so a tab does not hold a thread back to back
+LONGPOLL_IDLE_RETRY_SECONDS = 15
+
+
+class UnreadCountWaitView(APIView):
+    """
+    GET: Long-poll for unread count changes (replaces polling unread-count).
+    Query params:
+      - since: count the client last saw; answers as soon as the count differs from it
+      - timeout: seconds to wait (default/cap NOTIFICATIONS_LONGPOLL_SECONDS)
+    Response: {"unread": n, "changed": bool, "retry_after": seconds before the next call}
+    Waiters are woken by Postgres NOTIFY on notification insert, mark-read/dismiss and new broadcasts
+    (jobs.notify CHANNEL_UNREAD); the count is re-read only then (and every few seconds as a safety net).
+    Without a free waiter slot (NOTIFICATIONS_LONGPOLL_MAX_WAITERS, 0 by default) it answers at once with
+    retry_after, i.e. clients poll every LONGPOLL_BUSY_RETRY_SECONDS.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        current = unread_count(request.user)
+        try:
+            since = int(request.query_params.get("since"))
+        except Exception:
+            since = None
+        if since is None or since != current:
+            return Response({"unread": current, "changed": since is not None, "retry_after": 0}, status=200)
+
+        max_wait = float(getattr(settings, "NOTIFICATIONS_LONGPOLL_SECONDS", 25) or 0)
+        try:
+            wait = min(max_wait, float(request.query_params.get("timeout") or max_wait))
+        except Exception:
+            wait = max_wait
+        if wait <= 0 or _longpoll_slots is None or not _longpoll_slots.acquire(blocking=False):
+            return Response({"unread": current, "changed": False, "retry_after": LONGPOLL_BUSY_RETRY_SECONDS}, status=200)
+        try:
+            from jobs.notify import wait_for_unread_change
+            latest = {"unread": current}
+
+            def _changed() -> bool:
+                latest["unread"] = unread_count(request.user, fresh=True)
+                return latest["unread"] != since
+
+            if wait_for_unread_change(request.user.pk, wait, _changed):
+                return Response({"unread": latest["unread"], "changed": True, "retry_after": 0}, status=200)
+        finally:
+            _longpoll_slots.release()
+        return Response({"unread": latest["unread"], "changed": False, "retry_after": LONGPOLL_IDLE_RETRY_SECONDS}, status=200)
 
 
 class AdminTemplateDispatchView(APIView):
@@ -1100,6 +1100,17 @@ export async function notificationsUnreadCount() {
   });
   return res?.data || res;
 }
+// Long-poll: resolves when the unread count differs from `since` (or after the server's wait window).
+export async function notificationsUnreadWait(since) {
+  const res = await API.get("/notifications/unread-count/wait/", {
+    params: { since },
+    cacheTTL: 0,
+    dedupe: "none",
+    timeout: 45000,
+    _skipLoadingTrack: true,
+  });
+  return res?.data || res;
+}
 export async function notificationsPinned() {
   const res = await API.get("/notifications/pinned/", {
     cacheTTL: 30_000,
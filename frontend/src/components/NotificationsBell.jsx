@@ -1,4 +1,4 @@
-import React, { useCallback, useEffect, useMemo, useState } from "react";
+import React, { useCallback, useEffect, useMemo, useRef, useState } from "react";
 import {
   IconButton,
   Badge,
@@ -15,6 +15,7 @@ import {
 import NotificationsNoneIcon from "@mui/icons-material/NotificationsNone";
 import {
   notificationsUnreadCount,
+  notificationsUnreadWait,
   notificationsPinned,
   notificationsInbox,
   notificationsMarkRead,
@@ -71,11 +72,42 @@ export default function NotificationsBell() {
   useEffect(() => {
     loadUnread();
     loadPinned();
-    // Poll unread periodically (1 min)
-    const t = setInterval(loadUnread, 60000);
-    return () => clearInterval(t);
   }, [loadUnread, loadPinned]);
 
+  // Follow unread changes via long-poll; the server tells us when to back off (busy / errors => 1 min)
+  const unreadRef = useRef(0);
+  useEffect(() => {
+    unreadRef.current = unread;
+  }, [unread]);
+  useEffect(() => {
+    let stopped = false;
+    let timer = null;
+    const loop = async () => {
+      if (stopped) return;
+      let delay = 60000;
+      if (typeof document === "undefined" || document.visibilityState !== "hidden") {
+        try {
+          const res = await notificationsUnreadWait(unreadRef.current);
+          const n = Number(res?.unread ?? 0) || 0;
+          if (!stopped) {
+            unreadRef.current = n;
+            setUnread(n);
+          }
+          delay = Math.max(0, Number(res?.retry_after ?? 60)) * 1000;
+        } catch {
+          delay = 60000;
+        }
+      }
+      // Small floor so a misbehaving server cannot make us spin
+      if (!stopped) timer = setTimeout(loop, Math.max(delay, 1000));
+    };
+    timer = setTimeout(loop, 1000);
+    return () => {
+      stopped = true;
+      if (timer) clearTimeout(timer);
+    };
+  }, []);
+
   const handleOpen = async (e) => {
     setAnchorEl(e.currentTarget);
     // lazily refresh inbox each time opened
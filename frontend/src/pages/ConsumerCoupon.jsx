@@ -409,17 +409,30 @@ export default function ConsumerCoupon() {
 
   // Helpers for activation task polling
   const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+  // Long-polls: the server holds each request (?wait=) until the task finishes
   const pollTask = async (taskId, { intervalMs = 1500, timeoutMs = 30000 } = {}) => {
     const started = Date.now();
     while (Date.now() - started < timeoutMs) {
+      const reqStarted = Date.now();
       try {
-        const res = await API.get(`/jobs/${taskId}/status/`);
+        const waitS = Math.max(1, Math.min(20, Math.floor((timeoutMs - (Date.now() - started)) / 1000)));
+        const res = await API.get(`/jobs/${taskId}/status/`, {
+          params: { wait: waitS },
+          timeout: (waitS + 10) * 1000,
+        });
         const st = res?.data?.status;
         if (st === "DONE" || st === "FAILED") return res?.data;
+        // Server had no free long-poll slot: wait as told before asking again
+        const retryAfter = Number(res?.data?.retry_after) || 0;
+        if (retryAfter > 0) {
+          await sleep(retryAfter * 1000);
+          continue;
+        }
       } catch (e) {
         // ignore transient errors and continue polling
       }
-      await sleep(intervalMs);
+      // Back off only when the server answered immediately (error / no long-poll support)
+      if (Date.now() - reqStarted < intervalMs) await sleep(intervalMs);
     }
     return { id: taskId, status: "TIMEOUT" };
   };
@@ -559,6 +559,23 @@ export default function AdminECoupons() {
     }
   }
 
+  // Large batches are generated by a background task; long-poll its status and report progress
+  async function waitForGenerateTask(taskId, onProgress) {
+    for (;;) {
+      try {
+        const res = await API.get(`/jobs/${taskId}/status/`, { params: { wait: 20 }, timeout: 30000 });
+        const d = res?.data || {};
+        if (d.progress && onProgress) onProgress(d.progress);
+        if (d.status === "DONE" || d.status === "FAILED") return d;
+        // No free long-poll slot on the server: back off as told
+        const retryAfter = Number(d.retry_after) || 0;
+        if (retryAfter > 0) await new Promise((r) => setTimeout(r, retryAfter * 1000));
+      } catch (_) {
+        await new Promise((r) => setTimeout(r, 2000));
+      }
+    }
+  }
+
   async function createSeasonBatch(denom, count, prefix) {
     if (!seasonCouponId) {
       alert("Ensure Season first");
@@ -579,17 +596,25 @@ export default function AdminECoupons() {
     try {
       if (value === 150) setGen150((g) => ({ ...g, loading: true }));
       if (value === 759) setGen759((g) => ({ ...g, loading: true }));
-      await API.post("/coupons/batches/create-ecoupons/", payload);
+      const res = await API.post("/coupons/batches/create-ecoupons/", payload);
+      if (res?.data?.status === "queued" && res?.data?.task_id) {
+        const setGen = value === 150 ? setGen150 : value === 759 ? setGen759 : null;
+        const done = await waitForGenerateTask(res.data.task_id, (p) => {
+          const pct = p.total ? Math.floor((100 * (p.done || 0)) / p.total) : 0;
+          if (setGen) setGen((g) => ({ ...g, progress: pct }));
+        });
+        if (done?.status === "FAILED") throw new Error(done?.last_error || "Batch generation failed");
+      }
       await loadBootstrap();
       await preloadSeasonBatchDenoms(Number(seasonCouponId));
       await refreshSeasonAvailability(Number(seasonCouponId));
       alert(`Created ${cnt} codes (₹${value}) for ${seasonLabel(season.number)}`);
     } catch (e) {
-      const msg = e?.response?.data?.detail || "Failed to create batch";
+      const msg = e?.response?.data?.detail || e?.message || "Failed to create batch";
       alert(msg);
     } finally {
-      if (value === 150) setGen150((g) => ({ ...g, loading: false }));
-      if (value === 759) setGen759((g) => ({ ...g, loading: false }));
+      if (value === 150) setGen150((g) => ({ ...g, loading: false, progress: null }));
+      if (value === 759) setGen759((g) => ({ ...g, loading: false, progress: null }));
     }
   }
 
@@ -1509,7 +1534,7 @@ export default function AdminECoupons() {
                 fontWeight: 700,
               }}
             >
-              {gen150.loading ? "Creating..." : "Generate 150"}
+              {gen150.loading ? (gen150.progress != null ? `Creating... ${gen150.progress}%` : "Creating...") : "Generate 150"}
             </button>
           </div>
 
@@ -1551,7 +1576,7 @@ export default function AdminECoupons() {
                 fontWeight: 700,
               }}
             >
-              {gen759.loading ? "Creating..." : "Generate 759"}
+              {gen759.loading ? (gen759.progress != null ? `Creating... ${gen759.progress}%` : "Creating...") : "Generate 759"}
             </button>
           </div>
         </div>
@@ -88,6 +88,8 @@ export default function AdminLuckyDraw() {
   const [eligLoading, setEligLoading] = useState(false);
   const [eligErr, setEligErr] = useState("");
   const [eligRows, setEligRows] = useState([]);
+  const [eligNext, setEligNext] = useState(null);
+  const [eligMoreLoading, setEligMoreLoading] = useState(false);
   const [eligFilters, setEligFilters] = useState({ eligible_only: true, search: "" });
 
   function setF(key, val) {
@@ -253,13 +255,15 @@ export default function AdminLuckyDraw() {
     }
   }
 
-  async function fetchEligibility() {
+  async function fetchEligibility(cursor = null) {
     if (!seasonId) {
       setEligRows([]);
+      setEligNext(null);
       return;
     }
+    const setBusy = cursor ? setEligMoreLoading : setEligLoading;
     try {
-      setEligLoading(true);
+      setBusy(true);
       setEligErr("");
       const params = {
         coupon: seasonId,
@@ -267,14 +271,18 @@ export default function AdminLuckyDraw() {
       };
       const s = String(eligFilters.search || "").trim();
       if (s) params.search = s;
+      if (cursor) params.cursor = cursor;
       const res = await API.get("/coupons/lucky-draw/participants/", { params });
       const items = res?.data?.results || res?.data || [];
-      setEligRows(Array.isArray(items) ? items : []);
+      const list = Array.isArray(items) ? items : [];
+      setEligRows((prev) => (cursor ? [...prev, ...list] : list));
+      setEligNext(res?.data?.next_cursor || null);
     } catch (e) {
-      setEligRows([]);
+      if (!cursor) setEligRows([]);
+      setEligNext(null);
       setEligErr(e?.response?.data?.detail || "Failed to load participants");
     } finally {
-      setEligLoading(false);
+      setBusy(false);
     }
   }
 
@@ -594,7 +602,7 @@ export default function AdminLuckyDraw() {
           </div>
           <div style={{ display: "flex", alignItems: "flex-end" }}>
             <button
-              onClick={fetchEligibility}
+              onClick={() => fetchEligibility()}
               disabled={eligLoading}
               style={{
                 padding: "10px 12px",
@@ -686,6 +694,24 @@ export default function AdminLuckyDraw() {
               ))
             )}
           </div>
+          {!eligLoading && eligNext ? (
+            <div style={{ padding: 10, textAlign: "center" }}>
+              <button
+                onClick={() => fetchEligibility(eligNext)}
+                disabled={eligMoreLoading}
+                style={{
+                  padding: "8px 14px",
+                  background: "#fff",
+                  color: "#0f172a",
+                  border: "1px solid #e2e8f0",
+                  borderRadius: 8,
+                  cursor: eligMoreLoading ? "not-allowed" : "pointer",
+                }}
+              >
+                {eligMoreLoading ? "Loading..." : "Load more"}
+              </button>
+            </div>
+          ) : null}
         </div>
       </div>
 